@@ -0,0 +1,167 @@
+import json
+import random
+import threading
+import time
+from collections import namedtuple
+
+from botocore.exceptions import ClientError
+
+import blobs
+from metrics import emit
+
+# state is 'fresh', 'stale' or 'negative'; report is None for negative entries
+CacheEntry = namedtuple('CacheEntry', ['state', 'report', 'model'])
+
+
+class AnalysisCache:
+    """Per-signature analysis cache with stale-while-revalidate.
+
+    An entry is fresh for fresh_seconds and then served stale until its
+    hard expiry, max_age_seconds after caching less up to `jitter` of it,
+    so entries cached together don't all expire together. Whoever first
+    finds an entry stale takes a lease (a conditional update) and
+    refreshes it; everyone else keeps serving the stale report until the
+    refreshed one lands, so a popular signature never waits on the LLM.
+
+    A failed analysis for an uncached signature is remembered as a
+    negative entry for negative_seconds, answered with the fallback
+    instead of another doomed LLM call. A failed refresh leaves the stale
+    entry in place and holds the lease for negative_seconds before the
+    next attempt.
+
+    With generations (a Generations), entries are stored with their
+    alert's scope and that scope's deploy generation, and once a deploy
+    bumps it they are misses whatever their age. Entries are keyed by
+    signature alone, so an entry is always checked against its own scope,
+    not that of the alert looking it up.
+    """
+
+    def __init__(self, table, fresh_seconds=3600, max_age_seconds=86400, jitter=0.1, lease_seconds=120,
+                 negative_seconds=120, codec='native', generations=None):
+        self.table = table
+        self.fresh_seconds = fresh_seconds
+        self.max_age_seconds = max_age_seconds
+        self.jitter = jitter
+        self.lease_seconds = lease_seconds
+        self.negative_seconds = negative_seconds
+        self.codec = codec
+        self.generations = generations
+        self.stats = {'fresh': 0, 'stale': 0, 'negative': 0, 'miss': 0, 'invalidated': 0, 'refreshes': 0}
+        self.lock = threading.Lock()
+
+    def _count(self, stat):
+        with self.lock:
+            self.stats[stat] += 1
+
+    def lookup(self, signature, now=None):
+        """The usable CacheEntry for a signature, or None"""
+        now = now or time.time()
+        item = self.table.get_item(Key={'error_signature': signature}).get('Item')
+
+        if not item or item.get('expires_at', 0) <= now:
+            self._count('miss')
+            return None
+        if item.get('negative'):
+            self._count('negative')
+            return CacheEntry('negative', None, None)
+        if self.outdated(item, now):
+            # Analyzed before its scope's latest deploy or rollback
+            self._count('invalidated')
+            return None
+
+        state = 'fresh' if item.get('fresh_until', 0) > now else 'stale'
+        self._count(state)
+        report = json.loads(blobs.decode(item)['analysis'])
+        return CacheEntry(state, report, item.get('model'))
+
+    def outdated(self, item, now=None):
+        """Whether a deploy to the entry's scope came after it was cached"""
+        if not self.generations or not item.get('scope'):
+            return False
+        return item.get('generation', 0) < self.generations.current(item['scope'], now)
+
+    def acquire_lease(self, signature, now=None):
+        """Take the right to refresh a stale entry; False if someone holds it"""
+        now = now or time.time()
+        try:
+            self.table.update_item(
+                Key={'error_signature': signature},
+                UpdateExpression='SET lease_until = :until',
+                ConditionExpression='attribute_exists(error_signature) AND '
+                                    '(attribute_not_exists(lease_until) OR lease_until < :now)',
+                ExpressionAttributeValues={':until': int(now + self.lease_seconds), ':now': int(now)}
+            )
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+            return False
+        self._count('refreshes')
+        return True
+
+    def store(self, signature, report, model, now=None, scope=None):
+        """Cache a fresh analysis (also releases any lease)"""
+        now = now or time.time()
+        expires_at = int(now + self.max_age_seconds * (1 - random.uniform(0, self.jitter)))
+        item = {
+            'error_signature': signature,
+            'analysis': json.dumps(report),
+            'model': model,
+            'cached_at': int(now),
+            'fresh_until': int(now + self.fresh_seconds),
+            'expires_at': expires_at,
+            'ttl': expires_at
+        }
+        if self.generations and scope:
+            item['scope'] = scope
+            item['generation'] = self.generations.current(scope, now)
+        self.table.put_item(Item=blobs.encode(item, self.codec))
+
+    def record_failure(self, signature, now=None):
+        """Remember a failed analysis without clobbering a usable stale entry"""
+        now = now or time.time()
+        until = int(now + self.negative_seconds)
+        condition = 'attribute_not_exists(error_signature) OR expires_at <= :now OR negative = :true'
+        names, values = {}, {':now': int(now), ':true': True}
+        if self.generations:
+            # An entry from before its scope's last deploy isn't usable either
+            current = self.table.get_item(Key={'error_signature': signature},
+                                          ProjectionExpression='#scope, generation',
+                                          ExpressionAttributeNames={'#scope': 'scope'}).get('Item') or {}
+            if self.outdated(current, now):
+                condition += ' OR (#scope = :scope AND generation < :generation)'
+                names['#scope'] = 'scope'
+                values[':scope'] = current['scope']
+                values[':generation'] = self.generations.current(current['scope'], now)
+        kwargs = {'ExpressionAttributeNames': names} if names else {}
+        try:
+            self.table.put_item(
+                Item={'error_signature': signature, 'negative': True, 'cached_at': int(now),
+                      'expires_at': until, 'ttl': until},
+                ConditionExpression=condition,
+                ExpressionAttributeValues=values,
+                **kwargs
+            )
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+            # A stale entry is still being served: back off its next refresh
+            self.table.update_item(
+                Key={'error_signature': signature},
+                UpdateExpression='SET lease_until = :until',
+                ExpressionAttributeValues={':until': until}
+            )
+
+    def export_metrics(self):
+        """Emit lookups by outcome and refreshes started; counters reset after each export"""
+        with self.lock:
+            stats, self.stats = self.stats, dict.fromkeys(self.stats, 0)
+        if not any(stats.values()):
+            return
+        emit({
+            'AnalysisCacheFresh': stats['fresh'],
+            'AnalysisCacheStale': stats['stale'],
+            'AnalysisCacheNegative': stats['negative'],
+            'AnalysisCacheMisses': stats['miss'],
+            'AnalysisCacheInvalidated': stats['invalidated'],
+            'AnalysisCacheRefreshes': stats['refreshes']
+        })
@@ -0,0 +1,208 @@
+import os
+import re
+import threading
+import time
+import zlib
+from collections import namedtuple
+
+import structured
+from metrics import emit
+from prompt_builder import VOLATILE_PATTERN
+
+DEFAULT_MODEL_PATH = os.path.join(os.path.dirname(__file__), 'classifier.npz')
+
+# Hashed feature space; collisions between rare n-grams cost little
+DEFAULT_DIMS = 2 ** 16
+
+# Only the head of a message is featurized, as for runbooks
+FEATURE_CHARS = 2000
+
+TOKEN_PATTERN = re.compile(r'[a-z_][a-z0-9_]*|#')
+
+# Predicted severity ("category") and whether the alert needs an LLM
+# analysis; confidence is the probability of the needs_llm decision
+Prediction = namedtuple('Prediction', ['category', 'needs_llm', 'confidence'])
+
+
+def features(body, dims=DEFAULT_DIMS):
+    """Hashed unigram and bigram indices of an alert's message, plus its ingest severity.
+
+    Volatile parts (numbers, ids, timestamps) are masked first, so
+    occurrences of one template share their features. crc32 rather than
+    hash(), which is salted per process.
+    """
+    text = VOLATILE_PATTERN.sub('#', (body.get('message') or '')[:FEATURE_CHARS]).lower()
+    tokens = TOKEN_PATTERN.findall(text)
+    grams = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    grams.append(f"severity={body.get('severity', 'MEDIUM')}")
+    return sorted({zlib.crc32(gram.encode('utf-8')) % dims for gram in grams})
+
+
+class AlertClassifier:
+    """Hashed n-gram logistic regression deciding which alerts need the LLM.
+
+    One weight matrix over the hashed features: a softmax head over the
+    severities the LLM assigned in the training data, and a logistic head
+    for "needs an LLM analysis". Scoring an alert sums a few dozen weight
+    rows, so it costs microseconds.
+
+    The model file (numpy .npz, float16 weights) is read, and numpy
+    imported, on the first prediction; without either the classifier
+    predicts nothing and every alert goes to the LLM as before.
+    """
+
+    def __init__(self, path=DEFAULT_MODEL_PATH, threshold=0.9):
+        self.path = path
+        self.threshold = threshold
+        self._model = None
+        self._loaded = False
+        self.stats = {'predictions': 0, 'skipped': 0, 'seconds': 0.0}
+        self.lock = threading.Lock()
+
+    @classmethod
+    def load(cls):
+        """Classifier from CLASSIFIER_MODEL_PATH and CLASSIFIER_THRESHOLD; the file is read lazily"""
+        return cls(os.environ.get('CLASSIFIER_MODEL_PATH', DEFAULT_MODEL_PATH),
+                   float(os.environ.get('CLASSIFIER_THRESHOLD', '0.9')))
+
+    @property
+    def model(self):
+        if not self._loaded:
+            with self.lock:
+                if not self._loaded:
+                    self._model = self._read()
+                    self._loaded = True
+        return self._model
+
+    def _read(self):
+        if not self.path or not os.path.exists(self.path):
+            return None
+        try:
+            import numpy
+        except ImportError:
+            print(f"Classifier model at {self.path} but numpy is not installed, classifier disabled")
+            return None
+
+        start = time.perf_counter()
+        with numpy.load(self.path) as data:
+            model = {
+                'numpy': numpy,
+                'weights': data['weights'].astype(numpy.float32),
+                'bias': data['bias'].astype(numpy.float32),
+                'categories': [str(c) for c in data['categories']],
+                'dims': int(data['dims'])
+            }
+        print(f"Loaded classifier {self.path} ({len(model['categories'])} categories, {model['dims']} features) "
+              f"in {(time.perf_counter() - start) * 1000:.0f} ms")
+        return model
+
+    def predict(self, body):
+        """Prediction for an alert body, or None without a model"""
+        model = self.model
+        if model is None:
+            return None
+
+        start = time.perf_counter()
+        numpy = model['numpy']
+        scores = model['weights'][features(body, model['dims'])].sum(axis=0) + model['bias']
+        categories = scores[:-1]
+        p_llm = 1 / (1 + numpy.exp(-scores[-1]))
+        prediction = Prediction(model['categories'][int(categories.argmax())], bool(p_llm >= 0.5),
+                                float(max(p_llm, 1 - p_llm)))
+        self._count(seconds=time.perf_counter() - start, predictions=1)
+        return prediction
+
+    def skip(self, body):
+        """The prediction if the alert can skip the LLM: confidently routine, else None"""
+        prediction = self.predict(body)
+        if prediction is None or prediction.needs_llm or prediction.confidence < self.threshold:
+            return None
+        self._count(skipped=1)
+        return prediction
+
+    def _count(self, **deltas):
+        with self.lock:
+            for name, delta in deltas.items():
+                self.stats[name] += delta
+
+    def build_report(self, body, prediction):
+        """Report for an alert the classifier answered"""
+        first_line = (body.get('message') or 'Unknown error').splitlines()[0][:150]
+        report = structured.normalize_report({
+            'summary': f"Routine alert: {first_line}",
+            'severity': prediction.category,
+            'severity_assessment': (f"Classified as routine by the local classifier "
+                                    f"({prediction.confidence:.0%} confidence); not sent to the LLM"),
+            'impact_assessment': 'No immediate impact expected; similar alerts were routine in the past',
+            'remediation_steps': ['Watch for recurrence or escalation', 'Check related metrics if it persists'],
+            'requires_immediate_attention': False,
+            'confidence_level': 'MEDIUM'
+        }, body.get('severity', 'MEDIUM'))
+        report['classifier'] = {'category': prediction.category, 'confidence': round(prediction.confidence, 3)}
+        return report
+
+    def export_metrics(self):
+        """Emit predictions, LLM calls avoided and mean inference time; counters reset after each export"""
+        with self.lock:
+            stats, self.stats = self.stats, {'predictions': 0, 'skipped': 0, 'seconds': 0.0}
+        if not stats['predictions']:
+            return
+        emit({
+            'ClassifierPredictions': stats['predictions'],
+            'ClassifierSkipped': stats['skipped'],
+            'ClassifierInferenceMicros': stats['seconds'] * 1e6 / stats['predictions']
+        }, units={'ClassifierInferenceMicros': 'Microseconds'})
+
+
+def train(examples, categories, dims=DEFAULT_DIMS, epochs=60, learning_rate=0.5, l2=1e-6):
+    """(weights, bias) fitted to (body, category, needs_llm) examples.
+
+    Full-batch AdaGrad on the softmax and logistic losses; the feature
+    matrix is only ever touched through the hashed indices, so memory is
+    proportional to the examples' features, not to dims.
+    """
+    import numpy
+
+    column = {category: n for n, category in enumerate(categories)}
+    rows, cols = [], []
+    for n, (body, _, _) in enumerate(examples):
+        indices = features(body, dims)
+        rows += [n] * len(indices)
+        cols += indices
+    rows, cols = numpy.array(rows), numpy.array(cols)
+    targets = numpy.zeros((len(examples), len(categories) + 1), dtype=numpy.float32)
+    for n, (_, category, needs_llm) in enumerate(examples):
+        targets[n, column[category]] = 1
+        targets[n, -1] = needs_llm
+
+    weights = numpy.zeros((dims, len(categories) + 1), dtype=numpy.float32)
+    bias = numpy.zeros(len(categories) + 1, dtype=numpy.float32)
+    weights_g2 = numpy.full_like(weights, 1e-8)
+    bias_g2 = numpy.full_like(bias, 1e-8)
+    for _ in range(epochs):
+        scores = numpy.zeros_like(targets)
+        numpy.add.at(scores, rows, weights[cols])
+        scores += bias
+        categories_scores = scores[:, :-1] - scores[:, :-1].max(axis=1, keepdims=True)
+        probabilities = numpy.exp(categories_scores)
+        probabilities /= probabilities.sum(axis=1, keepdims=True)
+        error = numpy.concatenate([probabilities, 1 / (1 + numpy.exp(-scores[:, -1:]))], axis=1) - targets
+        error /= len(examples)
+
+        gradient = numpy.zeros_like(weights)
+        numpy.add.at(gradient, cols, error[rows])
+        gradient += l2 * weights
+        weights_g2 += gradient ** 2
+        weights -= learning_rate * gradient / numpy.sqrt(weights_g2)
+        bias_gradient = error.sum(axis=0)
+        bias_g2 += bias_gradient ** 2
+        bias -= learning_rate * bias_gradient / numpy.sqrt(bias_g2)
+    return weights, bias
+
+
+def save(path, weights, bias, categories):
+    """Write a model file: float16 weights, compressed"""
+    import numpy
+
+    numpy.savez_compressed(path, weights=weights.astype(numpy.float16), bias=bias.astype(numpy.float16),
+                           categories=numpy.array(categories), dims=numpy.array(weights.shape[0]))
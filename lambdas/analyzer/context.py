@@ -0,0 +1,246 @@
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import boto3
+from botocore.config import Config
+
+from metrics import emit
+from runbooks import fingerprint
+from signatures import SignatureStats
+from similar import SimilarAlerts, excluding
+
+# Context calls must fail fast: they only improve the prompt
+_aws_config = Config(connect_timeout=1, read_timeout=2, retries={'max_attempts': 2})
+dynamodb = boto3.resource('dynamodb', config=_aws_config)
+logs_client = boto3.client('logs', config=_aws_config)
+
+# A context source: name (the prompt context key), fetch(alert) -> value,
+# key(alert) -> cache key (None to skip the source), cache ttl in seconds and
+# an optional view(alert, value) -> per-alert context from a shared cached value
+ContextSource = namedtuple('ContextSource', ['name', 'fetch', 'key', 'ttl', 'view'], defaults=(None,))
+
+# Log context covers +/- LOG_WINDOW_SECONDS around the alert
+LOG_WINDOW_SECONDS = int(os.environ.get('CONTEXT_LOG_WINDOW_SECONDS', '60'))
+LOG_FETCH_DEADLINE = float(os.environ.get('CONTEXT_LOG_DEADLINE_SECONDS', '1.0'))
+LOG_MAX_EVENTS = 1000
+LOG_CONTEXT_LINES = 50
+
+# Similar alerts share the alert's error signature (or, if set, its severity)
+SIMILAR_BY = os.environ.get('CONTEXT_SIMILAR_BY', 'error_signature')
+SIMILAR_TOP_K = 5
+
+
+def alerts_table():
+    return dynamodb.Table(os.environ['ALERTS_TABLE'])
+
+
+def signature_stats():
+    return SignatureStats(dynamodb.Table(os.environ['SIGNATURE_STATS_TABLE']))
+
+
+def similar_alerts():
+    return SimilarAlerts(alerts_table(), top_k=SIMILAR_TOP_K)
+
+
+def similar_key(alert):
+    if SIMILAR_BY == 'severity':
+        return 'severity', alert.get('severity', 'MEDIUM')
+    return 'error_signature', fingerprint(alert.get('message', ''))
+
+
+def get_recent_similar_alerts(alert):
+    """Count and newest top-k of the past day's alerts matching this one"""
+    return similar_alerts().recent(*similar_key(alert))
+
+
+def alert_timestamp(alert):
+    """Alert time in epoch seconds (CloudWatch Logs timestamps are in ms)"""
+    timestamp = alert.get('timestamp')
+    if not isinstance(timestamp, (int, float)):
+        return int(time.time())
+    return int(timestamp / 1000) if timestamp > 1e11 else int(timestamp)
+
+
+def log_bucket(alert):
+    """Cache key: alerts from one stream within the same window share a fetch"""
+    return alert['log_group'], alert['log_stream'], alert_timestamp(alert) // LOG_WINDOW_SECONDS
+
+
+def get_log_context(alert):
+    """Log events of the alert's stream around its time bucket, as (ms, message) pairs.
+
+    Fetches the bucket widened by the window on both sides, so every alert
+    in the bucket finds its own +/- window in the result. Pages are
+    followed until the stream is exhausted, LOG_MAX_EVENTS is reached or
+    the fetch deadline passes; a truncated read keeps what it has.
+    """
+    bucket_start = log_bucket(alert)[2] * LOG_WINDOW_SECONDS
+    kwargs = {
+        'logGroupName': alert['log_group'],
+        'logStreamNames': [alert['log_stream']],
+        'startTime': (bucket_start - LOG_WINDOW_SECONDS) * 1000,
+        'endTime': (bucket_start + 2 * LOG_WINDOW_SECONDS) * 1000,
+    }
+    deadline = time.monotonic() + LOG_FETCH_DEADLINE
+    events = []
+
+    while True:
+        response = logs_client.filter_log_events(**kwargs)
+        events += [(e['timestamp'], e['message']) for e in response.get('events', [])]
+        token = response.get('nextToken')
+        if not token or len(events) >= LOG_MAX_EVENTS:
+            break
+        if time.monotonic() >= deadline:
+            print(f"Log context for {alert['log_stream']} truncated at {len(events)} events")
+            break
+        kwargs['nextToken'] = token
+
+    return sorted(events)
+
+
+def log_lines(alert, events):
+    """The LOG_CONTEXT_LINES events nearest the alert within its window, oldest first"""
+    at = alert_timestamp(alert) * 1000
+    window = LOG_WINDOW_SECONDS * 1000
+    nearby = [e for e in events if abs(e[0] - at) <= window]
+    nearest = sorted(nearby, key=lambda e: abs(e[0] - at))[:LOG_CONTEXT_LINES]
+    return '\n'.join(message.rstrip('\n') for _, message in sorted(nearest))
+
+
+def get_historical_pattern(alert):
+    """Occurrences of the alert's signature over the past week (one GetItem)"""
+    return signature_stats().pattern(fingerprint(alert.get('message', '')))
+
+
+def _table_configured(name='ALERTS_TABLE'):
+    return bool(os.environ.get(name))
+
+
+SOURCES = [
+    ContextSource(
+        'recent_similar_alerts', get_recent_similar_alerts,
+        lambda alert: similar_key(alert) if _table_configured() else None,
+        float(os.environ.get('CONTEXT_SIMILAR_TTL', '60')),
+        lambda alert, similar: excluding(alert, similar, SIMILAR_TOP_K)
+    ),
+    ContextSource(
+        'log_context', get_log_context,
+        lambda alert: log_bucket(alert)
+        if alert.get('source') == 'cloudwatch_logs' and alert.get('log_group') and alert.get('log_stream') else None,
+        float(os.environ.get('CONTEXT_LOGS_TTL', '300')),
+        log_lines
+    ),
+    ContextSource(
+        'historical_pattern', get_historical_pattern,
+        lambda alert: fingerprint(alert.get('message', '')) if _table_configured('SIGNATURE_STATS_TABLE') else None,
+        float(os.environ.get('CONTEXT_PATTERN_TTL', '300'))
+    ),
+]
+
+
+class ContextGatherer:
+    """Fetches prompt context from several sources concurrently.
+
+    Every source runs on a shared pool; gather() waits at most `deadline`
+    seconds and drops sources that haven't answered. A dropped call keeps
+    running and its result still lands in the per-container cache, so the
+    next warm invocation gets it for free. Failed calls are not cached.
+    """
+
+    _executor = ThreadPoolExecutor(max_workers=16)
+
+    def __init__(self, sources, deadline=1.5, max_entries=1000):
+        self.sources = sources
+        self.deadline = deadline
+        self.max_entries = max_entries
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {}
+
+    def _cached(self, key):
+        with self.lock:
+            entry = self.cache.get(key)
+            if entry and entry[0] > time.monotonic():
+                self.cache.move_to_end(key)
+                return entry
+            return None
+
+    def _store(self, key, ttl, value):
+        with self.lock:
+            self.cache[key] = (time.monotonic() + ttl, value)
+            self.cache.move_to_end(key)
+            while len(self.cache) > self.max_entries:
+                self.cache.popitem(last=False)
+
+    def _count(self, name, field, value=1):
+        with self.lock:
+            stats = self.stats.setdefault(name, {'calls': 0, 'hits': 0, 'timeouts': 0, 'errors': 0, 'seconds': 0.0})
+            stats[field] += value
+
+    def _fetch(self, source, key, alert):
+        start = time.monotonic()
+        try:
+            value = source.fetch(alert)
+        except Exception as e:
+            self._count(source.name, 'errors')
+            print(f"Context source {source.name} failed: {str(e)}")
+            raise
+        finally:
+            self._count(source.name, 'seconds', time.monotonic() - start)
+        self._store((source.name, key), source.ttl, value)
+        return value
+
+    @staticmethod
+    def _view(source, alert, value):
+        return source.view(alert, value) if source.view else value
+
+    def gather(self, alert, deadline=None):
+        """Context dict for an alert, with whatever arrived within the deadline"""
+        return self.gather_many([alert], deadline)[0]
+
+    def gather_many(self, alerts, deadline=None):
+        """Context dicts for several alerts, all fetched under one deadline"""
+        contexts = [{} for _ in alerts]
+        futures = {}
+
+        for position, alert in enumerate(alerts):
+            for source in self.sources:
+                key = source.key(alert)
+                if key is None:
+                    continue
+                cached = self._cached((source.name, key))
+                if cached:
+                    self._count(source.name, 'hits')
+                    contexts[position][source.name] = self._view(source, alert, cached[1])
+                    continue
+                self._count(source.name, 'calls')
+                futures[self._executor.submit(self._fetch, source, key, alert)] = (position, source)
+
+        if futures:
+            done, not_done = wait(futures, timeout=self.deadline if deadline is None else deadline)
+            for future in done:
+                position, source = futures[future]
+                if future.exception() is None:
+                    contexts[position][source.name] = self._view(source, alerts[position], future.result())
+            for future in not_done:
+                self._count(futures[future][1].name, 'timeouts')
+                print(f"Context source {futures[future][1].name} missed the deadline, dropped")
+
+        return contexts
+
+    def export_metrics(self):
+        """Emit per-source call, cache hit, timeout and mean latency; counters reset after each export"""
+        with self.lock:
+            stats, self.stats = self.stats, {}
+
+        for name, source_stats in stats.items():
+            emit({
+                'ContextCalls': source_stats['calls'],
+                'ContextCacheHits': source_stats['hits'],
+                'ContextTimeouts': source_stats['timeouts'],
+                'ContextErrors': source_stats['errors'],
+                'ContextLatency': source_stats['seconds'] * 1000 / max(source_stats['calls'], 1)
+            }, {'Source': name}, {'ContextLatency': 'Milliseconds'})
@@ -0,0 +1,262 @@
+import re
+import threading
+from collections import OrderedDict
+
+from metrics import emit
+from runbooks import fingerprint
+
+# Signals alerts are correlated by; CORRELATION_SIGNALS picks a subset
+SIGNAL_KINDS = ('trace', 'host', 'template', 'error')
+
+TRACE_PATTERNS = [
+    re.compile(r'\b00-([0-9a-f]{32})-[0-9a-f]{16}-[0-9a-f]{2}\b'),  # W3C traceparent
+    re.compile(r'\bRoot=(1-[0-9a-f]{8}-[0-9a-f]{24})\b'),  # X-Amzn-Trace-Id
+    re.compile(r'\btrace[_-]?id["\']?\s*[=:]\s*["\']?([\w-]{8,})', re.IGNORECASE),
+]
+HOST_PATTERNS = [
+    re.compile(r'://(?:[^@/\s]+@)?([A-Za-z0-9.-]+(?::\d+)?)'),
+    re.compile(r'\b((?:[a-z0-9-]+\.)+[a-z0-9-]+:\d{2,5}|(?:\d{1,3}\.){3}\d{1,3}(?::\d{2,5})?)\b', re.IGNORECASE),
+    re.compile(r'\bhost(?:name)?["\']?\s*[=:]\s*["\']?([A-Za-z0-9.-]+\.[A-Za-z0-9-]+)', re.IGNORECASE),
+]
+# Qualified exception names (redis.exceptions.ConnectionError,
+# JedisConnectionException) and errno names; a bare "Error" says nothing
+ERROR_PATTERN = re.compile(
+    r'\b((?:[a-z_]\w*\.)*[A-Z]\w*[a-z]\w*(?:Error|Exception|Timeout)'
+    r'|E(?:CONNREFUSED|CONNRESET|TIMEDOUT|HOSTUNREACH|NOTFOUND|PIPE))\b'
+)
+GENERIC_ERRORS = {'Error', 'Exception', 'RuntimeError', 'RuntimeException', 'ValueError', 'KeyError', 'TypeError',
+                  'IllegalStateException', 'IllegalArgumentException', 'NullPointerException'}
+LOCAL_HOSTS = ('localhost', '127.', '0.0.0.0')
+SCAN_CHARS = 4000
+
+
+def signals(alert, kinds=SIGNAL_KINDS):
+    """The (kind, value) signals in an alert's message"""
+    message = (alert.get('message') or '')[:SCAN_CHARS]
+    found = set()
+    if 'trace' in kinds:
+        found.update(('trace', m) for pattern in TRACE_PATTERNS for m in pattern.findall(message))
+    if 'host' in kinds:
+        found.update(('host', m.lower()) for pattern in HOST_PATTERNS for m in pattern.findall(message)
+                     if not m.lower().startswith(LOCAL_HOSTS))
+    if 'error' in kinds:
+        found.update(('error', m.rsplit('.', 1)[-1]) for m in ERROR_PATTERN.findall(message)
+                     if m.rsplit('.', 1)[-1] not in GENERIC_ERRORS)
+    if 'template' in kinds:
+        found.add(('template', fingerprint(message)))
+    return found
+
+
+class Incident:
+    """Alerts correlated by shared signals; the first alert leads"""
+
+    def __init__(self, alert, at, signals):
+        self.id = alert.get('alert_id')
+        self.lead = alert
+        self.members = [alert]
+        self.count = 1
+        self.signals = set(signals)
+        self.first_at = self.last_at = at
+        # Handed out for analysis, and (report, model) once analyzed
+        self.dispatched = False
+        self.analysis = None
+        # The incident this one was merged into
+        self.merged_into = None
+
+    def current(self):
+        """This incident, or the one it ended up merged into"""
+        incident = self
+        while incident.merged_into is not None:
+            incident = incident.merged_into
+        return incident
+
+    def add(self, alert, at, signals, max_members):
+        self.count += 1
+        if len(self.members) < max_members:
+            self.members.append(alert)
+            self.signals |= signals
+        self.first_at = min(self.first_at, at)
+        self.last_at = max(self.last_at, at)
+
+    def absorb(self, other, max_members):
+        self.count += other.count
+        self.members += other.members[:max(0, max_members - len(self.members))]
+        self.signals |= other.signals
+        self.first_at = min(self.first_at, other.first_at)
+        self.last_at = max(self.last_at, other.last_at)
+
+    def summary(self, max_chars=200):
+        """The 'incident' field for the lead's body: the members besides the lead"""
+        log_groups = {m.get('log_group') or m.get('source', 'unknown') for m in self.members}
+        return {
+            'id': self.id,
+            'count': self.count,
+            'log_groups': sorted(log_groups),
+            'members': [
+                {'alert_id': m.get('alert_id'), 'log_group': m.get('log_group') or m.get('source', 'unknown'),
+                 'message': (m.get('message') or '').split('\n', 1)[0][:max_chars]}
+                for m in self.members if m is not self.lead
+            ]
+        }
+
+
+class Correlator:
+    """Sliding-window incident correlation, bounded in memory and latency.
+
+    An alert joins the open incident it shares a signal with if it falls
+    within window_seconds of the incident's alerts, and if the incident
+    has spanned less than max_span_seconds, so a chatty signal can't grow
+    one incident forever. An alert matching several open incidents merges
+    them. Incidents stay joinable for window_seconds after their last
+    alert, once dispatched for analysis too: later alerts are attached to
+    that analysis instead of getting their own.
+
+    About max_incidents are tracked: analyzed ones are dropped least
+    recently active first, and past the bound the oldest unanalyzed ones
+    are due at once. Each keeps up to max_members member alerts (and their
+    signals); the rest are only counted.
+
+    A long-running consumer holds an incident's alerts until it is due -
+    no new alert for window_seconds, or max_span_seconds after its first -
+    and analyzes it then, with every member seen so far (dispatch(now)).
+
+    Safe to share between threads: the worker's main thread adds alerts
+    and dispatches incidents while its finisher discards them.
+    """
+
+    def __init__(self, window_seconds=30, max_span_seconds=300, max_incidents=1000, max_members=20,
+                 kinds=SIGNAL_KINDS):
+        self.window_seconds = window_seconds
+        self.max_span_seconds = max_span_seconds
+        self.max_incidents = max_incidents
+        self.max_members = max_members
+        self.kinds = kinds
+        self.incidents = OrderedDict()
+        self.index = {}
+        self.lock = threading.Lock()
+        self.stats = {'alerts': 0, 'incidents': 0, 'correlated': 0, 'evicted': 0}
+
+    def add(self, alert, at):
+        """The incident alert (seen at `at` seconds) belongs to, and whether it was just opened"""
+        found = signals(alert, self.kinds)
+        with self.lock:
+            self.stats['alerts'] += 1
+            return self._add(alert, at, found)
+
+    def _add(self, alert, at, found):
+        matches = []
+        for signal in found:
+            incident = self.index.get(signal)
+            if (incident is not None and incident not in matches
+                    and incident.first_at - self.window_seconds <= at <= incident.last_at + self.window_seconds
+                    and max(at, incident.last_at) - min(at, incident.first_at) <= self.max_span_seconds):
+                matches.append(incident)
+
+        analyzed = [incident for incident in matches if incident.dispatched or incident.analysis is not None]
+        if analyzed:
+            # Join the most recently active incident already being analyzed as is
+            incident = max(analyzed, key=lambda i: i.last_at)
+        elif matches:
+            incident = max(matches, key=lambda i: i.count)
+            for other in matches:
+                if other is not incident:
+                    incident.absorb(other, self.max_members)
+                    other.merged_into = incident
+                    self._forget(other)
+                    self._index(incident, other.signals)
+        else:
+            self._expire(at)
+            incident = Incident(alert, at, found)
+            self.incidents[id(incident)] = incident
+            self._index(incident, found)
+            self.stats['incidents'] += 1
+            return incident, True
+
+        incident.add(alert, at, found, self.max_members)
+        self.incidents.move_to_end(id(incident))
+        # Only the signals the incident kept, so forgetting it clears them all
+        self._index(incident, found & incident.signals)
+        self.stats['correlated'] += 1
+        return incident, False
+
+    def pending(self):
+        """Incidents not yet analyzed, oldest first"""
+        with self.lock:
+            return self._pending()
+
+    def dispatch(self, now=None):
+        """Pending incidents nobody is analyzing yet - those due at now, if given - marked as being analyzed"""
+        with self.lock:
+            incidents = [incident for incident in (self._pending() if now is None else self._due(now))
+                         if not incident.dispatched]
+            for incident in incidents:
+                incident.dispatched = True
+        return incidents
+
+    def due(self, now):
+        """Unanalyzed incidents whose hold is over: no new alert within the window, the span used up,
+        or too many incidents tracked"""
+        with self.lock:
+            return self._due(now)
+
+    def due_at(self):
+        """When the next incident nobody is analyzing yet comes due, None if there is none"""
+        with self.lock:
+            over = len(self.incidents) - self.max_incidents
+            return min((0 if n < over else self._due_at(incident)
+                        for n, incident in enumerate(self._pending()) if not incident.dispatched), default=None)
+
+    def discard(self, incident):
+        """Stop tracking an incident"""
+        with self.lock:
+            self._forget(incident)
+
+    def export_metrics(self):
+        """Emit alerts seen, incidents opened and alerts folded into one; counters reset after each export"""
+        with self.lock:
+            stats, self.stats = self.stats, dict.fromkeys(self.stats, 0)
+            tracked = len(self.incidents)
+        if not stats['alerts']:
+            return
+        emit({
+            'CorrelatedAlerts': stats['correlated'],
+            'Incidents': stats['incidents'],
+            'IncidentsTracked': tracked
+        })
+
+    def _pending(self):
+        return [incident for incident in self.incidents.values() if incident.analysis is None]
+
+    def _due(self, now):
+        over = len(self.incidents) - self.max_incidents
+        return [incident for n, incident in enumerate(self._pending())
+                if n < over or now >= self._due_at(incident)]
+
+    def _due_at(self, incident):
+        return min(incident.last_at + self.window_seconds, incident.first_at + self.max_span_seconds)
+
+    def _index(self, incident, found):
+        for signal in found:
+            self.index[signal] = incident
+
+    def _forget(self, incident):
+        self.incidents.pop(id(incident), None)
+        for signal in incident.signals:
+            if self.index.get(signal) is incident:
+                del self.index[signal]
+
+    def _expire(self, now):
+        """Drop analyzed incidents past their window, and the least recently active ones over the bound"""
+        over = len(self.incidents) - self.max_incidents + 1
+        for incident in list(self.incidents.values()):
+            if incident.analysis is None:
+                continue
+            if incident.last_at + self.window_seconds < now:
+                self._forget(incident)
+            elif over > 0:
+                self._forget(incident)
+                self.stats['evicted'] += 1
+            else:
+                # Least recently active first: the rest are newer still
+                break
+            over -= 1
@@ -1,97 +1,1051 @@
 import json
 import os
+import threading
+import time
 import boto3
-import urllib3
+from botocore.exceptions import ClientError
+
+import blobs
+import heartbeat
+import llm
+import prompt_builder
+import structured
+from analysis_cache import AnalysisCache
+from classifier import AlertClassifier
+from context import SOURCES, ContextGatherer, alert_timestamp, signature_stats
+from correlation import Correlator
+from generations import Generations, scope_of
+from idempotency import DONE, IN_PROGRESS, IdempotencyStore
+from runbooks import RunbookIndex, fingerprint
+from llm import HedgedProvider, LLMError, LLMProvider, create_provider
+from metrics import emit
+from quarantine import Quarantine
+from queues import message_group
+from resilience import AdaptiveLimiter, CircuitBreaker, GuardedProvider
+from routing import FrequencyCounter, RoutingPolicy
+from storage import WriteBehind
 
-http = urllib3.PoolManager()
 ssm = boto3.client('ssm')
 sqs = boto3.client('sqs')
+dynamodb = boto3.resource('dynamodb')
 
-def lambda_handler(event, context):
-    """
-    Basic analyzer Lambda to test Gemini API integration
-    """
-    print(f"Received event: {json.dumps(event)}")
+# Alert records are written behind the analysis, batched per invocation,
+# with the alerts' idempotency records
+ALERTS_TABLE = os.environ.get('ALERTS_TABLE')
+IDEMPOTENCY_TABLE = os.environ.get('IDEMPOTENCY_TABLE')
+writes = WriteBehind(dynamodb.meta.client, key_schema={
+    **({ALERTS_TABLE: ['alert_id']} if ALERTS_TABLE else {}),
+    **({IDEMPOTENCY_TABLE: ['alert_id', 'stage']} if IDEMPOTENCY_TABLE else {})
+})
 
-    # Get API key from SSM
-    api_key_param = os.environ.get('GOOGLE_API_KEY_PARAM')
-    response = ssm.get_parameter(Name=api_key_param, WithDecryption=True)
-    api_key = response['Parameter']['Value']
+# Stored layout: 'native' attributes, or the bulky fields compressed into one
+# binary attribute ('zlib' or 'zstd'); readers handle both via blobs.decode
+ANALYSIS_CODEC = os.environ.get('ANALYSIS_CODEC', 'native')
 
-    # Get distribution queue URL
-    distribution_queue_url = os.environ.get('DISTRIBUTION_QUEUE_URL')
+# Analyses cached per error signature; stale entries are served while one
+# re-queued copy of the alert refreshes them, and a deploy of the alert's
+# service (a bump of its log group's generation) invalidates them
+analysis_cache = AnalysisCache(
+    dynamodb.Table(os.environ['ANALYSIS_CACHE_TABLE']),
+    fresh_seconds=int(os.environ.get('ANALYSIS_CACHE_FRESH_SECONDS', '3600')),
+    max_age_seconds=int(os.environ.get('ANALYSIS_CACHE_MAX_AGE_SECONDS', '86400')),
+    negative_seconds=int(os.environ.get('ANALYSIS_CACHE_NEGATIVE_SECONDS', '120')),
+    codec=ANALYSIS_CODEC,
+    generations=Generations(
+        dynamodb.Table(os.environ['ANALYSIS_CACHE_TABLE']),
+        memo_seconds=int(os.environ.get('ANALYSIS_CACHE_GENERATION_SECONDS', '10'))
+    )
+) if os.environ.get('ANALYSIS_CACHE_TABLE') else None
 
-    # Parse alert from SQS event
-    for record in event.get('Records', []):
-        body = json.loads(record['body'])
-        alert_message = body.get('message', 'Unknown error')
+# SSM parameter env var holding each provider's API key
+API_KEY_PARAMS = {
+    'google': 'GOOGLE_API_KEY_PARAM',
+    'anthropic': 'ANTHROPIC_API_KEY_PARAM'
+}
 
-        # Create simple prompt
-        prompt = f"""Analyze this alert and provide a brief diagnosis:
+# Number of alerts packed into a single LLM prompt (1 = one call per alert)
+PACK_SIZE = int(os.environ.get('ANALYZER_PACK_SIZE', '1'))
 
-Alert: {alert_message}
+# Stream single-alert analyses and send a preliminary message as soon as the
+# summary and severity are known
+STREAMING = os.environ.get('LLM_STREAMING', 'false').lower() == 'true'
 
-Provide:
-1. Severity (CRITICAL/HIGH/MEDIUM/LOW)
-2. Likely cause
-3. One recommended action"""
+# Token budget for the alert and context part of a prompt
+PROMPT_TOKEN_BUDGET = int(os.environ.get('PROMPT_TOKEN_BUDGET', '1500'))
 
-        # Call Gemini REST API
-        url = f'https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash:generateContent?key={api_key}'
+# Send runbook answers as preliminary and re-queue the alert for an LLM analysis
+RUNBOOK_ENRICHMENT = os.environ.get('RUNBOOK_ENRICHMENT', 'false').lower() == 'true'
 
-        payload = {
-            'contents': [{
-                'parts': [{'text': prompt}]
-            }]
-        }
+# Runbook rules and the routing policy are loaded once per container
+runbooks = RunbookIndex.load()
+routing_policy = RoutingPolicy.load()
+
+# Local classifier answering confidently routine alerts without the LLM;
+# inactive unless a model file (and numpy) is packaged
+classifier = AlertClassifier.load()
+
+# Prompt context (similar alerts, logs, history) is fetched concurrently and
+# cached across warm invocations
+context_gatherer = ContextGatherer(SOURCES, deadline=float(os.environ.get('CONTEXT_DEADLINE_SECONDS', '1.5')))
+
+# Recent occurrences per alert fingerprint, for frequency-based routing
+frequencies = FrequencyCounter(window=float(os.environ.get('ROUTING_FREQUENCY_WINDOW', '3600')))
+
+# Alerts sharing a trace ID, dependency host or message template within the
+# window are analyzed and posted once, as one incident (0 disables). The
+# Lambda handler correlates each batch as a whole and analyzes it at once:
+# FIFO event sources have no batching window, so nothing is held. The worker
+# holds alerts until their incident is due (hold_alerts, release_held).
+# Later alerts that join an incident this container already analyzed are
+# attached to its analysis and posted as an update to the incident.
+CORRELATION_WINDOW_SECONDS = float(os.environ.get('CORRELATION_WINDOW_SECONDS', '30'))
+correlator = Correlator(
+    window_seconds=CORRELATION_WINDOW_SECONDS,
+    max_span_seconds=float(os.environ.get('CORRELATION_MAX_SPAN_SECONDS', '300')),
+    kinds=tuple(os.environ.get('CORRELATION_SIGNALS', 'trace,host,template').split(','))
+) if CORRELATION_WINDOW_SECONDS > 0 else None
 
-        resp = http.request(
-            'POST',
-            url,
-            body=json.dumps(payload),
-            headers={'Content-Type': 'application/json'}
+# Providers are built once per container, one per routing tier
+_providers = {}
+_api_keys = {}
+_guards = []
+
+# Received messages are kept invisible while their batch is worked on, so a
+# slow LLM call or context fetch doesn't outlive the visibility timeout and
+# get the batch analyzed (and posted) a second time by another consumer
+PROCESSING_VISIBILITY = int(os.environ.get('PROCESSING_VISIBILITY', '900'))
+
+# Each alert is analyzed once across consumers and deliveries: claimed
+# (a conditional put on alert_id and stage) before it is analyzed, marked
+# done when it is stored. Without the table, only redeliveries are checked,
+# against the stored alerts.
+ANALYSIS_STAGE = 'analysis'
+idempotency = IdempotencyStore(
+    writes.client, IDEMPOTENCY_TABLE,
+    ttl_seconds=int(os.environ.get('IDEMPOTENCY_TTL_SECONDS', '21600')),
+    lease_seconds=PROCESSING_VISIBILITY,
+    writes=writes
+) if IDEMPOTENCY_TABLE else None
+
+# Messages no redelivery can process - unparseable, or alerts that break the
+# pipeline by themselves - are moved here with their error and acknowledged,
+# instead of being retried up to the redrive policy's limit while their
+# message group waits; tools/manage_quarantine.py lists, inspects and
+# replays them.
+# Without the table they are left to the redrive policy.
+PROCESSING_SOURCE = 'processing'
+quarantine = Quarantine(
+    dynamodb.Table(os.environ['QUARANTINE_TABLE']),
+    ttl_seconds=int(os.environ.get('QUARANTINE_TTL_SECONDS', '1209600'))
+) if os.environ.get('QUARANTINE_TABLE') else None
+
+# Alert fields the pipeline treats as text
+TEXT_FIELDS = ('alert_id', 'message', 'severity', 'source', 'log_group', 'log_stream')
+# The 'incident' a re-queued incident lead carries (Incident.summary), by
+# field: the JSON types it must have
+INCIDENT_FIELDS = {'id': str, 'count': int, 'log_groups': list}
+
+# Alerts answered with a fallback analysis because of an overloaded provider
+# (or a recent failure cached for their signature); they are re-queued for a
+# real analysis after the next successful LLM call. FIFO queues have no
+# per-message delay, so holding them back here is what keeps them from being
+# retried into the overload. Shared by the worker's analysis threads.
+_pending_reanalysis = []
+_pending_lock = threading.Lock()
+MAX_PENDING_REANALYSIS = 100
+
+
+def get_api_key(provider_name):
+    """Fetch a provider's API key from SSM (once per container)"""
+    param_env = API_KEY_PARAMS.get(provider_name)
+    if not param_env:
+        return None
+
+    if provider_name not in _api_keys:
+        response = ssm.get_parameter(Name=os.environ.get(param_env), WithDecryption=True)
+        _api_keys[provider_name] = response['Parameter']['Value']
+    return _api_keys[provider_name]
+
+
+def guard(provider, tier):
+    """Wrap a provider with an AIMD limiter and circuit breaker (one per tier)"""
+    guarded = GuardedProvider(
+        provider,
+        AdaptiveLimiter(
+            initial=int(os.environ.get('LLM_INITIAL_CONCURRENCY', '4')),
+            maximum=int(os.environ.get('LLM_MAX_CONCURRENCY', '20'))
+        ),
+        CircuitBreaker(
+            f"{provider.name}-{tier}",
+            failure_threshold=int(os.environ.get('CIRCUIT_FAILURE_THRESHOLD', '5')),
+            reset_timeout=float(os.environ.get('CIRCUIT_RESET_SECONDS', '30')),
+            on_success=flush_reanalysis
         )
+    )
+    _guards.append(guarded)
+    return guarded
+
+
+def get_provider(tier='fast'):
+    """Provider for a routing tier: AI_PROVIDER with the tier's model, hedged
+    to AI_SECONDARY_PROVIDER if set"""
+    if tier not in _providers:
+        primary_name = os.environ.get('AI_PROVIDER', 'google')
+        provider = guard(create_provider(
+            primary_name, get_api_key(primary_name), routing_policy.model(tier, primary_name)
+        ), tier)
+
+        secondary_name = os.environ.get('AI_SECONDARY_PROVIDER')
+        if secondary_name and secondary_name != primary_name:
+            secondary = guard(create_provider(
+                secondary_name, get_api_key(secondary_name), routing_policy.model(tier, secondary_name)
+            ), tier)
+            provider = HedgedProvider(
+                provider,
+                secondary,
+                initial_delay=float(os.environ.get('HEDGE_INITIAL_DELAY', '10'))
+            )
+            print(f"Using {primary_name} hedged to {secondary_name} for {tier} tier")
+
+        _providers[tier] = provider
+    return _providers[tier]
+
+
+def build_packed_prompt(packed_alerts):
+    """Prompt for several alerts at once, keyed by their pack IDs"""
+    per_alert_budget = max(50, PROMPT_TOKEN_BUDGET // max(len(packed_alerts), 1))
+    alert_lines = '\n'.join(
+        f"[{alert_id}] {prompt_builder.compact(message, per_alert_budget)}" for alert_id, message in packed_alerts
+    )
+
+    return f"""Analyze each of the following production alerts and provide an incident report for each one.
+
+Alerts:
+{alert_lines}
+
+Respond with a JSON array containing one incident report per alert. Set "id" to the
+alert id in brackets and fill in every report field."""
+
+
+def generate_fallback_analysis(body, reason='automated analysis unavailable'):
+    """Rule-based report used when the LLM is unavailable or not worth calling"""
+    severity = body.get('severity', 'MEDIUM')
+    return structured.normalize_report({
+        'summary': f"Alert: {body.get('message', 'Unknown error').splitlines()[0][:150]}",
+        'severity': severity,
+        'severity_assessment': f"Severity from ingestion; {reason}",
+        'impact_assessment': 'Automated analysis unavailable',
+        'remediation_steps': [
+            'Review alert details',
+            'Check related logs and metrics',
+            'Investigate affected service'
+        ],
+        'requires_immediate_attention': severity in ['CRITICAL', 'HIGH'],
+        'confidence_level': 'LOW'
+    }, severity)
+
+
+def parse_report(text, body):
+    """Parse a single-alert response into a normalized report, recording
+    whether it was well-formed, repaired (truncated) or malformed"""
+    severity = body.get('severity', 'MEDIUM')
+    data, complete = structured.extract_json(text)
+
+    if isinstance(data, dict):
+        record_response_quality('repaired' if not complete else 'ok')
+        return structured.normalize_report(data, severity)
+
+    record_response_quality('malformed')
+    print(f"Malformed LLM response, using text: {text[:200]}")
+    return structured.text_report(text, severity)
+
+
+def record_response_quality(outcome):
+    """Count structured responses by outcome: ok, repaired or malformed"""
+    emit({
+        'StructuredResponses': 1,
+        'RepairedResponses': int(outcome == 'repaired'),
+        'MalformedResponses': int(outcome == 'malformed')
+    })
+
+
+def schedule_reanalysis(body):
+    """Remember an alert for re-analysis once a provider call succeeds again"""
+    if body.get('reanalysis'):
+        return
+    with _pending_lock:
+        if len(_pending_reanalysis) >= MAX_PENDING_REANALYSIS:
+            print(f"Re-analysis backlog full, dropping alert {body.get('alert_id')}")
+            return
+        _pending_reanalysis.append(body)
+
+
+def requeued(body):
+    """Whether a body is a re-queued copy of an alert already answered once"""
+    return bool(body.get('reanalysis') or body.get('enrich') or body.get('refresh'))
+
+
+def requeue(body, flag):
+    """Send a copy of an alert back to the processing queue with a flag set"""
+    queue_url = os.environ.get('PROCESSING_QUEUE_URL')
+    if not queue_url or requeued(body):
+        return
+
+    sqs.send_message(
+        QueueUrl=queue_url,
+        MessageBody=json.dumps({**body, flag: True}),
+        MessageGroupId=message_group(body)
+    )
+
 
-        result = json.loads(resp.data.decode('utf-8'))
-        print(f"Gemini API Response: {json.dumps(result)}")
+def schedule_enrichment(body):
+    """Re-queue a runbook-answered alert for an LLM analysis"""
+    requeue(body, 'enrich')
 
-        # Check for errors
-        if 'error' in result:
-            error_msg = result['error'].get('message', 'Unknown error')
-            print(f"Gemini API Error: {error_msg}")
-            analysis = f"Error calling Gemini: {error_msg}"
-        elif 'candidates' in result:
-            analysis = result['candidates'][0]['content']['parts'][0]['text']
+
+def schedule_refresh(body):
+    """Re-queue an alert answered from a stale cache entry to refresh the entry"""
+    requeue(body, 'refresh')
+
+
+def flush_reanalysis():
+    """Send alerts answered by the fallback back to the processing queue"""
+    with _pending_lock:
+        if not _pending_reanalysis:
+            return
+        pending = list(_pending_reanalysis)
+        _pending_reanalysis.clear()
+
+    queue_url = os.environ.get('PROCESSING_QUEUE_URL')
+    if not queue_url:
+        return
+
+    for body in pending:
+        try:
+            sqs.send_message(
+                QueueUrl=queue_url,
+                MessageBody=json.dumps({**body, 'reanalysis': True}),
+                MessageGroupId=message_group(body)
+            )
+        except ClientError as e:
+            print(f"Error re-queueing alert {body.get('alert_id')}: {str(e)}")
+            continue
+        print(f"Re-queued alert {body.get('alert_id')} for analysis")
+
+
+def parse_packed_response(text, pack_ids, bodies):
+    """Split a packed JSON array response into per-alert reports.
+
+    Returns a dict of pack ID -> report, or None if the response can't be
+    parsed. Alerts missing from the response (or cut off by truncation)
+    are left out.
+    """
+    items, complete = structured.extract_json(text, opener='[')
+    if not isinstance(items, list):
+        record_response_quality('malformed')
+        print(f"Could not parse packed response: {text[:200]}")
+        return None
+
+    record_response_quality('ok' if complete else 'repaired')
+
+    reports = {}
+    for item in items:
+        if not isinstance(item, dict) or not item.get('summary'):
+            continue
+        pack_id = str(item.get('id', '')).strip('[]')
+        if pack_id in pack_ids:
+            reports[pack_id] = structured.normalize_report(item, bodies[pack_ids[pack_id]].get('severity', 'MEDIUM'))
+
+    return reports
+
+
+def analyze_streaming(provider, body, prompt, on_preliminary, max_tokens=1024):
+    """Stream one alert's report, calling on_preliminary(body, report, model)
+    as soon as its summary and severity have been generated"""
+    extractor = structured.JsonExtractor()
+    sent = False
+
+    for chunk in provider.stream(prompt, max_tokens, schema=structured.REPORT_SCHEMA):
+        extractor.feed(chunk)
+        if not sent:
+            fields = extractor.complete_fields()
+            if 'summary' in fields and 'severity' in fields:
+                on_preliminary(body, structured.normalize_report(fields, body.get('severity', 'MEDIUM')),
+                               provider.model)
+                sent = True
+
+    return parse_report(extractor.text, body), provider.model
+
+
+def hold_alerts(bodies):
+    """Add new alerts to their incidents without analyzing any yet: the
+    incident of each, by id() (re-queued alerts, and every alert without
+    correlation, have none)"""
+    if correlator is None:
+        return {}
+    return {id(body): correlator.add(body, alert_timestamp(body))[0] for body in bodies if not requeued(body)}
+
+
+def correlate(bodies, incident_of=None, dispatched=None):
+    """Group a batch's new alerts into incidents.
+
+    Returns the bodies to analyze - alerts without an incident as they
+    are, then the lead of each incident dispatched, carrying the incident's
+    other members if it has any - the incident of every new alert and
+    lead, by id(), and the incidents handed out for analysis. Alerts that
+    joined an incident dispatched by an earlier batch are not analyzed
+    again: they are stored with its analysis, so batches must finish in
+    the order they were started.
+
+    Without incident_of the batch's alerts are correlated now and every
+    incident nobody is analyzing yet is dispatched.
+    """
+    if incident_of is None:
+        incident_of = hold_alerts(bodies)
+        dispatched = correlator.dispatch() if correlator else []
+
+    to_analyze = [body for body in bodies if id(body) not in incident_of]
+    incident_of = dict(incident_of)
+    for incident in dispatched:
+        lead = {**incident.lead, 'incident': incident.summary()} if incident.count > 1 else incident.lead
+        incident_of[id(lead)] = incident
+        to_analyze.append(lead)
+    return to_analyze, incident_of, dispatched
+
+
+def route_alerts(bodies):
+    """Routing decision per body; re-queued alerts and incidents don't count towards frequency"""
+    routes = []
+    for body in bodies:
+        if requeued(body) or body.get('incident'):
+            frequency = 1
         else:
-            analysis = "No analysis returned from Gemini"
+            frequency = frequencies.observe(fingerprint(body.get('message', '')))
+        routes.append(routing_policy.route(body, frequency))
 
-        print(f"Analysis: {analysis}")
+    tiers = [route.tier for route in routes]
+    for tier in sorted(set(tiers)):
+        emit({'RoutedAlerts': tiers.count(tier)}, {'Tier': tier})
+    return routes
 
-        # Send analysis to distribution queue
-        distribution_message = {
-            'alert_id': body.get('alert_id'),
-            'alert': alert_message,
-            'analysis': analysis,
-            'severity': body.get('severity', 'UNKNOWN'),
-            'source': body.get('source', 'unknown'),
-            'model': 'gemini-2.5-flash'
+
+def analyze_alerts(provider, bodies, pack_size=PACK_SIZE, on_preliminary=None):
+    """Analyze alert bodies, packing up to pack_size alerts per LLM call.
+
+    provider is either one provider for every tier or a dict of routing
+    tier -> provider. Returns one (report, model) pair per body, in order.
+    Alerts matching a runbook are answered from it (model 'runbook')
+    without an LLM call, unless they were re-queued for enrichment. New
+    alerts are then looked up in the analysis cache (model 'cache', or
+    'cache-stale' while a refresh is under way); alerts routed to the
+    'none' tier get a rule-based report (model 'none'), and alerts the
+    local classifier deems routine a classifier report (model
+    'classifier').
+    Packs only mix alerts of the same tier. Alerts that a packed response
+    doesn't cover fall back to a per-alert call, which is streamed when
+    on_preliminary is given and LLM_STREAMING is enabled.
+    """
+    analyses = [None] * len(bodies)
+    routes = route_alerts(bodies)
+
+    for i, body in enumerate(bodies):
+        if body.get('enrich'):
+            continue
+        runbook = runbooks.match(body.get('message', ''))
+        if runbook:
+            print(f"Alert {body.get('alert_id')} matched runbook {runbook.id}")
+            analyses[i] = (runbook.build_report(body), 'runbook')
+            continue
+        cached = cached_analysis(body)
+        if cached:
+            analyses[i] = cached
+        elif routes[i].tier == 'none':
+            analyses[i] = (generate_fallback_analysis(body, 'recurring alert, not sent to the LLM'), 'none')
+        else:
+            analyses[i] = classified_analysis(body)
+
+    analyzed = [i for i, analysis in enumerate(analyses) if analysis is None]
+    for tier in ('fast', 'deep'):
+        pending = [i for i in analyzed if routes[i].tier == tier]
+        if pending:
+            tier_provider = provider if isinstance(provider, LLMProvider) else provider[tier]
+            # Incidents get a prompt of their own, listing their member alerts
+            incidents = [i for i in pending if bodies[i].get('incident')]
+            analyze_tier(tier_provider, bodies, routes, incidents, analyses, 1, on_preliminary)
+            analyze_tier(tier_provider, bodies, routes, [i for i in pending if i not in incidents], analyses,
+                         pack_size, on_preliminary)
+
+    update_analysis_cache(bodies, analyses, analyzed)
+    return analyses
+
+
+def cached_analysis(body):
+    """(report, model) from the analysis cache, or None to analyze the alert.
+
+    A stale entry is served as is; the first caller to find it stale takes
+    the refresh lease and re-queues the alert to refresh it. Incidents are
+    not cached: their analysis covers more than the lead alert.
+    """
+    if analysis_cache is None or requeued(body) or body.get('incident'):
+        return None
+
+    signature = fingerprint(body.get('message', ''))
+    try:
+        entry = analysis_cache.lookup(signature)
+        if entry is None:
+            return None
+        if entry.state == 'negative':
+            schedule_reanalysis(body)
+            return generate_fallback_analysis(body, 'analysis recently failed for this error'), 'fallback'
+        if entry.state == 'stale' and analysis_cache.acquire_lease(signature):
+            schedule_refresh(body)
+    except ClientError as e:
+        print(f"Error reading analysis cache: {str(e)}")
+        return None
+
+    report = {**entry.report, 'severity': entry.report.get('severity') or body.get('severity', 'MEDIUM')}
+    return report, 'cache' if entry.state == 'fresh' else 'cache-stale'
+
+
+def classified_analysis(body):
+    """(report, model) for an alert the classifier deems routine, or None to analyze it.
+
+    Re-queued alerts, incidents and CRITICAL alerts always go to the LLM.
+    """
+    if requeued(body) or body.get('incident') or body.get('severity') == 'CRITICAL':
+        return None
+    prediction = classifier.skip(body)
+    if prediction is None:
+        return None
+    print(f"Alert {body.get('alert_id')} classified as routine ({prediction.confidence:.2f})")
+    return classifier.build_report(body, prediction), 'classifier'
+
+
+def update_analysis_cache(bodies, analyses, analyzed):
+    """Cache each analyzed signature's report, or remember that it failed"""
+    if analysis_cache is None:
+        return
+
+    done = set()
+    for i in analyzed:
+        if bodies[i].get('incident'):
+            continue
+        report, model = analyses[i]
+        signature = fingerprint(bodies[i].get('message', ''))
+        if signature in done:
+            continue
+        done.add(signature)
+        try:
+            if model == 'fallback':
+                analysis_cache.record_failure(signature)
+            else:
+                analysis_cache.store(signature, report, model, scope=scope_of(bodies[i]))
+        except ClientError as e:
+            print(f"Error updating analysis cache: {str(e)}")
+
+
+def analyze_tier(provider, bodies, routes, pending, analyses, pack_size, on_preliminary):
+    """Fill in analyses for the pending body indexes with one tier's provider"""
+    for chunk_start in range(0, len(pending), max(pack_size, 1)):
+        chunk = pending[chunk_start:chunk_start + max(pack_size, 1)]
+
+        if len(chunk) > 1:
+            # Stable per-alert IDs: the alert_id when unique, the position otherwise
+            pack_ids = {}
+            for i in chunk:
+                alert_id = str(bodies[i].get('alert_id') or '')
+                if not alert_id or alert_id in pack_ids:
+                    alert_id = f"alert-{i}"
+                pack_ids[alert_id] = i
+
+            prompt = build_packed_prompt(
+                [(alert_id, bodies[i].get('message', 'Unknown error')) for alert_id, i in pack_ids.items()]
+            )
+            try:
+                completion = provider.generate(
+                    prompt, sum(routes[i].max_tokens for i in chunk), schema=structured.packed_schema()
+                )
+                packed = parse_packed_response(completion.text, pack_ids, bodies) or {}
+            except LLMError as e:
+                print(f"Packed LLM call failed: {str(e)}")
+                packed = {}
+            print(f"Packed analysis covered {len(packed)}/{len(chunk)} alerts")
+
+            for alert_id, report in packed.items():
+                analyses[pack_ids[alert_id]] = (report, completion.model)
+
+        single = [i for i in chunk if analyses[i] is None]
+        contexts = context_gatherer.gather_many([bodies[i] for i in single])
+
+        for i, context in zip(single, contexts):
+            prompt = prompt_builder.build_prompt(bodies[i], context, budget=PROMPT_TOKEN_BUDGET)
+            try:
+                if STREAMING and on_preliminary:
+                    analyses[i] = analyze_streaming(provider, bodies[i], prompt, on_preliminary,
+                                                    routes[i].max_tokens)
+                else:
+                    completion = provider.generate(prompt, routes[i].max_tokens,
+                                                   schema=structured.REPORT_SCHEMA)
+                    analyses[i] = (parse_report(completion.text, bodies[i]), completion.model)
+            except LLMError as e:
+                print(f"LLM call failed, using fallback analysis: {str(e)}")
+                analyses[i] = (generate_fallback_analysis(bodies[i]), 'fallback')
+                if e.overload:
+                    schedule_reanalysis(bodies[i])
+
+
+def record_occurrences(bodies):
+    """Count each new alert against its signature's pre-aggregated stats"""
+    if not os.environ.get('SIGNATURE_STATS_TABLE'):
+        return
+
+    stats = signature_stats()
+    for body in bodies:
+        if requeued(body):
+            continue
+        try:
+            stats.record(fingerprint(body.get('message', '')), alert_timestamp(body))
+        except ClientError as e:
+            print(f"Error recording signature stats: {str(e)}")
+
+
+def alert_record(body, report, model, incident_id=None):
+    """The alerts table item for an analyzed alert"""
+    record = {
+        'alert_id': body['alert_id'],
+        'timestamp': alert_timestamp(body),
+        'severity': body.get('severity', 'MEDIUM'),
+        'source': body.get('source', 'unknown'),
+        'title': (report.get('summary') or '')[:200],
+        'message': body.get('message', ''),
+        'error_signature': fingerprint(body.get('message', '')),
+        'analysis': json.dumps(report),
+        'model': model,
+        'created_at': int(time.time())
+    }
+    if incident_id:
+        record['incident_id'] = incident_id
+    return record
+
+
+def store_alerts(bodies, analyses, incidents=None):
+    """Queue every analyzed alert for storage and flush the batch (with
+    anything else queued, such as idempotency records).
+
+    incidents maps an alert's position to the id of the incident it was
+    analyzed as part of.
+    """
+    incidents = incidents or {}
+    for i, (body, (report, model)) in enumerate(zip(bodies, analyses)):
+        if ALERTS_TABLE and body.get('alert_id'):
+            record = alert_record(body, report, model, incidents.get(i))
+            writes.put(ALERTS_TABLE, blobs.encode(record, ANALYSIS_CODEC))
+    try:
+        writes.flush()
+    except ClientError as e:
+        print(f"Error storing alerts: {str(e)}")
+
+
+def send_to_distribution(queue_url, body, report, model, preliminary=False, update=False):
+    """Send one alert's report to the distribution queue.
+
+    preliminary marks a partial/fallback analysis that a later message will
+    replace; update marks that later message. 'report' carries the typed
+    fields, 'analysis' a plain-text rendering of them.
+    """
+    distribution_message = {
+        'alert_id': body.get('alert_id'),
+        'alert': body.get('message', 'Unknown error'),
+        'analysis': structured.format_report(report),
+        'report': report,
+        'severity': body.get('severity', 'UNKNOWN'),
+        'source': body.get('source', 'unknown'),
+        'model': model,
+        'preliminary': preliminary,
+        'update': update
+    }
+    if body.get('incident'):
+        distribution_message['incident'] = {
+            key: body['incident'][key] for key in ('id', 'count', 'log_groups')
         }
 
-        sqs.send_message(
-            QueueUrl=distribution_queue_url,
-            MessageBody=json.dumps(distribution_message),
-            MessageGroupId='analysis'
+    sqs.send_message(
+        QueueUrl=queue_url,
+        MessageBody=json.dumps(distribution_message),
+        MessageGroupId='analysis'
+    )
+
+    print(f"Sent analysis to distribution queue: {queue_url}")
+
+
+def send_incident_update(queue_url, incident, joined, max_chars=200):
+    """Send the alerts that joined an incident an earlier batch analyzed to
+    the distribution queue, as one update referencing the incident"""
+    summary = incident.summary(max_chars)
+    distribution_message = {
+        'alert_id': incident.id,
+        'incident': {key: summary[key] for key in ('id', 'count', 'log_groups')},
+        'joined': [
+            {'alert_id': body.get('alert_id'), 'severity': body.get('severity', 'UNKNOWN'),
+             'log_group': body.get('log_group') or body.get('source', 'unknown'),
+             'message': (body.get('message') or '').split('\n', 1)[0][:max_chars]}
+            for body in joined
+        ]
+    }
+
+    sqs.send_message(
+        QueueUrl=queue_url,
+        MessageBody=json.dumps(distribution_message),
+        MessageGroupId='analysis'
+    )
+
+    print(f"Sent {len(joined)} alerts joining incident {incident.id} to distribution queue: {queue_url}")
+
+
+def already_stored(bodies, receive_counts):
+    """Positions of redelivered alerts a previous delivery already finished.
+
+    Alerts are stored after they are distributed, so a stored record means
+    the earlier delivery got through and only its acknowledgement was lost
+    (or came too late); the redelivery is acknowledged without analyzing or
+    posting it again. First deliveries and re-queued copies, which are meant
+    to be analyzed again, aren't looked up; the rest take one BatchGetItem.
+    """
+    if not ALERTS_TABLE:
+        return set()
+
+    candidates = {body['alert_id'] for body, count in zip(bodies, receive_counts)
+                  if count > 1 and body.get('alert_id') and not requeued(body)}
+    if not candidates:
+        return set()
+
+    try:
+        response = writes.client.batch_get_item(RequestItems={
+            ALERTS_TABLE: {'Keys': [{'alert_id': alert_id} for alert_id in candidates],
+                           'ProjectionExpression': 'alert_id'}
+        })
+    except ClientError as e:
+        print(f"Error checking for stored alerts, analyzing redeliveries again: {str(e)}")
+        return set()
+
+    # Unprocessed keys are analyzed again rather than looked up again
+    stored = {item['alert_id'] for item in response.get('Responses', {}).get(ALERTS_TABLE, [])}
+    return {i for i, body in enumerate(bodies) if body.get('alert_id') in stored and not requeued(body)}
+
+
+def idempotency_keys(bodies):
+    """(alert_id, stage) per position of the alerts that are analyzed at most once"""
+    return {i: (body['alert_id'], ANALYSIS_STAGE) for i, body in enumerate(bodies)
+            if body.get('alert_id') and not requeued(body)}
+
+
+def screen(bodies, receive_counts):
+    """Positions of a batch's alerts not to analyze now: (done, busy).
+
+    Done alerts were finished by an earlier delivery and are acknowledged;
+    busy ones are being analyzed by another consumer and are left to be
+    redelivered, in case it fails. With the idempotency table the batch
+    takes one read (none for alerts this container finished), then one
+    conditional put per alert to claim the rest. Re-queued copies, meant
+    to be analyzed again, always go through.
+    """
+    if not idempotency:
+        done, busy = already_stored(bodies, receive_counts), set()
+    else:
+        keys = idempotency_keys(bodies)
+        status = idempotency.lookup(keys.values())
+        done = {i for i, key in keys.items() if status.get(key) == DONE}
+        busy = {i for i, key in keys.items() if status.get(key) == IN_PROGRESS}
+        for i, key in keys.items():
+            if i in done or i in busy:
+                continue
+            try:
+                if not idempotency.claim(*key):
+                    busy.add(i)
+            except ClientError as e:
+                # Analyzed unclaimed rather than not at all
+                print(f"Error claiming alert {key[0]}: {str(e)}")
+
+    if done or busy:
+        print(f"Acknowledging {len(done)} alert(s) already analyzed, deferring {len(busy)} in progress elsewhere")
+        emit({'RedeliveriesAcknowledged': len(done), 'DuplicatesDeferred': len(busy)})
+    return done, busy
+
+
+class MalformedAlert(ValueError):
+    """Raised by parse_alert for an alert payload no redelivery can process:
+    not JSON, not an object, or fields of the wrong type.
+
+    It is the only error quarantined: anything else - a bug, a bad deploy,
+    throttling, AWS errors - may go away, and quarantining on it would
+    swallow every alert while it lasts.
+    """
+
+
+def _type_name(value):
+    return 'null' if value is None else type(value).__name__
+
+
+def parse_alert(payload):
+    """An alert body from a processing queue message; MalformedAlert if it isn't one"""
+    try:
+        body = json.loads(payload)
+    except ValueError as e:
+        raise MalformedAlert(f"Alert payload is not JSON: {str(e)}") from e
+    if not isinstance(body, dict):
+        raise MalformedAlert(f"Alert payload is a JSON {_type_name(body)}, not an object")
+    # Checked here rather than failing somewhere mid-batch, on every delivery
+    for name in TEXT_FIELDS:
+        if body.get(name) is not None and not isinstance(body[name], str):
+            raise MalformedAlert(f"Alert {name} is a JSON {_type_name(body[name])}, not a string")
+    incident = body.get('incident')
+    if incident is not None:
+        if not isinstance(incident, dict):
+            raise MalformedAlert(f"Alert incident is a JSON {_type_name(incident)}, not an object")
+        for name, kind in INCIDENT_FIELDS.items():
+            # bool is an int to Python, not to JSON
+            if not isinstance(incident.get(name), kind) or isinstance(incident[name], bool):
+                raise MalformedAlert(f"Alert incident {name} is a JSON {_type_name(incident.get(name))}, "
+                                     f"not {'a string' if kind is str else 'an ' + kind.__name__}")
+        members = incident.get('members', [])
+        if not isinstance(members, list) or not all(isinstance(member, dict) for member in members):
+            raise MalformedAlert('Alert incident members is not a list of objects')
+    joined = body.get('joined')
+    if joined is not None and (not isinstance(joined, list) or not all(isinstance(alert, dict) for alert in joined)):
+        raise MalformedAlert('Alert joined is not a list of objects')
+    return body
+
+
+def quarantine_message(message_id, payload, error):
+    """Move a message that failed permanently to quarantine; False if it
+    couldn't be, and is to be left for redelivery"""
+    if not quarantine:
+        return False
+    try:
+        quarantine.put(message_id, payload, error, PROCESSING_SOURCE)
+    except ClientError as e:
+        print(f"Error quarantining message {message_id}, leaving it to be redelivered: {str(e)}")
+        return False
+    print(f"Quarantined message {message_id}: {type(error).__name__}: {str(error)}")
+    emit({'MessagesQuarantined': 1})
+    return True
+
+
+def parse_messages(messages):
+    """Alert bodies of a batch's (message_id, payload) pairs, None where the
+    payload doesn't parse; returns (bodies, positions quarantined)"""
+    bodies, quarantined = [], set()
+    for i, (message_id, payload) in enumerate(messages):
+        try:
+            bodies.append(parse_alert(payload))
+        except MalformedAlert as e:
+            bodies.append(None)
+            if quarantine_message(message_id, payload, e):
+                quarantined.add(i)
+    return bodies, quarantined
+
+
+class Batch:
+    """A batch of alert bodies on its way through the pipeline.
+
+    start_batch (or release_held) correlates it, analyze_batch analyzes it
+    and finish_batch distributes and stores the analyses. Only
+    analyze_batch may run for several batches at once; the other steps
+    must see batches one at a time, in order.
+    """
+
+    def __init__(self, bodies, incident_of=None, dispatched=None):
+        self.bodies = bodies
+        # One analysis per incident: its lead goes through with the member
+        # alerts attached; the other members are only stored, with the
+        # incident's analysis
+        self.to_analyze, self.incident_of, self.dispatched = correlate(bodies, incident_of, dispatched)
+        self.analyses = None
+        self.preliminary_sent = set()
+
+
+def start_batch(bodies):
+    """Correlate a batch of alert bodies"""
+    return Batch(bodies)
+
+
+def release_held(bodies, incident_of, now=None):
+    """Start a batch of the alerts held (see hold_alerts) that are ready at
+    now: those without an incident, and those whose incident is due then
+    (see Correlator.due) or already being analyzed. now=None releases every
+    one. Returns the positions released and their batch, None if there
+    were none."""
+    dispatched = correlator.dispatch(now) if correlator else []
+    released = [i for i, body in enumerate(bodies)
+                if id(body) not in incident_of or incident_of[id(body)].current().dispatched]
+    if not released:
+        return [], None
+    bodies = [bodies[i] for i in released]
+    batch = Batch(bodies, {id(body): incident_of[id(body)] for body in bodies if id(body) in incident_of}, dispatched)
+    return released, batch
+
+
+def held_due_at():
+    """When the next alert held comes due (epoch seconds), None if none will"""
+    return correlator.due_at() if correlator else None
+
+
+def analyze_batch(batch, providers, distribution_queue_url):
+    """Analyze a correlated batch, sending preliminary results as they come"""
+    def on_preliminary(body, report, model):
+        send_to_distribution(distribution_queue_url, body, report, model, preliminary=True)
+        batch.preliminary_sent.add(id(body))
+
+    batch.analyses = analyze_alerts(providers, batch.to_analyze, on_preliminary=on_preliminary)
+
+    for body, analysis in zip(batch.to_analyze, batch.analyses):
+        if id(body) in batch.incident_of:
+            batch.incident_of[id(body)].analysis = analysis
+
+
+def finish_batch(batch, distribution_queue_url):
+    """Distribute and store an analyzed batch; returns the (report, model) stored per body"""
+    for body, (report, model) in zip(batch.to_analyze, batch.analyses):
+        print(f"Analysis ({model}): {json.dumps(report)}")
+
+        enrich = model == 'runbook' and RUNBOOK_ENRICHMENT
+
+        # Send analysis to distribution queue
+        send_to_distribution(
+            distribution_queue_url, body, report, model,
+            preliminary=model == 'fallback' or enrich,
+            update=requeued(body) or id(body) in batch.preliminary_sent
         )
 
-        print(f"Sent analysis to distribution queue: {distribution_queue_url}")
+        if enrich:
+            schedule_enrichment(body)
 
-        return {
-            'statusCode': 200,
-            'body': json.dumps({
-                'alert': alert_message,
-                'analysis': analysis,
-                'model': 'gemini-2.5-flash'
+    # Every alert is stored, members of an incident with its analysis
+    analysis_of = {id(body): analysis for body, analysis in zip(batch.to_analyze, batch.analyses)}
+    dispatched = {id(incident) for incident in batch.dispatched}
+    stored = []
+    incident_ids = {}
+    joined = {}
+    for i, body in enumerate(batch.bodies):
+        incident = batch.incident_of.get(id(body))
+        if incident is None:
+            stored.append(analysis_of[id(body)])
+            continue
+        incident = incident.current()
+        # Abandoned by the batch that was analyzing it
+        stored.append(incident.analysis or (generate_fallback_analysis(body), 'fallback'))
+        if incident.count > 1:
+            incident_ids[i] = incident.id
+        if id(incident) not in dispatched:
+            # Joined an incident an earlier batch posted; its lead's post doesn't list it
+            joined.setdefault(id(incident), (incident, []))[1].append(body)
+
+    for incident, bodies in joined.values():
+        send_incident_update(distribution_queue_url, incident, bodies)
+
+    if idempotency:
+        for alert_id, stage in idempotency_keys(batch.bodies).values():
+            idempotency.complete(alert_id, stage)
+    store_alerts(batch.bodies, stored, incident_ids)
+    record_occurrences(batch.bodies)
+    return stored
+
+
+def abandon_batch(batch):
+    """Forget the incidents a failed batch was analyzing and give up its
+    claims; SQS redelivers its alerts"""
+    for incident in batch.dispatched:
+        correlator.discard(incident)
+    if idempotency:
+        for alert_id, stage in idempotency_keys(batch.bodies).values():
+            idempotency.release(alert_id, stage)
+
+
+def export_metrics():
+    """Emit every component's metrics accumulated since the last export"""
+    if correlator:
+        correlator.export_metrics()
+    heartbeat.export_metrics()
+    if idempotency:
+        with idempotency.lock:
+            stats, idempotency.stats = idempotency.stats, dict.fromkeys(idempotency.stats, 0)
+        if any(stats.values()):
+            emit({
+                'IdempotencyCacheHits': stats['cache_hits'],
+                'IdempotencyReads': stats['reads'],
+                'IdempotencyClaims': stats['claims'],
+                'IdempotencyConflicts': stats['conflicts'],
+                'IdempotencyReleases': stats['releases']
             })
-        }
+    runbooks.export_metrics()
+    classifier.export_metrics()
+    context_gatherer.export_metrics()
+    if analysis_cache:
+        analysis_cache.export_metrics()
+    for guarded in _guards:
+        guarded.export_metrics()
+
+
+def lambda_handler(event, context):
+    """
+    Analyzer Lambda - runs each alert through the configured LLM provider
+    """
+    print(f"Received event: {json.dumps(event)}")
+
+    records = event.get('Records', [])
+    if not records:
+        return {'statusCode': 200, 'body': 'No records processed'}
+
+    providers = {tier: get_provider(tier) for tier in ('fast', 'deep')}
+
+    # Retries and timeouts for LLM calls stop short of the Lambda timeout
+    llm.http.set_deadline_from_context(context)
+
+    # Get distribution queue URL
+    distribution_queue_url = os.environ.get('DISTRIBUTION_QUEUE_URL')
+
+    # Parse alerts from SQS event; unparseable messages are quarantined.
+    # Alerts an earlier delivery finished are acknowledged without another
+    # analysis, and those another consumer is analyzing are reported as
+    # failures, to be redelivered
+    bodies, quarantined = parse_messages([(record['messageId'], record['body']) for record in records])
+    failures = [{'itemIdentifier': record['messageId']} for i, record in enumerate(records)
+                if bodies[i] is None and i not in quarantined]
+    records = [record for record, body in zip(records, bodies) if body is not None]
+    bodies = [body for body in bodies if body is not None]
+    done, busy = screen(bodies, [int(record.get('attributes', {}).get('ApproximateReceiveCount', '1'))
+                                 for record in records])
+    failures += [{'itemIdentifier': records[i]['messageId']} for i in sorted(busy)]
+    records = [record for i, record in enumerate(records) if i not in done | busy]
+    batch = start_batch([body for i, body in enumerate(bodies) if i not in done | busy])
+
+    receipts = [record['receiptHandle'] for record in records if record.get('receiptHandle')]
+    with heartbeat.Heartbeat(sqs, os.environ.get('PROCESSING_QUEUE_URL'), receipts, PROCESSING_VISIBILITY):
+        try:
+            analyze_batch(batch, providers, distribution_queue_url)
+            stored = finish_batch(batch, distribution_queue_url)
+        except Exception:
+            abandon_batch(batch)
+            raise
+
+    # Held-back alerts only outlive the invocation (and risk being lost with
+    # the container) while a circuit is open
+    if all(guarded.breaker.state == CircuitBreaker.CLOSED for guarded in _guards):
+        flush_reanalysis()
+
+    export_metrics()
 
-    return {'statusCode': 200, 'body': 'No records processed'}
+    return {
+        'statusCode': 200,
+        'body': json.dumps({
+            'alerts': len(batch.bodies),
+            'acknowledged': len(done),
+            'deferred': len(busy),
+            'quarantined': len(quarantined),
+            'analyses': [
+                {'alert': body.get('message', 'Unknown error'), 'report': report, 'model': model}
+                for body, (report, model) in zip(batch.bodies, stored)
+            ]
+        }),
+        'batchItemFailures': failures
+    }
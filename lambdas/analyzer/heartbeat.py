@@ -0,0 +1,117 @@
+import threading
+import time
+
+from botocore.exceptions import ClientError
+
+from metrics import emit
+
+# SQS caps a message's visibility at 12 hours from when it was received
+MAX_VISIBILITY_SECONDS = 43200
+
+_lock = threading.Lock()
+_stats = {'extensions': 0, 'lost': 0, 'errors': 0, 'longest': 0.0}
+
+
+def _count(**deltas):
+    with _lock:
+        for name, delta in deltas.items():
+            _stats[name] += delta
+
+
+class Heartbeat:
+    """Keeps received SQS messages invisible while they are being worked on.
+
+    A background thread resets the messages' visibility timeout to
+    visibility_timeout every interval (half of it by default), with one
+    ChangeMessageVisibilityBatch per beat, until stop(). A message whose
+    receipt handle is rejected (deleted, or already redelivered elsewhere)
+    is dropped from later beats, as is one given to remove(). Extensions
+    stop short of SQS's 12 hour cap. Usable as a context manager.
+    """
+
+    def __init__(self, sqs, queue_url, receipts, visibility_timeout, interval=None):
+        self.sqs = sqs
+        self.queue_url = queue_url
+        self.receipts = list(receipts)
+        self.visibility_timeout = int(visibility_timeout)
+        self.interval = interval or self.visibility_timeout / 2
+        self.started_at = None
+        self.stopped = threading.Event()
+        self.thread = None
+        # Held through each beat, so remove() waits out an extension in progress
+        self.lock = threading.Lock()
+
+    def start(self):
+        self.started_at = time.monotonic()
+        if self.receipts and self.queue_url:
+            self.thread = threading.Thread(target=self._run, name='heartbeat', daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self):
+        """Stop extending; returns once no extension is in progress"""
+        self.stopped.set()
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+            elapsed = time.monotonic() - self.started_at
+            with _lock:
+                _stats['longest'] = max(_stats['longest'], elapsed)
+
+    def remove(self, receipts):
+        """Stop extending some of the messages (returns once no extension of
+        them is in progress); returns how many are still extended"""
+        receipts = set(receipts)
+        with self.lock:
+            self.receipts = [receipt for receipt in self.receipts if receipt not in receipts]
+            return len(self.receipts)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            if time.monotonic() - self.started_at + self.visibility_timeout > MAX_VISIBILITY_SECONDS:
+                print('Heartbeat stopped: messages at the maximum visibility')
+                return
+            with self.lock:
+                if not self.receipts:
+                    return
+                self._extend()
+
+    def _extend(self):
+        try:
+            response = self.sqs.change_message_visibility_batch(
+                QueueUrl=self.queue_url,
+                Entries=[{'Id': str(n), 'ReceiptHandle': receipt, 'VisibilityTimeout': self.visibility_timeout}
+                         for n, receipt in enumerate(self.receipts)]
+            )
+        except ClientError as e:
+            # The next beat tries again, while the current timeout lasts
+            print(f"Error extending message visibility: {str(e)}")
+            _count(errors=1)
+            return
+
+        lost = {int(failure['Id']) for failure in response.get('Failed', [])}
+        if lost:
+            print(f"Heartbeat lost {len(lost)} message(s): "
+                  f"{', '.join(sorted({f.get('Code', 'unknown') for f in response['Failed']}))}")
+            self.receipts = [receipt for n, receipt in enumerate(self.receipts) if n not in lost]
+        _count(extensions=len(response.get('Successful', [])), lost=len(lost))
+
+
+def export_metrics():
+    """Emit heartbeat counters accumulated since the last export, then reset them"""
+    with _lock:
+        stats = dict(_stats)
+        _stats.update(extensions=0, lost=0, errors=0, longest=0.0)
+    if stats['extensions'] or stats['lost'] or stats['errors']:
+        emit({
+            'VisibilityExtensions': stats['extensions'],
+            'VisibilityExtensionsLost': stats['lost'],
+            'VisibilityExtensionErrors': stats['errors'],
+            'LongestHeartbeatSeconds': round(stats['longest'], 1)
+        }, units={'LongestHeartbeatSeconds': 'Seconds'})
@@ -0,0 +1,114 @@
+import email.utils
+import os
+import random
+import time
+
+import urllib3
+
+# Statuses worth retrying: rate limiting and transient server errors
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def parse_retry_after(value):
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP-date)"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class ResilientHTTP:
+    """urllib3 wrapper with timeouts, retries and an overall deadline.
+
+    Retries connection errors, timeouts and RETRY_STATUSES with exponential
+    backoff and full jitter (sleep ~ U(0, min(max_delay, base_delay * 2^n))),
+    honouring Retry-After when the server sends one. No attempt or sleep is
+    started that can't finish before the deadline; the last response (or
+    error) is returned to the caller instead.
+    """
+
+    def __init__(self, connect_timeout=3.0, read_timeout=60.0, max_attempts=4,
+                 base_delay=0.5, max_delay=8.0):
+        self.pool = urllib3.PoolManager(retries=False)
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = None
+        self.retries = 0
+
+    def set_deadline(self, seconds):
+        """Set the overall deadline, in seconds from now (None to clear)"""
+        self.deadline = None if seconds is None else time.monotonic() + seconds
+
+    def set_deadline_from_context(self, context, margin=None):
+        """Derive the deadline from a Lambda context, keeping a safety margin"""
+        if margin is None:
+            margin = float(os.environ.get('DEADLINE_MARGIN_SECONDS', '5'))
+        remaining = getattr(context, 'get_remaining_time_in_millis', None)
+        self.set_deadline(remaining() / 1000.0 - margin if remaining else None)
+
+    def remaining(self):
+        return None if self.deadline is None else self.deadline - time.monotonic()
+
+    def backoff(self, attempt, retry_after=None):
+        if retry_after is not None:
+            return retry_after
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def request(self, method, url, body=None, headers=None, preload_content=True):
+        """Send a request with retries; preload_content=False returns a
+        streamable response once the status line and headers arrive."""
+        last_error = None
+
+        for attempt in range(self.max_attempts):
+            remaining = self.remaining()
+            if remaining is not None and remaining <= 0:
+                break
+
+            read_timeout = self.read_timeout if remaining is None else min(self.read_timeout, remaining)
+            timeout = urllib3.Timeout(connect=min(self.connect_timeout, read_timeout), read=read_timeout)
+
+            retry_after = None
+            try:
+                resp = self.pool.request(method, url, body=body, headers=headers, timeout=timeout,
+                                         preload_content=preload_content)
+            except urllib3.exceptions.HTTPError as e:
+                print(f"HTTP {method} attempt {attempt + 1} failed: {str(e)}")
+                last_error = e
+            else:
+                if resp.status not in RETRY_STATUSES:
+                    return resp
+                print(f"HTTP {method} attempt {attempt + 1} returned {resp.status}")
+                retry_after = parse_retry_after(resp.headers.get('Retry-After'))
+                last_error = resp
+
+            if attempt + 1 >= self.max_attempts:
+                break
+
+            if isinstance(last_error, urllib3.response.BaseHTTPResponse) and not preload_content:
+                # Free the connection of a response we're not going to return
+                last_error.drain_conn()
+                last_error.release_conn()
+
+            delay = self.backoff(attempt, retry_after)
+            remaining = self.remaining()
+            if remaining is not None and delay >= remaining:
+                print(f"Not retrying: backoff {delay:.2f}s exceeds remaining deadline {remaining:.2f}s")
+                break
+
+            self.retries += 1
+            time.sleep(delay)
+
+        if isinstance(last_error, Exception):
+            raise last_error
+        if last_error is None:
+            raise urllib3.exceptions.TimeoutError('Deadline exceeded before request could be sent')
+        return last_error
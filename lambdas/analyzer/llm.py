@@ -0,0 +1,408 @@
+import codecs
+import json
+import os
+import threading
+import time
+from collections import deque, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import urllib3
+
+from http_client import ResilientHTTP
+from structured import to_gemini_schema
+
+http = ResilientHTTP(
+    connect_timeout=float(os.environ.get('LLM_CONNECT_TIMEOUT', '3')),
+    read_timeout=float(os.environ.get('LLM_READ_TIMEOUT', '60')),
+    max_attempts=int(os.environ.get('LLM_MAX_ATTEMPTS', '4'))
+)
+
+ANTHROPIC_TOOL_NAME = 'record_analysis'
+
+# Result of a provider call: the generated text and the model/provider that produced it
+Completion = namedtuple('Completion', ['text', 'model', 'provider'])
+
+
+# HTTP statuses that mean the provider is overloaded rather than rejecting the request
+OVERLOAD_STATUSES = {429, 500, 502, 503, 504}
+
+
+class LLMError(Exception):
+    """Raised when a provider call fails or returns no usable text.
+
+    overload is True for rate limiting, 5xx and network failures - errors
+    that say "back off" rather than "this request is bad".
+    """
+
+    def __init__(self, message, status=None, overload=None):
+        super().__init__(message)
+        self.status = status
+        self.overload = status in OVERLOAD_STATUSES if overload is None else overload
+
+
+class LLMProvider:
+    """Base class for LLM providers.
+
+    generate(prompt) -> Completion; stream(prompt) yields text chunks as they
+    are generated (by default the whole completion as a single chunk).
+    With a JSON schema, providers constrain the output to JSON matching it
+    and return it as the completion text.
+    """
+
+    name = 'base'
+
+    def __init__(self, model):
+        self.model = model
+
+    def generate(self, prompt, max_tokens=1024, schema=None):
+        raise NotImplementedError
+
+    def stream(self, prompt, max_tokens=1024, schema=None):
+        yield self.generate(prompt, max_tokens, schema).text
+
+    def _stream_events(self, url, payload, headers):
+        """POST a streaming request and yield each server-sent event's JSON data"""
+        try:
+            resp = http.request(
+                'POST',
+                url,
+                body=json.dumps(payload),
+                headers={'Content-Type': 'application/json', **headers},
+                preload_content=False
+            )
+        except urllib3.exceptions.HTTPError as e:
+            raise LLMError(f"{self.name} request failed: {str(e)}", overload=True)
+
+        try:
+            if resp.status >= 400:
+                data = resp.read().decode('utf-8', 'replace')
+                try:
+                    message = json.loads(data).get('error', {}).get('message', 'Unknown error')
+                except (ValueError, AttributeError):
+                    message = data[:200]
+                raise LLMError(f"{self.name} API Error (HTTP {resp.status}): {message}", status=resp.status)
+
+            decoder = codecs.getincrementaldecoder('utf-8')()
+            buffer = ''
+            for chunk in resp.stream(1024):
+                buffer += decoder.decode(chunk)
+                while '\n' in buffer:
+                    line, buffer = buffer.split('\n', 1)
+                    line = line.strip()
+                    if line.startswith('data:') and line[5:].strip() not in ('', '[DONE]'):
+                        yield json.loads(line[5:])
+        except urllib3.exceptions.HTTPError as e:
+            raise LLMError(f"{self.name} stream interrupted: {str(e)}", overload=True)
+        except ValueError as e:
+            raise LLMError(f"{self.name} sent a malformed stream event: {str(e)}")
+        finally:
+            resp.release_conn()
+
+    def _post(self, url, payload, headers):
+        """POST a JSON payload and return the decoded JSON response"""
+        try:
+            resp = http.request(
+                'POST',
+                url,
+                body=json.dumps(payload),
+                headers={'Content-Type': 'application/json', **headers}
+            )
+        except urllib3.exceptions.HTTPError as e:
+            raise LLMError(f"{self.name} request failed: {str(e)}", overload=True)
+
+        try:
+            result = json.loads(resp.data.decode('utf-8'))
+        except ValueError:
+            raise LLMError(f"{self.name} returned non-JSON response (HTTP {resp.status})", status=resp.status)
+
+        if resp.status >= 400:
+            error = result.get('error', {}) if isinstance(result, dict) else {}
+            raise LLMError(f"{self.name} API Error (HTTP {resp.status}): {error.get('message', 'Unknown error')}",
+                           status=resp.status)
+
+        return result
+
+
+class GeminiProvider(LLMProvider):
+    """Google Gemini generateContent REST API"""
+
+    name = 'google'
+
+    def __init__(self, api_key, model='gemini-2.5-flash',
+                 base_url='https://generativelanguage.googleapis.com'):
+        super().__init__(model)
+        self.api_key = api_key
+        self.base_url = base_url
+
+    def _payload(self, prompt, max_tokens, schema):
+        generation_config = {'maxOutputTokens': max_tokens}
+        if schema:
+            generation_config['responseMimeType'] = 'application/json'
+            generation_config['responseSchema'] = to_gemini_schema(schema)
+
+        return {
+            'contents': [{
+                'parts': [{'text': prompt}]
+            }],
+            'generationConfig': generation_config
+        }
+
+    def generate(self, prompt, max_tokens=1024, schema=None):
+        url = f'{self.base_url}/v1beta/models/{self.model}:generateContent?key={self.api_key}'
+
+        payload = self._payload(prompt, max_tokens, schema)
+
+        result = self._post(url, payload, {})
+
+        if 'error' in result:
+            raise LLMError(f"Gemini API Error: {result['error'].get('message', 'Unknown error')}")
+        if not result.get('candidates'):
+            raise LLMError("No analysis returned from Gemini")
+
+        parts = result['candidates'][0].get('content', {}).get('parts', [])
+        return Completion(''.join(p.get('text', '') for p in parts), self.model, self.name)
+
+    def stream(self, prompt, max_tokens=1024, schema=None):
+        url = f'{self.base_url}/v1beta/models/{self.model}:streamGenerateContent?alt=sse&key={self.api_key}'
+
+        payload = self._payload(prompt, max_tokens, schema)
+
+        for event in self._stream_events(url, payload, {}):
+            if 'error' in event:
+                raise LLMError(f"Gemini API Error: {event['error'].get('message', 'Unknown error')}")
+            for candidate in event.get('candidates', [])[:1]:
+                for part in candidate.get('content', {}).get('parts', []):
+                    if part.get('text'):
+                        yield part['text']
+
+
+class AnthropicProvider(LLMProvider):
+    """Anthropic Messages REST API"""
+
+    name = 'anthropic'
+
+    def __init__(self, api_key, model='claude-sonnet-4-20250514',
+                 base_url='https://api.anthropic.com'):
+        super().__init__(model)
+        self.api_key = api_key
+        self.base_url = base_url
+
+    def _payload(self, prompt, max_tokens, schema, stream=False):
+        payload = {
+            'model': self.model,
+            'max_tokens': max_tokens,
+            'temperature': 0,
+            'messages': [{'role': 'user', 'content': prompt}]
+        }
+        if stream:
+            payload['stream'] = True
+        if schema:
+            # Tool use with a forced tool is how Anthropic constrains output to a schema
+            payload['tools'] = [{
+                'name': ANTHROPIC_TOOL_NAME,
+                'description': 'Record the structured analysis',
+                'input_schema': schema if schema['type'] == 'object' else {
+                    'type': 'object', 'properties': {'items': schema}, 'required': ['items']
+                }
+            }]
+            payload['tool_choice'] = {'type': 'tool', 'name': ANTHROPIC_TOOL_NAME}
+        return payload
+
+    def generate(self, prompt, max_tokens=1024, schema=None):
+        payload = self._payload(prompt, max_tokens, schema)
+
+        result = self._post(f'{self.base_url}/v1/messages', payload, {
+            'x-api-key': self.api_key,
+            'anthropic-version': '2023-06-01'
+        })
+
+        if result.get('type') == 'error' or 'error' in result:
+            raise LLMError(f"Anthropic API Error: {result['error'].get('message', 'Unknown error')}")
+
+        for block in result.get('content', []):
+            if block.get('type') == 'tool_use':
+                tool_input = block.get('input', {})
+                if schema and schema['type'] != 'object':
+                    tool_input = tool_input.get('items', [])
+                return Completion(json.dumps(tool_input), self.model, self.name)
+
+        text = ''.join(block.get('text', '') for block in result.get('content', []) if block.get('type') == 'text')
+        if not text:
+            raise LLMError("No analysis returned from Anthropic")
+        return Completion(text, self.model, self.name)
+
+    def stream(self, prompt, max_tokens=1024, schema=None):
+        if schema and schema['type'] != 'object':
+            # Array schemas are wrapped in a tool input object; don't stream those
+            yield self.generate(prompt, max_tokens, schema).text
+            return
+
+        payload = self._payload(prompt, max_tokens, schema, stream=True)
+
+        events = self._stream_events(f'{self.base_url}/v1/messages', payload, {
+            'x-api-key': self.api_key,
+            'anthropic-version': '2023-06-01'
+        })
+        for event in events:
+            if event.get('type') == 'error':
+                raise LLMError(f"Anthropic API Error: {event.get('error', {}).get('message', 'Unknown error')}",
+                               overload=event.get('error', {}).get('type') == 'overloaded_error')
+            if event.get('type') == 'content_block_delta':
+                delta = event['delta']
+                if delta.get('type') == 'text_delta':
+                    yield delta['text']
+                elif delta.get('type') == 'input_json_delta':
+                    yield delta.get('partial_json', '')
+
+
+class MockProvider(LLMProvider):
+    """In-process provider for local runs: fixed latency and a canned or computed reply"""
+
+    name = 'mock'
+
+    def __init__(self, model='mock', latency=0.0, reply=None, fail=False):
+        super().__init__(model)
+        self.latency = latency
+        self.reply = reply
+        self.fail = fail
+        self.calls = 0
+
+    def generate(self, prompt, max_tokens=1024, schema=None):
+        self.calls += 1
+        time.sleep(self.latency)
+        if self.fail:
+            raise LLMError(f"{self.model} failed")
+        text = self.reply(prompt) if callable(self.reply) else (self.reply or f"Mock analysis ({len(prompt)} chars)")
+        return Completion(text, self.model, self.name)
+
+
+class LatencyTracker:
+    """Sliding window of successful call latencies"""
+
+    def __init__(self, window=100):
+        self.samples = deque(maxlen=window)
+        self.lock = threading.Lock()
+
+    def record(self, seconds):
+        with self.lock:
+            self.samples.append(seconds)
+
+    def percentile(self, pct, min_samples=1):
+        """The pct percentile latency, None with fewer than min_samples samples"""
+        with self.lock:
+            ordered = sorted(self.samples)
+        if not ordered or len(ordered) < min_samples:
+            return None
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def _in_flight_limit(provider, default=8):
+    """Most calls a provider takes at once: its limiter's maximum if it has one"""
+    limiter = getattr(provider, 'limiter', None)
+    return limiter.maximum if limiter is not None else default
+
+
+class HedgedProvider(LLMProvider):
+    """Primary provider with a hedged request to a secondary.
+
+    The primary is called first; if it hasn't answered within its observed
+    p95 latency (or fails), the same prompt is sent to the secondary and
+    whichever answers first wins. Until min_samples latencies have been
+    observed, initial_delay is used as the hedge delay.
+
+    Calls run on the instance's own pool, with a thread for every call the
+    providers' limiters admit at once (max_workers overrides), and the
+    hedge delay counts from when the primary call starts: a call waiting
+    for a thread is not mistaken for a slow primary.
+    """
+
+    name = 'hedged'
+
+    def __init__(self, primary, secondary, percentile=95, initial_delay=10.0, min_samples=20, max_workers=None):
+        super().__init__(primary.model)
+        self.primary = primary
+        self.secondary = secondary
+        self.pct = percentile
+        self.initial_delay = initial_delay
+        self.min_samples = min_samples
+        self.latency = {primary.name: LatencyTracker(), secondary.name: LatencyTracker()}
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers or _in_flight_limit(primary) + _in_flight_limit(secondary),
+            thread_name_prefix='hedge'
+        )
+        self.lock = threading.Lock()
+        self.hedges = 0
+
+    def hedge_delay(self):
+        delay = self.latency[self.primary.name].percentile(self.pct, self.min_samples)
+        return self.initial_delay if delay is None else delay
+
+    def _timed(self, provider, prompt, max_tokens, schema):
+        start = time.monotonic()
+        completion = provider.generate(prompt, max_tokens, schema)
+        return completion, time.monotonic() - start
+
+    def _win(self, future):
+        # Only winning calls are recorded, so a degraded primary that keeps
+        # losing the race doesn't drag its own p95 (the hedge delay) up
+        completion, elapsed = future.result()
+        self.latency[completion.provider].record(elapsed)
+        return completion
+
+    def generate(self, prompt, max_tokens=1024, schema=None):
+        delay = self.hedge_delay()
+        started = threading.Event()
+
+        def call_primary():
+            started.set()
+            return self._timed(self.primary, prompt, max_tokens, schema)
+
+        primary = self.executor.submit(call_primary)
+        started.wait()
+        done, _ = wait([primary], timeout=delay)
+
+        if done and primary.exception() is None:
+            return self._win(primary)
+
+        if done:
+            print(f"Primary provider {self.primary.name} failed: {primary.exception()}")
+        else:
+            print(f"Primary provider {self.primary.name} slower than {delay:.2f}s, hedging to {self.secondary.name}")
+        with self.lock:
+            self.hedges += 1
+
+        pending = {primary} if not done else set()
+        pending.add(self.executor.submit(self._timed, self.secondary, prompt, max_tokens, schema))
+
+        errors = [primary.exception()] if done else []
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return self._win(future)
+                errors.append(future.exception())
+
+        raise LLMError(
+            f"All providers failed: {'; '.join(str(e) for e in errors)}",
+            overload=all(getattr(e, 'overload', True) for e in errors)
+        )
+
+
+def create_provider(name, api_key, model=None):
+    """Build a provider from its AI_PROVIDER name; model overrides the env default"""
+    if name == 'google':
+        return GeminiProvider(
+            api_key,
+            model=model or os.environ.get('GEMINI_MODEL', 'gemini-2.5-flash'),
+            base_url=os.environ.get('GEMINI_BASE_URL', 'https://generativelanguage.googleapis.com')
+        )
+    elif name == 'anthropic':
+        return AnthropicProvider(
+            api_key,
+            model=model or os.environ.get('ANTHROPIC_MODEL', 'claude-sonnet-4-20250514'),
+            base_url=os.environ.get('ANTHROPIC_BASE_URL', 'https://api.anthropic.com')
+        )
+    elif name == 'mock':
+        return MockProvider(model=model or 'mock', latency=float(os.environ.get('MOCK_LLM_LATENCY', '0')))
+    else:
+        raise ValueError(f"Unknown AI provider: {name}")
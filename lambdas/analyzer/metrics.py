@@ -0,0 +1,42 @@
+import json
+import os
+import time
+
+NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'MCPFirstResponder')
+
+# Tools running the pipeline outside Lambda or the worker turn metrics off:
+# nothing extracts them from their output
+_enabled = True
+
+
+def set_enabled(enabled):
+    """Turn metric emission on or off for this process"""
+    global _enabled
+    _enabled = enabled
+
+
+def emit(metrics, dimensions=None, units=None):
+    """Emit metrics as a CloudWatch Embedded Metric Format log line.
+
+    metrics is a dict of name -> value; CloudWatch extracts them from the
+    Lambda log stream, so no PutMetricData call is made.
+    """
+    if not _enabled:
+        return
+    dimensions = dimensions or {}
+    units = units or {}
+
+    record = {
+        '_aws': {
+            'Timestamp': int(time.time() * 1000),
+            'CloudWatchMetrics': [{
+                'Namespace': NAMESPACE,
+                'Dimensions': [list(dimensions.keys())],
+                'Metrics': [{'Name': name, 'Unit': units.get(name, 'Count')} for name in metrics]
+            }]
+        },
+        **dimensions,
+        **metrics
+    }
+
+    print(json.dumps(record))
@@ -0,0 +1,181 @@
+import json
+import re
+
+# Rough characters per token; good enough for budgeting without a tokenizer
+CHARS_PER_TOKEN = 4
+
+# Lines that look like stack frames (Python, Java/JVM, Node, Go)
+FRAME_PATTERN = re.compile(r'^\s*(File ".*", line \d+|at [\w$.<>]+\(.*\)|at .+:\d+(:\d+)?\)?$|[\w./-]+\.go:\d+)')
+
+# Volatile tokens (timestamps, hex ids, numbers) ignored when comparing log lines
+VOLATILE_PATTERN = re.compile(r'\d{4}-\d\d-\d\d[T ][\d:.,]+Z?|0x[0-9a-fA-F]+|\b[0-9a-f]{8,}\b|\d+')
+
+OMITTED_MARKER = '... [{} lines omitted] ...'
+
+
+def estimate_tokens(text):
+    """Cheap token estimate (~4 characters per token)"""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN if text else 0
+
+
+def collapse_repeats(lines):
+    """Collapse runs of lines that differ only in numbers/ids into 'line (xN)'"""
+    collapsed = []
+    previous_key = None
+    count = 0
+
+    for line in lines:
+        # Frames differing only in line number are different frames
+        key = line.strip() if FRAME_PATTERN.match(line) else VOLATILE_PATTERN.sub('#', line.strip())
+        if key == previous_key:
+            count += 1
+            continue
+        if count > 1:
+            collapsed[-1] = f"{collapsed[-1]} (x{count})"
+        collapsed.append(line)
+        previous_key = key
+        count = 1
+
+    if count > 1:
+        collapsed[-1] = f"{collapsed[-1]} (x{count})"
+    return collapsed
+
+
+def dedupe_frames(lines):
+    """Drop stack frames already seen earlier in the trace (recursion, chained causes)"""
+    seen = set()
+    deduped = []
+    skipped = 0
+    in_skipped_frame = False
+
+    for line in lines:
+        if FRAME_PATTERN.match(line):
+            key = line.strip()
+            if key in seen:
+                skipped += 1
+                in_skipped_frame = True
+                continue
+            seen.add(key)
+        elif in_skipped_frame and line.startswith('    '):
+            # Source line printed under a skipped Python frame
+            continue
+        if skipped:
+            deduped.append(f"    ... [{skipped} repeated frames] ...")
+            skipped = 0
+        in_skipped_frame = False
+        deduped.append(line)
+
+    if skipped:
+        deduped.append(f"    ... [{skipped} repeated frames] ...")
+    return deduped
+
+
+def head_tail(lines, max_tokens, head_share=0.4):
+    """Keep the head and tail of a long line list within max_tokens.
+
+    The tail gets the larger share: for traces and logs the innermost frame
+    and the final error line are at the end.
+    """
+    if estimate_tokens('\n'.join(lines)) <= max_tokens:
+        return lines
+
+    head_budget = max_tokens * head_share
+    tail_budget = max_tokens - head_budget
+    head, tail = [], []
+
+    used = 0
+    for line in lines:
+        cost = estimate_tokens(line) + 1
+        if used + cost > head_budget:
+            break
+        head.append(line)
+        used += cost
+
+    used = 0
+    for line in reversed(lines[len(head):]):
+        cost = estimate_tokens(line) + 1
+        if used + cost > tail_budget:
+            break
+        tail.insert(0, line)
+        used += cost
+
+    omitted = len(lines) - len(head) - len(tail)
+    if not head and not tail:
+        # A single oversized line: hard-cut it
+        text = lines[-1]
+        return [text[:max_tokens * CHARS_PER_TOKEN]]
+    return head + ([OMITTED_MARKER.format(omitted)] if omitted else []) + tail
+
+
+def compact(text, max_tokens=None):
+    """Dedupe frames, collapse repeated lines and fit text to max_tokens"""
+    if not text:
+        return ''
+    lines = collapse_repeats(dedupe_frames(text.splitlines()))
+    if max_tokens is not None:
+        lines = head_tail(lines, max_tokens)
+    return '\n'.join(lines)
+
+
+def build_sections(alert, context):
+    """Prompt sections as (priority, title, text); lower priority number = more useful"""
+    sections = [(0, 'Alert', alert.get('message', 'Unknown error'))]
+
+    incident = alert.get('incident') or {}
+    if incident.get('members'):
+        members = '\n'.join(f"- [{m.get('log_group', 'unknown')}] {m.get('message', '')}" for m in incident['members'])
+        if incident.get('count', 0) > len(incident['members']) + 1:
+            members += f"\n- ... and {incident['count'] - len(incident['members']) - 1} more"
+        sections.append((1, (
+            f"Correlated alerts ({incident['count']} across {len(incident.get('log_groups', []))} log groups, "
+            "likely one incident - analyze their common cause)"
+        ), members))
+
+    pattern = context.get('historical_pattern') or {}
+    if pattern:
+        sections.append((1, 'Historical pattern (past 7 days)', (
+            f"Occurrences: {pattern.get('occurrence_count', 0)}, "
+            f"frequency: {pattern.get('frequency', 'unknown')}"
+        )))
+
+    similar = context.get('recent_similar_alerts') or {}
+    if similar.get('count'):
+        matched_on = 'same error signature' if similar.get('matched_on') == 'error_signature' else 'same severity'
+        count = f"{similar['count']}{'' if similar.get('complete', True) else '+'}"
+        titles = '\n'.join(f"- {a.get('title') or a.get('error_signature', '')}" for a in similar.get('alerts', []))
+        sections.append((2, f"Similar alerts (past 24h, {matched_on}): {count}", titles))
+
+    if context.get('log_context'):
+        sections.append((3, 'Recent log entries', context['log_context']))
+
+    if alert.get('raw_data'):
+        sections.append((4, 'Raw alert data', json.dumps(alert['raw_data'], indent=1, default=str)))
+
+    return sections
+
+
+def build_prompt(alert, context=None, budget=1500, header=None, footer=None):
+    """Build an analysis prompt that fits in `budget` tokens.
+
+    Sections are compacted, then filled in priority order; a section that
+    doesn't fit whole gets whatever budget is left (head and tail kept),
+    and sections with less than a few lines' worth of room are dropped.
+    """
+    header = header or 'Analyze this production alert and provide a structured incident report:'
+    footer = footer or (
+        "Respond with a JSON incident report. Be concise, technical and actionable: "
+        "start with a one-line summary and the severity, then root cause, impact and remediation steps."
+    )
+
+    remaining = budget - estimate_tokens(header) - estimate_tokens(footer)
+    parts = []
+
+    for _, title, text in sorted(build_sections(alert, context or {}), key=lambda s: s[0]):
+        room = remaining - estimate_tokens(title) - 2
+        if room < 20:
+            continue
+        body = compact(text, room)
+        parts.append(f"{title}: {body}" if title == 'Alert' else f"{title}:\n{body}")
+        remaining -= estimate_tokens(parts[-1]) + 1
+
+    return '\n\n'.join([header] + parts + [footer])
@@ -0,0 +1,204 @@
+import threading
+import time
+
+from llm import LLMError, LLMProvider
+from metrics import emit
+
+
+class CircuitOpenError(LLMError):
+    """Raised instead of calling the provider while the circuit is open"""
+
+    def __init__(self, message):
+        super().__init__(message, overload=True)
+
+
+class LoadShedError(LLMError):
+    """Raised when the adaptive limiter has no capacity for another call"""
+
+    def __init__(self, message):
+        super().__init__(message, overload=True)
+
+
+class AdaptiveLimiter:
+    """AIMD concurrency limiter.
+
+    The limit grows by 1/limit for every successful call (about +1 per
+    full window of calls) and is halved on every overload signal (429,
+    5xx, timeout). Callers that can't get a slot within the wait time are
+    shed.
+    """
+
+    def __init__(self, initial=4, minimum=1, maximum=20, decrease_factor=0.5):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decrease_factor = decrease_factor
+        self.in_flight = 0
+        self.shed = 0
+        self.cond = threading.Condition()
+
+    def acquire(self, wait=0.0):
+        deadline = time.monotonic() + wait
+        with self.cond:
+            while self.in_flight >= int(self.limit):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.shed += 1
+                    return False
+                self.cond.wait(remaining)
+            self.in_flight += 1
+            return True
+
+    def release(self, overloaded=False):
+        with self.cond:
+            self.in_flight -= 1
+            if overloaded:
+                self.limit = max(self.minimum, self.limit * self.decrease_factor)
+            else:
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            self.cond.notify_all()
+
+
+class CircuitBreaker:
+    """Closed -> open after failure_threshold consecutive overload failures,
+    open -> half-open after reset_timeout, half-open -> closed on a
+    successful probe (or back to open on a failed one).
+
+    on_success is called (outside the lock) after every successful call,
+    e.g. to release work held back while the provider was struggling.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30.0, on_success=None):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.on_success = on_success
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.transitions = 0
+        self.lock = threading.Lock()
+
+    def _transition(self, state):
+        # Caller holds the lock
+        print(f"Circuit breaker {self.name}: {self.state} -> {state}")
+        self.state = state
+        self.transitions += 1
+        emit({'CircuitTransitions': 1, 'CircuitState': self.STATE_VALUES[state]}, {'Provider': self.name})
+
+    def allow(self):
+        """Whether a call may go through now"""
+        with self.lock:
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self._transition(self.HALF_OPEN)
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.HALF_OPEN and not self.probe_in_flight:
+                self.probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.probe_in_flight = False
+            if self.state != self.CLOSED:
+                self._transition(self.CLOSED)
+        if self.on_success:
+            self.on_success()
+
+    def release_probe(self):
+        """Give back the half-open probe slot without a verdict on the
+        provider, e.g. when the call never reached it or failed on our side"""
+        with self.lock:
+            self.probe_in_flight = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.probe_in_flight = False
+            if self.state == self.HALF_OPEN or (self.state == self.CLOSED and self.failures >= self.failure_threshold):
+                self.opened_at = time.monotonic()
+                self._transition(self.OPEN)
+
+
+class GuardedProvider(LLMProvider):
+    """Wraps a provider with an adaptive limiter and a circuit breaker.
+
+    Raises CircuitOpenError / LoadShedError without touching the provider
+    when the call would only add load to a struggling upstream.
+    """
+
+    def __init__(self, provider, limiter, breaker, acquire_wait=0.0):
+        super().__init__(provider.model)
+        self.name = provider.name
+        self.provider = provider
+        self.limiter = limiter
+        self.breaker = breaker
+        self.acquire_wait = acquire_wait
+
+    def _admit(self):
+        if not self.breaker.allow():
+            self.limiter.shed += 1
+            raise CircuitOpenError(f"Circuit open for {self.name}")
+
+        if not self.limiter.acquire(self.acquire_wait):
+            # Give back the half-open probe slot if we took it
+            self.breaker.release_probe()
+            raise LoadShedError(f"Concurrency limit {int(self.limiter.limit)} reached for {self.name}")
+
+    def _record(self, error=None):
+        overloaded = error is not None and error.overload
+        if overloaded:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        self.limiter.release(overloaded)
+
+    def generate(self, prompt, max_tokens=1024, schema=None):
+        self._admit()
+        try:
+            completion = self.provider.generate(prompt, max_tokens, schema)
+        except LLMError as e:
+            self._record(e)
+            raise
+        except Exception:
+            # Not the provider's fault; a probe that ends here proves nothing
+            self.breaker.release_probe()
+            self.limiter.release()
+            raise
+
+        self._record()
+        return completion
+
+    def stream(self, prompt, max_tokens=1024, schema=None):
+        self._admit()
+        try:
+            yield from self.provider.stream(prompt, max_tokens, schema)
+        except LLMError as e:
+            self._record(e)
+            raise
+        except BaseException:
+            # Includes the consumer closing the generator early
+            self.breaker.release_probe()
+            self.limiter.release()
+            raise
+
+        self._record()
+
+    def export_metrics(self):
+        """Emit breaker/limiter state; shed count is reset after each export"""
+        emit({
+            'CircuitState': CircuitBreaker.STATE_VALUES[self.breaker.state],
+            'ConcurrencyLimit': self.limiter.limit,
+            'InFlight': self.limiter.in_flight,
+            'ShedCount': self.limiter.shed
+        }, {'Provider': self.breaker.name})
+        self.limiter.shed = 0
@@ -0,0 +1,104 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict, deque, namedtuple
+
+DEFAULT_POLICY_PATH = os.path.join(os.path.dirname(__file__), 'routing.json')
+
+# Tiers: 'none' answers from rules without an LLM call, 'fast' uses a cheap
+# model, 'deep' a stronger one
+TIERS = ('none', 'fast', 'deep')
+
+# Routing decision for one alert; rule is the index of the matching policy
+# rule (None for the default)
+Route = namedtuple('Route', ['tier', 'max_tokens', 'rule'])
+
+
+class FrequencyCounter:
+    """Per-container count of recent alerts per fingerprint (sliding window)"""
+
+    def __init__(self, window=3600.0, max_keys=10000):
+        self.window = window
+        self.max_keys = max_keys
+        self.seen = OrderedDict()
+        self.lock = threading.Lock()
+
+    def observe(self, key, now=None):
+        """Record one occurrence and return the count within the window"""
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            times = self.seen.pop(key, None) or deque()
+            times.append(now)
+            while times and now - times[0] > self.window:
+                times.popleft()
+            self.seen[key] = times
+            while len(self.seen) > self.max_keys:
+                self.seen.popitem(last=False)
+            return len(times)
+
+
+class RoutingPolicy:
+    """Maps an alert's severity, source and fingerprint frequency to a tier.
+
+    The policy is a dict with 'tiers' (tier -> {'models': {provider: model},
+    'max_tokens': n}), an ordered list of 'rules' and a 'default_tier'. A
+    rule matches when every condition it sets holds - 'severity' and
+    'source' (lists), 'min_frequency' and 'max_frequency' (occurrences of
+    the fingerprint in the frequency window, this one included). The first
+    matching rule picks the tier and may override its max_tokens.
+
+    'min_tiers' (severity -> tier) is a floor applied after the rules, so
+    e.g. a frequency rule can't route a CRITICAL alert below the fast tier.
+    """
+
+    def __init__(self, policy):
+        self.tiers = policy.get('tiers', {})
+        self.rules = policy.get('rules', [])
+        self.default_tier = policy.get('default_tier', 'fast')
+        self.min_tiers = policy.get('min_tiers', {})
+
+        for tier in [self.default_tier] + [rule['tier'] for rule in self.rules] + list(self.min_tiers.values()):
+            if tier not in TIERS:
+                raise ValueError(f"Unknown routing tier: {tier}")
+
+    @classmethod
+    def load(cls, path=None):
+        """Policy from ROUTING_POLICY (inline JSON) or ROUTING_POLICY_PATH"""
+        inline = os.environ.get('ROUTING_POLICY')
+        if inline:
+            return cls(json.loads(inline))
+        path = path or os.environ.get('ROUTING_POLICY_PATH', DEFAULT_POLICY_PATH)
+        if not os.path.exists(path):
+            print(f"No routing policy at {path}, routing everything to the fast tier")
+            return cls({})
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def model(self, tier, provider_name):
+        """Model configured for a tier and provider, or None for the provider default"""
+        return self.tiers.get(tier, {}).get('models', {}).get(provider_name)
+
+    def route(self, body, frequency=1):
+        severity = body.get('severity', 'MEDIUM')
+        source = body.get('source', 'unknown')
+
+        for position, rule in enumerate(self.rules):
+            if 'severity' in rule and severity not in rule['severity']:
+                continue
+            if 'source' in rule and source not in rule['source']:
+                continue
+            if frequency < rule.get('min_frequency', 0):
+                continue
+            if 'max_frequency' in rule and frequency > rule['max_frequency']:
+                continue
+            return self._route(rule['tier'], rule.get('max_tokens'), position, severity)
+
+        return self._route(self.default_tier, None, None, severity)
+
+    def _route(self, tier, max_tokens, rule, severity):
+        floor = self.min_tiers.get(severity)
+        if floor and TIERS.index(tier) < TIERS.index(floor):
+            # The rule's max_tokens was meant for a lower tier
+            tier, max_tokens = floor, None
+        return Route(tier, max_tokens or self.tiers.get(tier, {}).get('max_tokens', 1024), rule)
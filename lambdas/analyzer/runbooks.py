@@ -0,0 +1,132 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+import structured
+from metrics import emit
+from prompt_builder import VOLATILE_PATTERN
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(__file__), 'runbooks.json')
+
+# Only the head of a message is matched; known signatures show up early
+MATCH_CHARS = 4096
+
+TOKEN_PATTERN = re.compile(r'[a-z0-9_]+')
+
+
+def fingerprint(message):
+    """Stable hash of a message with timestamps, ids and numbers masked"""
+    normalized = ' '.join(VOLATILE_PATTERN.sub('#', (message or '')[:MATCH_CHARS]).split())
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()[:16]
+
+
+class Runbook:
+    """One rule: a regex and/or exact fingerprints mapped to a canned report"""
+
+    def __init__(self, rule):
+        self.id = rule['id']
+        self.source = rule.get('pattern')
+        self.keywords = [k.lower() for k in rule.get('keywords', [])]
+        self.fingerprints = rule.get('fingerprints', [])
+        self.report = rule.get('report', {})
+        self._pattern = None
+
+    @property
+    def pattern(self):
+        # Compiled on first use: with thousands of rules, compiling them all
+        # up front would dominate the cold start
+        if self._pattern is None and self.source:
+            self._pattern = re.compile(self.source, re.IGNORECASE)
+        return self._pattern
+
+    def build_report(self, body):
+        """Report for an alert matched by this runbook"""
+        severity = body.get('severity', 'MEDIUM')
+        report = structured.normalize_report({'confidence_level': 'HIGH', **self.report},
+                                             self.report.get('severity', severity))
+        report['runbook'] = self.id
+        return report
+
+
+class RunbookIndex:
+    """Runbook rules indexed for cheap lookups.
+
+    Exact fingerprints are a dict lookup. Regex rules are indexed by their
+    keywords (tokens that must appear in any matching message), so a lookup
+    only runs the regexes of rules sharing a token with the message; rules
+    without keywords are always tried. Rules keep file order as priority.
+    """
+
+    def __init__(self, rules):
+        self.rules = [Runbook(rule) for rule in rules]
+        self.by_fingerprint = {}
+        self.by_keyword = {}
+        self.unindexed = []
+
+        for position, rule in enumerate(self.rules):
+            for fp in rule.fingerprints:
+                self.by_fingerprint.setdefault(fp, rule)
+            if not rule.source:
+                continue
+            if rule.keywords:
+                for keyword in rule.keywords:
+                    self.by_keyword.setdefault(keyword, []).append(position)
+            else:
+                self.unindexed.append(position)
+
+        self.hits = 0
+        self.misses = 0
+        self.lookup_seconds = 0.0
+        self.lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path=None):
+        path = path or os.environ.get('RUNBOOKS_PATH', DEFAULT_RULES_PATH)
+        if not os.path.exists(path):
+            print(f"No runbook rules at {path}")
+            return cls([])
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def candidates(self, text):
+        positions = set(self.unindexed)
+        for token in set(TOKEN_PATTERN.findall(text.lower())):
+            positions.update(self.by_keyword.get(token, ()))
+        return sorted(positions)
+
+    def match(self, message):
+        """The first runbook matching a message, or None"""
+        start = time.perf_counter()
+        text = (message or '')[:MATCH_CHARS]
+
+        rule = self.by_fingerprint.get(fingerprint(text)) if self.by_fingerprint else None
+        if rule is None:
+            for position in self.candidates(text):
+                if self.rules[position].pattern.search(text):
+                    rule = self.rules[position]
+                    break
+
+        with self.lock:
+            self.lookup_seconds += time.perf_counter() - start
+            if rule:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return rule
+
+    def export_metrics(self):
+        """Emit hit/miss counts and mean lookup time; counters reset after each export"""
+        with self.lock:
+            hits, misses, seconds = self.hits, self.misses, self.lookup_seconds
+            self.hits = self.misses = 0
+            self.lookup_seconds = 0.0
+        if not hits + misses:
+            return
+        emit({
+            'RunbookHits': hits,
+            'RunbookMisses': misses,
+            'RunbookLookupMicros': seconds * 1e6 / (hits + misses)
+        }, units={'RunbookLookupMicros': 'Microseconds'})
@@ -0,0 +1,125 @@
+import time
+from datetime import datetime, timezone
+
+from botocore.exceptions import ClientError
+
+DAY_SECONDS = 86400
+
+
+def calculate_frequency(count):
+    """Bucket an occurrence count"""
+    if not count:
+        return 'first_occurrence'
+    if count > 50:
+        return 'very_frequent'
+    if count > 10:
+        return 'frequent'
+    if count > 3:
+        return 'occasional'
+    return 'rare'
+
+
+def day_attribute(timestamp):
+    """Name of the per-day counter attribute for an epoch-seconds timestamp"""
+    return 'd' + datetime.fromtimestamp(timestamp, timezone.utc).strftime('%Y%m%d')
+
+
+class SignatureStats:
+    """Pre-aggregated occurrence counters, one item per error signature.
+
+    Each item holds occurrence_count, first_seen/last_seen (epoch seconds)
+    and one counter attribute per day (dYYYYMMDD), all maintained with
+    atomic ADD/SET updates as alerts are stored, so a signature's history
+    is a single GetItem instead of a table Scan. Every in-order write
+    removes the day counters that have fallen out of retention since the
+    item could last have been written (the TTL bounds that gap), so items
+    stay small however irregular the signature, and the item's TTL is
+    pushed out on every occurrence.
+    """
+
+    def __init__(self, table, window_days=7, retention_days=14, ttl_days=30):
+        self.table = table
+        self.window_days = window_days
+        self.retention_days = retention_days
+        self.ttl_days = ttl_days
+
+    def expired_days(self, timestamp):
+        """Day attributes that may still exist but are out of retention.
+
+        The previous write was at most ttl_days ago (the item would have
+        expired otherwise) and cleared everything before its own
+        retention boundary, so nothing older than that can be left.
+        """
+        start = timestamp - self.retention_days * DAY_SECONDS
+        return [day_attribute(start - n * DAY_SECONDS) for n in range(self.ttl_days + 1)]
+
+    def _update(self, signature, expression, names, values, condition=None):
+        kwargs = {
+            'Key': {'error_signature': signature},
+            'UpdateExpression': expression,
+            'ExpressionAttributeNames': names,
+            'ExpressionAttributeValues': values
+        }
+        if condition:
+            kwargs['ConditionExpression'] = condition
+        self.table.update_item(**kwargs)
+
+    def record(self, signature, timestamp=None):
+        """Count one occurrence of a signature at an epoch-seconds timestamp.
+
+        One write in the common (in-order) case; an event older than the
+        item's last_seen takes a second write, and a third only if it is
+        also not older than first_seen.
+        """
+        timestamp = int(timestamp or time.time())
+        day = day_attribute(timestamp)
+        names = {'#day': day}
+        values = {':one': 1, ':ts': timestamp}
+
+        expired = {f"#x{n}": day for n, day in enumerate(self.expired_days(timestamp))}
+
+        try:
+            self._update(
+                signature,
+                'ADD occurrence_count :one, #day :one '
+                'SET last_seen = :ts, first_seen = if_not_exists(first_seen, :ts), #ttl = :ttl '
+                'REMOVE ' + ', '.join(expired),
+                {**names, **expired, '#ttl': 'ttl'},
+                {**values, ':ttl': timestamp + self.ttl_days * DAY_SECONDS},
+                'attribute_not_exists(last_seen) OR last_seen <= :ts'
+            )
+            return
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+
+        # Out-of-order event: last_seen stays, first_seen may move back
+        try:
+            self._update(signature, 'ADD occurrence_count :one, #day :one SET first_seen = :ts',
+                         names, values, 'first_seen > :ts')
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+            self._update(signature, 'ADD occurrence_count :one, #day :one', names, {':one': 1})
+
+    def pattern(self, signature, now=None):
+        """Occurrences within the window, first/last seen and a frequency bucket"""
+        now = int(now or time.time())
+        days = [day_attribute(now - n * DAY_SECONDS) for n in range(self.window_days)]
+        names = {f"#d{n}": day for n, day in enumerate(days)}
+
+        response = self.table.get_item(
+            Key={'error_signature': signature},
+            ProjectionExpression=', '.join(['occurrence_count', 'first_seen', 'last_seen'] + list(names)),
+            ExpressionAttributeNames=names
+        )
+        item = response.get('Item', {})
+        count = sum(int(item.get(day, 0)) for day in days)
+
+        return {
+            'occurrence_count': count,
+            'total_count': int(item.get('occurrence_count', 0)),
+            'first_seen': int(item['first_seen']) if 'first_seen' in item else None,
+            'last_seen': int(item['last_seen']) if 'last_seen' in item else None,
+            'frequency': calculate_frequency(count)
+        }
@@ -0,0 +1,67 @@
+import time
+
+from boto3.dynamodb.conditions import Key
+
+# GSI per attribute an alert can be matched on; both are ranged on timestamp
+INDEXES = {
+    'severity': 'severity-timestamp-index',
+    'error_signature': 'signature-timestamp-index',
+}
+
+# Attributes the prompt uses; the GSIs project only these (plus keys)
+FIELDS = ['alert_id', 'timestamp', 'severity', 'error_signature', 'title']
+
+
+class SimilarAlerts:
+    """Recent alerts sharing a severity or an error signature.
+
+    One Query on the matching GSI, newest first and projected to FIELDS,
+    returns the top-k; if there are more, the rest of the window is only
+    counted (Select=COUNT) for at most max_pages further pages, and the
+    count is flagged incomplete when that limit cuts it short.
+    """
+
+    def __init__(self, table, top_k=5, hours=24, max_pages=4):
+        self.table = table
+        self.top_k = top_k
+        self.hours = hours
+        self.max_pages = max_pages
+
+    def recent(self, attribute, value, now=None):
+        """{'count', 'complete', 'matched_on', 'alerts'} for the past `hours`"""
+        cutoff = int(now or time.time()) - self.hours * 3600
+        query = {
+            'IndexName': INDEXES[attribute],
+            'KeyConditionExpression': Key(attribute).eq(value) & Key('timestamp').gt(cutoff),
+            'ScanIndexForward': False,
+        }
+
+        # One extra so the alert itself can be dropped and still leave top_k
+        response = self.table.query(
+            Limit=self.top_k + 1,
+            ProjectionExpression=', '.join(f"#f{n}" for n in range(len(FIELDS))),
+            ExpressionAttributeNames={f"#f{n}": name for n, name in enumerate(FIELDS)},
+            **query
+        )
+        alerts = response.get('Items', [])
+        count = len(alerts)
+
+        pages = 0
+        while 'LastEvaluatedKey' in response and pages < self.max_pages:
+            response = self.table.query(Select='COUNT', ExclusiveStartKey=response['LastEvaluatedKey'], **query)
+            count += response.get('Count', 0)
+            pages += 1
+
+        return {
+            'count': count,
+            'complete': 'LastEvaluatedKey' not in response,
+            'matched_on': attribute,
+            'alerts': alerts
+        }
+
+
+def excluding(alert, similar, top_k):
+    """similar without the alert itself, trimmed to the top-k"""
+    others = [item for item in similar['alerts'] if item.get('alert_id') != alert.get('alert_id')]
+    dropped = len(similar['alerts']) - len(others)
+    return {**similar, 'count': similar['count'] - dropped, 'alerts': others[:top_k]}
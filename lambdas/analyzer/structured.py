@@ -0,0 +1,222 @@
+import json
+
+SEVERITIES = ['CRITICAL', 'HIGH', 'MEDIUM', 'LOW']
+
+# Incident report returned by the LLM, as a JSON schema (Anthropic tool input
+# format; converted for Gemini's responseSchema by to_gemini_schema)
+REPORT_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'summary': {'type': 'string', 'description': 'Brief one-line summary of the issue'},
+        'severity': {'type': 'string', 'enum': SEVERITIES},
+        'severity_assessment': {'type': 'string', 'description': 'Justification for the severity'},
+        'root_cause_hypothesis': {'type': 'string', 'description': 'Most likely root cause based on the evidence'},
+        'affected_components': {'type': 'array', 'items': {'type': 'string'}},
+        'impact_assessment': {'type': 'string', 'description': 'Business/technical impact'},
+        'remediation_steps': {'type': 'array', 'items': {'type': 'string'},
+                              'description': 'Immediate action, investigation steps, resolution steps'},
+        'monitoring_recommendations': {'type': 'array', 'items': {'type': 'string'}},
+        'related_documentation': {'type': 'array', 'items': {'type': 'string'}},
+        'confidence_level': {'type': 'string', 'enum': ['HIGH', 'MEDIUM', 'LOW']},
+        'requires_immediate_attention': {'type': 'boolean'}
+    },
+    # Order matters for streaming: summary and severity are generated first
+    'required': ['summary', 'severity', 'severity_assessment', 'root_cause_hypothesis', 'affected_components',
+                 'impact_assessment', 'remediation_steps', 'monitoring_recommendations',
+                 'related_documentation', 'confidence_level', 'requires_immediate_attention']
+}
+
+
+def packed_schema():
+    """Schema for a packed response: an array of reports tagged with the alert id"""
+    item = dict(REPORT_SCHEMA)
+    item['properties'] = {'id': {'type': 'string'}, **REPORT_SCHEMA['properties']}
+    item['required'] = ['id'] + REPORT_SCHEMA['required']
+    return {'type': 'array', 'items': item}
+
+
+def to_gemini_schema(schema):
+    """Convert a JSON schema to Gemini's OpenAPI-style responseSchema"""
+    converted = {'type': schema['type'].upper()}
+    for key in ('description', 'enum', 'required'):
+        if key in schema:
+            converted[key] = schema[key]
+    if 'properties' in schema:
+        converted['properties'] = {name: to_gemini_schema(s) for name, s in schema['properties'].items()}
+        converted['propertyOrdering'] = list(schema['properties'])
+    if 'items' in schema:
+        converted['items'] = to_gemini_schema(schema['items'])
+    return converted
+
+
+class JsonExtractor:
+    """Tolerant, incremental JSON extractor for LLM output.
+
+    Text is fed in chunks. The first top-level value starting with `opener`
+    is located (skipping prose and ``` fences); parse() returns it once
+    complete, or a best-effort repair of a truncated value - open strings
+    and containers are closed, dropping a dangling partial member.
+    complete_fields() returns the top-level members whose values are
+    already complete, for acting on a stream before it finishes.
+    """
+
+    CLOSERS = {'{': '}', '[': ']'}
+
+    def __init__(self, opener='{'):
+        self.opener = opener
+        self.text = ''
+        self.start = None
+        self.scanned = 0
+        self.stack = []
+        self.in_string = False
+        self.escape = False
+        self.end = None
+        # (position, closers) at each comma outside strings, for repair
+        self.commas = []
+
+    def feed(self, chunk):
+        self.text += chunk
+        self._scan()
+
+    def _scan(self):
+        if self.start is None:
+            self.start = self.text.find(self.opener)
+            if self.start < 0:
+                self.start = None
+                return
+            self.scanned = self.start
+
+        while self.end is None and self.scanned < len(self.text):
+            char = self.text[self.scanned]
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif char == '\\':
+                    self.escape = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char in self.CLOSERS:
+                self.stack.append(self.CLOSERS[char])
+            elif char in '}]' and self.stack:
+                self.stack.pop()
+                if not self.stack:
+                    self.end = self.scanned + 1
+            elif char == ',':
+                self.commas.append((self.scanned, ''.join(reversed(self.stack))))
+            self.scanned += 1
+
+    @property
+    def complete(self):
+        return self.end is not None
+
+    def parse(self):
+        """Return (value, complete); value is None if nothing parseable was found"""
+        if self.start is None:
+            return None, False
+        if self.end is not None:
+            try:
+                return json.loads(self.text[self.start:self.end]), True
+            except ValueError:
+                return None, False
+
+        closers = ''.join(reversed(self.stack))
+        candidates = [self.text[self.start:self.scanned] + ('"' if self.in_string else '') + closers]
+        candidates += [self.text[self.start:pos] + stack for pos, stack in reversed(self.commas)]
+        for candidate in candidates:
+            try:
+                return json.loads(candidate), False
+            except ValueError:
+                continue
+        return None, False
+
+    def complete_fields(self):
+        """Top-level object members whose values are complete"""
+        if self.start is None:
+            return {}
+        if self.end is not None:
+            value, _ = self.parse()
+            return value if isinstance(value, dict) else {}
+
+        for pos, stack in reversed(self.commas):
+            if len(stack) == 1:
+                try:
+                    value = json.loads(self.text[self.start:pos] + stack)
+                except ValueError:
+                    return {}
+                return value if isinstance(value, dict) else {}
+        return {}
+
+
+def extract_json(text, opener='{'):
+    """Parse JSON out of a full response; returns (value, complete)"""
+    extractor = JsonExtractor(opener)
+    extractor.feed(text or '')
+    return extractor.parse()
+
+
+def _as_list(value):
+    if isinstance(value, list):
+        return [str(v) for v in value if v not in (None, '')]
+    if isinstance(value, str) and value:
+        return [value]
+    return []
+
+
+def normalize_report(data, default_severity='MEDIUM'):
+    """Coerce a parsed report into REPORT_SCHEMA's types, filling gaps"""
+    properties = REPORT_SCHEMA['properties']
+    report = {}
+
+    for name, spec in properties.items():
+        value = data.get(name)
+        if spec['type'] == 'array':
+            report[name] = _as_list(value)
+        elif spec['type'] == 'boolean':
+            report[name] = value if isinstance(value, bool) else str(value).lower() == 'true'
+        else:
+            report[name] = '' if value is None else str(value).strip()
+
+    severity = report['severity'].upper()
+    if severity not in SEVERITIES:
+        # Accept "HIGH - because ..." style answers
+        words = (severity or report['severity_assessment'].upper()).replace('-', ' ').split()
+        severity = words[0] if words and words[0] in SEVERITIES else default_severity
+    report['severity'] = severity
+
+    if report['confidence_level'].upper() not in properties['confidence_level']['enum']:
+        report['confidence_level'] = 'LOW'
+    else:
+        report['confidence_level'] = report['confidence_level'].upper()
+
+    if 'requires_immediate_attention' not in data:
+        report['requires_immediate_attention'] = severity in ['CRITICAL', 'HIGH']
+
+    return report
+
+
+def text_report(text, default_severity='MEDIUM'):
+    """Report for a response with no usable JSON"""
+    report = normalize_report({'summary': (text or '')[:200]}, default_severity)
+    report['analysis_text'] = text
+    return report
+
+
+def format_report(report):
+    """Plain-text rendering of a report, for consumers without typed fields"""
+    lines = [
+        f"Summary: {report.get('summary', '')}",
+        f"Severity: {report.get('severity', 'UNKNOWN')}"
+        + (f" - {report['severity_assessment']}" if report.get('severity_assessment') else '')
+    ]
+    if report.get('root_cause_hypothesis'):
+        lines.append(f"Likely cause: {report['root_cause_hypothesis']}")
+    if report.get('impact_assessment'):
+        lines.append(f"Impact: {report['impact_assessment']}")
+    if report.get('remediation_steps'):
+        lines.append('Remediation:')
+        lines += [f"{n}. {step}" for n, step in enumerate(report['remediation_steps'], 1)]
+    if report.get('confidence_level'):
+        lines.append(f"Confidence: {report['confidence_level']}")
+    return '\n'.join(lines)
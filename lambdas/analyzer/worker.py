@@ -0,0 +1,307 @@
+"""
+Long-running SQS worker for the analyzer, for sustained volume (e.g. an
+ECS service) instead of the Lambda event source mapping.
+
+Runs the same pipeline as the Lambda handler - correlation, then
+handler.analyze_batch and finish_batch - over messages it receives
+itself in long polls of up to 10. Unlike the Lambda handler it holds
+correlated alerts: each received alert joins its incident at once
+(handler.hold_alerts), and an incident is analyzed once it is due - no
+new alert for CORRELATION_WINDOW_SECONDS, or CORRELATION_MAX_SPAN_SECONDS
+after its first - with every member seen by then attached
+(handler.release_held). Alerts joining an incident already being
+analyzed, re-queued alerts, and every alert when correlation is off go
+through at once. Up to WORKER_MAX_IN_FLIGHT batches of released alerts
+are analyzed at once on a thread pool, each deleted once it is
+distributed and stored; batches are finished in the order they were
+started. A heartbeat keeps the messages of each receive invisible,
+while they are held too, until each is deleted (PROCESSING_VISIBILITY,
+the queue's visibility timeout). Alerts an earlier delivery already
+analyzed are deleted without being analyzed again, and alerts another
+consumer is analyzing are left for redelivery (see handler.screen).
+Malformed alerts (handler.MalformedAlert) are quarantined and deleted; a
+batch failing for any other reason is retried.
+
+On SIGTERM or SIGINT it stops receiving, analyzes what it holds,
+finishes the batches in flight (LLM retries are cut off
+WORKER_SHUTDOWN_SECONDS after the signal) and exits; messages it
+received after the signal are made visible again at once rather than
+after the visibility timeout.
+
+Threads: the main thread receives, screens, holds and releases alerts
+(handler.screen, hold_alerts, release_held), the pool threads run
+analyze_batch, and one finisher thread runs finish_batch and
+abandon_batch in order. The main thread adds alerts to the correlator
+while the finisher discards the incidents of failed batches, so the
+correlator locks its own state. The write-behind buffer is only used by the finisher. What
+the pool threads share - the providers' limiters and breakers, the
+routing frequency counter, the held-back re-analysis list, the
+idempotency memo, the context cache and the components' metric
+counters - is lock-guarded too. Anything added to the pipeline that
+keeps module state must be.
+
+With one message group (ALERT_MESSAGE_GROUPS=single) a FIFO queue hands
+out one batch at a time however many consumers there are; set it to
+'log_group' for batches to be in flight concurrently. A FIFO queue also
+hands out nothing more of a group while any of its messages is held, so
+alerts are only held with 'log_group' groups: correlating alerts across
+log groups is what the hold is for, and a held alert delays only its
+own log group's next ones.
+
+    PROCESSING_QUEUE_URL=... DISTRIBUTION_QUEUE_URL=... python worker.py
+
+Disable the Lambda event source (analyzer_event_source_enabled = false)
+while a worker consumes the queue.
+"""
+
+import math
+import os
+import queue
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import handler
+import heartbeat
+import llm
+from metrics import emit
+
+MAX_BATCH = 10
+
+
+class Worker:
+    """Receives, analyzes and deletes processing queue messages until stopped"""
+
+    def __init__(self, sqs, queue_url, providers, distribution_queue_url=None, max_in_flight=4,
+                 batch_size=MAX_BATCH, wait_seconds=20, metrics_interval=60.0, shutdown_seconds=25.0,
+                 visibility_timeout=900, hold=True):
+        self.sqs = sqs
+        self.queue_url = queue_url
+        self.providers = providers
+        self.distribution_queue_url = distribution_queue_url
+        self.batch_size = min(batch_size, MAX_BATCH)
+        self.wait_seconds = wait_seconds
+        self.metrics_interval = metrics_interval
+        self.shutdown_seconds = shutdown_seconds
+        self.visibility_timeout = visibility_timeout
+        self.hold = hold
+        self.slots = threading.BoundedSemaphore(max_in_flight)
+        self.executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix='analyze')
+        # (message, body, heartbeat) of the alerts held until their incident
+        # is due, in receive order, and the incident of each by id(body)
+        self.held = []
+        self.incident_of = {}
+        # (batch, [(message, heartbeat)], future) in the order the batches were started
+        self.finishing = queue.Queue()
+        self.stopping = threading.Event()
+        self.lock = threading.Lock()
+        self.stats = {'receives': 0, 'empty_receives': 0, 'received': 0, 'deleted': 0, 'failed': 0,
+                      'released': 0}
+
+    def stop(self, *_):
+        """Stop receiving; batches in flight still finish"""
+        if not self.stopping.is_set():
+            print('Stopping: finishing the batches in flight')
+            llm.http.set_deadline(self.shutdown_seconds)
+            self.stopping.set()
+
+    def run(self):
+        # No overall deadline until asked to stop: a batch that outlives the
+        # visibility timeout is redelivered
+        llm.http.set_deadline(None)
+        finisher = threading.Thread(target=self._finish_loop, name='finish')
+        finisher.start()
+        try:
+            while not self.stopping.is_set():
+                # Bounded in-flight work: no receive until a batch slot is free
+                if not self.slots.acquire(timeout=1):
+                    continue
+                messages = self._receive(self._wait_seconds())
+                if messages and self.stopping.is_set():
+                    self._release(messages)
+                elif messages:
+                    self._hold(messages)
+                # The alerts ready by now, if any, take the slot
+                if not self._start(time.time() if self.hold else None):
+                    self.slots.release()
+        finally:
+            # What is still held is analyzed now rather than redelivered
+            if self.held:
+                self.slots.acquire()
+                if not self._start(None):
+                    self.slots.release()
+            self.finishing.put(None)
+            finisher.join()
+            self.executor.shutdown()
+            # Alerts held back for re-analysis would go with the process
+            handler.flush_reanalysis()
+            self.export_metrics()
+
+    def _wait_seconds(self):
+        """Long poll no longer than until the next held alert comes due"""
+        due_at = handler.held_due_at() if self.held else None
+        if due_at is None:
+            return self.wait_seconds
+        return max(0, min(self.wait_seconds, math.ceil(due_at - time.time())))
+
+    def _receive(self, wait_seconds):
+        response = self.sqs.receive_message(
+            QueueUrl=self.queue_url,
+            MaxNumberOfMessages=self.batch_size,
+            WaitTimeSeconds=wait_seconds,
+            AttributeNames=['ApproximateReceiveCount']
+        )
+        messages = response.get('Messages', [])
+        self._count(receives=1, empty_receives=int(not messages), received=len(messages))
+        return messages
+
+    def _hold(self, messages):
+        """Screen received messages and hold their alerts, correlated, until they are ready"""
+        # Unparseable messages are quarantined and deleted, or failing that
+        # left for the redrive policy to move to the dead-letter queue
+        bodies, quarantined = handler.parse_messages([(m['MessageId'], m['Body']) for m in messages])
+        if quarantined:
+            self._delete([m for i, m in enumerate(messages) if i in quarantined])
+        unparsed = sum(body is None for body in bodies) - len(quarantined)
+        if unparsed:
+            print(f"{unparsed} unparseable message(s) in batch, leaving them to be redelivered")
+            self._count(failed=unparsed)
+        messages = [m for m, body in zip(messages, bodies) if body is not None]
+        bodies = [body for body in bodies if body is not None]
+        if not messages:
+            return
+
+        # Already analyzed: deleted now; being analyzed elsewhere: left to
+        # be redelivered once their visibility timeout runs out
+        done, busy = handler.screen(bodies, [int(m.get('Attributes', {}).get('ApproximateReceiveCount', '1'))
+                                             for m in messages])
+        if done:
+            self._delete([m for i, m in enumerate(messages) if i in done])
+        if done or busy:
+            messages = [m for i, m in enumerate(messages) if i not in done | busy]
+            bodies = [body for i, body in enumerate(bodies) if i not in done | busy]
+            if not messages:
+                return
+
+        beat = heartbeat.Heartbeat(self.sqs, self.queue_url, [m['ReceiptHandle'] for m in messages],
+                                   self.visibility_timeout).start()
+        self.incident_of.update(handler.hold_alerts(bodies))
+        self.held += [(message, body, beat) for message, body in zip(messages, bodies)]
+
+    def _start(self, now):
+        """Analyze the held alerts ready at now (all of them if None) on the pool; False if none were"""
+        if not self.held:
+            return False
+        released, batch = handler.release_held([body for _, body, _ in self.held], self.incident_of, now)
+        if batch is None:
+            return False
+        released = set(released)
+        messages = [(message, beat) for i, (message, body, beat) in enumerate(self.held) if i in released]
+        for i in released:
+            self.incident_of.pop(id(self.held[i][1]), None)
+        self.held = [item for i, item in enumerate(self.held) if i not in released]
+        future = self.executor.submit(handler.analyze_batch, batch, self.providers, self.distribution_queue_url)
+        self.finishing.put((batch, messages, future))
+        return True
+
+    def _finish_loop(self):
+        """Distribute, store and delete batches in the order they were started"""
+        exported_at = time.monotonic()
+        while True:
+            item = self.finishing.get()
+            if item is None:
+                return
+            batch, messages, future = item
+            try:
+                future.result()
+                handler.finish_batch(batch, self.distribution_queue_url)
+            except Exception as e:
+                handler.abandon_batch(batch)
+                # Not deleted: redelivered after the visibility timeout
+                print(f"Batch of {len(messages)} failed: {str(e)}")
+                self._count(failed=len(messages))
+                self._unwatch(messages)
+            else:
+                # No extension may land after the delete
+                self._unwatch(messages)
+                self._delete([message for message, _ in messages])
+            finally:
+                self.slots.release()
+
+            if time.monotonic() - exported_at >= self.metrics_interval:
+                self.export_metrics()
+                exported_at = time.monotonic()
+
+    def _unwatch(self, messages):
+        """Stop extending the visibility of (message, heartbeat) pairs; a
+        heartbeat left with nothing to extend is stopped"""
+        receipts = {}
+        for message, beat in messages:
+            receipts.setdefault(beat, []).append(message['ReceiptHandle'])
+        for beat, handles in receipts.items():
+            if not beat.remove(handles):
+                beat.stop()
+
+    def _delete(self, messages):
+        # A released batch can span several receives: 10 entries per call
+        for start in range(0, len(messages), MAX_BATCH):
+            chunk = messages[start:start + MAX_BATCH]
+            response = self.sqs.delete_message_batch(
+                QueueUrl=self.queue_url,
+                Entries=[{'Id': str(n), 'ReceiptHandle': m['ReceiptHandle']} for n, m in enumerate(chunk)]
+            )
+            for failure in response.get('Failed', []):
+                print(f"Could not delete message {chunk[int(failure['Id'])]['MessageId']}: {failure.get('Code')}")
+            self._count(deleted=len(response.get('Successful', [])))
+
+    def _release(self, messages):
+        """Make received messages visible again for another consumer"""
+        self.sqs.change_message_visibility_batch(
+            QueueUrl=self.queue_url,
+            Entries=[{'Id': str(n), 'ReceiptHandle': m['ReceiptHandle'], 'VisibilityTimeout': 0}
+                     for n, m in enumerate(messages)]
+        )
+        self._count(released=len(messages))
+
+    def _count(self, **deltas):
+        with self.lock:
+            for name, delta in deltas.items():
+                self.stats[name] += delta
+
+    def export_metrics(self):
+        """Emit the worker's and the pipeline's metrics; counters reset after each export"""
+        with self.lock:
+            stats, self.stats = self.stats, dict.fromkeys(self.stats, 0)
+        if stats['receives']:
+            emit({
+                'WorkerReceives': stats['receives'],
+                'WorkerEmptyReceives': stats['empty_receives'],
+                'WorkerMessagesDeleted': stats['deleted'],
+                'WorkerMessagesFailed': stats['failed']
+            })
+        handler.export_metrics()
+
+
+def main():
+    queue_url = os.environ['PROCESSING_QUEUE_URL']
+    worker = Worker(
+        handler.sqs, queue_url,
+        providers={tier: handler.get_provider(tier) for tier in ('fast', 'deep')},
+        distribution_queue_url=os.environ.get('DISTRIBUTION_QUEUE_URL'),
+        max_in_flight=int(os.environ.get('WORKER_MAX_IN_FLIGHT', '4')),
+        wait_seconds=int(os.environ.get('WORKER_WAIT_SECONDS', '20')),
+        metrics_interval=float(os.environ.get('WORKER_METRICS_SECONDS', '60')),
+        shutdown_seconds=float(os.environ.get('WORKER_SHUTDOWN_SECONDS', '25')),
+        visibility_timeout=handler.PROCESSING_VISIBILITY,
+        hold=os.environ.get('ALERT_MESSAGE_GROUPS', 'single') == 'log_group'
+    )
+    signal.signal(signal.SIGTERM, worker.stop)
+    signal.signal(signal.SIGINT, worker.stop)
+    print(f"Worker consuming {queue_url}")
+    worker.run()
+    print('Worker stopped')
+
+
+if __name__ == '__main__':
+    main()
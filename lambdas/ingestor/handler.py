@@ -4,7 +4,11 @@ import boto3
 import gzip
 import base64
 
+from generations import Generations, deploy_scopes, deployed_service
+from queues import message_group
+
 sqs = boto3.client('sqs')
+dynamodb = boto3.resource('dynamodb')
 
 def parse_cloudwatch_logs_event(event):
     """Parse CloudWatch Logs event from subscription filter"""
@@ -64,7 +68,7 @@ def lambda_handler(event, context):
             sqs.send_message(
                 QueueUrl=queue_url,
                 MessageBody=json.dumps(alert_message),
-                MessageGroupId='alerts'
+                MessageGroupId=message_group(alert_message)
             )
 
         return {
@@ -72,6 +76,21 @@ def lambda_handler(event, context):
             'body': json.dumps(f'Processed {len(log_data["logEvents"])} log events')
         }
 
+    # Handle CodeDeploy/ECS deployment events: invalidate cached analyses
+    # for the deployed service by bumping its log groups' generations
+    elif event.get('source') in ('aws.codedeploy', 'aws.ecs'):
+        deployed = deployed_service(event)
+        if deployed is None or not os.environ.get('ANALYSIS_CACHE_TABLE'):
+            return {'statusCode': 200, 'body': 'Ignored deployment event'}
+
+        service, reason = deployed
+        generations = Generations(dynamodb.Table(os.environ['ANALYSIS_CACHE_TABLE']))
+        for scope in deploy_scopes(service, os.environ.get('DEPLOY_SCOPES', '{}')):
+            generation = generations.bump(scope, reason)
+            print(f"Deployment of {service}: {scope} now at generation {generation}")
+
+        return {'statusCode': 200, 'body': f'Invalidated cached analyses for {service}'}
+
     # Handle EventBridge events (legacy support)
     elif 'detail' in event:
         message = {
@@ -84,7 +103,7 @@ def lambda_handler(event, context):
         sqs.send_message(
             QueueUrl=queue_url,
             MessageBody=json.dumps(message),
-            MessageGroupId='alerts'
+            MessageGroupId=message_group(message)
         )
 
         return {'statusCode': 200, 'body': 'Alert sent'}
@@ -102,7 +121,7 @@ def lambda_handler(event, context):
         sqs.send_message(
             QueueUrl=queue_url,
             MessageBody=json.dumps(message),
-            MessageGroupId='alerts'
+            MessageGroupId=message_group(message)
         )
 
         return {'statusCode': 200, 'body': 'Test alert sent'}
@@ -0,0 +1,104 @@
+import json
+import zlib
+from collections.abc import Mapping
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Attribute holding the compressed fields, and its header: one byte of
+# schema version, one byte of codec id, then the compressed JSON object
+PAYLOAD = 'payload'
+VERSION = 1
+CODECS = {'zlib': 1, 'zstd': 2}
+RAW = 0
+
+# Bulky, never-queried fields moved into the payload; everything else
+# (keys, index attributes, title, model, timestamps) stays native
+BLOB_FIELDS = ('message', 'analysis', 'raw_data')
+
+
+def _compress(codec, data):
+    if codec == 'zstd':
+        return zstandard.ZstdCompressor(level=6).compress(data)
+    return zlib.compress(data, 6)
+
+
+def _decompress(codec_id, data):
+    if codec_id == CODECS['zstd']:
+        if zstandard is None:
+            raise RuntimeError('Item was written with zstd but the zstandard package is not installed')
+        return zstandard.ZstdDecompressor().decompress(data)
+    if codec_id == CODECS['zlib']:
+        return zlib.decompress(data)
+    return data
+
+
+def encode(item, codec='zlib', fields=BLOB_FIELDS):
+    """item with its bulky fields packed into one compressed binary attribute.
+
+    codec is 'zlib', 'zstd' (falls back to zlib without the zstandard
+    package) or 'native' to leave the item as is. The payload is stored
+    uncompressed when compressing doesn't make it smaller.
+    """
+    moved = {name: item[name] for name in fields if name in item}
+    if codec == 'native' or not moved:
+        return item
+    if codec == 'zstd' and zstandard is None:
+        codec = 'zlib'
+
+    data = json.dumps(moved, separators=(',', ':'), default=str).encode('utf-8')
+    compressed = _compress(codec, data)
+    codec_id = CODECS[codec]
+    if len(compressed) >= len(data):
+        compressed, codec_id = data, RAW
+
+    encoded = {name: value for name, value in item.items() if name not in moved}
+    encoded[PAYLOAD] = bytes([VERSION, codec_id]) + compressed
+    return encoded
+
+
+class LazyItem(Mapping):
+    """Read-only view of a stored item; the payload is decompressed on the
+    first access to a field that lives in it, not when the item is read."""
+
+    def __init__(self, item):
+        self._item = item
+        self._fields = None
+
+    def _unpack(self):
+        if self._fields is None:
+            payload = self._item[PAYLOAD]
+            payload = bytes(getattr(payload, 'value', payload))
+            if payload[0] != VERSION:
+                raise ValueError(f"Unsupported payload version {payload[0]}")
+            self._fields = json.loads(_decompress(payload[1], payload[2:]))
+        return self._fields
+
+    def __getitem__(self, name):
+        if name in self._item and name != PAYLOAD:
+            return self._item[name]
+        if PAYLOAD in self._item:
+            fields = self._unpack()
+            if name in fields:
+                return fields[name]
+        raise KeyError(name)
+
+    def __iter__(self):
+        yield from (name for name in self._item if name != PAYLOAD)
+        if PAYLOAD in self._item:
+            yield from self._unpack()
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    @property
+    def decoded(self):
+        """Whether the payload has been decompressed"""
+        return self._fields is not None
+
+
+def decode(item):
+    """A stored item (either layout) as a lazily decoded mapping"""
+    return LazyItem(item) if PAYLOAD in item else item
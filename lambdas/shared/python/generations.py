@@ -0,0 +1,110 @@
+import json
+import time
+
+from botocore.exceptions import ClientError
+
+# Generation counters share the analysis cache table, as one item no error
+# signature (a 16 character hex digest) can collide with: a map of scope
+# to generation, so a reader gets every scope's generation in one read
+KEY = {'error_signature': 'generations'}
+
+# Log groups a deployed service's alerts come from, when DEPLOY_SCOPES
+# doesn't list them explicitly
+DEFAULT_SCOPE_PATTERNS = ('/ecs/{name}', '/aws/ecs/{name}', '/aws/lambda/{name}')
+
+
+def scope_of(alert):
+    """What a deploy invalidates an alert's cached analysis by: its log group, else its source"""
+    return alert.get('log_group') or alert.get('source') or 'default'
+
+
+class Generations:
+    """Deploy generation per scope (a log group, usually).
+
+    A cached analysis records the generation of its alert's scope when it
+    is stored; a deploy or rollback bumps the scope's generation with a
+    single atomic update, and every entry recorded under an older one
+    stops being served. Nothing is scanned or deleted, so invalidating a
+    service costs one write however many entries it has cached.
+
+    Readers memoize the generations for memo_seconds (per container),
+    which bounds how long an invalidated entry can still be served.
+    """
+
+    def __init__(self, table, memo_seconds=10):
+        self.table = table
+        self.memo_seconds = memo_seconds
+        self._scopes = {}
+        self._memo_until = 0
+
+    def current(self, scope, now=None):
+        """The scope's generation (0 if never bumped)"""
+        now = now or time.time()
+        if now >= self._memo_until:
+            item = self.table.get_item(Key=KEY).get('Item') or {}
+            self._scopes = {name: int(value) for name, value in item.get('scopes', {}).items()}
+            self._memo_until = now + self.memo_seconds
+        return self._scopes.get(scope, 0)
+
+    def bump(self, scope, reason='', now=None):
+        """Invalidate everything cached under scope; returns the new generation"""
+        now = now or time.time()
+        for attempt in range(2):
+            try:
+                response = self.table.update_item(
+                    Key=KEY,
+                    UpdateExpression='SET scopes.#scope = if_not_exists(scopes.#scope, :zero) + :one, '
+                                     'bumped_at = :now, bumped_by = :reason',
+                    ExpressionAttributeNames={'#scope': scope},
+                    ExpressionAttributeValues={':zero': 0, ':one': 1, ':now': int(now),
+                                               ':reason': reason or 'manual'},
+                    ReturnValues='UPDATED_NEW'
+                )
+                break
+            except ClientError as e:
+                if e.response['Error']['Code'] != 'ValidationException' or attempt:
+                    raise
+                # First bump ever: create the map, unless a concurrent bump just did
+                try:
+                    self.table.put_item(Item={**KEY, 'scopes': {}},
+                                        ConditionExpression='attribute_not_exists(error_signature)')
+                except ClientError as e:
+                    if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                        raise
+
+        generation = int(response['Attributes']['scopes'][scope])
+        self._scopes[scope] = generation
+        return generation
+
+
+def deployed_service(event):
+    """(service name, reason) for a finished CodeDeploy or ECS deployment event,
+    else None (also when the event doesn't name the service)"""
+    detail = event.get('detail') or {}
+    if event.get('source') == 'aws.codedeploy':
+        if detail.get('state') != 'SUCCESS':
+            return None
+        service, reason = detail.get('application'), f"codedeploy {detail.get('deploymentId', '')}".strip()
+    elif event.get('source') == 'aws.ecs' and event.get('detail-type') == 'ECS Deployment State Change':
+        if detail.get('eventName') != 'SERVICE_DEPLOYMENT_COMPLETED':
+            return None
+        # arn:aws:ecs:region:account:service/cluster/name
+        resources = event.get('resources') or ['']
+        service, reason = (resources[0] or '').rsplit('/', 1)[-1], f"ecs {detail.get('deploymentId', '')}".strip()
+    else:
+        return None
+    if not isinstance(service, str) or not service:
+        print(f"Deployment event without a service name: {json.dumps(event, default=str)[:500]}")
+        return None
+    return service, reason
+
+
+def deploy_scopes(service, mapping=None):
+    """Scopes to bump for a deployed service: mapping[service] if listed, else the conventional log groups"""
+    if not service:
+        return []
+    if isinstance(mapping, str):
+        mapping = json.loads(mapping or '{}')
+    if mapping and service in mapping:
+        return list(mapping[service])
+    return [pattern.format(name=service) for pattern in DEFAULT_SCOPE_PATTERNS]
@@ -0,0 +1,144 @@
+import threading
+import time
+from collections import OrderedDict
+
+from botocore.exceptions import ClientError
+
+DONE = 'done'
+IN_PROGRESS = 'in_progress'
+
+# BatchGetItem key limit
+READ_LIMIT = 100
+
+CLAIM_CONDITION = ('attribute_not_exists(alert_id) OR #ttl < :now '
+                   'OR (#status = :in_progress AND lease_until < :now)')
+
+
+class IdempotencyStore:
+    """Which processing stages each alert has been through, across consumers.
+
+    One item per (alert_id, stage), e.g. the analyzer's 'analysis' or the
+    notifier's Slack posts. claim() is a conditional put only one consumer
+    wins: the stage is then in progress until complete() marks it done, or
+    until its lease runs out (a consumer that died mid-way) or release()
+    gives it up after a failure, when a redelivery can claim it again.
+    Items expire ttl_seconds after they are written (DynamoDB TTL on
+    'ttl'; expired items still awaiting deletion are treated as absent).
+
+    lookup() reads the stages of a whole batch with one BatchGetItem. Done
+    stages are remembered per container (up to cache_size), so a warm
+    container doesn't read again for the duplicates it processed itself;
+    the memo and stats are lock-guarded, for the worker's threads.
+
+    client is a DynamoDB client taking plain values (dynamodb.meta.client).
+    With writes (a WriteBehind the caller flushes), completions go out
+    with the caller's other writes instead of one PutItem each.
+    """
+
+    def __init__(self, client, table, ttl_seconds=21600, lease_seconds=900, cache_size=10000, writes=None):
+        self.client = client
+        self.table = table
+        self.ttl_seconds = ttl_seconds
+        self.lease_seconds = lease_seconds
+        self.cache_size = cache_size
+        self.writes = writes
+        self._done = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {'cache_hits': 0, 'reads': 0, 'claims': 0, 'conflicts': 0, 'releases': 0}
+
+    def _remember(self, key, expires_at):
+        with self.lock:
+            self._done[key] = expires_at
+            self._done.move_to_end(key)
+            while len(self._done) > self.cache_size:
+                self._done.popitem(last=False)
+
+    def _count(self, stat):
+        with self.lock:
+            self.stats[stat] += 1
+
+    def lookup(self, keys, now=None):
+        """Status (DONE or IN_PROGRESS) of each (alert_id, stage) with a live item; absent ones are left out"""
+        now = now or time.time()
+        found = {}
+        missing = []
+        with self.lock:
+            for key in dict.fromkeys(keys):
+                if self._done.get(key, 0) > now:
+                    self.stats['cache_hits'] += 1
+                    found[key] = DONE
+                else:
+                    self._done.pop(key, None)
+                    missing.append(key)
+
+        for start in range(0, len(missing), READ_LIMIT):
+            chunk = missing[start:start + READ_LIMIT]
+            try:
+                response = self.client.batch_get_item(RequestItems={self.table: {
+                    'Keys': [{'alert_id': alert_id, 'stage': stage} for alert_id, stage in chunk],
+                    'ProjectionExpression': 'alert_id, #stage, #status, lease_until, #ttl',
+                    'ExpressionAttributeNames': {'#stage': 'stage', '#status': 'status', '#ttl': 'ttl'}
+                }})
+            except ClientError as e:
+                # Unknown stages are claimed as usual; the claim is the real check
+                print(f"Error reading idempotency records: {str(e)}")
+                continue
+            self._count('reads')
+            # Unprocessed keys are left to the claim too
+            for item in response.get('Responses', {}).get(self.table, []):
+                key = (item['alert_id'], item['stage'])
+                if int(item.get('ttl', 0)) <= now:
+                    continue
+                if item.get('status') == DONE:
+                    found[key] = DONE
+                    self._remember(key, int(item['ttl']))
+                elif int(item.get('lease_until', 0)) > now:
+                    found[key] = IN_PROGRESS
+        return found
+
+    def claim(self, alert_id, stage, now=None):
+        """Take the stage for this consumer; False if it is done or in progress elsewhere"""
+        now = int(now or time.time())
+        try:
+            self.client.put_item(
+                TableName=self.table,
+                Item={'alert_id': alert_id, 'stage': stage, 'status': IN_PROGRESS,
+                      'lease_until': now + self.lease_seconds, 'ttl': now + self.ttl_seconds},
+                ConditionExpression=CLAIM_CONDITION,
+                ExpressionAttributeNames={'#status': 'status', '#ttl': 'ttl'},
+                ExpressionAttributeValues={':now': now, ':in_progress': IN_PROGRESS}
+            )
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+            self._count('conflicts')
+            return False
+        self._count('claims')
+        return True
+
+    def complete(self, alert_id, stage, now=None):
+        """Mark a claimed stage done"""
+        now = int(now or time.time())
+        item = {'alert_id': alert_id, 'stage': stage, 'status': DONE, 'completed_at': now,
+                'ttl': now + self.ttl_seconds}
+        if self.writes is not None:
+            self.writes.put(self.table, item)
+        else:
+            self.client.put_item(TableName=self.table, Item=item)
+        self._remember((alert_id, stage), item['ttl'])
+
+    def release(self, alert_id, stage):
+        """Give up a claim after a failure, so the stage can be claimed again at once"""
+        try:
+            self.client.delete_item(
+                TableName=self.table,
+                Key={'alert_id': alert_id, 'stage': stage},
+                ConditionExpression='#status = :in_progress',
+                ExpressionAttributeNames={'#status': 'status'},
+                ExpressionAttributeValues={':in_progress': IN_PROGRESS}
+            )
+            self._count('releases')
+        except ClientError as e:
+            # Completed meanwhile, or gone: nothing to give up
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                print(f"Error releasing {alert_id} {stage}: {str(e)}")
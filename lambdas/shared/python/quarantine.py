@@ -0,0 +1,77 @@
+import json
+import time
+
+QUARANTINED = 'quarantined'
+REPLAYED = 'replayed'
+
+# Keeps items well under DynamoDB's 400 KB limit; SQS messages are at most 256 KB
+MAX_ERROR_CHARS = 2000
+
+
+class Quarantine:
+    """Messages no redelivery can process, kept with the error that broke them.
+
+    One item per SQS message ID, so a message quarantined again (its
+    acknowledgement lost) overwrites its own item. The payload is stored
+    as received, unparseable or not; the alert's ID, severity and log
+    group are copied out when it parses, for listing. Items expire
+    ttl_seconds after they are written (DynamoDB TTL on 'ttl').
+
+    table is a DynamoDB Table resource.
+    """
+
+    def __init__(self, table, ttl_seconds=1209600):
+        self.table = table
+        self.ttl_seconds = ttl_seconds
+
+    def put(self, message_id, payload, error, source, now=None):
+        """Quarantine a message's payload with its error"""
+        now = int(now or time.time())
+        item = {
+            'message_id': message_id,
+            'source': source,
+            'payload': payload,
+            'error': str(error)[:MAX_ERROR_CHARS],
+            'error_type': type(error).__name__,
+            'status': QUARANTINED,
+            'quarantined_at': now,
+            'ttl': now + self.ttl_seconds
+        }
+        try:
+            body = json.loads(payload)
+        except ValueError:
+            body = None
+        if isinstance(body, dict):
+            for name in ('alert_id', 'severity', 'log_group'):
+                if isinstance(body.get(name), str) and body[name]:
+                    item[name] = body[name]
+        self.table.put_item(Item=item)
+        return item
+
+    def get(self, message_id):
+        return self.table.get_item(Key={'message_id': message_id}, ConsistentRead=True).get('Item')
+
+    def list(self, status=None):
+        """Every quarantined item (with status, only those), newest first"""
+        kwargs = {}
+        if status:
+            kwargs = {'FilterExpression': '#status = :status',
+                      'ExpressionAttributeNames': {'#status': 'status'},
+                      'ExpressionAttributeValues': {':status': status}}
+        items = []
+        while True:
+            response = self.table.scan(**kwargs)
+            items += response.get('Items', [])
+            if 'LastEvaluatedKey' not in response:
+                break
+            kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+        return sorted(items, key=lambda item: int(item.get('quarantined_at', 0)), reverse=True)
+
+    def mark_replayed(self, message_id, now=None):
+        """Record that a quarantined message was sent back to its queue"""
+        self.table.update_item(
+            Key={'message_id': message_id},
+            UpdateExpression='SET #status = :replayed, replayed_at = :now ADD replays :one',
+            ExpressionAttributeNames={'#status': 'status'},
+            ExpressionAttributeValues={':replayed': REPLAYED, ':now': int(now or time.time()), ':one': 1}
+        )
@@ -0,0 +1,23 @@
+import os
+import re
+
+# FIFO message group IDs: up to 128 alphanumeric or punctuation characters
+GROUP_ID_INVALID = re.compile(r'[^\x21-\x7e]')
+DEFAULT_GROUP = 'alerts'
+
+
+def message_group(alert, mode=None):
+    """The processing queue message group for an alert.
+
+    A FIFO queue hands out one group's messages one batch at a time, in
+    order. With ALERT_MESSAGE_GROUPS=single (the default) every alert is
+    in one group: strict order, but a single batch in flight across all
+    consumers. 'log_group' gives each log group (else source) its own
+    group, so batches from different services are analyzed concurrently
+    and only each service's alerts stay in order.
+    """
+    mode = mode or os.environ.get('ALERT_MESSAGE_GROUPS', 'single')
+    if mode != 'log_group':
+        return DEFAULT_GROUP
+    group = GROUP_ID_INVALID.sub('_', alert.get('log_group') or alert.get('source') or DEFAULT_GROUP)
+    return group[-128:]
@@ -0,0 +1,195 @@
+import random
+import time
+
+from botocore.exceptions import ClientError
+
+BATCH_LIMIT = 25
+TRANSACTION_LIMIT = 100
+
+# Transaction cancellation reasons worth another attempt
+RETRYABLE_CANCELLATIONS = {'TransactionConflict', 'ThrottlingError', 'ProvisionedThroughputExceeded'}
+RETRYABLE_ERRORS = {'ProvisionedThroughputExceededException', 'ThrottlingException', 'RequestLimitExceeded',
+                    'InternalServerError', 'TransactionInProgressException'}
+
+
+class WriteBehind:
+    """Buffers DynamoDB writes and sends them in as few requests as possible.
+
+    Plain puts and deletes are flushed with BatchWriteItem, 25 per call;
+    UnprocessedItems are resent with jittered exponential backoff. Writes
+    that need a ConditionExpression (or an update expression, which
+    BatchWriteItem can't carry) are sent one PutItem/UpdateItem each, in
+    the order queued. Only writes queued with atomic=True are flushed as
+    TransactWriteItems of up to 100, for callers that need them to land
+    together: a transaction costs twice the write units. A write whose
+    condition fails is dropped and counted (in a transaction, the rest is
+    retried without it).
+
+    client is a DynamoDB client; the one behind a boto3 resource
+    (dynamodb.meta.client) accepts plain Python values. key_schema maps a
+    table name to its key attribute names, used to keep two writes to one
+    item out of the same request.
+    """
+
+    def __init__(self, client, key_schema=None, flush_at=100, max_attempts=6, base_delay=0.05, max_delay=2.0):
+        self.client = client
+        self.key_schema = key_schema or {}
+        self.flush_at = flush_at
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.batched = []
+        self.single = []
+        self.transactional = []
+        self.stats = {'requests': 0, 'written': 0, 'retries': 0, 'conditional_failures': 0, 'failed': 0}
+
+    def __len__(self):
+        return len(self.batched) + len(self.single) + len(self.transactional)
+
+    def put(self, table, item, condition=None, values=None, names=None, atomic=False):
+        """Queue a put; with a condition it is sent on its own"""
+        if condition or atomic:
+            self._queue_single(table, 'Put', {'Item': item}, condition, values, names, self._key(table, item), atomic)
+        else:
+            self._queue_batched(table, {'PutRequest': {'Item': item}}, self._key(table, item))
+
+    def delete(self, table, key):
+        self._queue_batched(table, {'DeleteRequest': {'Key': key}}, tuple(sorted(key.items())))
+
+    def update(self, table, key, expression, values=None, names=None, condition=None, atomic=False):
+        """Queue an update expression (an UpdateItem, or part of a transaction if atomic)"""
+        self._queue_single(table, 'Update', {'Key': key, 'UpdateExpression': expression},
+                           condition, values, names, tuple(sorted(key.items())), atomic)
+
+    def _key(self, table, item):
+        names = self.key_schema.get(table)
+        return tuple((name, item[name]) for name in names) if names else None
+
+    def _queue_batched(self, table, request, key):
+        self.batched.append((table, request, key))
+        self._maybe_flush()
+
+    def _queue_single(self, table, action, params, condition, values, names, key, atomic):
+        params = {'TableName': table, **params}
+        if condition:
+            params['ConditionExpression'] = condition
+        if values:
+            params['ExpressionAttributeValues'] = values
+        if names:
+            params['ExpressionAttributeNames'] = names
+        if atomic:
+            self.transactional.append(({action: params}, (table, key)))
+        else:
+            self.single.append((action, params))
+        self._maybe_flush()
+
+    def _maybe_flush(self):
+        if len(self) >= self.flush_at:
+            self.flush()
+
+    def _backoff(self, attempt):
+        time.sleep(random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt)))
+
+    @staticmethod
+    def _chunks(entries, limit, key_of):
+        """Split into requests of at most `limit`, never two writes to one item in a request"""
+        chunk, keys = [], set()
+        for entry in entries:
+            key = key_of(entry)
+            if len(chunk) >= limit or (key is not None and key in keys):
+                yield chunk
+                chunk, keys = [], set()
+            chunk.append(entry)
+            if key is not None:
+                keys.add(key)
+        if chunk:
+            yield chunk
+
+    def flush(self):
+        """Send everything queued; returns the stats so far"""
+        batched, self.batched = self.batched, []
+        single, self.single = self.single, []
+        transactional, self.transactional = self.transactional, []
+
+        for chunk in self._chunks(batched, BATCH_LIMIT, lambda e: (e[0], e[2]) if e[2] is not None else None):
+            self._write_batch(chunk)
+        for action, params in single:
+            self._write_single(action, params)
+        for chunk in self._chunks(transactional, TRANSACTION_LIMIT, lambda e: e[1]):
+            self._write_transaction([item for item, _ in chunk])
+        return self.stats
+
+    def _write_batch(self, chunk):
+        request_items = {}
+        for table, request, _ in chunk:
+            request_items.setdefault(table, []).append(request)
+
+        for attempt in range(self.max_attempts):
+            try:
+                self.stats['requests'] += 1
+                response = self.client.batch_write_item(RequestItems=request_items)
+            except ClientError as e:
+                if e.response['Error']['Code'] not in RETRYABLE_ERRORS:
+                    raise
+                response = {'UnprocessedItems': request_items}
+
+            unprocessed = response.get('UnprocessedItems') or {}
+            left = sum(len(requests) for requests in unprocessed.values())
+            self.stats['written'] += sum(len(requests) for requests in request_items.values()) - left
+            if not left:
+                return
+            request_items = unprocessed
+            self.stats['retries'] += 1
+            self._backoff(attempt)
+
+        self.stats['failed'] += left
+        print(f"BatchWriteItem gave up on {left} unprocessed writes after {self.max_attempts} attempts")
+
+    def _write_single(self, action, params):
+        call = self.client.put_item if action == 'Put' else self.client.update_item
+        for attempt in range(self.max_attempts):
+            try:
+                self.stats['requests'] += 1
+                call(**params)
+                self.stats['written'] += 1
+                return
+            except ClientError as e:
+                code = e.response['Error']['Code']
+                if code == 'ConditionalCheckFailedException':
+                    self.stats['conditional_failures'] += 1
+                    return
+                if code not in RETRYABLE_ERRORS:
+                    raise
+            self.stats['retries'] += 1
+            self._backoff(attempt)
+
+        self.stats['failed'] += 1
+        print(f"{action}Item gave up after {self.max_attempts} attempts")
+
+    def _write_transaction(self, items):
+        for attempt in range(self.max_attempts):
+            try:
+                self.stats['requests'] += 1
+                self.client.transact_write_items(TransactItems=items)
+                self.stats['written'] += len(items)
+                return
+            except ClientError as e:
+                code = e.response['Error']['Code']
+                if code == 'TransactionCanceledException':
+                    reasons = [r.get('Code', 'None') for r in e.response.get('CancellationReasons', [])]
+                    failed = [item for item, reason in zip(items, reasons) if reason == 'ConditionalCheckFailed']
+                    if failed:
+                        self.stats['conditional_failures'] += len(failed)
+                        items = [item for item, reason in zip(items, reasons) if reason != 'ConditionalCheckFailed']
+                        if not items:
+                            return
+                        continue
+                    if not RETRYABLE_CANCELLATIONS.intersection(reasons):
+                        raise
+                elif code not in RETRYABLE_ERRORS:
+                    raise
+            self.stats['retries'] += 1
+            self._backoff(attempt)
+
+        self.stats['failed'] += len(items)
+        print(f"TransactWriteItems gave up on {len(items)} writes after {self.max_attempts} attempts")
@@ -1,10 +1,101 @@
+import hashlib
 import json
 import os
+import time
 import boto3
 import urllib3
+from botocore.exceptions import ClientError
+
+from idempotency import DONE, IdempotencyStore
+from storage import WriteBehind
 
 http = urllib3.PoolManager()
 secrets_client = boto3.client('secretsmanager')
+dynamodb = boto3.resource('dynamodb')
+
+# Distribution status updates for a batch go out together at the end
+writes = WriteBehind(dynamodb.meta.client)
+
+# Each post is made once across deliveries: claimed (a conditional put on
+# alert_id and stage) before it is sent, marked done once Slack accepts it
+IDEMPOTENCY_TABLE = os.environ.get('IDEMPOTENCY_TABLE')
+idempotency = IdempotencyStore(
+    dynamodb.meta.client, IDEMPOTENCY_TABLE,
+    ttl_seconds=int(os.environ.get('IDEMPOTENCY_TTL_SECONDS', '21600')),
+    lease_seconds=int(os.environ.get('IDEMPOTENCY_LEASE_SECONDS', '300')),
+    writes=writes
+) if IDEMPOTENCY_TABLE else None
+
+
+def format_report(report):
+    """Slack mrkdwn for a structured incident report"""
+    lines = [
+        f"*{report.get('severity', 'UNKNOWN')}*: {report.get('summary', '')}"
+    ]
+    if report.get('root_cause_hypothesis'):
+        lines.append(f"*Likely cause:* {report['root_cause_hypothesis']}")
+    if report.get('impact_assessment'):
+        lines.append(f"*Impact:* {report['impact_assessment']}")
+    if report.get('remediation_steps'):
+        lines.append('*Remediation:*')
+        lines += [f"{n}. {step}" for n, step in enumerate(report['remediation_steps'], 1)]
+    if report.get('confidence_level'):
+        lines.append(f"_Confidence: {report['confidence_level']}_")
+    return '\n'.join(lines)
+
+
+def format_incident(incident, max_groups=5):
+    """One line naming the alerts an analysis covers"""
+    log_groups = incident.get('log_groups', [])
+    shown = ', '.join(f"`{group}`" for group in log_groups[:max_groups])
+    if len(log_groups) > max_groups:
+        shown += f" and {len(log_groups) - max_groups} more"
+    return f"_Correlated: {incident.get('count', 0)} alerts across {shown}_"
+
+
+def format_joined(body, max_alerts=10):
+    """Slack mrkdwn for alerts that joined an already posted incident"""
+    incident = body.get('incident', {})
+    joined = body.get('joined', [])
+    lines = [format_incident(incident),
+             f"{len(joined)} more alert(s) joined incident `{incident.get('id')}` since it was posted:"]
+    lines += [f"• *{alert.get('severity', 'UNKNOWN')}* `{alert.get('log_group')}`: {alert.get('message', '')}"
+              for alert in joined[:max_alerts]]
+    if len(joined) > max_alerts:
+        lines.append(f"_and {len(joined) - max_alerts} more_")
+    return '\n'.join(lines)
+
+
+def record_status(alert_id, stage, delivered):
+    """Queue the alert record's distribution status update.
+
+    Conditional on the record existing, so a message for an alert that was
+    never stored doesn't create a stub item.
+    """
+    table = os.environ.get('ALERTS_TABLE')
+    if not table or not alert_id:
+        return
+    writes.update(
+        table, {'alert_id': alert_id},
+        'SET distribution_status = :status, distributed_at = :time',
+        values={':status': {'slack': delivered, 'stage': stage}, ':time': int(time.time())},
+        condition='attribute_exists(alert_id)'
+    )
+
+
+def post_stage(body, stage):
+    """The idempotency stage of a post: one preliminary and one final post per
+    alert, one per distinct update (an alert can be re-analyzed more than
+    once) and one per set of alerts joining an incident"""
+    if stage == 'joined':
+        content = sorted(alert.get('alert_id') or '' for alert in body.get('joined', []))
+    elif stage == 'update':
+        content = body.get('report') or body.get('analysis')
+    else:
+        return f"slack-{stage}"
+    digest = hashlib.sha256(json.dumps(content, sort_keys=True).encode())
+    return f"slack-{stage}-{digest.hexdigest()[:16]}"
+
 
 def lambda_handler(event, context):
     """Basic Slack notifier"""
@@ -19,19 +110,81 @@ def lambda_handler(event, context):
     secret_data = json.loads(secret_string)
     webhook_url = secret_data['saar_slack_webhook']
 
-    # Parse message
-    for record in event.get('Records', []):
-        body = json.loads(record['body'])
+    # Parse messages; posts already made are skipped, and those another
+    # invocation is making are reported as failures, to be redelivered
+    records = event.get('Records', [])
+    bodies = [json.loads(record['body']) for record in records]
+    stages = ['joined' if body.get('joined') else 'preliminary' if body.get('preliminary')
+              else 'update' if body.get('update') else 'final' for body in bodies]
+    keys = {i: (body['alert_id'], post_stage(body, stage))
+            for i, (body, stage) in enumerate(zip(bodies, stages)) if body.get('alert_id')}
+    posted = idempotency.lookup(keys.values()) if idempotency else {}
+    failures = []
+
+    for i, (record, body, stage) in enumerate(zip(records, bodies, stages)):
+        key = keys.get(i)
+        if idempotency and key:
+            if posted.get(key) == DONE:
+                print(f"Already posted {stage} analysis of {key[0]}, skipping")
+                continue
+            try:
+                claimed = idempotency.claim(*key)
+            except ClientError as e:
+                print(f"Error claiming {stage} post of {key[0]}: {str(e)}")
+                failures.append({'itemIdentifier': record['messageId']})
+                continue
+            if not claimed:
+                print(f"{stage.capitalize()} analysis of {key[0]} is being posted elsewhere")
+                failures.append({'itemIdentifier': record['messageId']})
+                continue
+
+        if stage == 'joined':
+            title = '🔗 *Incident Update*'
+        elif stage == 'preliminary':
+            title = '⏳ *Preliminary Alert Analysis*'
+        elif stage == 'update':
+            title = '🔄 *Updated Alert Analysis*'
+        else:
+            title = '🚨 *Alert Analysis*'
+
+        if stage == 'joined':
+            text = format_joined(body)
+        elif body.get('report'):
+            text = format_report(body['report'])
+        else:
+            text = body.get('analysis', 'No analysis')
+        if body.get('incident') and stage != 'joined':
+            text = f"{format_incident(body['incident'])}\n{text}"
 
         msg = {
-            'text': f"🚨 *Alert Analysis*\n{body.get('analysis', 'No analysis')}"
+            'text': f"{title}\n{text}"
         }
 
-        http.request(
+        response = http.request(
             'POST',
             webhook_url,
             body=json.dumps(msg),
             headers={'Content-Type': 'application/json'}
         )
+        if stage == 'joined':
+            # The incident's lead keeps its own status; each joined alert gets one
+            for alert in body['joined']:
+                record_status(alert.get('alert_id'), stage, response.status == 200)
+        else:
+            record_status(body.get('alert_id'), stage, response.status == 200)
+        if idempotency and key:
+            if response.status == 200:
+                idempotency.complete(*key)
+            else:
+                idempotency.release(*key)
+        if response.status != 200:
+            # Redelivered for another attempt (and, after maxReceiveCount, dead-lettered)
+            print(f"Slack returned {response.status} for the {stage} post of {body.get('alert_id')}")
+            failures.append({'itemIdentifier': record['messageId']})
+
+    try:
+        writes.flush()
+    except ClientError as e:
+        print(f"Error updating distribution status: {str(e)}")
 
-    return {'statusCode': 200}
+    return {'statusCode': 200, 'batchItemFailures': failures}
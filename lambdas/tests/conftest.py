@@ -0,0 +1,11 @@
+import os
+import sys
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+for path in (os.path.join(ROOT, 'test'),
+             os.path.join(ROOT, 'lambdas', 'shared', 'python'),
+             os.path.join(ROOT, 'lambdas', 'analyzer')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
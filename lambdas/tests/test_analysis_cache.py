@@ -0,0 +1,69 @@
+import unittest
+
+from analysis_cache import AnalysisCache
+from dynamodb_local import LocalTable
+from generations import Generations, deploy_scopes, deployed_service
+
+REPORT = {'summary': 'Upstream timeouts', 'root_cause_hypothesis': 'payments shard down'}
+
+
+class ScopedCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.table = LocalTable('error_signature')
+        self.generations = Generations(self.table, memo_seconds=0)
+        self.cache = AnalysisCache(self.table, negative_seconds=120, generations=self.generations)
+
+    def test_entry_checked_against_its_own_scope(self):
+        self.cache.store('sig', REPORT, 'model', now=1000, scope='/ecs/api')
+        self.generations.bump('/ecs/worker', now=1100)
+
+        # Looked up for an alert from the bumped scope: the entry's own scope wasn't deployed
+        self.assertEqual(self.cache.lookup('sig', now=1200).state, 'fresh')
+
+        self.generations.bump('/ecs/api', now=1300)
+        self.assertIsNone(self.cache.lookup('sig', now=1400))
+
+    def test_failure_replaces_entry_outdated_by_its_scope(self):
+        self.cache.store('sig', REPORT, 'model', now=1000, scope='/ecs/api')
+        self.generations.bump('/ecs/api', now=1100)
+
+        self.cache.record_failure('sig', now=1200)
+
+        self.assertEqual(self.cache.lookup('sig', now=1210).state, 'negative')
+
+    def test_failure_keeps_usable_entry(self):
+        self.cache.store('sig', REPORT, 'model', now=1000, scope='/ecs/api')
+        self.generations.bump('/ecs/worker', now=1100)
+
+        self.cache.record_failure('sig', now=1200)
+
+        entry = self.cache.lookup('sig', now=1210)
+        self.assertEqual(entry.report, REPORT)
+        self.assertEqual(int(self.table.items['sig']['lease_until']), 1320)
+
+
+class DeployedServiceTest(unittest.TestCase):
+
+    def test_codedeploy_without_application_ignored(self):
+        event = {'source': 'aws.codedeploy', 'detail': {'state': 'SUCCESS', 'deploymentId': 'd-1'}}
+
+        self.assertIsNone(deployed_service(event))
+
+    def test_ecs_service_from_resource_arn(self):
+        event = {'source': 'aws.ecs', 'detail-type': 'ECS Deployment State Change',
+                 'resources': ['arn:aws:ecs:us-east-1:123456789012:service/prod/payments'],
+                 'detail': {'eventName': 'SERVICE_DEPLOYMENT_COMPLETED', 'deploymentId': 'ecs-svc/1'}}
+
+        self.assertEqual(deployed_service(event), ('payments', 'ecs ecs-svc/1'))
+
+    def test_ecs_without_resources_ignored(self):
+        event = {'source': 'aws.ecs', 'detail-type': 'ECS Deployment State Change', 'resources': [],
+                 'detail': {'eventName': 'SERVICE_DEPLOYMENT_COMPLETED'}}
+
+        self.assertIsNone(deployed_service(event))
+        self.assertEqual(deploy_scopes(None), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
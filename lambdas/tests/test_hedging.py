@@ -0,0 +1,62 @@
+import threading
+import unittest
+from unittest import mock
+
+from llm import HedgedProvider, LatencyTracker, MockProvider
+from resilience import AdaptiveLimiter, CircuitBreaker, GuardedProvider
+
+CALLERS = 24
+
+
+def provider(name, latency):
+    mock_provider = MockProvider(model=f"{name}-model", latency=latency, reply='{}')
+    mock_provider.name = name
+    return mock_provider
+
+
+class HedgedProviderTest(unittest.TestCase):
+
+    def setUp(self):
+        patch = mock.patch('llm.print', lambda *a, **k: None, create=True)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def test_calls_waiting_for_a_thread_are_not_hedged(self):
+        hedged = HedgedProvider(provider('primary', 0.1), provider('secondary', 0.1), initial_delay=0.15,
+                                max_workers=4)
+
+        threads = [threading.Thread(target=hedged.generate, args=('prompt',)) for _ in range(CALLERS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(hedged.hedges, 0)
+
+    def test_slow_primary_hedged(self):
+        hedged = HedgedProvider(provider('primary', 0.5), provider('secondary', 0.01), initial_delay=0.05)
+
+        completion = hedged.generate('prompt')
+
+        self.assertEqual(completion.provider, 'secondary')
+        self.assertEqual(hedged.hedges, 1)
+
+    def test_pool_sized_from_limiters(self):
+        def guarded(name, maximum):
+            return GuardedProvider(provider(name, 0), AdaptiveLimiter(maximum=maximum), CircuitBreaker(name))
+
+        hedged = HedgedProvider(guarded('primary', 20), guarded('secondary', 12))
+
+        self.assertEqual(hedged.executor._max_workers, 32)
+
+    def test_percentile_needs_min_samples(self):
+        tracker = LatencyTracker()
+        for n in range(5):
+            tracker.record(n)
+
+        self.assertIsNone(tracker.percentile(95, min_samples=10))
+        self.assertEqual(tracker.percentile(95, min_samples=5), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,163 @@
+import email.utils
+import unittest
+from unittest import mock
+
+import urllib3
+
+import http_client
+from http_client import ResilientHTTP, parse_retry_after
+
+
+class FakeClock:
+    """Stands in for the time module; sleeping advances the clock"""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class ScriptedPool:
+    """Answers each request with the next scripted response or exception"""
+
+    def __init__(self, clock, script, latency=0.0):
+        self.clock = clock
+        self.script = list(script)
+        self.latency = latency
+        self.timeouts = []
+
+    def request(self, method, url, body=None, headers=None, timeout=None, preload_content=True):
+        self.timeouts.append(timeout)
+        self.clock.now += self.latency
+        outcome = self.script.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        status, response_headers = outcome if isinstance(outcome, tuple) else (outcome, {})
+        return urllib3.HTTPResponse(body=b'{}', status=status, headers=response_headers,
+                                    preload_content=preload_content)
+
+    @property
+    def attempts(self):
+        return len(self.timeouts)
+
+
+class ResilientHTTPTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        for patch in (mock.patch.object(http_client, 'time', self.clock),
+                      mock.patch.object(http_client, 'print', lambda *a, **k: None, create=True)):
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def client(self, script, latency=0.0, **kwargs):
+        client = ResilientHTTP(**kwargs)
+        client.pool = ScriptedPool(self.clock, script, latency)
+        return client
+
+    def test_retries_transient_statuses_until_success(self):
+        client = self.client([503, 429, 200], base_delay=0.5, max_delay=8.0)
+
+        resp = client.request('POST', 'https://llm.local/generate')
+
+        self.assertEqual(resp.status, 200)
+        self.assertEqual(client.pool.attempts, 3)
+        self.assertEqual(client.retries, 2)
+        self.assertLessEqual(self.clock.sleeps[0], 0.5)
+        self.assertLessEqual(self.clock.sleeps[1], 1.0)
+
+    def test_client_errors_not_retried(self):
+        client = self.client([400])
+
+        self.assertEqual(client.request('POST', 'https://llm.local/generate').status, 400)
+        self.assertEqual(client.pool.attempts, 1)
+        self.assertEqual(self.clock.sleeps, [])
+
+    def test_last_response_returned_after_max_attempts(self):
+        client = self.client([503, 502, 500], max_attempts=3)
+
+        resp = client.request('POST', 'https://llm.local/generate')
+
+        self.assertEqual(resp.status, 500)
+        self.assertEqual(client.pool.attempts, 3)
+        self.assertEqual(len(self.clock.sleeps), 2)
+
+    def test_connection_errors_retried_then_raised(self):
+        error = urllib3.exceptions.NewConnectionError(None, 'connection refused')
+        client = self.client([error, error], max_attempts=2)
+
+        with self.assertRaises(urllib3.exceptions.NewConnectionError):
+            client.request('POST', 'https://llm.local/generate')
+        self.assertEqual(client.pool.attempts, 2)
+
+    def test_retry_after_seconds_honoured(self):
+        client = self.client([(429, {'Retry-After': '3'}), 200])
+
+        self.assertEqual(client.request('POST', 'https://llm.local/generate').status, 200)
+        self.assertEqual(self.clock.sleeps, [3.0])
+
+    def test_retry_after_http_date_honoured(self):
+        retry_at = email.utils.formatdate(self.clock.now + 5, usegmt=True)
+        client = self.client([(503, {'Retry-After': retry_at}), 200])
+
+        client.request('POST', 'https://llm.local/generate')
+
+        self.assertAlmostEqual(self.clock.sleeps[0], 5.0, delta=1.0)
+
+    def test_retry_after_beyond_deadline_returns_response(self):
+        client = self.client([(429, {'Retry-After': '30'}), 200])
+        client.set_deadline(10)
+
+        resp = client.request('POST', 'https://llm.local/generate')
+
+        self.assertEqual(resp.status, 429)
+        self.assertEqual(client.pool.attempts, 1)
+        self.assertEqual(self.clock.sleeps, [])
+
+    def test_read_timeout_capped_by_deadline(self):
+        client = self.client([503, 200], latency=4.0, read_timeout=60.0, base_delay=0.0)
+        client.set_deadline(10)
+
+        client.request('POST', 'https://llm.local/generate')
+
+        self.assertEqual(client.pool.timeouts[0].read_timeout, 10)
+        self.assertEqual(client.pool.timeouts[1].read_timeout, 6)
+
+    def test_expired_deadline_sends_nothing(self):
+        client = self.client([200])
+        client.set_deadline(0)
+
+        with self.assertRaises(urllib3.exceptions.TimeoutError):
+            client.request('POST', 'https://llm.local/generate')
+        self.assertEqual(client.pool.attempts, 0)
+
+    def test_deadline_from_lambda_context_keeps_margin(self):
+        client = self.client([])
+        context = mock.Mock(get_remaining_time_in_millis=lambda: 30000)
+
+        client.set_deadline_from_context(context, margin=5)
+
+        self.assertEqual(client.remaining(), 25)
+
+
+class ParseRetryAfterTest(unittest.TestCase):
+
+    def test_values(self):
+        self.assertEqual(parse_retry_after('2.5'), 2.5)
+        self.assertEqual(parse_retry_after('-1'), 0.0)
+        self.assertIsNone(parse_retry_after(None))
+        self.assertIsNone(parse_retry_after('soon'))
+        self.assertEqual(parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT'), 0.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
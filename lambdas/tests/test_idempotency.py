@@ -0,0 +1,123 @@
+import json
+import os
+import sys
+import threading
+import unittest
+from unittest import mock
+
+from botocore.exceptions import ClientError
+
+from dynamodb_local import LocalDynamoDB, LocalTable
+from idempotency import DONE, IdempotencyStore
+
+NOTIFIER = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'slack_notifier')
+
+
+def import_notifier():
+    """The notifier's handler module (the analyzer's is also called handler)"""
+    analyzer = sys.modules.pop('handler', None)
+    sys.path.insert(0, NOTIFIER)
+    try:
+        import handler as notifier
+    finally:
+        sys.path.remove(NOTIFIER)
+        if analyzer is not None:
+            sys.modules['handler'] = analyzer
+        else:
+            sys.modules.pop('handler', None)
+    return notifier
+
+
+class IdempotencyStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.client = LocalDynamoDB({'idempotency': LocalTable('alert_id', 'stage')}, latency=0.0)
+        self.store = IdempotencyStore(self.client, 'idempotency', cache_size=50)
+
+    def test_claim_once(self):
+        self.assertTrue(self.store.claim('a-1', 'analysis', now=1000))
+        self.assertFalse(self.store.claim('a-1', 'analysis', now=1001))
+
+        self.store.release('a-1', 'analysis')
+
+        self.assertTrue(self.store.claim('a-1', 'analysis', now=1002))
+
+    def test_completed_stage_served_from_memo(self):
+        self.store.claim('a-1', 'analysis', now=1000)
+        self.store.complete('a-1', 'analysis', now=1000)
+
+        self.assertEqual(self.store.lookup([('a-1', 'analysis')], now=1001), {('a-1', 'analysis'): DONE})
+        self.assertEqual(self.store.stats['cache_hits'], 1)
+        self.assertEqual(self.store.stats['reads'], 0)
+
+    def test_memo_consistent_under_concurrent_use(self):
+        errors = []
+
+        def work(thread):
+            try:
+                for n in range(300):
+                    key = (f"a-{thread}-{n}", 'analysis')
+                    self.store._remember(key, 10 ** 10)
+                    self.store.lookup([key, (f"a-{thread}-{n - 20}", 'analysis')], now=1000)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=work, args=(t,)) for t in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertLessEqual(len(self.store._done), self.store.cache_size)
+
+
+class NotifierFailuresTest(unittest.TestCase):
+
+    def setUp(self):
+        self.notifier = import_notifier()
+        self.idempotency = mock.Mock()
+        self.idempotency.lookup.return_value = {}
+        self.http = mock.Mock()
+        secrets = mock.Mock()
+        secrets.get_secret_value.return_value = {
+            'SecretString': json.dumps({'saar_slack_webhook': 'https://hooks.slack.local/T000'})}
+        patches = [mock.patch.object(self.notifier, 'idempotency', self.idempotency),
+                   mock.patch.object(self.notifier, 'http', self.http),
+                   mock.patch.object(self.notifier, 'secrets_client', secrets),
+                   mock.patch.object(self.notifier, 'writes', mock.Mock()),
+                   mock.patch.object(self.notifier, 'print', lambda *a, **k: None, create=True),
+                   mock.patch.dict('os.environ', {'SLACK_WEBHOOK_SECRET': 'slack'})]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def invoke(self, *alert_ids):
+        event = {'Records': [{'messageId': f"m-{alert_id}",
+                              'body': json.dumps({'alert_id': alert_id, 'analysis': 'text'})}
+                             for alert_id in alert_ids]}
+        return self.notifier.lambda_handler(event, None)['batchItemFailures']
+
+    def test_claim_error_fails_only_its_record(self):
+        throttled = ClientError({'Error': {'Code': 'ThrottlingException', 'Message': 'slow down'}}, 'PutItem')
+        self.idempotency.claim.side_effect = [throttled, True]
+        self.http.request.return_value = mock.Mock(status=200)
+
+        failures = self.invoke('a-1', 'a-2')
+
+        self.assertEqual(failures, [{'itemIdentifier': 'm-a-1'}])
+        self.assertEqual(self.http.request.call_count, 1)
+        self.idempotency.complete.assert_called_once_with('a-2', 'slack-final')
+
+    def test_rejected_post_redelivered(self):
+        self.idempotency.claim.return_value = True
+        self.http.request.side_effect = [mock.Mock(status=500), mock.Mock(status=200)]
+
+        failures = self.invoke('a-1', 'a-2')
+
+        self.assertEqual(failures, [{'itemIdentifier': 'm-a-1'}])
+        self.idempotency.release.assert_called_once_with('a-1', 'slack-final')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,209 @@
+import json
+import os
+import sys
+import threading
+import time
+import unittest
+from unittest import mock
+
+from correlation import Correlator
+from sqs_local import LocalSQS
+
+NOTIFIER = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'slack_notifier')
+
+
+def alert(n, at, host='redis-main.internal:6379'):
+    return {'alert_id': f"alert-{n}", 'severity': 'HIGH', 'log_group': f"/ecs/service-{n}",
+            'timestamp': at, 'message': f"[ERROR] ConnectionError: could not reach {host} (attempt {n})"}
+
+
+class IncidentUpdateTest(unittest.TestCase):
+
+    def setUp(self):
+        import handler
+        self.handler = handler
+        self.sqs = mock.Mock()
+        patches = [mock.patch.object(handler, 'sqs', self.sqs),
+                   mock.patch.object(handler, 'correlator', Correlator(window_seconds=30, kinds=('host',))),
+                   mock.patch.object(handler, 'idempotency', None),
+                   mock.patch.object(handler, 'ALERTS_TABLE', None),
+                   mock.patch.object(handler, 'print', lambda *a, **k: None, create=True)]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def run_batch(self, bodies):
+        batch = self.handler.start_batch(bodies)
+        batch.analyses = [({'summary': 'Redis unreachable'}, 'model') for _ in batch.to_analyze]
+        for body, analysis in zip(batch.to_analyze, batch.analyses):
+            if id(body) in batch.incident_of:
+                batch.incident_of[id(body)].analysis = analysis
+        self.handler.finish_batch(batch, 'https://sqs.local/distribution.fifo')
+        sent = [json.loads(call.kwargs['MessageBody']) for call in self.sqs.send_message.call_args_list]
+        self.sqs.send_message.reset_mock()
+        return sent
+
+    def test_alerts_joining_posted_incident_sent_as_update(self):
+        first = self.run_batch([alert(1, 1000), alert(2, 1001)])
+        self.assertEqual(len(first), 1)
+        self.assertEqual(first[0]['incident']['count'], 2)
+
+        later = self.run_batch([alert(3, 1010), alert(4, 1012)])
+
+        self.assertEqual(len(later), 1)
+        self.assertEqual(later[0]['alert_id'], 'alert-1')
+        self.assertEqual(later[0]['incident'], {'id': 'alert-1', 'count': 4,
+                                                'log_groups': [f"/ecs/service-{n}" for n in range(1, 5)]})
+        self.assertEqual([joined['alert_id'] for joined in later[0]['joined']], ['alert-3', 'alert-4'])
+
+    def test_members_of_new_incident_not_sent_separately(self):
+        sent = self.run_batch([alert(1, 1000), alert(2, 1001), alert(3, 1002)])
+
+        self.assertEqual(len(sent), 1)
+        self.assertNotIn('joined', sent[0])
+
+
+class HoldTest(unittest.TestCase):
+    """The worker holds correlated alerts until their incident is due"""
+
+    def setUp(self):
+        import handler
+        self.handler = handler
+        self.correlator = Correlator(window_seconds=30, max_span_seconds=300, kinds=('host',))
+        patch = mock.patch.object(handler, 'correlator', self.correlator)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def test_incident_analyzed_once_due_with_every_member(self):
+        held = [alert(1, 1000)]
+        incident_of = self.handler.hold_alerts(held)
+        self.assertEqual(self.handler.held_due_at(), 1030)
+        self.assertEqual(self.handler.release_held(held, incident_of, now=1010), ([], None))
+
+        held.append(alert(2, 1015))
+        incident_of.update(self.handler.hold_alerts(held[1:]))
+        self.assertEqual(self.handler.held_due_at(), 1045)
+        self.assertEqual(self.handler.release_held(held, incident_of, now=1040), ([], None))
+
+        released, batch = self.handler.release_held(held, incident_of, now=1045)
+
+        self.assertEqual(released, [0, 1])
+        self.assertEqual(len(batch.to_analyze), 1)
+        self.assertEqual(batch.to_analyze[0]['incident']['count'], 2)
+        self.assertIsNone(self.handler.held_due_at())
+
+    def test_alerts_joining_dispatched_incident_released_at_once(self):
+        held = [alert(1, 1000)]
+        self.handler.release_held(held, self.handler.hold_alerts(held), now=1030)
+        later = [alert(2, 1020), {**alert(3, 1021, host='db.internal:5432'), 'reanalysis': True}]
+
+        released, batch = self.handler.release_held(later, self.handler.hold_alerts(later), now=1021)
+
+        self.assertEqual(released, [0, 1])
+        self.assertEqual([body['alert_id'] for body in batch.to_analyze], ['alert-3'])
+        self.assertEqual(batch.dispatched, [])
+
+    def test_span_bounds_the_hold(self):
+        held = [alert(n, 1000 + 20 * n) for n in range(20)]
+        incident_of = self.handler.hold_alerts(held)
+
+        released, batch = self.handler.release_held(held, incident_of, now=1300)
+
+        self.assertEqual(len(batch.dispatched), 1)
+        self.assertEqual(batch.dispatched[0].first_at, 1000)
+
+    def test_everything_released_without_now(self):
+        held = [alert(1, 1000), alert(2, 1001, host='db.internal:5432')]
+
+        released, batch = self.handler.release_held(held, self.handler.hold_alerts(held))
+
+        self.assertEqual(released, [0, 1])
+        self.assertEqual(len(batch.to_analyze), 2)
+
+
+class WorkerHoldTest(unittest.TestCase):
+
+    def setUp(self):
+        import handler
+        self.handler = handler
+        self.sqs = LocalSQS()
+        self.queue_url = self.sqs.create_queue(QueueName='processing.fifo')['QueueUrl']
+        self.distribution_url = self.sqs.create_queue(QueueName='distribution.fifo')['QueueUrl']
+        self.analyzed = []
+        patches = [mock.patch.object(handler, 'sqs', self.sqs),
+                   mock.patch.object(handler, 'correlator', Correlator(window_seconds=2, kinds=('host',))),
+                   mock.patch.object(handler, 'analyze_alerts', self.analyze),
+                   mock.patch.object(handler, 'idempotency', None),
+                   mock.patch.object(handler, 'ALERTS_TABLE', None),
+                   mock.patch.object(handler, 'print', lambda *a, **k: None, create=True)]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def analyze(self, providers, bodies, on_preliminary=None):
+        self.analyzed.append(bodies)
+        return [({'summary': 'Redis unreachable'}, 'model') for _ in bodies]
+
+    def test_alerts_from_several_receives_analyzed_as_one_incident(self):
+        import worker as worker_module
+        worker = worker_module.Worker(self.sqs, self.queue_url, {}, self.distribution_url, batch_size=1,
+                                      wait_seconds=1, visibility_timeout=30)
+        now = int(time.time())
+        for n in range(3):
+            body = alert(n, now)
+            self.sqs.send_message(QueueUrl=self.queue_url, MessageBody=json.dumps(body),
+                                  MessageGroupId=body['log_group'])
+        with mock.patch.object(worker_module, 'print', lambda *a, **k: None, create=True):
+            thread = threading.Thread(target=worker.run)
+            thread.start()
+            deadline = time.monotonic() + 10
+            while worker.stats['deleted'] < 3 and time.monotonic() < deadline:
+                time.sleep(0.05)
+            deleted = worker.stats['deleted']
+            worker.stop()
+            thread.join()
+
+        self.assertEqual(deleted, 3)
+        self.assertEqual(len(self.analyzed), 1)
+        self.assertEqual([body['incident']['count'] for body in self.analyzed[0]], [3])
+        self.assertEqual(worker.held, [])
+
+
+class NotifierJoinedTest(unittest.TestCase):
+
+    def setUp(self):
+        # Both Lambdas have a handler module
+        analyzer = sys.modules.pop('handler', None)
+        sys.path.insert(0, NOTIFIER)
+        try:
+            import handler as notifier
+        finally:
+            sys.path.remove(NOTIFIER)
+            if analyzer is not None:
+                sys.modules['handler'] = analyzer
+            else:
+                sys.modules.pop('handler', None)
+        self.notifier = notifier
+
+    def test_joined_stage_keyed_on_joined_alerts(self):
+        body = {'alert_id': 'alert-1', 'incident': {'id': 'alert-1', 'count': 3, 'log_groups': ['/ecs/a']},
+                'joined': [{'alert_id': 'alert-3'}, {'alert_id': 'alert-2'}]}
+        reordered = {**body, 'joined': list(reversed(body['joined']))}
+
+        stage = self.notifier.post_stage(body, 'joined')
+
+        self.assertTrue(stage.startswith('slack-joined-'))
+        self.assertEqual(stage, self.notifier.post_stage(reordered, 'joined'))
+        self.assertNotEqual(stage, self.notifier.post_stage({**body, 'joined': [{'alert_id': 'alert-4'}]}, 'joined'))
+
+    def test_format_joined_lists_alerts(self):
+        text = self.notifier.format_joined({
+            'incident': {'id': 'alert-1', 'count': 3, 'log_groups': ['/ecs/a', '/ecs/b']},
+            'joined': [{'alert_id': 'alert-3', 'severity': 'HIGH', 'log_group': '/ecs/b', 'message': 'boom'}]})
+
+        self.assertIn('`alert-1`', text)
+        self.assertIn('`/ecs/b`: boom', text)
+
+
+if __name__ == '__main__':
+    unittest.main()
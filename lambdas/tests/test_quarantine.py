@@ -0,0 +1,74 @@
+import json
+import unittest
+from unittest import mock
+
+from dynamodb_local import LocalTable
+from quarantine import QUARANTINED, Quarantine
+
+
+class ParseAlertTest(unittest.TestCase):
+
+    def setUp(self):
+        import handler
+        self.handler = handler
+
+    def test_rejects_malformed_payloads(self):
+        for payload in ('{"alert_id": "a-1", "message": "trunc', '[1, 2]', '{"message": {"error": "x"}}'):
+            with self.assertRaises(self.handler.MalformedAlert):
+                self.handler.parse_alert(payload)
+
+        self.assertEqual(self.handler.parse_alert('{"alert_id": "a-1", "message": "boom"}')['alert_id'], 'a-1')
+
+    def test_rejects_malformed_incidents(self):
+        incident = {'id': 'a-1', 'count': 2, 'log_groups': ['/ecs/a', '/ecs/b'],
+                    'members': [{'alert_id': 'a-2', 'log_group': '/ecs/b', 'message': 'boom'}]}
+        for body in ({'incident': 'x'}, {'incident': {**incident, 'count': '2'}},
+                     {'incident': {**incident, 'count': True}}, {'incident': {'id': 'a-1'}},
+                     {'incident': {**incident, 'members': ['a-2']}}, {'joined': {'alert_id': 'a-2'}},
+                     {'joined': ['a-2']}):
+            with self.assertRaises(self.handler.MalformedAlert, msg=body):
+                self.handler.parse_alert(json.dumps({'alert_id': 'a-1', 'message': 'boom', **body}))
+
+        body = self.handler.parse_alert(json.dumps({'alert_id': 'a-1', 'message': 'boom', 'incident': incident,
+                                                    'reanalysis': True}))
+        self.assertEqual(body['incident']['count'], 2)
+
+
+class ParseMessagesTest(unittest.TestCase):
+
+    def setUp(self):
+        import handler
+        self.handler = handler
+        self.store = Quarantine(LocalTable('message_id'))
+        patches = [mock.patch.object(handler, 'quarantine', self.store),
+                   mock.patch.object(handler, 'emit', lambda *a, **k: None),
+                   mock.patch.object(handler, 'print', lambda *a, **k: None, create=True)]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_malformed_messages_quarantined(self):
+        messages = [('m-1', json.dumps({'alert_id': 'a-1', 'message': 'boom'})),
+                    ('m-2', '{"alert_id": "a-2", "message": "trunc'),
+                    ('m-3', json.dumps({'alert_id': 'a-3', 'message': ['not', 'text']}))]
+
+        bodies, quarantined = self.handler.parse_messages(messages)
+
+        self.assertEqual(bodies[0]['alert_id'], 'a-1')
+        self.assertEqual(bodies[1:], [None, None])
+        self.assertEqual(quarantined, {1, 2})
+        item = self.store.get('m-3')
+        self.assertEqual(item['status'], QUARANTINED)
+        self.assertEqual(item['error_type'], 'MalformedAlert')
+        self.assertEqual(item['alert_id'], 'a-3')
+
+    def test_left_for_redelivery_without_table(self):
+        with mock.patch.object(self.handler, 'quarantine', None):
+            bodies, quarantined = self.handler.parse_messages([('m-1', 'not json')])
+
+        self.assertEqual(bodies, [None])
+        self.assertEqual(quarantined, set())
+
+
+if __name__ == '__main__':
+    unittest.main()
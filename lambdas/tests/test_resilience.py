@@ -0,0 +1,136 @@
+import json
+import unittest
+from unittest import mock
+
+from llm import Completion, LLMError, LLMProvider
+from resilience import AdaptiveLimiter, CircuitBreaker, CircuitOpenError, GuardedProvider
+
+
+class ScriptedProvider(LLMProvider):
+    """Raises (or returns) the next item of its script on each call"""
+
+    name = 'scripted'
+
+    def __init__(self, script):
+        super().__init__('scripted-model')
+        self.script = list(script)
+        self.calls = 0
+
+    def generate(self, prompt, max_tokens=1024, schema=None):
+        self.calls += 1
+        outcome = self.script.pop(0)
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return Completion(outcome, self.model, self.name)
+
+    def stream(self, prompt, max_tokens=1024, schema=None):
+        for chunk in self.generate(prompt, max_tokens, schema).text.split():
+            yield chunk
+
+
+def half_open(breaker):
+    """Trip the breaker and let its reset timeout pass"""
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+    breaker.opened_at -= breaker.reset_timeout + 1
+    return breaker
+
+
+def guarded(script, **kwargs):
+    breaker = half_open(CircuitBreaker('scripted-fast', failure_threshold=2, reset_timeout=30.0, **kwargs))
+    return GuardedProvider(ScriptedProvider(script), AdaptiveLimiter(initial=2), breaker)
+
+
+class GuardedProviderTest(unittest.TestCase):
+
+    def test_probe_failing_on_our_side_releases_probe(self):
+        provider = guarded([AttributeError('bug in prompt handling'), 'recovered'])
+
+        with self.assertRaises(AttributeError):
+            provider.generate('prompt')
+
+        self.assertFalse(provider.breaker.probe_in_flight)
+        self.assertEqual(provider.limiter.in_flight, 0)
+        self.assertEqual(provider.generate('prompt').text, 'recovered')
+        self.assertEqual(provider.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_overloaded_probe_reopens_circuit(self):
+        provider = guarded([LLMError('rate limited', status=429)])
+
+        with self.assertRaises(LLMError):
+            provider.generate('prompt')
+
+        self.assertEqual(provider.breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(provider.breaker.probe_in_flight)
+        with self.assertRaises(CircuitOpenError):
+            provider.generate('prompt')
+        self.assertEqual(provider.provider.calls, 1)
+
+    def test_stream_closed_early_releases_probe(self):
+        provider = guarded(['one two three', 'recovered'])
+
+        chunks = provider.stream('prompt')
+        self.assertEqual(next(chunks), 'one')
+        chunks.close()
+
+        self.assertFalse(provider.breaker.probe_in_flight)
+        self.assertEqual(provider.limiter.in_flight, 0)
+        self.assertEqual(provider.generate('prompt').text, 'recovered')
+
+    def test_on_success_called_on_every_success(self):
+        successes = []
+        provider = guarded(['probe', 'next'], on_success=lambda: successes.append(1))
+
+        provider.generate('prompt')
+        provider.generate('prompt')
+
+        self.assertEqual(len(successes), 2)
+
+
+class ReanalysisTest(unittest.TestCase):
+
+    def setUp(self):
+        import handler
+        self.handler = handler
+        self.sqs = mock.Mock()
+        patches = [mock.patch.object(handler, 'sqs', self.sqs),
+                   mock.patch.object(handler, '_pending_reanalysis', []),
+                   mock.patch.object(handler, 'print', lambda *a, **k: None, create=True),
+                   mock.patch.dict('os.environ', {'PROCESSING_QUEUE_URL': 'https://sqs.local/processing.fifo'})]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def sent(self):
+        return [json.loads(call.kwargs['MessageBody']) for call in self.sqs.send_message.call_args_list]
+
+    def test_success_flushes_held_back_alerts_without_circuit_transition(self):
+        breaker = CircuitBreaker('scripted-fast', on_success=self.handler.flush_reanalysis)
+        provider = GuardedProvider(ScriptedProvider(['ok']), AdaptiveLimiter(), breaker)
+        self.handler.schedule_reanalysis({'alert_id': 'a-1', 'log_group': '/ecs/api'})
+
+        provider.generate('prompt')
+
+        self.assertEqual(self.sent(), [{'alert_id': 'a-1', 'log_group': '/ecs/api', 'reanalysis': True}])
+        self.assertEqual(self.handler._pending_reanalysis, [])
+
+    def test_reanalysis_alerts_not_held_back_again(self):
+        self.handler.schedule_reanalysis({'alert_id': 'a-1', 'reanalysis': True})
+        self.handler.flush_reanalysis()
+
+        self.sqs.send_message.assert_not_called()
+
+    def test_failed_send_does_not_stop_flush(self):
+        from botocore.exceptions import ClientError
+        self.sqs.send_message.side_effect = [
+            ClientError({'Error': {'Code': 'ServiceUnavailable', 'Message': 'down'}}, 'SendMessage'), {}]
+        self.handler.schedule_reanalysis({'alert_id': 'a-1'})
+        self.handler.schedule_reanalysis({'alert_id': 'a-2'})
+
+        self.handler.flush_reanalysis()
+
+        self.assertEqual([body['alert_id'] for body in self.sent()], ['a-1', 'a-2'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,35 @@
+import unittest
+
+from routing import DEFAULT_POLICY_PATH, RoutingPolicy
+
+
+class RoutingPolicyTest(unittest.TestCase):
+
+    def setUp(self):
+        self.policy = RoutingPolicy.load(DEFAULT_POLICY_PATH)
+
+    def test_frequent_alerts_answered_without_llm(self):
+        self.assertEqual(self.policy.route({'severity': 'HIGH'}, frequency=50).tier, 'none')
+
+    def test_frequent_critical_alerts_never_below_fast(self):
+        route = self.policy.route({'severity': 'CRITICAL'}, frequency=50)
+
+        self.assertEqual(route.tier, 'fast')
+        self.assertEqual(route.max_tokens, 768)
+
+    def test_rare_critical_alerts_go_deep(self):
+        self.assertEqual(self.policy.route({'severity': 'CRITICAL'}, frequency=1).tier, 'deep')
+
+    def test_floor_applies_to_default_tier(self):
+        policy = RoutingPolicy({'default_tier': 'none', 'min_tiers': {'HIGH': 'deep'}})
+
+        self.assertEqual(policy.route({'severity': 'HIGH'}).tier, 'deep')
+        self.assertEqual(policy.route({'severity': 'LOW'}).tier, 'none')
+
+    def test_unknown_floor_tier_rejected(self):
+        with self.assertRaises(ValueError):
+            RoutingPolicy({'min_tiers': {'CRITICAL': 'fastest'}})
+
+
+if __name__ == '__main__':
+    unittest.main()
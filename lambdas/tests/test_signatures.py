@@ -0,0 +1,60 @@
+import unittest
+
+from dynamodb_local import LocalTable
+from signatures import DAY_SECONDS, SignatureStats, day_attribute
+
+START = 1760000000
+
+
+class SignatureStatsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.table = LocalTable('error_signature')
+        self.stats = SignatureStats(self.table, window_days=7, retention_days=14, ttl_days=30)
+
+    def days(self):
+        item = self.table.get_item(Key={'error_signature': 'sig'})['Item']
+        return sorted(name for name in item if name.startswith('d'))
+
+    def test_counts_within_window(self):
+        for n in range(3):
+            self.stats.record('sig', START + n * DAY_SECONDS)
+
+        pattern = self.stats.pattern('sig', now=START + 2 * DAY_SECONDS)
+
+        self.assertEqual(pattern['occurrence_count'], 3)
+        self.assertEqual(pattern['first_seen'], START)
+        self.assertEqual(pattern['last_seen'], START + 2 * DAY_SECONDS)
+
+    def test_all_expired_days_removed_after_a_gap(self):
+        # Occurrences on five consecutive days, then nothing for 25 days
+        for n in range(5):
+            self.stats.record('sig', START + n * DAY_SECONDS)
+        later = START + 29 * DAY_SECONDS
+
+        self.stats.record('sig', later)
+
+        self.assertEqual(self.days(), [day_attribute(later)])
+        self.assertEqual(self.stats.pattern('sig', now=later)['total_count'], 6)
+
+    def test_days_within_retention_kept(self):
+        self.stats.record('sig', START)
+        later = START + 13 * DAY_SECONDS
+
+        self.stats.record('sig', later)
+
+        self.assertEqual(self.days(), [day_attribute(START), day_attribute(later)])
+
+    def test_out_of_order_event_moves_first_seen(self):
+        self.stats.record('sig', START)
+        self.stats.record('sig', START - 3600)
+
+        pattern = self.stats.pattern('sig', now=START)
+
+        self.assertEqual(pattern['first_seen'], START - 3600)
+        self.assertEqual(pattern['last_seen'], START)
+        self.assertEqual(pattern['total_count'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import unittest
+
+from dynamodb_local import LocalDynamoDB, LocalTable
+from storage import WriteBehind
+
+STATUS_UPDATE = 'SET distribution_status = :status'
+
+
+class WriteBehindTest(unittest.TestCase):
+
+    def setUp(self):
+        self.table = LocalTable('alert_id')
+        self.client = LocalDynamoDB({'alerts': self.table}, latency=0.0)
+        self.writes = WriteBehind(self.client, key_schema={'alerts': ['alert_id']}, base_delay=0.0)
+
+    def store(self, *alert_ids):
+        for alert_id in alert_ids:
+            self.writes.put('alerts', {'alert_id': alert_id})
+        self.writes.flush()
+        self.client.stats['wcu'] = 0
+
+    def test_conditional_updates_sent_as_update_item(self):
+        self.store('a-1', 'a-2')
+        for alert_id in ('a-1', 'a-2', 'never-stored'):
+            self.writes.update('alerts', {'alert_id': alert_id}, STATUS_UPDATE, values={':status': 'sent'},
+                               condition='attribute_exists(alert_id)')
+
+        stats = self.writes.flush()
+
+        self.assertEqual(self.table.items['a-1']['distribution_status'], 'sent')
+        self.assertNotIn('never-stored', self.table.items)
+        self.assertEqual(stats['conditional_failures'], 1)
+        # One write unit per update (a failed condition is billed too), not
+        # the two a transaction bills
+        self.assertEqual(self.client.stats['wcu'], 3)
+
+    def test_atomic_updates_sent_as_transaction(self):
+        self.store('a-1', 'a-2')
+        for alert_id in ('a-1', 'a-2'):
+            self.writes.update('alerts', {'alert_id': alert_id}, STATUS_UPDATE, values={':status': 'sent'},
+                               atomic=True)
+        requests = self.writes.stats['requests']
+
+        self.writes.flush()
+
+        self.assertEqual(self.writes.stats['requests'] - requests, 1)
+        self.assertEqual(self.client.stats['wcu'], 4)
+
+    def test_updates_applied_in_order(self):
+        self.store('a-1')
+        for status in ('preliminary', 'final'):
+            self.writes.update('alerts', {'alert_id': 'a-1'}, STATUS_UPDATE, values={':status': status})
+
+        self.writes.flush()
+
+        self.assertEqual(self.table.items['a-1']['distribution_status'], 'final')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import json
+import sys
+import threading
+import unittest
+from unittest import mock
+
+from analysis_cache import AnalysisCache
+from correlation import Correlator
+from dynamodb_local import LocalTable
+from runbooks import RunbookIndex
+
+THREADS = 8
+
+
+def run_threads(target):
+    threads = [threading.Thread(target=target, args=(n,)) for n in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+class SharedStateTest(unittest.TestCase):
+    """What the worker's analysis threads share loses no updates"""
+
+    def test_reanalysis_list_neither_loses_nor_duplicates_alerts(self):
+        import handler
+        sqs = mock.Mock()
+        with mock.patch.object(handler, 'sqs', sqs), \
+                mock.patch.object(handler, '_pending_reanalysis', []), \
+                mock.patch.object(handler, 'MAX_PENDING_REANALYSIS', 10 ** 6), \
+                mock.patch.object(handler, 'print', lambda *a, **k: None, create=True), \
+                mock.patch.dict('os.environ', {'PROCESSING_QUEUE_URL': 'https://sqs.local/processing.fifo'}):
+
+            def work(thread):
+                for n in range(200):
+                    handler.schedule_reanalysis({'alert_id': f"a-{thread}-{n}"})
+                    if n % 10 == 0:
+                        handler.flush_reanalysis()
+
+            run_threads(work)
+            handler.flush_reanalysis()
+
+        sent = [json.loads(call.kwargs['MessageBody'])['alert_id'] for call in sqs.send_message.call_args_list]
+        self.assertEqual(len(sent), THREADS * 200)
+        self.assertEqual(len(set(sent)), THREADS * 200)
+
+    def test_cache_stats_count_every_lookup(self):
+        cache = AnalysisCache(LocalTable('error_signature'))
+
+        run_threads(lambda thread: [cache.lookup(f"sig-{thread}-{n}", now=1000) for n in range(500)])
+
+        self.assertEqual(cache.stats['miss'], THREADS * 500)
+
+    def test_runbook_counters_count_every_match(self):
+        index = RunbookIndex([])
+
+        run_threads(lambda thread: [index.match(f"[ERROR] failure {n}") for n in range(500)])
+
+        self.assertEqual(index.misses, THREADS * 500)
+
+    def test_correlator_survives_discards_during_adds(self):
+        # The worker's main thread adds alerts while its finisher discards
+        # the incidents of failed batches
+        correlator = Correlator(window_seconds=10 ** 6, max_span_seconds=10 ** 6)
+        errors = []
+
+        def work(thread):
+            try:
+                for n in range(1000):
+                    if thread % 2:
+                        for incident in correlator.pending():
+                            correlator.discard(incident)
+                    else:
+                        correlator.add({'alert_id': f"a-{thread}-{n}",
+                                        'message': f"redis://cache-{n % 3}.internal:6379 refused"}, n)
+                        correlator.dispatch()
+            except Exception as e:
+                errors.append(e)
+
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            run_threads(work)
+        finally:
+            sys.setswitchinterval(interval)
+
+        self.assertEqual(errors, [])
+        self.assertEqual(correlator.stats['alerts'], THREADS // 2 * 1000)
+
+
+if __name__ == '__main__':
+    unittest.main()
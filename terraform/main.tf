@@ -12,11 +12,14 @@ locals {
   )
 
   lambda_source_dir = "${path.module}/../lambdas"
+
+  # Providers the analyzer needs API keys for (primary + optional hedge secondary)
+  ai_providers = compact([var.ai_provider, var.ai_secondary_provider])
 }
 
 # SSM Parameters for Secrets Management
 resource "aws_ssm_parameter" "anthropic_api_key" {
-  count = var.ai_provider == "anthropic" ? 1 : 0
+  count = contains(local.ai_providers, "anthropic") ? 1 : 0
 
   name        = "/${var.project_name}/${var.environment}/anthropic-api-key"
   description = "Anthropic API key for Claude"
@@ -27,7 +30,7 @@ resource "aws_ssm_parameter" "anthropic_api_key" {
 }
 
 resource "aws_ssm_parameter" "google_api_key" {
-  count = var.ai_provider == "google" ? 1 : 0
+  count = contains(local.ai_providers, "google") ? 1 : 0
 
   name        = "/${var.project_name}/${var.environment}/google-api-key"
   description = "Google API key for Gemini"
@@ -79,15 +82,29 @@ module "dynamodb_alerts" {
     {
       name = "timestamp"
       type = "N"
+    },
+    {
+      name = "error_signature"
+      type = "S"
     }
   ]
 
+  # Similar-alert lookups only read these attributes, so the indexes
+  # project them instead of whole alerts
   global_secondary_indexes = [
     {
-      name            = "severity-timestamp-index"
-      hash_key        = "severity"
-      range_key       = "timestamp"
-      projection_type = "ALL"
+      name               = "severity-timestamp-index"
+      hash_key           = "severity"
+      range_key          = "timestamp"
+      projection_type    = "INCLUDE"
+      non_key_attributes = ["error_signature", "title"]
+    },
+    {
+      name               = "signature-timestamp-index"
+      hash_key           = "error_signature"
+      range_key          = "timestamp"
+      projection_type    = "INCLUDE"
+      non_key_attributes = ["severity", "title"]
     }
   ]
 
@@ -125,6 +142,95 @@ module "dynamodb_cache" {
   tags = local.common_tags
 }
 
+# Per-signature occurrence counters (total, first/last seen, per-day counts)
+module "dynamodb_signature_stats" {
+  source = "./modules/dynamodb"
+
+  table_name   = "${local.name_prefix}-signature-stats"
+  billing_mode = var.dynamodb_billing_mode
+
+  hash_key      = "error_signature"
+  hash_key_type = "S"
+
+  attributes = [
+    {
+      name = "error_signature"
+      type = "S"
+    }
+  ]
+
+  global_secondary_indexes = []
+
+  enable_streams = false
+
+  enable_ttl         = true
+  ttl_attribute_name = "ttl"
+
+  tags = local.common_tags
+}
+
+# Which stages (analysis, Slack posts) each alert has been through, so
+# redelivered and duplicate messages aren't analyzed or posted twice
+module "dynamodb_idempotency" {
+  source = "./modules/dynamodb"
+
+  table_name   = "${local.name_prefix}-idempotency"
+  billing_mode = var.dynamodb_billing_mode
+
+  hash_key       = "alert_id"
+  hash_key_type  = "S"
+  range_key      = "stage"
+  range_key_type = "S"
+
+  attributes = [
+    {
+      name = "alert_id"
+      type = "S"
+    },
+    {
+      name = "stage"
+      type = "S"
+    }
+  ]
+
+  global_secondary_indexes = []
+
+  enable_streams = false
+
+  enable_ttl         = true
+  ttl_attribute_name = "ttl"
+
+  tags = local.common_tags
+}
+
+# Processing queue messages the analyzer can never process, with their
+# error, for inspection and replay (tools/manage_quarantine.py)
+module "dynamodb_quarantine" {
+  source = "./modules/dynamodb"
+
+  table_name   = "${local.name_prefix}-quarantine"
+  billing_mode = var.dynamodb_billing_mode
+
+  hash_key      = "message_id"
+  hash_key_type = "S"
+
+  attributes = [
+    {
+      name = "message_id"
+      type = "S"
+    }
+  ]
+
+  global_secondary_indexes = []
+
+  enable_streams = false
+
+  enable_ttl         = true
+  ttl_attribute_name = "ttl"
+
+  tags = local.common_tags
+}
+
 # SQS Queues
 module "sqs_processing" {
   source = "./modules/sqs"
@@ -182,6 +288,14 @@ module "iam_ingestor" {
               "sqs:GetQueueAttributes"
             ]
             Resource = module.sqs_processing.queue_arn
+          },
+          {
+            Effect = "Allow"
+            Action = [
+              "dynamodb:PutItem",
+              "dynamodb:UpdateItem"
+            ]
+            Resource = module.dynamodb_cache.table_arn
           }
         ]
       })
@@ -212,6 +326,8 @@ module "iam_analyzer" {
             Action = [
               "sqs:ReceiveMessage",
               "sqs:DeleteMessage",
+              "sqs:SendMessage",
+              "sqs:ChangeMessageVisibility",
               "sqs:GetQueueAttributes"
             ]
             Resource = module.sqs_processing.queue_arn
@@ -228,15 +344,21 @@ module "iam_analyzer" {
             Effect = "Allow"
             Action = [
               "dynamodb:GetItem",
+              "dynamodb:BatchGetItem",
               "dynamodb:PutItem",
               "dynamodb:UpdateItem",
+              "dynamodb:BatchWriteItem",
+              "dynamodb:DeleteItem",
               "dynamodb:Query",
               "dynamodb:Scan"
             ]
             Resource = [
               module.dynamodb_alerts.table_arn,
               "${module.dynamodb_alerts.table_arn}/index/*",
-              module.dynamodb_cache.table_arn
+              module.dynamodb_cache.table_arn,
+              module.dynamodb_signature_stats.table_arn,
+              module.dynamodb_idempotency.table_arn,
+              module.dynamodb_quarantine.table_arn
             ]
           },
           {
@@ -256,8 +378,8 @@ module "iam_analyzer" {
               "ssm:GetParameters"
             ]
             Resource = concat(
-              var.ai_provider == "anthropic" ? [aws_ssm_parameter.anthropic_api_key[0].arn] : [],
-              var.ai_provider == "google" ? [aws_ssm_parameter.google_api_key[0].arn] : []
+              contains(local.ai_providers, "anthropic") ? [aws_ssm_parameter.anthropic_api_key[0].arn] : [],
+              contains(local.ai_providers, "google") ? [aws_ssm_parameter.google_api_key[0].arn] : []
             )
           }
         ]
@@ -297,10 +419,21 @@ module "iam_notifier" {
             Effect = "Allow"
             Action = [
               "dynamodb:GetItem",
+              "dynamodb:UpdateItem",
               "dynamodb:Query"
             ]
             Resource = module.dynamodb_alerts.table_arn
           },
+          {
+            Effect = "Allow"
+            Action = [
+              "dynamodb:BatchGetItem",
+              "dynamodb:PutItem",
+              "dynamodb:DeleteItem",
+              "dynamodb:BatchWriteItem"
+            ]
+            Resource = module.dynamodb_idempotency.table_arn
+          },
           {
             Effect = "Allow"
             Action = [
@@ -331,6 +464,20 @@ module "iam_notifier" {
   tags = local.common_tags
 }
 
+# Code shared by several functions (lambdas/shared/python), as a layer
+data "archive_file" "shared_layer" {
+  type        = "zip"
+  source_dir  = "${local.lambda_source_dir}/shared"
+  output_path = "${path.module}/.terraform/tmp/${local.name_prefix}-shared.zip"
+}
+
+resource "aws_lambda_layer_version" "shared" {
+  layer_name          = "${local.name_prefix}-shared"
+  filename            = data.archive_file.shared_layer.output_path
+  source_code_hash    = data.archive_file.shared_layer.output_base64sha256
+  compatible_runtimes = [var.lambda_runtime]
+}
+
 # Lambda Functions
 module "lambda_ingestor" {
   source = "./modules/lambda"
@@ -340,7 +487,8 @@ module "lambda_ingestor" {
   handler       = "handler.lambda_handler"
   runtime       = var.lambda_runtime
 
-  source_dir = "${local.lambda_source_dir}/ingestor"
+  source_dir    = "${local.lambda_source_dir}/ingestor"
+  lambda_layers = [aws_lambda_layer_version.shared.arn]
 
   role_arn = module.iam_ingestor.role_arn
 
@@ -351,6 +499,9 @@ module "lambda_ingestor" {
     ENVIRONMENT          = var.environment
     PROCESSING_QUEUE_URL = module.sqs_processing.queue_url
     ALERTS_TABLE         = module.dynamodb_alerts.table_name
+    ANALYSIS_CACHE_TABLE = module.dynamodb_cache.table_name
+    DEPLOY_SCOPES        = jsonencode(var.deploy_scopes)
+    ALERT_MESSAGE_GROUPS = var.alert_message_groups
   }
 
   tags = local.common_tags
@@ -364,7 +515,8 @@ module "lambda_analyzer" {
   handler       = "handler.lambda_handler"
   runtime       = var.lambda_runtime
 
-  source_dir = "${local.lambda_source_dir}/analyzer"
+  source_dir    = "${local.lambda_source_dir}/analyzer"
+  lambda_layers = [aws_lambda_layer_version.shared.arn]
 
   role_arn = module.iam_analyzer.role_arn
 
@@ -373,16 +525,33 @@ module "lambda_analyzer" {
 
   environment_variables = merge(
     {
-      ENVIRONMENT            = var.environment
-      AI_PROVIDER            = var.ai_provider
-      ALERTS_TABLE           = module.dynamodb_alerts.table_name
-      ANALYSIS_CACHE_TABLE   = module.dynamodb_cache.table_name
-      DISTRIBUTION_QUEUE_URL = module.sqs_distribution.queue_url
+      ENVIRONMENT                = var.environment
+      AI_PROVIDER                = var.ai_provider
+      AI_SECONDARY_PROVIDER      = var.ai_secondary_provider
+      ALERTS_TABLE               = module.dynamodb_alerts.table_name
+      ANALYSIS_CACHE_TABLE       = module.dynamodb_cache.table_name
+      SIGNATURE_STATS_TABLE      = module.dynamodb_signature_stats.table_name
+      DISTRIBUTION_QUEUE_URL     = module.sqs_distribution.queue_url
+      PROCESSING_QUEUE_URL       = module.sqs_processing.queue_url
+      PROCESSING_VISIBILITY      = tostring(var.processing_queue_visibility_timeout)
+      ANALYZER_PACK_SIZE         = tostring(var.analyzer_batch_size)
+      LLM_STREAMING              = tostring(var.analyzer_streaming)
+      RUNBOOK_ENRICHMENT         = tostring(var.runbook_enrichment)
+      ROUTING_POLICY             = var.analyzer_routing_policy
+      ANALYSIS_CODEC             = var.analysis_codec
+      CORRELATION_WINDOW_SECONDS = tostring(var.correlation_window_seconds)
+      CORRELATION_SIGNALS        = var.correlation_signals
+      CLASSIFIER_THRESHOLD       = tostring(var.classifier_threshold)
+      ALERT_MESSAGE_GROUPS       = var.alert_message_groups
+      IDEMPOTENCY_TABLE          = module.dynamodb_idempotency.table_name
+      IDEMPOTENCY_TTL_SECONDS    = tostring(var.idempotency_ttl_hours * 3600)
+      QUARANTINE_TABLE           = module.dynamodb_quarantine.table_name
+      QUARANTINE_TTL_SECONDS     = tostring(var.quarantine_retention_days * 86400)
     },
-    var.ai_provider == "anthropic" ? {
+    contains(local.ai_providers, "anthropic") ? {
       ANTHROPIC_API_KEY_PARAM = aws_ssm_parameter.anthropic_api_key[0].name
     } : {},
-    var.ai_provider == "google" ? {
+    contains(local.ai_providers, "google") ? {
       GOOGLE_API_KEY_PARAM = aws_ssm_parameter.google_api_key[0].name
     } : {}
   )
@@ -400,7 +569,8 @@ module "lambda_slack_notifier" {
   handler       = "handler.lambda_handler"
   runtime       = var.lambda_runtime
 
-  source_dir = "${local.lambda_source_dir}/slack_notifier"
+  source_dir    = "${local.lambda_source_dir}/slack_notifier"
+  lambda_layers = [aws_lambda_layer_version.shared.arn]
 
   role_arn = module.iam_notifier.role_arn
 
@@ -408,9 +578,11 @@ module "lambda_slack_notifier" {
   timeout     = var.notifier_timeout
 
   environment_variables = {
-    ENVIRONMENT           = var.environment
-    ALERTS_TABLE          = module.dynamodb_alerts.table_name
-    SLACK_WEBHOOK_SECRET  = data.aws_secretsmanager_secret.slack_webhook.name
+    ENVIRONMENT             = var.environment
+    ALERTS_TABLE            = module.dynamodb_alerts.table_name
+    SLACK_WEBHOOK_SECRET    = data.aws_secretsmanager_secret.slack_webhook.name
+    IDEMPOTENCY_TABLE       = module.dynamodb_idempotency.table_name
+    IDEMPOTENCY_TTL_SECONDS = tostring(var.idempotency_ttl_hours * 3600)
   }
 
   tags = local.common_tags
@@ -420,8 +592,12 @@ module "lambda_slack_notifier" {
 resource "aws_lambda_event_source_mapping" "analyzer_sqs" {
   event_source_arn = module.sqs_processing.queue_arn
   function_name    = module.lambda_analyzer.function_arn
-  batch_size       = 1
-  enabled          = true
+  batch_size       = var.analyzer_batch_size
+  enabled          = var.analyzer_event_source_enabled
+
+  # Alerts being analyzed (or posted) by another invocation are reported
+  # back and redelivered; the rest of the batch is deleted
+  function_response_types = ["ReportBatchItemFailures"]
 
   scaling_config {
     maximum_concurrency = 10
@@ -431,8 +607,12 @@ resource "aws_lambda_event_source_mapping" "analyzer_sqs" {
 resource "aws_lambda_event_source_mapping" "notifier_sqs" {
   event_source_arn = module.sqs_distribution.queue_arn
   function_name    = module.lambda_slack_notifier.function_arn
-  batch_size       = 1
+  batch_size       = var.notifier_batch_size
   enabled          = true
+
+  # Alerts being analyzed (or posted) by another invocation are reported
+  # back and redelivered; the rest of the batch is deleted
+  function_response_types = ["ReportBatchItemFailures"]
 }
 
 # EventBridge Rule for CloudWatch Events
@@ -466,6 +646,33 @@ resource "aws_lambda_permission" "eventbridge_invoke_ingestor" {
   source_arn    = module.eventbridge.rule_arn
 }
 
+# EventBridge Rule for finished deployments and rollbacks: the ingestor bumps
+# the deployed service's cache generations
+module "eventbridge_deploys" {
+  source = "./modules/eventbridge"
+
+  rule_name        = "${local.name_prefix}-deploy-invalidation"
+  rule_description = "Routes finished CodeDeploy and ECS deployments to the ingestor to invalidate cached analyses"
+  rule_state       = var.deploy_invalidation_rule_state
+
+  event_pattern = jsonencode({
+    source      = ["aws.codedeploy", "aws.ecs"]
+    detail-type = ["CodeDeploy Deployment State-change Notification", "ECS Deployment State Change"]
+  })
+
+  target_arn = module.lambda_ingestor.function_arn
+
+  tags = local.common_tags
+}
+
+resource "aws_lambda_permission" "eventbridge_deploys_invoke_ingestor" {
+  statement_id  = "AllowExecutionFromEventBridgeDeploys"
+  action        = "lambda:InvokeFunction"
+  function_name = module.lambda_ingestor.function_name
+  principal     = "events.amazonaws.com"
+  source_arn    = module.eventbridge_deploys.rule_arn
+}
+
 # CloudWatch Alarms
 resource "aws_cloudwatch_metric_alarm" "processing_dlq_alarm" {
   count = var.enable_cloudwatch_alarms ? 1 : 0
@@ -507,6 +714,22 @@ resource "aws_cloudwatch_metric_alarm" "distribution_dlq_alarm" {
   tags = local.common_tags
 }
 
+resource "aws_cloudwatch_metric_alarm" "quarantine_alarm" {
+  count = var.enable_cloudwatch_alarms ? 1 : 0
+
+  alarm_name          = "${local.name_prefix}-quarantine-alarm"
+  alarm_description   = "Alert when the analyzer quarantines messages it can never process"
+  comparison_operator = "GreaterThanThreshold"
+  evaluation_periods  = 1
+  metric_name         = "MessagesQuarantined"
+  namespace           = "MCPFirstResponder"
+  period              = 300
+  statistic           = "Sum"
+  threshold           = var.dlq_alarm_threshold
+
+  tags = local.common_tags
+}
+
 resource "aws_cloudwatch_metric_alarm" "analyzer_errors" {
   count = var.enable_cloudwatch_alarms ? 1 : 0
 
@@ -71,6 +71,16 @@ output "alerts_table_arn" {
   value       = module.dynamodb_alerts.table_arn
 }
 
+output "quarantine_table_name" {
+  description = "Name of the DynamoDB table of quarantined processing queue messages"
+  value       = module.dynamodb_quarantine.table_name
+}
+
+output "alert_message_groups" {
+  description = "How alerts are assigned to processing queue message groups"
+  value       = var.alert_message_groups
+}
+
 output "analysis_cache_table_name" {
   description = "Name of the analysis cache DynamoDB table"
   value       = module.dynamodb_cache.table_name
@@ -81,6 +91,11 @@ output "analysis_cache_table_arn" {
   value       = module.dynamodb_cache.table_arn
 }
 
+output "signature_stats_table_name" {
+  description = "Name of the signature stats DynamoDB table"
+  value       = module.dynamodb_signature_stats.table_name
+}
+
 # EventBridge Outputs
 output "eventbridge_rule_name" {
   description = "Name of the EventBridge rule"
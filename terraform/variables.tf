@@ -36,6 +36,16 @@ variable "ai_provider" {
   }
 }
 
+variable "ai_secondary_provider" {
+  description = "Optional second AI provider; requests are hedged to it when the primary is slower than its p95 latency"
+  type        = string
+  default     = ""
+  validation {
+    condition     = contains(["", "anthropic", "google"], var.ai_secondary_provider)
+    error_message = "Secondary AI provider must be empty, 'anthropic' or 'google'."
+  }
+}
+
 # Secrets Configuration
 variable "anthropic_api_key" {
   description = "Anthropic API key for Claude (stored in SSM Parameter Store)"
@@ -128,6 +138,78 @@ variable "analyzer_timeout" {
   default     = 900
 }
 
+variable "analyzer_batch_size" {
+  description = "SQS batch size for the analyzer; alerts in a batch are packed into one LLM prompt"
+  type        = number
+  default     = 1
+  validation {
+    condition     = var.analyzer_batch_size >= 1 && var.analyzer_batch_size <= 10
+    error_message = "Analyzer batch size must be between 1 and 10 (FIFO queue limit)."
+  }
+}
+
+variable "analyzer_event_source_enabled" {
+  description = "Invoke the analyzer Lambda from the processing queue; disable while the long-running worker (lambdas/analyzer/worker.py) consumes it"
+  type        = bool
+  default     = true
+}
+
+variable "alert_message_groups" {
+  description = "Processing queue message groups: single (one group, one batch in flight at a time) or log_group (a group per log group, batches analyzed concurrently)"
+  type        = string
+  default     = "single"
+  validation {
+    condition     = contains(["single", "log_group"], var.alert_message_groups)
+    error_message = "Alert message groups must be single or log_group."
+  }
+}
+
+variable "analyzer_streaming" {
+  description = "Stream LLM responses and send a preliminary analysis as soon as severity and cause are known"
+  type        = bool
+  default     = false
+}
+
+variable "analyzer_routing_policy" {
+  description = "Model tiering policy as JSON (see lambdas/analyzer/routing.json); empty uses the packaged policy"
+  type        = string
+  default     = ""
+}
+
+variable "runbook_enrichment" {
+  description = "Send runbook-matched analyses as preliminary and follow up with an LLM analysis"
+  type        = bool
+  default     = false
+}
+
+variable "analysis_codec" {
+  description = "Layout of stored alert records: native attributes, or message/analysis compressed into one binary attribute (zlib, or zstd when the zstandard package is bundled)"
+  type        = string
+  default     = "native"
+  validation {
+    condition     = contains(["native", "zlib", "zstd"], var.analysis_codec)
+    error_message = "Analysis codec must be native, zlib or zstd."
+  }
+}
+
+variable "correlation_window_seconds" {
+  description = "Alerts sharing a trace ID, dependency host or message template within this many seconds are analyzed and posted as one incident (0 disables)"
+  type        = number
+  default     = 30
+}
+
+variable "correlation_signals" {
+  description = "Comma-separated signals alerts are correlated by: trace, host, template, error (exception type; merges more aggressively)"
+  type        = string
+  default     = "trace,host,template"
+}
+
+variable "classifier_threshold" {
+  description = "Confidence at which the analyzer's local classifier answers a routine alert without the LLM (needs a packaged model file)"
+  type        = number
+  default     = 0.9
+}
+
 variable "notifier_memory_size" {
   description = "Memory size (MB) for notifier Lambdas"
   type        = number
@@ -140,6 +222,16 @@ variable "notifier_timeout" {
   default     = 300
 }
 
+variable "notifier_batch_size" {
+  description = "SQS batch size for the notifier; distribution status writes for a batch are sent together"
+  type        = number
+  default     = 10
+  validation {
+    condition     = var.notifier_batch_size >= 1 && var.notifier_batch_size <= 10
+    error_message = "Notifier batch size must be between 1 and 10 (FIFO queue limit)."
+  }
+}
+
 # SQS Configuration
 variable "processing_queue_visibility_timeout" {
   description = "Visibility timeout (seconds) for processing queue"
@@ -184,6 +276,18 @@ variable "cache_ttl_hours" {
   default     = 24
 }
 
+variable "idempotency_ttl_hours" {
+  description = "How long the record of an alert's analysis or Slack post is kept to skip duplicate deliveries (hours)"
+  type        = number
+  default     = 6
+}
+
+variable "quarantine_retention_days" {
+  description = "How long messages the analyzer quarantined are kept for inspection and replay (days)"
+  type        = number
+  default     = 14
+}
+
 # EventBridge Configuration
 variable "eventbridge_rule_state" {
   description = "State of EventBridge rule (ENABLED or DISABLED)"
@@ -201,6 +305,22 @@ variable "cloudwatch_log_group_patterns" {
   default     = ["/aws/lambda/*"]
 }
 
+variable "deploy_invalidation_rule_state" {
+  description = "State of the rule routing CodeDeploy/ECS deployment events to the ingestor to invalidate cached analyses (ENABLED or DISABLED)"
+  type        = string
+  default     = "ENABLED"
+  validation {
+    condition     = contains(["ENABLED", "DISABLED"], var.deploy_invalidation_rule_state)
+    error_message = "Deploy invalidation rule state must be ENABLED or DISABLED."
+  }
+}
+
+variable "deploy_scopes" {
+  description = "Log groups whose cached analyses a deployment invalidates, by CodeDeploy application or ECS service name; unlisted services use /ecs/<name>, /aws/ecs/<name> and /aws/lambda/<name>"
+  type        = map(list(string))
+  default     = {}
+}
+
 # CloudWatch Logs Subscription Filter Configuration
 variable "enable_test_app_monitoring" {
   description = "Enable monitoring for test application log group"
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Benchmark the analysis cache under hot signatures and an LLM outage.
+
+Replays three simulated hours of alerts (a few hot signatures firing every
+few seconds, a long tail of rare ones) against two cache policies on the
+in-memory DynamoDB stand-in, with a simulated clock: an LLM call takes
+--llm-seconds, and during a 20 minute outage it fails after
+--timeout-seconds. Results land in the cache only when the call finishes,
+so alerts arriving meanwhile see the old state - as concurrent Lambda
+invocations would.
+
+  archived - the old check_analysis_cache: entries older than one hour
+             are misses, every miss calls the LLM
+  swr      - AnalysisCache: stale entries are served while one leased
+             refresh runs, failures are cached briefly as negative entries
+
+Reports LLM calls (and failed ones), alert latency percentiles overall and
+for hot signatures once they have been analyzed, and stale answers served.
+"""
+
+import argparse
+import heapq
+import os
+import random
+import sys
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+from dynamodb_local import LocalTable
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'lambdas', 'analyzer'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'lambdas', 'shared', 'python'))
+
+from analysis_cache import AnalysisCache
+
+CACHE_SECONDS = 0.005
+HOUR = 3600
+
+
+def alerts(rng, hours, hot, tail):
+    events = []
+    for signature in range(hot):
+        t = rng.uniform(0, 10)
+        while t < hours * HOUR:
+            events.append((t, f"hot-{signature}"))
+            t += rng.expovariate(1 / 6)
+    for _ in range(tail):
+        events.append((rng.uniform(0, hours * HOUR), f"rare-{rng.randrange(tail // 3)}"))
+    return sorted(events)
+
+
+class Simulation:
+    """Clock, in-flight LLM calls and their landing writes"""
+
+    def __init__(self, llm_seconds, timeout_seconds, outage):
+        self.llm_seconds = llm_seconds
+        self.timeout_seconds = timeout_seconds
+        self.outage = outage
+        self.landing = []
+        self.calls = self.failures = 0
+        self.seq = 0
+
+    def llm(self, t, on_success, on_failure):
+        """Start an LLM call at t; returns its latency"""
+        self.calls += 1
+        failed = self.outage[0] <= t < self.outage[1]
+        latency = self.timeout_seconds if failed else self.llm_seconds
+        self.failures += failed
+        self.seq += 1
+        heapq.heappush(self.landing, (t + latency, self.seq, on_failure if failed else on_success))
+        return latency
+
+    def advance(self, t):
+        while self.landing and self.landing[0][0] <= t:
+            at, _, land = heapq.heappop(self.landing)
+            land(at)
+
+
+def run_archived(events, sim):
+    cache = {}
+    latencies = []
+    for t, signature in events:
+        sim.advance(t)
+        cached_at = cache.get(signature)
+        if cached_at is not None and t - cached_at < HOUR:
+            latencies.append((signature, CACHE_SECONDS, False))
+            continue
+        latency = sim.llm(t, lambda at, s=signature: cache.__setitem__(s, at), lambda at: None)
+        latencies.append((signature, latency, True))
+    return latencies, 0
+
+
+def run_swr(events, sim):
+    cache = AnalysisCache(LocalTable('error_signature'), fresh_seconds=HOUR, max_age_seconds=24 * HOUR)
+    report = {'summary': 'cached', 'severity': 'HIGH'}
+    latencies = []
+    stale = 0
+
+    def stored(signature):
+        return lambda at: cache.store(signature, report, 'model', now=at)
+
+    def failed(signature):
+        return lambda at: cache.record_failure(signature, now=at)
+
+    for t, signature in events:
+        sim.advance(t)
+        entry = cache.lookup(signature, now=t)
+        if entry is None:
+            latencies.append((signature, sim.llm(t, stored(signature), failed(signature)), True))
+            continue
+        if entry.state == 'stale':
+            stale += 1
+            if cache.acquire_lease(signature, now=t):
+                sim.llm(t, stored(signature), failed(signature))
+        latencies.append((signature, CACHE_SECONDS, False))
+    return latencies, stale
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))] if ordered else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--hours', type=int, default=3)
+    parser.add_argument('--hot', type=int, default=5)
+    parser.add_argument('--tail', type=int, default=600)
+    parser.add_argument('--llm-seconds', type=float, default=4.0)
+    parser.add_argument('--timeout-seconds', type=float, default=10.0)
+    parser.add_argument('--seed', type=int, default=9)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    events = alerts(random.Random(args.seed), args.hours, args.hot, args.tail)
+    # Covers the moment the hot signatures' first entries go stale
+    outage = (HOUR - 60, HOUR + 1140)
+
+    print(f"{len(events):,} alerts over {args.hours} h, {args.hot} hot signatures; LLM {args.llm_seconds:.0f} s, "
+          f"outage {outage[0] / HOUR:.2f}-{outage[1] / HOUR:.2f} h failing after {args.timeout_seconds:.0f} s\n")
+    print(f"{'policy':>9} {'LLM calls':>10} {'failed':>7} {'stale':>6} {'p50 s':>6} {'p99 s':>6} "
+          f"{'hot p99 s':>10} {'hot max s':>10} {'hot LLM waits':>14}")
+
+    for name, run in (('archived', run_archived), ('swr', run_swr)):
+        sim = Simulation(args.llm_seconds, args.timeout_seconds, outage)
+        latencies, stale = run(events, sim)
+
+        # Hot signatures once their first analysis has landed
+        hot = []
+        first_done = {}
+        for (t, signature), (_, latency, waited) in zip(events, latencies):
+            if signature.startswith('hot-'):
+                if signature in first_done and t >= first_done[signature]:
+                    hot.append((latency, waited))
+                elif waited and signature not in first_done:
+                    first_done[signature] = t + latency
+        all_latencies = [latency for _, latency, _ in latencies]
+        hot_latencies = [latency for latency, _ in hot]
+
+        print(f"{name:>9} {sim.calls:>10,} {sim.failures:>7,} {stale:>6,} {percentile(all_latencies, 50):>6.3f} "
+              f"{percentile(all_latencies, 99):>6.2f} {percentile(hot_latencies, 99):>10.3f} "
+              f"{max(hot_latencies):>10.3f} {sum(waited for _, waited in hot):>14,}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Size and cost report for the stored alert record layouts.
+
+Builds alert records the way the analyzer does (alert_record) for a mix of
+messages - one-line errors, Python and Java stack traces, large JSON log
+lines - with full incident reports, and stores each with blobs.encode in
+every available layout:
+
+  native - every field a native attribute
+  zlib   - message and analysis in one zlib-compressed binary attribute
+  zstd   - the same with zstd (only if the zstandard package is installed)
+
+Reports mean item size, WCU per write and RCU per read (eventually
+consistent and strongly consistent), encode and decode time, and the cost
+of a read that only touches native fields (decoding stays lazy).
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+from dynamodb_local import item_size
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'lambdas', 'analyzer'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'lambdas', 'shared', 'python'))
+
+import blobs
+import handler
+
+PYTHON_TRACE = '''Traceback (most recent call last):
+  File "/var/task/app/orders.py", line {n}, in create_order
+    payment = gateway.charge(order.total, order.card_token)
+  File "/var/task/app/gateway.py", line 88, in charge
+    response = self.session.post(self.url, json=payload, timeout=self.timeout)
+  File "/var/lang/lib/python3.11/site-packages/requests/sessions.py", line 637, in post
+    return self.request("POST", url, data=data, json=json, **kwargs)
+  File "/var/lang/lib/python3.11/site-packages/requests/adapters.py", line 532, in send
+    raise ReadTimeout(e, request=request)
+requests.exceptions.ReadTimeout: HTTPSConnectionPool(host='payments.internal', port=443): Read timed out. (read timeout=30)'''
+
+JAVA_TRACE = '\n'.join(
+    ['java.lang.IllegalStateException: Connection pool exhausted (active=50, idle=0, waiting={n})'] +
+    [f"\tat com.example.orders.service.Layer{i}.handle(Layer{i}.java:{100 + i})" for i in range(40)]
+)
+
+
+def message(rng, n):
+    kind = rng.choice(['line', 'python', 'java', 'json'])
+    if kind == 'line':
+        return f"[ERROR] Database connection timeout after 30s on orders-db-{n % 4}"
+    if kind == 'python':
+        return PYTHON_TRACE.format(n=n)
+    if kind == 'java':
+        return JAVA_TRACE.format(n=n)
+    return json.dumps({'level': 'ERROR', 'request_id': f"{rng.getrandbits(64):016x}", 'path': '/v1/orders',
+                       'headers': {f"x-header-{i}": 'v' * 20 for i in range(15)}, 'error': 'upstream 502'})
+
+
+def report(rng):
+    return {
+        'summary': 'Payment gateway timeouts are failing order creation',
+        'severity': rng.choice(['CRITICAL', 'HIGH', 'MEDIUM']),
+        'severity_assessment': 'Customer-facing checkout path is failing for a share of requests. ' * 2,
+        'root_cause_hypothesis': 'The payments service is saturated; the client retries amplify load. ' * 3,
+        'affected_components': ['orders-api', 'payments-gateway', 'checkout-web'],
+        'impact_assessment': 'Orders fail at checkout; revenue impact proportional to error rate. ' * 2,
+        'remediation_steps': [f"Step {i}: check gateway latency dashboards and recent deploys, "
+                              f"then scale or roll back as needed" for i in range(6)],
+        'monitoring_recommendations': ['Alert on p99 gateway latency', 'Track retry rate per client'],
+        'related_documentation': ['https://runbooks.example.com/payments/timeouts'],
+        'confidence_level': 'MEDIUM',
+        'requires_immediate_attention': True,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--records', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=3)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    records = [
+        handler.alert_record({'alert_id': f"alert-{n}", 'message': message(rng, n), 'severity': 'HIGH',
+                              'source': 'cloudwatch_logs', 'timestamp': 1_700_000_000_000 + n}, report(rng), 'model')
+        for n in range(args.records)
+    ]
+
+    codecs = ['native', 'zlib'] + (['zstd'] if blobs.zstandard else [])
+    print(f"{args.records} records" + ('' if blobs.zstandard else ' (zstandard not installed, zstd skipped)') + '\n')
+    print(f"{'layout':>7} {'mean B':>7} {'p95 B':>7} {'WCU/write':>10} {'RCU/read':>9} {'RCU strong':>11} "
+          f"{'encode us':>10} {'decode us':>10} {'title-only us':>14}")
+
+    for codec in codecs:
+        start = time.perf_counter()
+        stored = [blobs.encode(record, codec) for record in records]
+        encode_us = (time.perf_counter() - start) * 1e6 / len(records)
+
+        sizes = sorted(item_size(item) for item in stored)
+        wcu = statistics.mean(-(-size // 1024) for size in sizes)
+        rcu_strong = statistics.mean(-(-size // 4096) for size in sizes)
+
+        start = time.perf_counter()
+        titles = [blobs.decode(item)['title'] for item in stored]
+        title_us = (time.perf_counter() - start) * 1e6 / len(records)
+
+        start = time.perf_counter()
+        for item, record in zip(stored, records):
+            decoded = blobs.decode(item)
+            assert decoded['analysis'] == record['analysis'] and decoded['message'] == record['message']
+        decode_us = (time.perf_counter() - start) * 1e6 / len(records)
+        assert len(titles) == len(records)
+
+        print(f"{codec:>7} {statistics.mean(sizes):>7.0f} {sizes[int(len(sizes) * 0.95)]:>7} {wcu:>10.2f} "
+              f"{rcu_strong / 2:>9.2f} {rcu_strong:>11.2f} {encode_us:>10.1f} {decode_us:>10.1f} {title_us:>14.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Benchmark invalidating cached analyses when a service deploys.
+
+Fills the analysis cache (on the in-memory DynamoDB stand-in) with --entries
+analyses spread over --scopes log groups, deploys the busiest log group's
+service, and replays the next --minutes of lookups from --containers
+analyzer containers on a simulated clock. Three policies:
+
+  ttl         - do nothing: entries live out their 24 h expiry
+  scan-delete - a job scans the cache for the scope's entries and deletes
+                them one by one (--request-ms per request)
+  generations - the deploy bumps the scope's generation (one UpdateItem);
+                containers see it once their memoized generation expires
+
+Reports the invalidation's requests, RCU/WCU and duration, how many
+post-deploy lookups for the deployed scope still returned a pre-deploy
+analysis, and the generation reads added to steady-state lookups.
+"""
+
+import argparse
+import os
+import random
+import sys
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+from dynamodb_local import LocalTable, item_size
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'lambdas', 'analyzer'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'lambdas', 'shared', 'python'))
+
+from analysis_cache import AnalysisCache
+from generations import Generations
+
+REPORT = {'summary': 'Connection pool exhausted on the orders database', 'severity': 'HIGH',
+          'root_cause_hypothesis': 'Pool size too small for the current release. ' * 8,
+          'remediation_steps': [f"Step {i}: raise the pool size and recycle the tasks" for i in range(5)]}
+
+
+def populate(table, generations, entries, scopes, rng):
+    """(signature, scope) per entry; scope 0 is the busiest"""
+    weights = [1 / (rank + 1) for rank in range(scopes)]
+    cache = AnalysisCache(table, generations=generations)
+    keys = []
+    for n in range(entries):
+        scope = f"/ecs/service-{rng.choices(range(scopes), weights=weights)[0]}"
+        signature = f"{rng.getrandbits(64):016x}"
+        cache.store(signature, REPORT, 'model', now=0, scope=scope)
+        keys.append((signature, scope))
+    return keys
+
+
+def lookups(keys, containers, minutes, rate, rng):
+    """(t, container, signature, scope) after a deploy at t=0; popular entries recur"""
+    weights = [1 / (rank + 1) ** 0.8 for rank in range(len(keys))]
+    count = int(minutes * 60 * rate)
+    times = sorted(rng.uniform(0, minutes * 60) for _ in range(count))
+    chosen = rng.choices(keys, weights=weights, k=count)
+    return [(t, rng.randrange(containers), signature, scope) for t, (signature, scope) in zip(times, chosen)]
+
+
+def replay(table, generations_for, events, deployed, invalidated_at):
+    """Pre-deploy answers for the deployed scope, and re-analyses (misses) after the deploy"""
+    caches = {}
+    stale = misses = 0
+    for t, container, signature, scope in events:
+        if container not in caches:
+            caches[container] = AnalysisCache(table, generations=generations_for(container))
+        cache = caches[container]
+        if invalidated_at.get(signature, float('inf')) <= t:
+            del invalidated_at[signature]
+            table.delete_item(Key={'error_signature': signature})
+        entry = cache.lookup(signature, now=1800 + t)
+        if entry is None:
+            misses += 1
+            cache.store(signature, {**REPORT, 'summary': 'post-deploy'}, 'model', now=1800 + t, scope=scope)
+        elif scope == deployed and entry.report['summary'] == REPORT['summary']:
+            stale += 1
+    return stale, misses
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--entries', type=int, default=50000)
+    parser.add_argument('--scopes', type=int, default=100)
+    parser.add_argument('--containers', type=int, default=10)
+    parser.add_argument('--minutes', type=int, default=10)
+    parser.add_argument('--rate', type=float, default=20.0, help='alerts per second')
+    parser.add_argument('--memo-seconds', type=int, default=10)
+    parser.add_argument('--request-ms', type=float, default=5.0)
+    parser.add_argument('--seed', type=int, default=4)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    random.seed(args.seed)
+    seed_table, seed_generations = LocalTable('error_signature'), LocalTable('error_signature')
+    # Some earlier deploy created the generations map
+    Generations(seed_generations).bump(f"/ecs/service-{args.scopes - 1}", 'earlier deploy', now=0)
+    keys = populate(seed_table, Generations(seed_generations), args.entries, args.scopes, rng)
+    deployed = '/ecs/service-0'
+    in_scope = sum(scope == deployed for _, scope in keys)
+    events = lookups(keys, args.containers, args.minutes, args.rate, rng)
+    deployed_lookups = sum(scope == deployed for *_, scope in events)
+
+    print(f"{args.entries:,} cached analyses over {args.scopes} log groups; deploying {deployed} "
+          f"({in_scope:,} entries); {len(events):,} lookups from {args.containers} containers over "
+          f"{args.minutes} min ({deployed_lookups:,} for {deployed})\n")
+    print(f"{'policy':>12} {'requests':>9} {'RCU':>8} {'WCU':>7} {'duration s':>11} {'stale answers':>14} "
+          f"{'re-analyses':>12} {'gen reads/1k lookups':>21}")
+
+    for policy in ('ttl', 'scan-delete', 'generations'):
+        table = LocalTable('error_signature')
+        table.items = {key: dict(item) for key, item in seed_table.items.items()}
+        generation_table = LocalTable('error_signature')
+        generation_table.items = {key: dict(item) for key, item in seed_generations.items.items()}
+        invalidated_at = {}
+        duration = 0.0
+        memos = {c: Generations(generation_table, memo_seconds=args.memo_seconds) for c in range(args.containers)}
+
+        if policy == 'scan-delete':
+            kwargs = {'FilterExpression': '#scope = :scope', 'ExpressionAttributeNames': {'#scope': 'scope'},
+                      'ExpressionAttributeValues': {':scope': deployed}, 'ProjectionExpression': 'error_signature'}
+            matched = []
+            while True:
+                response = table.scan(**kwargs)
+                duration += args.request_ms / 1000
+                matched += [item['error_signature'] for item in response['Items']]
+                if 'LastEvaluatedKey' not in response:
+                    break
+                kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+            for signature in matched:
+                duration += args.request_ms / 1000
+                invalidated_at[signature] = duration
+            # The deletes themselves are applied during the replay, when they land
+            cost = {'requests': table.stats['requests'] + len(matched), 'rcu': table.stats['rcu'],
+                    'wcu': sum(max(1, -(-item_size(table.items[s]) // 1024)) for s in matched)}
+        elif policy == 'generations':
+            # Each container last read the scope's generation somewhere in
+            # the memo window before the deploy
+            for memo in memos.values():
+                memo.current(deployed, now=1800 - rng.uniform(0, args.memo_seconds))
+            generation_table.reset_stats()
+            Generations(generation_table).bump(deployed, 'bench', now=1800)
+            duration = args.request_ms / 1000
+            cost = dict(generation_table.stats)
+        else:
+            cost = {'requests': 0, 'rcu': 0.0, 'wcu': 0}
+
+        generation_table.reset_stats()
+
+        def generations_for(container):
+            return memos[container] if policy == 'generations' else None
+
+        stale, misses = replay(table, generations_for, events, deployed, invalidated_at)
+        reads = generation_table.stats['requests'] * 1000 / len(events)
+        print(f"{policy:>12} {cost['requests']:>9,} {cost['rcu']:>8,.1f} {cost['wcu']:>7,.0f} {duration:>11.3f} "
+              f"{stale:>14,} {misses:>12,} {reads:>21.1f}")
+
+
+if __name__ == '__main__':
+    main()
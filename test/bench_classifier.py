@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Benchmark the analyzer's local alert classifier.
+
+Fills the in-memory alerts table stand-in with --history synthetic
+analyzed alerts (routine WARN-level templates like test_app.py's "High CPU
+usage detected", errors, and warnings that do matter, such as expiring
+certificates; some templates are ambiguous once numbers are masked, and a
+few labels are flipped as an LLM would be inconsistent), trains the
+classifier through tools/train_classifier.py's pipeline, then replays
+--alerts new alerts - --novel of them from templates never seen in
+training - at each --thresholds confidence.
+
+Reports LLM calls avoided, alerts that needed the LLM but were skipped,
+the category (severity) accuracy on skipped alerts, and per-alert
+inference time, next to a naive rule skipping every MEDIUM/LOW alert.
+Also prints training time, model file size and load time.
+
+Needs numpy.
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+from dynamodb_local import LocalTable
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'lambdas', 'analyzer'))
+sys.path.insert(0, os.path.join(ROOT, 'lambdas', 'shared', 'python'))
+sys.path.insert(0, os.path.join(ROOT, 'tools'))
+
+SERVICES = ['orders', 'payments', 'search', 'auth', 'inventory', 'cart', 'gateway', 'billing', 'media', 'reports']
+WORDS = ['customer_id', 'currency', 'sku', 'tenant', 'locale', 'coupon', 'region', 'plan']
+
+# (template, ingest severity, weight, [(analyzed severity, needs the LLM, probability)])
+TEMPLATES = [
+    ("[WARNING] High CPU usage detected: {n}% sustained over {n} minutes", 'MEDIUM', 12,
+     [('MEDIUM', False, 0.9), ('HIGH', True, 0.1)]),
+    ("[WARNING] Slow query on {svc}.{word} took {n}ms", 'MEDIUM', 10, [('LOW', False, 1.0)]),
+    ("[WARNING] Retrying request to {svc}-api (attempt {n}/3)", 'MEDIUM', 10, [('LOW', False, 1.0)]),
+    ("[WARNING] Cache hit ratio dropped to {n}% on {svc}", 'MEDIUM', 6, [('MEDIUM', False, 1.0)]),
+    ("[INFO] Deprecated endpoint /v1/{svc} called by client {hex}", 'LOW', 6, [('LOW', False, 1.0)]),
+    ("[WARNING] GC pause of {n}ms in {svc}-worker", 'MEDIUM', 5, [('LOW', False, 0.95), ('HIGH', True, 0.05)]),
+    ("[WARNING] Disk usage at {n}% on /var/lib/{svc}", 'MEDIUM', 6, [('MEDIUM', False, 0.5), ('HIGH', True, 0.5)]),
+    ("[WARNING] Connection pool {n}% utilized for {svc}-db", 'MEDIUM', 5,
+     [('MEDIUM', False, 0.7), ('HIGH', True, 0.3)]),
+    ("[WARNING] Certificate for {svc}.example.com expires in {n} days", 'MEDIUM', 3, [('HIGH', True, 1.0)]),
+    ("[WARNING] Replication lag {n}s on {svc}-db replica", 'MEDIUM', 3,
+     [('HIGH', True, 0.7), ('MEDIUM', False, 0.3)]),
+    ("[ERROR] Database connection failed: Connection timeout after {n}s\n"
+     "psycopg2.OperationalError: could not connect to server", 'HIGH', 6, [('HIGH', True, 1.0)]),
+    ("[CRITICAL] Out of memory error in {svc} processing\n"
+     "MemoryError: Unable to allocate {n}MB for transaction batch", 'CRITICAL', 3, [('CRITICAL', True, 1.0)]),
+    ("[ERROR] API request failed: External service timeout\nrequests.exceptions.Timeout: Request to "
+     "https://api.example.com/v1/{svc} timed out", 'HIGH', 5, [('HIGH', True, 0.8), ('MEDIUM', False, 0.2)]),
+    ("[ERROR] S3 upload failed: Access denied\nbotocore.exceptions.ClientError: An error occurred (AccessDenied) "
+     "when calling the PutObject operation", 'HIGH', 4, [('HIGH', True, 1.0)]),
+    ("[ERROR] Unhandled exception in {svc}: KeyError: '{word}'", 'HIGH', 6,
+     [('HIGH', True, 0.75), ('MEDIUM', False, 0.25)]),
+]
+NOVEL = [
+    ("[WARNING] Kafka consumer group {svc}-consumers rebalancing, lag {n} messages", 'MEDIUM', 1,
+     [('HIGH', True, 1.0)]),
+    ("[WARNING] Feature flag {word} evaluation fell back to the default", 'MEDIUM', 1, [('LOW', False, 1.0)]),
+    ("[ERROR] TLS handshake failed with {svc}.partner.example", 'HIGH', 1, [('HIGH', True, 1.0)]),
+]
+FLIP_RATE = 0.03
+
+
+def alert(rng, templates):
+    """(body, analyzed severity, needs the LLM) drawn from weighted templates"""
+    template, severity, _, outcomes = rng.choices(templates, weights=[t[2] for t in templates])[0]
+    message = template.format(svc=rng.choice(SERVICES), word=rng.choice(WORDS), n=rng.randrange(1, 1000),
+                              hex=f"{rng.getrandbits(48):012x}")
+    analyzed, needs_llm, _ = rng.choices(outcomes, weights=[o[2] for o in outcomes])[0]
+    if rng.random() < FLIP_RATE:
+        needs_llm = not needs_llm
+        analyzed = 'HIGH' if needs_llm else 'MEDIUM'
+    return {'message': message, 'severity': severity}, analyzed, needs_llm
+
+
+def history(rng, count, now, days=30):
+    """An alerts table stand-in holding count analyzed alerts, as the analyzer stores them"""
+    import blobs
+
+    table = LocalTable('alert_id')
+    for n in range(count):
+        body, analyzed, needs_llm = alert(rng, TEMPLATES)
+        report = {'summary': body['message'].splitlines()[0], 'severity': analyzed,
+                  'requires_immediate_attention': needs_llm and analyzed in ('CRITICAL', 'HIGH')}
+        model = rng.choices(['gemini-2.5-flash', 'cache', 'runbook'], weights=[80, 15, 5])[0]
+        table.items[f"alert-{n}"] = blobs.encode({
+            'alert_id': f"alert-{n}", 'timestamp': int(now - rng.uniform(0, days * 86400)),
+            'severity': body['severity'], 'source': 'cloudwatch_logs', 'message': body['message'],
+            'analysis': json.dumps(report), 'model': model
+        }, rng.choice(['native', 'zlib']))
+    return table
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))] if ordered else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--history', type=int, default=20000)
+    parser.add_argument('--alerts', type=int, default=5000)
+    parser.add_argument('--novel', type=float, default=0.05, help='share of replayed alerts from unseen templates')
+    parser.add_argument('--thresholds', default='0.8,0.9,0.95,0.99')
+    parser.add_argument('--seed', type=int, default=3)
+    args = parser.parse_args()
+
+    import metrics
+    from train_classifier import examples, fit
+
+    metrics.print = lambda *a, **k: None
+    rng = random.Random(args.seed)
+    now = time.time()
+    data = examples(history(rng, args.history, now), 30, now, {'LOW', 'MEDIUM'})
+    stream = [alert(rng, NOVEL if rng.random() < args.novel else TEMPLATES) for _ in range(args.alerts)]
+    needing = sum(needs_llm for *_, needs_llm in stream)
+
+    with tempfile.TemporaryDirectory() as scratch:
+        path = os.path.join(scratch, 'classifier.npz')
+        start = time.perf_counter()
+        model = fit(data, path, 2 ** 16, 60, 0.9)
+        trained = time.perf_counter() - start
+        start = time.perf_counter()
+        model.predict(stream[0][0])
+        loaded = time.perf_counter() - start
+        print(f"trained on {len(data):,} labelled alerts in {trained:.1f} s; model file "
+              f"{os.path.getsize(path) / 1024:.0f} KB, loaded on first prediction in {loaded * 1000:.0f} ms")
+        print(f"replaying {len(stream):,} alerts, {needing:,} of them needing the LLM\n")
+
+        print(f"{'policy':>22} {'LLM calls':>10} {'avoided':>8} {'needed but skipped':>19} "
+              f"{'category acc.':>14} {'us/alert p50':>13} {'us/alert p99':>13}")
+
+        skipped = [(a, needs) for a, _, needs in stream if a['severity'] in ('MEDIUM', 'LOW')]
+        missed = sum(needs for _, needs in skipped)
+        print(f"{'skip MEDIUM/LOW':>22} {len(stream) - len(skipped):>10,} {len(skipped) / len(stream):>7.0%} "
+              f"{missed:>10,} ({missed / needing:>4.0%}) {'-':>14} {'-':>13} {'-':>13}")
+
+        for threshold in (float(t) for t in args.thresholds.split(',')):
+            model.threshold = threshold
+            timings = []
+            avoided = missed = correct = 0
+            for body, category, needs_llm in stream:
+                start = time.perf_counter()
+                prediction = model.skip(body)
+                timings.append((time.perf_counter() - start) * 1e6)
+                if prediction:
+                    avoided += 1
+                    missed += needs_llm
+                    correct += prediction.category == category
+            print(f"{f'classifier @ {threshold}':>22} {len(stream) - avoided:>10,} {avoided / len(stream):>7.0%} "
+                  f"{missed:>10,} ({missed / needing:>4.0%}) {correct / max(1, avoided):>13.0%} "
+                  f"{percentile(timings, 50):>13.1f} {percentile(timings, 99):>13.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Benchmark prompt context gathering.
+
+Uses stand-in context sources with the latency profile of the real ones
+(a DynamoDB Query, a CloudWatch Logs read and a slow table Scan that
+occasionally stalls) and compares, per alert:
+
+  sequential - archived gather_context: each source in turn, no deadline
+  parallel   - ContextGatherer with caching off: sources fan out under a deadline
+  cached     - ContextGatherer from a cold cache (alerts share severities,
+               log streams and signatures, so later alerts hit the cache)
+  warm       - the same alerts again on the warm container
+
+Reports gather latency percentiles and, per source, calls, cache hits,
+deadline drops and mean latency.
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'lambdas', 'analyzer'))
+
+import context
+import metrics
+from context import ContextGatherer, ContextSource
+
+
+def stand_in(base, jitter, stall_rate=0.0, stall=2.0, seed=0):
+    rng = random.Random(seed)
+
+    def fetch(alert):
+        delay = base + rng.uniform(0, jitter)
+        if rng.random() < stall_rate:
+            delay = stall
+        time.sleep(delay)
+        return {'alert_id': alert['alert_id'], 'fetched_after': delay}
+    return fetch
+
+
+def sources(cache=True):
+    ttl = 300 if cache else 0
+    return [
+        ContextSource('recent_similar_alerts', stand_in(0.04, 0.04, seed=1), lambda a: a['severity'], ttl),
+        ContextSource('log_context', stand_in(0.08, 0.10, seed=2), lambda a: a['log_stream'], ttl),
+        ContextSource('historical_pattern', stand_in(0.25, 0.25, stall_rate=0.1, seed=3), lambda a: a['signature'], ttl),
+    ]
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--alerts', type=int, default=40)
+    parser.add_argument('--deadline', type=float, default=0.5)
+    args = parser.parse_args()
+
+    context.print = metrics.print = lambda *a, **k: None
+    alerts = [
+        {'alert_id': f"bench-{n}", 'severity': ['CRITICAL', 'HIGH', 'MEDIUM'][n % 3],
+         'log_stream': f"stream-{n % 8}", 'signature': f"sig-{n % 12}"}
+        for n in range(args.alerts)
+    ]
+
+    runs = {}
+
+    sequential_sources = sources()
+    samples = []
+    for alert in alerts:
+        start = time.perf_counter()
+        {source.name: source.fetch(alert) for source in sequential_sources}
+        samples.append(time.perf_counter() - start)
+    runs['sequential'] = (samples, None)
+
+    cached = ContextGatherer(sources(), deadline=args.deadline)
+    gatherers = {
+        'parallel': ContextGatherer(sources(cache=False), deadline=args.deadline),
+        'cached': cached,
+        'warm': cached,
+    }
+    for name, gatherer in gatherers.items():
+        if name == 'warm':
+            # Let calls dropped at the deadline finish and fill the cache
+            time.sleep(2.5)
+        gatherer.stats = {}
+        samples = []
+        for alert in alerts:
+            start = time.perf_counter()
+            gatherer.gather(alert)
+            samples.append(time.perf_counter() - start)
+        runs[name] = (samples, dict(gatherer.stats))
+
+    print(f"{args.alerts} alerts, deadline {args.deadline * 1000:.0f} ms\n")
+    print(f"{'mode':>10} {'p50 ms':>7} {'p95 ms':>7} {'max ms':>7}")
+    for name, (samples, _) in runs.items():
+        print(f"{name:>10} {percentile(samples, 50) * 1000:>7.0f} {percentile(samples, 95) * 1000:>7.0f} "
+              f"{max(samples) * 1000:>7.0f}")
+
+    print(f"\n{'mode':>10} {'source':>22} {'calls':>6} {'hits':>5} {'dropped':>8} {'mean ms':>8}")
+    for name in gatherers:
+        for source, stats in sorted(runs[name][1].items()):
+            mean = stats['seconds'] * 1000 / stats['calls'] if stats['calls'] else 0.0
+            print(f"{name:>10} {source:>22} {stats['calls']:>6} {stats['hits']:>5} {stats['timeouts']:>8} {mean:>8.0f}")
+
+
+if __name__ == '__main__':
+    main()
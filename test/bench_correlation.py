@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Replay benchmark for incident correlation.
+
+Generates --minutes of alerts: background noise from 20 services (a pool
+of error templates, some naming their own hosts or generic error types)
+plus an injected incident every --incident-every seconds, one of:
+
+  redis     - five services in three languages fail to reach the same Redis
+  trace     - a slow payments call times out along request chains (trace IDs)
+  database  - three services lose the same database endpoint
+  deploy    - one service logs the same new error repeatedly
+  dns       - several services fail name resolution for different hosts
+
+and replays it through three modes:
+
+  none    - every alert analyzed and posted (today)
+  lambda  - the analyzer's FIFO batches (up to --batch messages, one
+            invocation per --invocation-seconds): each batch is correlated
+            at once, later alerts join incidents analyzed in earlier batches
+  hold    - a long-running worker holding incidents for the window
+
+for each --signals set. Reports LLM calls and posts (analyses, plus one
+incident update per batch for alerts joining an incident already
+analyzed - per alert in hold mode) and the reduction,
+alerts merged into an incident they don't belong to, true incidents split
+over several analyses, the share of grouped alerts the incident's analysis
+saw (the rest joined after it), the wait from arrival to analysis, and the
+peak number of incidents tracked.
+"""
+
+import argparse
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'lambdas', 'analyzer'))
+
+from correlation import Correlator, Incident
+
+SERVICES = [f"svc-{name}" for name in (
+    'orders', 'payments', 'search', 'auth', 'inventory', 'cart', 'gateway', 'notifications', 'shipping',
+    'pricing', 'reviews', 'catalog', 'accounts', 'billing', 'media', 'recommendations', 'fraud', 'tax',
+    'loyalty', 'reports')]
+
+NOISE = [
+    "ValueError: invalid literal for int() with base 10: '{n}'",
+    "TimeoutError: request to {service}-worker timed out after 30s",
+    "psycopg2.OperationalError: could not connect to server {service}-db.internal:5432",
+    "java.lang.NullPointerException at com.example.{service}.Handler.handle(Handler.java:{n})",
+    "HTTP 500 from /v1/{service}/items/{n}",
+    "KeyError: 'customer_{n}'",
+    "Rate limit exceeded for tenant {n}",
+    "Disk usage at 9{d}% on /var/lib/{service}",
+    "Error: connect ETIMEDOUT {ip}:443",
+    "Failed to process message {n}: schema validation error",
+]
+
+
+def noise_alert(rng, t):
+    service = rng.choice(SERVICES)
+    template = rng.randrange(len(NOISE))
+    message = NOISE[template].format(service=service.split('-')[1], n=rng.randrange(10000), d=rng.randrange(10),
+                                     ip=f"10.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(256)}")
+    return t, service, message, f"noise-{service}-{template}"
+
+
+def incident_alerts(rng, kind, t0, label):
+    """(t, service, message, truth) for one injected incident"""
+    alerts = []
+    if kind == 'redis':
+        host = 'redis-master.internal:6379'
+        for service, messages in (
+                ('svc-cart', [f"redis.exceptions.ConnectionError: Error 111 connecting to {host}. Connection refused."]),
+                ('svc-auth', [f"redis.exceptions.ConnectionError: Error 111 connecting to {host}. Connection refused.",
+                              "redis.exceptions.TimeoutError: Timeout reading from socket"]),
+                ('svc-orders', [f"redis.clients.jedis.exceptions.JedisConnectionException: Could not get a resource "
+                                f"from the pool ({host})"]),
+                ('svc-pricing', [f"io.lettuce.core.RedisConnectionException: Unable to connect to {host}"]),
+                ('svc-gateway', [f"Error: connect ECONNREFUSED {host} at TCPConnectWrap.afterConnect"])):
+            for _ in range(rng.randint(2, 6)):
+                alerts.append((t0 + rng.uniform(0, 20), service, rng.choice(messages), label))
+    elif kind == 'trace':
+        for _ in range(rng.randint(2, 5)):
+            trace = f"{rng.getrandbits(128):032x}"
+            start = t0 + rng.uniform(0, 30)
+            for hop, service in enumerate(('svc-gateway', 'svc-orders', 'svc-payments')):
+                alerts.append((start + hop * 0.5, service,
+                               f"upstream request failed: deadline exceeded (traceparent 00-{trace}-"
+                               f"{rng.getrandbits(64):016x}-01) while calling /v1/{service.split('-')[1]}/charge",
+                               label))
+    elif kind == 'database':
+        endpoint = 'orders-db.cluster-abc123.us-east-1.rds.amazonaws.com:5432'
+        for service in ('svc-orders', 'svc-billing', 'svc-reports'):
+            for _ in range(rng.randint(2, 5)):
+                alerts.append((t0 + rng.uniform(0, 25), service,
+                               f"FATAL: could not connect to server {endpoint}: connection timed out", label))
+    elif kind == 'deploy':
+        service = rng.choice(SERVICES)
+        for _ in range(rng.randint(5, 15)):
+            alerts.append((t0 + rng.uniform(0, 40), service,
+                           f"AttributeError: 'NoneType' object has no attribute 'currency' "
+                           f"(order {rng.randrange(100000)})", label))
+    elif kind == 'dns':
+        for service in rng.sample(SERVICES, 4):
+            alerts.append((t0 + rng.uniform(0, 15), service,
+                           f"Error: getaddrinfo ENOTFOUND {service.split('-')[1]}-api.partner.example", label))
+    return alerts
+
+
+def stream(rng, minutes, noise_rate, incident_every):
+    alerts = []
+    t = rng.expovariate(noise_rate)
+    while t < minutes * 60:
+        alerts.append(noise_alert(rng, t))
+        t += rng.expovariate(noise_rate)
+    kinds = ['redis', 'trace', 'database', 'deploy', 'dns']
+    for n, t0 in enumerate(range(incident_every // 2, minutes * 60, incident_every)):
+        alerts += incident_alerts(rng, kinds[n % len(kinds)], t0, f"incident-{n}-{kinds[n % len(kinds)]}")
+    return [{'alert_id': f"alert-{n}", 'log_group': f"/ecs/{service}", 'message': message, 'at': t, 'truth': truth}
+            for n, (t, service, message, truth) in enumerate(sorted(alerts))]
+
+
+class Outcome:
+    def __init__(self):
+        self.incidents = []
+        self.waits = []
+        self.peak = 0
+        self.updates = 0
+
+    def analyze(self, incident, now):
+        incident.analysis = ({}, 'model')
+        incident.analyzed_with = incident.count
+        self.incidents.append(incident)
+        self.waits += [now - member['at'] for member in incident.members]
+
+    def attached(self, incident, wait):
+        """An alert joined an incident analyzed earlier"""
+        if incident.analysis is not None:
+            self.waits.append(wait)
+
+
+def batches(alerts, args):
+    """(invocation time, batch): whatever arrived, up to --batch, when the previous invocation ended"""
+    position, now = 0, 0.0
+    while position < len(alerts):
+        now = max(now, alerts[position]['at'])
+        batch = []
+        while position < len(alerts) and alerts[position]['at'] <= now and len(batch) < args.batch:
+            batch.append(alerts[position])
+            position += 1
+        yield now, batch
+        now += args.invocation_seconds
+
+
+def run_none(alerts, kinds, args):
+    outcome = Outcome()
+    for now, batch in batches(alerts, args):
+        for alert in batch:
+            outcome.analyze(Incident(alert, alert['at'], set()), now)
+    return outcome
+
+
+def run_lambda(alerts, kinds, args):
+    correlator = Correlator(window_seconds=args.window, kinds=kinds, max_members=10 ** 6)
+    outcome = Outcome()
+    for now, batch in batches(alerts, args):
+        updated = set()
+        for alert in batch:
+            incident, _ = correlator.add(alert, alert['at'])
+            outcome.attached(incident, now - alert['at'])
+            if incident.analysis is not None:
+                updated.add(id(incident))
+        outcome.updates += len(updated)
+        for incident in correlator.pending():
+            outcome.analyze(incident, now)
+        outcome.peak = max(outcome.peak, len(correlator.incidents))
+    return outcome
+
+
+def run_hold(alerts, kinds, args):
+    """A worker adds alerts as they arrive and analyzes incidents once they are due"""
+    correlator = Correlator(window_seconds=args.window, max_span_seconds=args.max_span, kinds=kinds,
+                            max_members=10 ** 6)
+    outcome = Outcome()
+    clock = 0.0
+    for alert in alerts:
+        # Incidents come due between arrivals; the worker checks once a second
+        while clock + 1 <= alert['at']:
+            clock += 1
+            for incident in correlator.due(clock):
+                outcome.analyze(incident, clock)
+        incident, _ = correlator.add(alert, alert['at'])
+        outcome.attached(incident, 0.0)
+        outcome.updates += incident.analysis is not None
+        outcome.peak = max(outcome.peak, len(correlator.incidents))
+    for incident in correlator.pending():
+        outcome.analyze(incident, incident.last_at + args.window)
+    return outcome
+
+
+def score(outcome):
+    """(analyses of injected incidents, misattributed alerts, injected incidents split over several
+    analyses, share of grouped alerts their incident's analysis saw)"""
+    misattributed = 0
+    analyses_per_truth = {}
+    for incident in outcome.incidents:
+        truths = [member['truth'] for member in incident.members]
+        majority = max(set(truths), key=truths.count)
+        misattributed += len(truths) - truths.count(majority)
+        for truth in set(truths):
+            if truth.startswith('incident-'):
+                analyses_per_truth[truth] = analyses_per_truth.get(truth, 0) + 1
+    grouped = [incident for incident in outcome.incidents if incident.count > 1]
+    seen = sum(incident.analyzed_with for incident in grouped) / max(1, sum(incident.count for incident in grouped))
+    return (sum(analyses_per_truth.values()), misattributed,
+            sum(count > 1 for count in analyses_per_truth.values()), seen)
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))] if ordered else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--minutes', type=int, default=120)
+    parser.add_argument('--noise-rate', type=float, default=0.05, help='background alerts per second')
+    parser.add_argument('--incident-every', type=int, default=300)
+    parser.add_argument('--window', type=float, default=30)
+    parser.add_argument('--max-span', type=float, default=300)
+    parser.add_argument('--batch', type=int, default=10)
+    parser.add_argument('--invocation-seconds', type=float, default=4.0)
+    parser.add_argument('--signals', default='trace,host,template;trace,host,template,error',
+                        help='semicolon-separated signal sets')
+    parser.add_argument('--seed', type=int, default=5)
+    args = parser.parse_args()
+
+    alerts = stream(random.Random(args.seed), args.minutes, args.noise_rate, args.incident_every)
+    incident_alerts = sum(a['truth'].startswith('incident-') for a in alerts)
+    incidents = len({a['truth'] for a in alerts if a['truth'].startswith('incident-')})
+    print(f"{len(alerts):,} alerts over {args.minutes} min, {incident_alerts:,} of them in {incidents} injected "
+          f"incidents; window {args.window:.0f} s\n")
+    print(f"{'mode':>7} {'signals':>26} {'LLM calls':>10} {'posts':>6} {'reduction':>10} {'incident calls':>15} "
+          f"{'misattributed':>14} {'split':>6} {'seen':>5} {'wait p50 s':>11} {'wait p95 s':>11} {'peak tracked':>13}")
+
+    runs = [('none', run_none, '-')]
+    for kinds in args.signals.split(';'):
+        runs += [('lambda', run_lambda, kinds), ('hold', run_hold, kinds)]
+    for mode, run, kinds in runs:
+        outcome = run(alerts, tuple(kinds.split(',')), args)
+        incident_calls, misattributed, split, seen = score(outcome)
+        calls = len(outcome.incidents)
+        posts = calls + outcome.updates
+        print(f"{mode:>7} {kinds:>26} {calls:>10,} {posts:>6,} {(1 - posts / len(alerts)) * 100:>9.0f}% "
+              f"{incident_calls:>6,} of {incident_alerts:<5,} {misattributed:>14,} {split:>3}/{incidents:<2} {seen * 100:>4.0f}% "
+              f"{percentile(outcome.waits, 50):>11.1f} {percentile(outcome.waits, 95):>11.1f} {outcome.peak:>13,}")
+
+
+if __name__ == '__main__':
+    main()
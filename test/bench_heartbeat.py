@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Benchmark the analyzer worker's visibility heartbeat and redelivery guard.
+
+Two workers drain --alerts alerts (--log-groups message groups, receives
+of --batch-size) from a FIFO processing queue on the local SQS stand-in,
+whose visibility timeout (--visibility seconds) is shorter than a batch's
+analysis on the mock LLM (--llm-seconds per alert). The queue has a
+redrive policy of --max-receives, as deployed. Runs:
+
+  no heartbeat       - messages reappear mid-analysis and the other worker
+                       analyzes and posts them again (a message received
+                       --max-receives times goes to the dead-letter queue)
+  heartbeat          - visibility extended every visibility/2 seconds
+  lost deletes       - the first delete of every message fails, so each
+                       one is redelivered after it was posted; with and
+                       without the guard acknowledging alerts already
+                       stored
+
+Reports LLM calls, distribution messages, alerts posted more than once,
+messages ending in the dead-letter queue, ChangeMessageVisibilityBatch
+requests and wall time.
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+from dynamodb_local import LocalDynamoDB, LocalTable
+from mock_llm import MockLLMServer
+from sqs_local import LocalSQS
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'lambdas', 'analyzer'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'lambdas', 'shared', 'python'))
+
+
+class BenchSQS(LocalSQS):
+    """Counts distribution messages per alert; can fail each message's first delete"""
+
+    def __init__(self, *args, lose_deletes=False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.distribution_url = self.create_queue(QueueName='distribution.fifo')['QueueUrl']
+        self.posts = {}
+        self.lose_deletes = lose_deletes
+        self.lost = set()
+
+    def send_message(self, QueueUrl, MessageBody, **kwargs):
+        response = super().send_message(QueueUrl, MessageBody, **kwargs)
+        if QueueUrl == self.distribution_url:
+            with self.cond:
+                alert_id = json.loads(MessageBody)['alert_id']
+                self.posts[alert_id] = self.posts.get(alert_id, 0) + 1
+        return response
+
+    def delete_message_batch(self, QueueUrl, Entries):
+        if not self.lose_deletes:
+            return super().delete_message_batch(QueueUrl, Entries)
+        with self.cond:
+            first = [e for e in Entries if e['ReceiptHandle'].split('/')[0] not in self.lost]
+            self.lost.update(e['ReceiptHandle'].split('/')[0] for e in first)
+        response = super().delete_message_batch(QueueUrl, [e for e in Entries if e not in first])
+        response['Failed'] += [{'Id': e['Id'], 'Code': 'InternalError', 'SenderFault': False} for e in first]
+        return response
+
+    def drained(self, url):
+        attributes = self.get_queue_attributes(QueueUrl=url)['Attributes']
+        return attributes['ApproximateNumberOfMessages'] == attributes['ApproximateNumberOfMessagesNotVisible'] == '0'
+
+
+def run(args, server, providers, heartbeat_on, guard_on, lose_deletes):
+    import handler
+    import heartbeat
+    import worker as worker_module
+    from storage import WriteBehind
+
+    sqs = BenchSQS(latency=0.002, lose_deletes=lose_deletes)
+    dlq_url = sqs.create_queue(QueueName='processing-dlq.fifo')['QueueUrl']
+    redrive = {'deadLetterTargetArn': sqs.get_queue_attributes(QueueUrl=dlq_url)['Attributes']['QueueArn'],
+               'maxReceiveCount': str(args.max_receives)}
+    queue_url = sqs.create_queue(QueueName='processing.fifo', Attributes={
+        'VisibilityTimeout': str(args.visibility), 'RedrivePolicy': json.dumps(redrive)})['QueueUrl']
+    sqs.stats.clear()
+
+    table = LocalTable('alert_id')
+    dynamodb = LocalDynamoDB({'alerts': table}, latency=0.002)
+    handler.sqs = sqs
+    handler.ALERTS_TABLE = 'alerts'
+    handler.writes = WriteBehind(dynamodb, key_schema={'alerts': ['alert_id']})
+    guard, beat = handler.already_stored, heartbeat.Heartbeat.start
+    if not guard_on:
+        handler.already_stored = lambda bodies, receive_counts: set()
+    if not heartbeat_on:
+        heartbeat.Heartbeat.start = lambda self: self
+
+    for n in range(args.alerts):
+        group = f"/ecs/service-{n % args.log_groups}"
+        sqs.send_message(QueueUrl=queue_url, MessageGroupId=group, MessageBody=json.dumps({
+            'alert_id': f"alert-{n}", 'severity': 'HIGH', 'log_group': group,
+            'message': f"[ERROR] request {n} failed: upstream service-{n % args.log_groups} unavailable"}))
+    server.reset_stats()
+
+    start = time.monotonic()
+    workers = [worker_module.Worker(sqs, queue_url, providers, sqs.distribution_url, max_in_flight=args.in_flight,
+                                    batch_size=args.batch_size, wait_seconds=1, shutdown_seconds=5,
+                                    visibility_timeout=args.visibility) for _ in range(2)]
+    threads = [threading.Thread(target=worker.run) for worker in workers]
+    for thread in threads:
+        thread.start()
+    while not sqs.drained(queue_url) and time.monotonic() - start < args.timeout:
+        time.sleep(0.2)
+    for worker in workers:
+        worker.stop()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - start
+    handler.already_stored, heartbeat.Heartbeat.start = guard, beat
+
+    dead = int(sqs.get_queue_attributes(QueueUrl=dlq_url)['Attributes']['ApproximateNumberOfMessages'])
+    return {
+        'llm': server.stats['requests'],
+        'posts': sum(sqs.posts.values()),
+        'twice': sum(count > 1 for count in sqs.posts.values()),
+        'dead': dead,
+        'extensions': sqs.stats['ChangeMessageVisibilityBatch'],
+        'elapsed': elapsed
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--alerts', type=int, default=20)
+    parser.add_argument('--log-groups', type=int, default=10)
+    parser.add_argument('--batch-size', type=int, default=2)
+    parser.add_argument('--in-flight', type=int, default=2, help='batches in flight per worker (two workers)')
+    parser.add_argument('--visibility', type=int, default=2, help='processing queue visibility timeout, seconds')
+    parser.add_argument('--llm-seconds', type=float, default=1.5, help='mock LLM latency per alert')
+    parser.add_argument('--max-receives', type=int, default=3, help='redrive policy maxReceiveCount')
+    parser.add_argument('--timeout', type=float, default=120.0)
+    args = parser.parse_args()
+
+    server = MockLLMServer(base_latency=args.llm_seconds, per_token_latency=0.0).start()
+
+    import handler
+    import heartbeat
+    import http_client
+    import metrics
+    import worker as worker_module
+    from llm import GeminiProvider
+    from routing import RoutingPolicy
+    from runbooks import RunbookIndex
+
+    handler.print = metrics.print = worker_module.print = http_client.print = heartbeat.print = \
+        lambda *a, **k: None
+    handler.runbooks = RunbookIndex([])
+    handler.routing_policy = RoutingPolicy({})
+    handler.correlator = None
+    provider = GeminiProvider('test-key', model='gemini-2.5-flash', base_url=server.url)
+    providers = {'fast': provider, 'deep': provider}
+
+    print(f"{args.alerts} alerts, two workers, batches of {args.batch_size}; visibility timeout "
+          f"{args.visibility} s, mock LLM {args.llm_seconds} s per alert, maxReceiveCount {args.max_receives}\n")
+    print(f"{'run':>28} {'LLM calls':>10} {'posts':>6} {'posted twice':>13} {'dead-lettered':>14} "
+          f"{'extensions':>11} {'seconds':>8}")
+
+    runs = [('no heartbeat', False, True, False), ('heartbeat', True, True, False),
+            ('lost deletes, no guard', True, False, True), ('lost deletes, guard', True, True, True)]
+    for name, heartbeat_on, guard_on, lose_deletes in runs:
+        result = run(args, server, providers, heartbeat_on, guard_on, lose_deletes)
+        print(f"{name:>28} {result['llm']:>10} {result['posts']:>6} {result['twice']:>13} {result['dead']:>14} "
+              f"{result['extensions']:>11} {result['elapsed']:>8.1f}")
+
+    server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Benchmark hedged requests across two LLM providers.
+
+A Gemini-style and an Anthropic-style mock server both answer in ~50ms.
+Partway through the run the primary degrades; the script reports latency
+percentiles for the primary alone and for the hedged provider.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+from mock_llm import MockLLMServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'lambdas', 'analyzer'))
+
+from llm import AnthropicProvider, GeminiProvider, HedgedProvider
+
+PROMPT = 'Analyze this alert and provide a brief diagnosis:\n\nAlert: Redis cache cluster unavailable'
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def run(provider, primary_server, calls, degrade_at, degraded_latency):
+    primary_server.base_latency = 0.05
+    latencies = []
+    for i in range(calls):
+        if i == degrade_at:
+            primary_server.base_latency = degraded_latency
+        start = time.perf_counter()
+        provider.generate(PROMPT)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--calls', type=int, default=100)
+    parser.add_argument('--degraded-latency', type=float, default=1.0, help='Primary latency (s) once degraded')
+    args = parser.parse_args()
+
+    primary_server = MockLLMServer(per_token_latency=0).start()
+    secondary_server = MockLLMServer(base_latency=0.08, per_token_latency=0).start()
+    degrade_at = args.calls // 2
+
+    primary = GeminiProvider('test-key', base_url=primary_server.url)
+    secondary = AnthropicProvider('test-key', base_url=secondary_server.url)
+    hedged = HedgedProvider(
+        GeminiProvider('test-key', base_url=primary_server.url),
+        secondary,
+        initial_delay=1.0,
+        min_samples=10
+    )
+
+    import llm
+    llm.print = lambda *a, **k: None
+
+    print(f"{'mode':>8} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8} {'hedges':>7}")
+    for name, provider in [('primary', primary), ('hedged', hedged)]:
+        latencies = run(provider, primary_server, args.calls, degrade_at, args.degraded_latency)
+        print(
+            f"{name:>8} {percentile(latencies, 50) * 1000:>8.1f} "
+            f"{percentile(latencies, 95) * 1000:>8.1f} {max(latencies) * 1000:>8.1f} "
+            f"{getattr(provider, 'hedges', 0):>7}"
+        )
+
+    primary_server.stop()
+    secondary_server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Exercise the analyzer's resilient HTTP client against a fault-injecting
+local server.
+
+Each scenario scripts the server's responses (status codes, Retry-After
+headers, slow or HTML bodies) and checks the client's outcome, number of
+attempts and elapsed time. Exits non-zero if any scenario misbehaves.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'lambdas', 'analyzer'))
+
+import urllib3
+
+import http_client
+import llm
+from http_client import ResilientHTTP
+from llm import GeminiProvider, LLMError
+
+
+class FaultServer:
+    """Serves a scripted list of faults, one per request, then 200 OK"""
+
+    def __init__(self):
+        self.script = []
+        self.attempts = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                server.attempts += 1
+                fault = server.script.pop(0) if server.script else {}
+
+                time.sleep(fault.get('delay', 0))
+                status = fault.get('status', 200)
+                body = fault.get('body', json.dumps(
+                    {'candidates': [{'content': {'parts': [{'text': 'ok'}]}}]}
+                )).encode('utf-8')
+
+                try:
+                    self.send_response(status)
+                    for name, value in fault.get('headers', {}).items():
+                        self.send_header(name, value)
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                except BrokenPipeError:
+                    # Client gave up (read timeout scenario)
+                    pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address
+        return f"http://{host}:{port}"
+
+    def run(self, script):
+        self.script = list(script)
+        self.attempts = 0
+
+
+SCENARIOS = [
+    # name, server script, client kwargs, deadline, expected outcome
+    ('transient 503 then OK', [{'status': 503}, {'status': 503}], {}, None, 'ok'),
+    ('429 honours Retry-After', [{'status': 429, 'headers': {'Retry-After': '1'}}], {}, None, 'ok'),
+    ('HTML 502 body is retried', [{'status': 502, 'body': '<html>Bad Gateway</html>'}], {}, None, 'ok'),
+    ('read timeout is retried', [{'delay': 1.0}], {'read_timeout': 0.3}, None, 'ok'),
+    ('400 is not retried', [{'status': 400, 'body': '{"error": {"message": "bad request"}}'}], {}, None, 'error'),
+    ('persistent 503 gives up', [{'status': 503}] * 10, {}, None, 'error'),
+    ('deadline stops Retry-After wait', [{'status': 429, 'headers': {'Retry-After': '30'}}], {}, 2.0, 'error'),
+]
+
+
+def main():
+    server = FaultServer()
+    http_client.print = lambda *a, **k: None
+    failures = 0
+
+    print(f"{'scenario':<34} {'outcome':>8} {'attempts':>9} {'elapsed s':>10}")
+    for name, script, kwargs, deadline, expected in SCENARIOS:
+        llm.http = ResilientHTTP(base_delay=0.1, max_delay=0.5, **kwargs)
+        llm.http.set_deadline(deadline)
+        provider = GeminiProvider('test-key', base_url=server.url)
+
+        server.run(script)
+        start = time.perf_counter()
+        try:
+            provider.generate('ping')
+            outcome = 'ok'
+        except (LLMError, urllib3.exceptions.HTTPError):
+            outcome = 'error'
+        elapsed = time.perf_counter() - start
+
+        mark = '' if outcome == expected else '  <-- expected ' + expected
+        failures += outcome != expected
+        print(f"{name:<34} {outcome:>8} {server.attempts:>9} {elapsed:>10.2f}{mark}")
+
+    server.httpd.shutdown()
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Exercise duplicate deliveries through the analyzer and Slack notifier
+handlers, on the local SQS and DynamoDB stand-ins and the mock LLM.
+
+Each scenario delivers --alerts alerts to the analyzer Lambda handler
+(and every resulting distribution message to the notifier handler) with
+some duplication, once with the redelivery guard alone (alerts table
+lookup of redelivered messages) and once with the idempotency store:
+
+  lost delete           - every alert redelivered to the same (warm)
+                          container after it was analyzed
+  redelivered elsewhere - redelivered to a cold container
+  ingested twice        - a second message for each alert (new message,
+                          first receive), to a cold container
+  analyzed concurrently - delivered while another container holds the
+                          alert's claim, then redelivered once it is done
+  notifier duplicates   - every distribution message delivered twice
+
+Reports LLM calls, distribution messages, Slack posts, messages
+acknowledged and deferred, idempotency table item reads and writes, and
+lookups answered by the containers' front caches. Exits non-zero if the store lets a duplicate through.
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import sys
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+from dynamodb_local import LocalDynamoDB, LocalTable
+from mock_llm import MockLLMServer
+from sqs_local import LocalSQS
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'lambdas', 'analyzer'))
+sys.path.insert(0, os.path.join(ROOT, 'lambdas', 'shared', 'python'))
+
+
+def load_notifier():
+    """The notifier's handler.py, under a name that doesn't clash with the analyzer's"""
+    spec = importlib.util.spec_from_file_location(
+        'notifier_handler', os.path.join(ROOT, 'lambdas', 'slack_notifier', 'handler.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class Slack:
+    """Secrets Manager and webhook stand-in counting posts"""
+
+    class Response:
+        status = 200
+
+    def __init__(self):
+        self.posts = 0
+
+    def get_secret_value(self, SecretId):
+        return {'SecretString': json.dumps({'saar_slack_webhook': 'https://hooks.slack.invalid/T0'})}
+
+    def request(self, method, url, body=None, headers=None):
+        self.posts += 1
+        return self.Response()
+
+
+class Context:
+    def get_remaining_time_in_millis(self):
+        return 60000
+
+
+class Pipeline:
+    """One scenario's stand-ins, wired into the analyzer and notifier handlers"""
+
+    def __init__(self, handler, notifier, store):
+        from idempotency import IdempotencyStore
+        from storage import WriteBehind
+
+        self.handler = handler
+        self.notifier = notifier
+        self.store = store
+        self.table = LocalTable('alert_id', 'stage')
+        self.db = LocalDynamoDB({'alerts': LocalTable('alert_id'), 'idempotency': self.table}, latency=0)
+        self.sqs = LocalSQS()
+        self.distribution_url = self.sqs.create_queue(QueueName='distribution.fifo')['QueueUrl']
+        self.slack = Slack()
+        self.messages = 0
+        self.acknowledged = self.deferred = 0
+        self.cache_hits = 0
+
+        # The analyzer resets its counters as it exports them
+        handler.emit = self.emit
+        handler.sqs = self.sqs
+        handler.ALERTS_TABLE = 'alerts'
+        handler.writes = WriteBehind(self.db, key_schema={'alerts': ['alert_id'],
+                                                          'idempotency': ['alert_id', 'stage']})
+        notifier.writes = WriteBehind(self.db)
+        notifier.secrets_client = notifier.http = self.slack
+        self.containers = {}
+        self.store_class = IdempotencyStore
+        self.container('analyzer', 'a')
+        self.container('notifier', 'a')
+
+    def container(self, function, name):
+        """Switch a function to a (new or earlier) container: its own front cache"""
+        module = self.handler if function == 'analyzer' else self.notifier
+        if not self.store:
+            module.idempotency = None
+            return
+        key = (function, name)
+        if key not in self.containers:
+            self.containers[key] = self.store_class(self.db, 'idempotency', lease_seconds=900, writes=module.writes)
+        module.idempotency = self.containers[key]
+
+    def emit(self, metrics, dimensions=None, units=None):
+        self.cache_hits += metrics.get('IdempotencyCacheHits', 0)
+
+    def analyze(self, bodies, receive_count=1):
+        records = [{'messageId': f"m-{n}", 'body': json.dumps(body),
+                    'attributes': {'ApproximateReceiveCount': str(receive_count)}} for n, body in enumerate(bodies)]
+        result = json.loads(self.handler.lambda_handler({'Records': records}, Context())['body'])
+        self.acknowledged += result['acknowledged']
+        self.deferred += result['deferred']
+
+    def notify(self, copies=1):
+        """Deliver every distribution message so far, copies times"""
+        response = self.sqs.receive_message(QueueUrl=self.distribution_url, MaxNumberOfMessages=10)
+        while response.get('Messages'):
+            messages = response['Messages']
+            self.messages += len(messages)
+            for _ in range(copies):
+                self.notifier.lambda_handler({'Records': [
+                    {'messageId': m['MessageId'], 'body': m['Body']} for m in messages]}, None)
+            self.sqs.delete_message_batch(QueueUrl=self.distribution_url, Entries=[
+                {'Id': str(n), 'ReceiptHandle': m['ReceiptHandle']} for n, m in enumerate(messages)])
+            response = self.sqs.receive_message(QueueUrl=self.distribution_url, MaxNumberOfMessages=10)
+
+    def idempotency_requests(self):
+        hits = sum(store.stats['cache_hits'] for (function, _), store in self.containers.items()
+                   if function == 'notifier')
+        return self.table.stats['requests'], self.cache_hits + hits
+
+
+def lost_delete(pipeline, bodies):
+    pipeline.analyze(bodies)
+    pipeline.analyze(bodies, receive_count=2)
+    pipeline.notify()
+
+
+def redelivered_elsewhere(pipeline, bodies):
+    pipeline.analyze(bodies)
+    pipeline.container('analyzer', 'b')
+    pipeline.analyze(bodies, receive_count=2)
+    pipeline.notify()
+
+
+def ingested_twice(pipeline, bodies):
+    pipeline.analyze(bodies)
+    pipeline.container('analyzer', 'b')
+    pipeline.analyze(bodies)
+    pipeline.notify()
+
+
+def analyzed_concurrently(pipeline, bodies):
+    # Container b is analyzing every alert (holds its claim) when a gets it
+    if pipeline.store:
+        pipeline.container('analyzer', 'b')
+        for body in bodies:
+            pipeline.handler.idempotency.claim(body['alert_id'], 'analysis')
+        pipeline.container('analyzer', 'a')
+    pipeline.analyze(bodies)
+    # b's own analysis, run here rather than around a's
+    pipeline.container('analyzer', 'b')
+    if pipeline.store:
+        for body in bodies:
+            pipeline.handler.idempotency.release(body['alert_id'], 'analysis')
+    pipeline.analyze(bodies)
+    # a gets the messages it deferred again
+    pipeline.container('analyzer', 'a')
+    pipeline.analyze(bodies, receive_count=2)
+    pipeline.notify()
+
+
+def notifier_duplicates(pipeline, bodies):
+    pipeline.analyze(bodies)
+    pipeline.notify(copies=2)
+
+
+SCENARIOS = [
+    # name, deliveries
+    ('lost delete', lost_delete),
+    ('redelivered elsewhere', redelivered_elsewhere),
+    ('ingested twice', ingested_twice),
+    ('analyzed concurrently', analyzed_concurrently),
+    ('notifier duplicates', notifier_duplicates),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--alerts', type=int, default=10)
+    args = parser.parse_args()
+
+    server = MockLLMServer(base_latency=0.01, per_token_latency=0.0).start()
+
+    import handler
+    import http_client
+    import metrics
+    from llm import GeminiProvider
+    from routing import RoutingPolicy
+    from runbooks import RunbookIndex
+
+    notifier = load_notifier()
+    handler.print = metrics.print = http_client.print = notifier.print = lambda *a, **k: None
+    handler.runbooks = RunbookIndex([])
+    handler.routing_policy = RoutingPolicy({})
+    handler.correlator = None
+    handler.analysis_cache = None
+    provider = GeminiProvider('test-key', model='gemini-2.5-flash', base_url=server.url)
+    handler.get_provider = lambda tier: provider
+    os.environ['DISTRIBUTION_QUEUE_URL'] = 'local://distribution.fifo'
+    os.environ['SLACK_WEBHOOK_SECRET'] = 'slack'
+    os.environ.pop('PROCESSING_QUEUE_URL', None)
+
+    bodies = [{'alert_id': f"alert-{n}", 'severity': 'HIGH', 'log_group': '/ecs/orders',
+               'message': f"[ERROR] order {n} failed: payment gateway returned 502"} for n in range(args.alerts)]
+    failures = 0
+
+    print(f"{args.alerts} alerts per scenario\n")
+    print(f"{'scenario':>22} {'mode':>7} {'LLM calls':>10} {'dist. msgs':>11} {'Slack posts':>12} "
+          f"{'acked':>6} {'deferred':>9} {'idem. item ops':>15} {'cache hits':>11}")
+    for name, scenario in SCENARIOS:
+        for mode in ('guard', 'store'):
+            pipeline = Pipeline(handler, notifier, store=mode == 'store')
+            server.reset_stats()
+            scenario(pipeline, bodies)
+            requests, hits = pipeline.idempotency_requests()
+            duplicate = server.stats['requests'] > args.alerts or pipeline.slack.posts > args.alerts
+            mark = '  <-- duplicate' if duplicate and mode == 'store' else ''
+            failures += bool(mark)
+            print(f"{name:>22} {mode:>7} {server.stats['requests']:>10} {pipeline.messages:>11} "
+                  f"{pipeline.slack.posts:>12} {pipeline.acknowledged:>6} {pipeline.deferred:>9} "
+                  f"{requests:>15} {hits:>11}{mark}")
+
+    server.stop()
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
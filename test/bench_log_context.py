@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Benchmark time-windowed log context retrieval.
+
+A stand-in CloudWatch Logs client serves one busy stream (an event every
+half second for two hours, 100 events per filter_log_events page, with a
+per-request latency). A burst of alerts from that stream, raised some
+minutes before they are analyzed (a queue backlog), is gathered with:
+
+  newest   - archived get_log_context: get_log_events(limit=50), the
+             newest entries in the stream, one call per alert
+  windowed - the log_context source: filter_log_events over the alert's
+             time bucket +/- the window, cached per (group, stream, bucket)
+
+Reports calls, pages, gather time and how many returned lines actually
+fall within +/- the window of the alert that asked for them.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'lambdas', 'analyzer'))
+
+import context
+import metrics
+from context import SOURCES, ContextGatherer
+
+
+class StandInLogs:
+    """The get_log_events/filter_log_events subset, over one in-memory stream"""
+
+    def __init__(self, events, page_size, latency):
+        self.events = events
+        self.page_size = page_size
+        self.latency = latency
+        self.calls = 0
+
+    def get_log_events(self, logGroupName, logStreamName, limit):
+        self.calls += 1
+        time.sleep(self.latency)
+        return {'events': [{'timestamp': t, 'message': m} for t, m in self.events[-limit:]]}
+
+    def filter_log_events(self, logGroupName, logStreamNames, startTime, endTime, nextToken=None):
+        self.calls += 1
+        time.sleep(self.latency)
+        matching = [(t, m) for t, m in self.events if startTime <= t <= endTime]
+        offset = int(nextToken or 0)
+        page = matching[offset:offset + self.page_size]
+        response = {'events': [{'timestamp': t, 'message': m} for t, m in page]}
+        if offset + self.page_size < len(matching):
+            response['nextToken'] = str(offset + self.page_size)
+        return response
+
+
+def archived_log_context(alert):
+    response = context.logs_client.get_log_events(
+        logGroupName=alert['log_group'],
+        logStreamName=alert['log_stream'],
+        limit=50
+    )
+    events = response.get('events', [])
+    return '\n'.join(e['message'] for e in events[-20:])
+
+
+def relevant(alert, text, window):
+    """Lines whose embedded timestamp is within +/- window of the alert"""
+    at = alert['timestamp'] // 1000
+    lines = [line for line in text.split('\n') if line]
+    return sum(1 for line in lines if abs(int(line.split()[0]) - at) <= window), len(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--alerts', type=int, default=30)
+    parser.add_argument('--lag', type=int, default=900, help='seconds between the burst and its analysis')
+    parser.add_argument('--latency', type=float, default=0.03, help='seconds per Logs API request')
+    args = parser.parse_args()
+
+    context.print = metrics.print = lambda *a, **k: None
+    now = int(time.time())
+    events = [((now - 7200) * 1000 + n * 500, f"{now - 7200 + n // 2} INFO worker tick {n}") for n in range(14400)]
+    logs = StandInLogs(events, page_size=100, latency=args.latency)
+    context.logs_client = logs
+
+    burst_start = now - args.lag
+    alerts = [
+        {'alert_id': f"bench-{n}", 'source': 'cloudwatch_logs', 'log_group': '/aws/bench', 'log_stream': 'worker-1',
+         'timestamp': (burst_start + n * 20 // args.alerts) * 1000}
+        for n in range(args.alerts)
+    ]
+    window = context.LOG_WINDOW_SECONDS
+    log_source = next(source for source in SOURCES if source.name == 'log_context')
+
+    gatherers = {
+        'newest': ContextGatherer([log_source._replace(fetch=archived_log_context, key=lambda a: a['alert_id'],
+                                                       view=None)]),
+        'windowed': ContextGatherer([log_source]),
+    }
+
+    print(f"{args.alerts} alerts over 20 s from one stream, analyzed {args.lag} s later; "
+          f"window +/-{window} s\n")
+    print(f"{'mode':>9} {'API calls':>10} {'fetches':>8} {'cache hits':>11} {'total ms':>9} {'lines':>6} {'in window':>10}")
+    for name, gatherer in gatherers.items():
+        logs.calls = 0
+        start = time.perf_counter()
+        results = [gatherer.gather(alert)['log_context'] for alert in alerts]
+        elapsed = time.perf_counter() - start
+        inside = total = 0
+        for alert, text in zip(alerts, results):
+            hits, lines = relevant(alert, text, window)
+            inside += hits
+            total += lines
+        stats = gatherer.stats['log_context']
+        print(f"{name:>9} {logs.calls:>10} {stats['calls']:>8} {stats['hits']:>11} {elapsed * 1000:>9.0f} "
+              f"{total / len(alerts):>6.0f} {inside * 100 / max(total, 1):>9.0f}%")
+
+
+if __name__ == '__main__':
+    main()
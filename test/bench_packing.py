@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Benchmark multi-alert prompt packing against one call per alert.
+
+Runs the analyzer's analyze_alerts() against the local mock LLM server
+and reports tokens and latency per alert for each pack size.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+from mock_llm import MockLLMServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'lambdas', 'analyzer'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'lambdas', 'shared', 'python'))
+
+ALERTS = [
+    'Database connection failed: Connection timeout after 30s\npsycopg2.OperationalError: could not connect to server',
+    'Out of memory error in payment processing\nMemoryError: Unable to allocate 512MB for transaction batch',
+    'API request failed: External service timeout\nrequests.exceptions.Timeout: Request to https://api.example.com/v1/users timed out',
+    'High CPU usage detected: 95% sustained over 5 minutes',
+    'S3 upload failed: Access denied\nbotocore.exceptions.ClientError: An error occurred (AccessDenied) when calling the PutObject operation',
+    'Redis cache cluster unavailable\nredis.exceptions.ConnectionError: Error connecting to Redis on localhost:6379',
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--alerts', type=int, default=60, help='Number of alerts to analyze')
+    parser.add_argument('--pack-sizes', default='1,5,10', help='Comma-separated pack sizes')
+    args = parser.parse_args()
+
+    server = MockLLMServer().start()
+
+    import handler
+    import metrics
+    from routing import RoutingPolicy
+    from runbooks import RunbookIndex
+    from llm import GeminiProvider
+
+    handler.print = metrics.print = lambda *a, **k: None
+    # No runbooks and one tier for every alert, so every alert reaches the LLM
+    handler.runbooks = RunbookIndex([])
+    handler.routing_policy = RoutingPolicy({})
+    provider = GeminiProvider('test-key', base_url=server.url)
+
+    bodies = [
+        {'alert_id': f"bench-{i}", 'message': ALERTS[i % len(ALERTS)], 'severity': 'HIGH'}
+        for i in range(args.alerts)
+    ]
+
+    print(f"{'pack':>5} {'calls':>6} {'in tok/alert':>13} {'out tok/alert':>14} {'ms/alert':>9}")
+    for pack_size in [int(p) for p in args.pack_sizes.split(',')]:
+        server.reset_stats()
+        start = time.perf_counter()
+        handler.analyze_alerts(provider, bodies, pack_size=pack_size)
+        elapsed = time.perf_counter() - start
+
+        stats = server.stats
+        print(
+            f"{pack_size:>5} {stats['requests']:>6} "
+            f"{stats['input_tokens'] / len(bodies):>13.1f} "
+            f"{stats['output_tokens'] / len(bodies):>14.1f} "
+            f"{elapsed * 1000 / len(bodies):>9.2f}"
+        )
+
+    server.stop()
+
+
+if __name__ == '__main__':
+    main()
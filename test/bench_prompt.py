@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Benchmark the token-budgeted prompt builder on a fixed corpus.
+
+Compares three ways of building the prompt for the same alerts:
+  raw       - message, logs and raw data sent as-is (live analyzer today)
+  truncated - archived build_analysis_prompt style (logs[:2000], raw[:1000])
+  budgeted  - prompt_builder.build_prompt with compaction and a token budget
+
+Reports prompt tokens, mock LLM latency (input-token dependent) and how
+many of each alert's key signals (exception type, final error line,
+innermost frame) survive in the prompt, as a proxy for analysis quality.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+from mock_llm import MockLLMServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'lambdas', 'analyzer'))
+
+import prompt_builder
+from llm import GeminiProvider
+
+
+def python_trace(depth, error):
+    frames = ['Traceback (most recent call last):', '  File "/app/worker.py", line 88, in run']
+    frames += ['  File "/app/tree.py", line 41, in walk\n    return walk(node.child)'] * depth
+    frames += ['  File "/app/db.py", line 17, in connect', error]
+    return '\n'.join(frames)
+
+
+def java_trace(error):
+    frames = [f"{error}"]
+    for cause in range(3):
+        frames += [f"\tat com.example.pool.Pool.borrow(Pool.java:{100 + i})" for i in range(15)]
+        frames += [f"\tat com.example.api.Handler.handle(Handler.java:{200 + i})" for i in range(15)]
+        frames.append(f"Caused by: java.net.SocketTimeoutException: Read timed out (level {cause})")
+    frames.append("\tat java.net.SocketInputStream.socketRead0(Native Method)")
+    return '\n'.join(frames)
+
+
+def retry_logs(count, line):
+    return '\n'.join(f"2025-01-{10 + i % 9:02d}T12:00:{i % 60:02d}Z {line} attempt={i}" for i in range(count))
+
+
+# (alert, context, signals that must survive for a useful analysis)
+CORPUS = [
+    (
+        {'message': 'Database connection failed: Connection timeout after 30s\n'
+                    + python_trace(60, 'psycopg2.OperationalError: could not connect to server')},
+        {'log_context': retry_logs(300, 'WARN db pool: connection refused, retrying')},
+        ['psycopg2.OperationalError', 'Connection timeout after 30s', '/app/db.py']
+    ),
+    (
+        {'message': 'API request failed\n' + java_trace('java.lang.IllegalStateException: pool exhausted')},
+        {'log_context': retry_logs(150, 'INFO request handled status=200 ms=12')},
+        ['IllegalStateException', 'SocketTimeoutException', 'socketRead0']
+    ),
+    (
+        {'message': 'Out of memory error in payment processing\nMemoryError: Unable to allocate 512MB for transaction batch',
+         'raw_data': {'batch': [{'txn': i, 'amount': i * 3.5, 'currency': 'USD'} for i in range(200)]}},
+        {'log_context': retry_logs(80, 'INFO batch chunk processed') + '\nCRITICAL heap usage 98% before allocation'},
+        ['MemoryError', 'Unable to allocate 512MB', 'heap usage 98%']
+    ),
+    (
+        {'message': 'Redis cache cluster unavailable\nredis.exceptions.ConnectionError: Error connecting to Redis on localhost:6379'},
+        {'log_context': retry_logs(500, 'ERROR redis: connection reset by peer'),
+         'historical_pattern': {'occurrence_count': 42, 'frequency': 'frequent'}},
+        ['redis.exceptions.ConnectionError', 'connection reset by peer', 'frequent']
+    ),
+]
+
+
+def raw_prompt(alert, context):
+    parts = [f"Alert: {alert['message']}"]
+    if context.get('log_context'):
+        parts.append(f"Recent Log Entries:\n{context['log_context']}")
+    if alert.get('raw_data'):
+        parts.append(f"Raw Alert Data:\n{json.dumps(alert['raw_data'], indent=2)}")
+    return '\n\n'.join(parts)
+
+
+def truncated_prompt(alert, context):
+    parts = [f"Alert: {alert['message']}"]
+    if context.get('log_context'):
+        parts.append(f"Recent Log Entries:\n{context['log_context'][:2000]}")
+    if context.get('historical_pattern'):
+        parts.append(f"Frequency: {context['historical_pattern'].get('frequency')}")
+    if alert.get('raw_data'):
+        parts.append(f"Raw Alert Data:\n{json.dumps(alert['raw_data'], indent=2)[:1000]}")
+    return '\n\n'.join(parts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--budget', type=int, default=1500, help='Token budget for the budgeted builder')
+    args = parser.parse_args()
+
+    server = MockLLMServer(per_input_token_latency=0.0001).start()
+    provider = GeminiProvider('test-key', base_url=server.url)
+
+    builders = [
+        ('raw', raw_prompt),
+        ('truncated', truncated_prompt),
+        ('budgeted', lambda alert, context: prompt_builder.build_prompt(alert, context, budget=args.budget)),
+    ]
+
+    print(f"{'builder':>10} {'tokens/alert':>13} {'ms/alert':>9} {'signals kept':>13}")
+    for name, build in builders:
+        tokens = elapsed = kept = total = 0
+        for alert, context, signals in CORPUS:
+            prompt = build(alert, context)
+            tokens += prompt_builder.estimate_tokens(prompt)
+            start = time.perf_counter()
+            provider.generate(prompt)
+            elapsed += time.perf_counter() - start
+            kept += sum(signal in prompt for signal in signals)
+            total += len(signals)
+
+        print(f"{name:>10} {tokens / len(CORPUS):>13.0f} {elapsed * 1000 / len(CORPUS):>9.1f} {f'{kept}/{total}':>13}")
+
+    server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Benchmark poison-message quarantine in the analyzer worker.
+
+One worker drains --alerts healthy alerts (--log-groups message groups,
+receives of --batch-size) from a FIFO processing queue on the local SQS
+stand-in, with a visibility timeout of --visibility seconds and a
+redrive policy of --max-receives, as deployed. The first log group's
+batch also holds three poison messages: unparseable JSON, an alert whose
+message is not a string, and a re-queued incident lead whose incident is
+a string. Runs:
+
+  redrive       - without a quarantine table: poison messages are
+                  redelivered until the redrive policy moves them to the
+                  dead-letter queue, holding their message group up
+  quarantine    - poison messages quarantined and deleted at once
+
+Reports LLM calls, the time until the poisoned group's healthy alerts
+were all distributed, the time to drain the queue, and messages
+dead-lettered and quarantined. The quarantine run then replays the
+quarantined alerts (tools/manage_quarantine.py's replay) with corrected
+payloads, and reports how many were analyzed; the unparseable message is
+skipped.
+
+Only MalformedAlert is quarantined: any other error (a bug, a bad deploy)
+is retried into the dead-letter queue in both modes.
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+from dynamodb_local import LocalTable
+from mock_llm import MockLLMServer
+from sqs_local import LocalSQS
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'tools'))
+sys.path.insert(0, os.path.join(ROOT, 'lambdas', 'analyzer'))
+sys.path.insert(0, os.path.join(ROOT, 'lambdas', 'shared', 'python'))
+
+
+
+def corrected(payload):
+    """The payload with its wrongly typed fields fixed, or None if it isn't a JSON object"""
+    try:
+        body = json.loads(payload)
+    except ValueError:
+        return None
+    if not isinstance(body, dict):
+        return None
+    if not isinstance(body.get('message'), str):
+        body['message'] = json.dumps(body.get('message'))
+    if not isinstance(body.get('incident'), dict):
+        body.pop('incident', None)
+    return json.dumps(body)
+
+
+class BenchSQS(LocalSQS):
+    """Records when each alert was first sent to the distribution queue"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.distribution_url = self.create_queue(QueueName='distribution.fifo')['QueueUrl']
+        self.distributed = {}
+
+    def send_message(self, QueueUrl, MessageBody, **kwargs):
+        response = super().send_message(QueueUrl, MessageBody, **kwargs)
+        if QueueUrl == self.distribution_url:
+            with self.cond:
+                self.distributed.setdefault(json.loads(MessageBody)['alert_id'], time.monotonic())
+        return response
+
+    def depth(self, url):
+        attributes = self.get_queue_attributes(QueueUrl=url)['Attributes']
+        return int(attributes['ApproximateNumberOfMessages']) + int(attributes['ApproximateNumberOfMessagesNotVisible'])
+
+
+def drain(sqs, queue_url, providers, args, start):
+    import worker as worker_module
+
+    worker = worker_module.Worker(sqs, queue_url, providers, sqs.distribution_url, max_in_flight=2,
+                                  batch_size=args.batch_size, wait_seconds=1, shutdown_seconds=5,
+                                  visibility_timeout=args.visibility)
+    thread = threading.Thread(target=worker.run)
+    thread.start()
+    while sqs.depth(queue_url) and time.monotonic() - start < args.timeout:
+        time.sleep(0.05)
+    worker.stop()
+    thread.join()
+
+
+def run(args, server, providers, mode):
+    import handler
+    import manage_quarantine
+    from quarantine import QUARANTINED, Quarantine
+
+    sqs = BenchSQS()
+    dlq_url = sqs.create_queue(QueueName='processing-dlq.fifo')['QueueUrl']
+    redrive = {'deadLetterTargetArn': sqs.get_queue_attributes(QueueUrl=dlq_url)['Attributes']['QueueArn'],
+               'maxReceiveCount': str(args.max_receives)}
+    queue_url = sqs.create_queue(QueueName='processing.fifo', Attributes={
+        'VisibilityTimeout': str(args.visibility), 'RedrivePolicy': json.dumps(redrive)})['QueueUrl']
+
+    store = Quarantine(LocalTable('message_id'))
+    handler.sqs = sqs
+    handler.quarantine = store if mode == 'quarantine' else None
+
+    poisoned = '/ecs/service-0'
+    payloads = [(poisoned, '{"alert_id": "poison-json", "message": "[ERROR] truncated'),
+                (poisoned, json.dumps({'alert_id': 'poison-type', 'log_group': poisoned, 'message': {'error': 'x'}})),
+                (poisoned, json.dumps({'alert_id': 'poison-incident', 'severity': 'HIGH', 'log_group': poisoned,
+                                       'message': '[ERROR] payments timed out', 'incident': 'x',
+                                       'reanalysis': True}))]
+    for n in range(args.alerts):
+        group = f"/ecs/service-{n % args.log_groups}"
+        payloads.append((group, json.dumps({
+            'alert_id': f"alert-{n}", 'severity': 'HIGH', 'log_group': group,
+            'message': f"[ERROR] request {n} failed: upstream service-{n % args.log_groups} unavailable"})))
+    # The poison first in its group's first batch
+    payloads.sort(key=lambda item: item[0] != poisoned)
+    for group, payload in payloads:
+        sqs.send_message(QueueUrl=queue_url, MessageGroupId=group, MessageBody=payload)
+    healthy = {f"alert-{n}" for n in range(args.alerts) if n % args.log_groups == 0}
+
+    server.reset_stats()
+    start = time.monotonic()
+    drain(sqs, queue_url, providers, args, start)
+    elapsed = time.monotonic() - start
+    unblocked = max(sqs.distributed.get(alert_id, float('inf')) for alert_id in healthy) - start
+    result = {
+        'llm': server.stats['requests'],
+        'unblocked': unblocked,
+        'elapsed': elapsed,
+        'dead': int(sqs.get_queue_attributes(QueueUrl=dlq_url)['Attributes']['ApproximateNumberOfMessages']),
+        'quarantined': len(store.list()),
+        'replayed': '-'
+    }
+
+    if mode == 'quarantine':
+        before = set(sqs.distributed)
+        for item in store.list(QUARANTINED):
+            payload = corrected(item['payload'])
+            if payload is None:
+                continue
+            manage_quarantine.replay(store, sqs, queue_url, item, payload)
+        drain(sqs, queue_url, providers, args, time.monotonic())
+        result['replayed'] = len(set(sqs.distributed) - before)
+    handler.quarantine = None
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--alerts', type=int, default=40)
+    parser.add_argument('--log-groups', type=int, default=4)
+    parser.add_argument('--batch-size', type=int, default=5)
+    parser.add_argument('--visibility', type=int, default=2, help='processing queue visibility timeout, seconds')
+    parser.add_argument('--max-receives', type=int, default=3, help='redrive policy maxReceiveCount')
+    parser.add_argument('--timeout', type=float, default=120.0)
+    args = parser.parse_args()
+
+    server = MockLLMServer(base_latency=0.02, per_token_latency=0.0).start()
+
+    import handler
+    import heartbeat
+    import http_client
+    import metrics
+    import worker as worker_module
+    from llm import GeminiProvider
+    from routing import RoutingPolicy
+    from runbooks import RunbookIndex
+    from storage import WriteBehind
+
+    handler.print = metrics.print = worker_module.print = http_client.print = heartbeat.print = \
+        lambda *a, **k: None
+    handler.runbooks = RunbookIndex([])
+    handler.routing_policy = RoutingPolicy({})
+    handler.correlator = None
+    handler.analysis_cache = None
+    handler.idempotency = None
+    handler.ALERTS_TABLE = None
+    handler.writes = WriteBehind(None)
+    provider = GeminiProvider('test-key', model='gemini-2.5-flash', base_url=server.url)
+    providers = {'fast': provider, 'deep': provider}
+
+    print(f"{args.alerts} alerts in {args.log_groups} log groups plus 3 poison messages in the first, batches of "
+          f"{args.batch_size}; visibility timeout {args.visibility} s, maxReceiveCount {args.max_receives}\n")
+    print(f"{'mode':>12} {'LLM calls':>10} {'group unblocked s':>18} {'drained s':>10} {'dead-lettered':>14} "
+          f"{'quarantined':>12} {'replayed':>9}")
+    for mode in ('redrive', 'quarantine'):
+        result = run(args, server, providers, mode)
+        unblocked = 'never' if result['unblocked'] == float('inf') else f"{result['unblocked']:.1f}"
+        print(f"{mode:>12} {result['llm']:>10} {unblocked:>18} {result['elapsed']:>10.1f} "
+              f"{result['dead']:>14} {result['quarantined']:>12} {result['replayed']:>9}")
+
+    server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Benchmark severity/frequency-based model tiering.
+
+Replays a synthetic hour of alerts (a few CRITICAL incidents, a storm of
+one repeating error, MEDIUM and LOW noise) through analyze_alerts() against
+the mock LLM server, once with every alert sent to gemini-2.5-flash (the
+previous behaviour) and once routed by the shipped routing.json policy.
+Reports per-tier latency, tokens and cost per 1k alerts.
+
+Runbooks are disabled so every alert is routed. Model latencies are
+scaled-down profiles (pro slower than flash slower than flash-lite) and
+prices are list prices per 1M tokens at the time of writing - adjust
+PRICES to your contract.
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+from mock_llm import MockLLMServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'lambdas', 'analyzer'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'lambdas', 'shared', 'python'))
+
+BASELINE_MODEL = 'gemini-2.5-flash'
+
+# model -> (base latency s, per output token s)
+LATENCY = {
+    'gemini-2.5-flash-lite': (0.03, 0.0002),
+    'gemini-2.5-flash': (0.06, 0.0005),
+    'gemini-2.5-pro': (0.20, 0.0015),
+}
+
+# model -> (USD per 1M input tokens, USD per 1M output tokens)
+PRICES = {
+    'gemini-2.5-flash-lite': (0.10, 0.40),
+    'gemini-2.5-flash': (0.30, 2.50),
+    'gemini-2.5-pro': (1.25, 10.00),
+}
+
+
+def corpus(rng):
+    """One hour of alerts, shuffled"""
+    alerts = []
+    for n in range(8):
+        alerts.append({'severity': 'CRITICAL', 'source': 'cloudwatch_logs',
+                       'message': f"[CRITICAL] Payment service {n} failing: upstream returned 502 for all requests"})
+    alerts += [{'severity': 'HIGH', 'source': 'cloudwatch_logs',
+                'message': 'API request failed: External service timeout\n'
+                           'requests.exceptions.Timeout: Request to https://api.example.com/v1/users timed out'}] * 40
+    for n in range(20):
+        alerts.append({'severity': 'MEDIUM', 'source': 'cloudwatch_logs',
+                       'message': f"[WARNING] Queue depth {rng.randrange(1000, 5000)} above threshold on worker-{n % 5}"})
+    for n in range(30):
+        alerts.append({'severity': 'LOW', 'source': 'cloudwatch_logs',
+                       'message': f"[INFO] Retrying cache refresh for tenant-{n}"})
+    rng.shuffle(alerts)
+    return [dict(alert, alert_id=f"bench-{i}") for i, alert in enumerate(alerts)]
+
+
+def cost(model, stats):
+    if model not in PRICES:
+        return 0.0
+    input_price, output_price = PRICES[model]
+    return (stats['input_tokens'] * input_price + stats['output_tokens'] * output_price) / 1e6
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))] if ordered else 0.0
+
+
+def run(handler, providers, alerts, server):
+    """Analyze alerts one at a time; returns {model: [latency seconds]}"""
+    from routing import FrequencyCounter
+
+    handler.frequencies = FrequencyCounter()
+    server.reset_stats()
+    latencies = {}
+    for alert in alerts:
+        start = time.perf_counter()
+        [(_, model)] = handler.analyze_alerts(providers, [alert], pack_size=1)
+        latencies.setdefault(model, []).append(time.perf_counter() - start)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    server = MockLLMServer(models=LATENCY).start()
+
+    import handler
+    import metrics
+    from llm import GeminiProvider
+    from routing import RoutingPolicy
+    from runbooks import RunbookIndex
+
+    handler.print = metrics.print = lambda *a, **k: None
+    handler.runbooks = RunbookIndex([])
+    alerts = corpus(random.Random(args.seed))
+
+    # Baseline: every alert to flash with the default token limit
+    handler.routing_policy = RoutingPolicy({})
+    baseline = GeminiProvider('test-key', model=BASELINE_MODEL, base_url=server.url)
+    baseline_latency = run(handler, baseline, alerts, server)
+    baseline_stats = dict(server.stats['by_model'])
+
+    policy = RoutingPolicy.load()
+    handler.routing_policy = policy
+    providers = {
+        tier: GeminiProvider('test-key', model=policy.model(tier, 'google'), base_url=server.url)
+        for tier in ('fast', 'deep')
+    }
+    routed_latency = run(handler, providers, alerts, server)
+    routed_stats = dict(server.stats['by_model'])
+    tier_of = {providers[tier].model: tier for tier in providers}
+
+    print(f"{len(alerts)} alerts\n")
+    print(f"{'run':>8} {'tier':>5} {'model':>22} {'alerts':>7} {'p50 ms':>7} {'p95 ms':>7} "
+          f"{'in tok':>7} {'out tok':>8} {'$/1k alerts':>12}")
+
+    totals = {}
+    for run_name, latencies, stats in (('baseline', baseline_latency, baseline_stats),
+                                       ('routed', routed_latency, routed_stats)):
+        total_cost = 0.0
+        for model, samples in sorted(latencies.items()):
+            model_stats = stats.get(model, {'requests': 0, 'input_tokens': 0, 'output_tokens': 0})
+            model_cost = cost(model, model_stats)
+            total_cost += model_cost
+            tier = '-' if run_name == 'baseline' else tier_of.get(model, model)
+            print(f"{run_name:>8} {tier:>5} {model:>22} {len(samples):>7} "
+                  f"{percentile(samples, 50) * 1000:>7.0f} {percentile(samples, 95) * 1000:>7.0f} "
+                  f"{model_stats['input_tokens'] / len(samples):>7.0f} "
+                  f"{model_stats['output_tokens'] / len(samples):>8.0f} "
+                  f"{model_cost * 1000 / len(samples):>12.4f}")
+        all_samples = [s for samples in latencies.values() for s in samples]
+        totals[run_name] = (total_cost * 1000 / len(alerts), sum(all_samples) * 1000 / len(all_samples))
+
+    print()
+    for run_name, (per_1k, mean_ms) in totals.items():
+        print(f"{run_name:>8}: ${per_1k:.4f} per 1k alerts, mean {mean_ms:.0f} ms per alert")
+
+    server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Benchmark runbook lookups.
+
+Loads the shipped runbooks and reports the hit rate on the test_app.py
+error scenarios, then builds 10k synthetic rules and compares lookup cost
+for the keyword-indexed RunbookIndex against trying every rule's regex in
+turn, for alerts that hit and alerts that miss.
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'lambdas', 'analyzer'))
+
+import metrics
+from runbooks import RunbookIndex
+
+# The error scenarios generated by test_app.py, as they arrive from CloudWatch
+SCENARIOS = [
+    '[ERROR] Database connection failed: Connection timeout after 30s\n'
+    'psycopg2.OperationalError: could not connect to server',
+    '[CRITICAL] Out of memory error in payment processing\n'
+    'MemoryError: Unable to allocate 512MB for transaction batch',
+    '[ERROR] API request failed: External service timeout\n'
+    'requests.exceptions.Timeout: Request to https://api.example.com/v1/users timed out',
+    '[WARNING] High CPU usage detected: 95% sustained over 5 minutes',
+    '[ERROR] S3 upload failed: Access denied\n'
+    'botocore.exceptions.ClientError: An error occurred (AccessDenied) when calling the PutObject operation',
+    '[CRITICAL] Redis cache cluster unavailable\n'
+    'redis.exceptions.ConnectionError: Error connecting to Redis on localhost:6379',
+]
+
+
+ERROR_CODES = ['E_TIMEOUT', 'E_REFUSED', 'E_QUOTA', 'E_AUTH', 'E_CORRUPT']
+
+
+def synthetic_rules(count):
+    """count rules, each keyed on a distinct service name and error code"""
+    rules = []
+    for n in range(count):
+        service = f"svc{n:05d}"
+        code = ERROR_CODES[n % len(ERROR_CODES)]
+        rules.append({
+            'id': f"rule-{n}",
+            'pattern': rf"\b{service}\b.*\b{code}\b",
+            'keywords': [service],
+            'report': {'summary': f"{service} {code}"}
+        })
+    return rules
+
+
+def linear_match(index, message):
+    """Baseline: try every regex in order"""
+    for rule in index.rules:
+        if rule.pattern.search(message):
+            return rule
+    return None
+
+
+def time_lookups(lookup, messages, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for message in messages:
+            lookup(message)
+    return (time.perf_counter() - start) * 1e6 / (repeat * len(messages))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rules', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    metrics.print = lambda *a, **k: None
+    rng = random.Random(7)
+
+    shipped = RunbookIndex.load()
+    hits = sum(1 for message in SCENARIOS if shipped.match(message))
+    print(f"shipped runbooks: {len(shipped.rules)} rules, "
+          f"hit rate {hits}/{len(SCENARIOS)} on test_app scenarios\n")
+
+    start = time.perf_counter()
+    index = RunbookIndex(synthetic_rules(args.rules))
+    build_ms = (time.perf_counter() - start) * 1000
+
+    hit_messages = []
+    for n in range(200):
+        rule = rng.randrange(args.rules)
+        hit_messages.append(f"2026-10-19T10:00:{n % 60:02d}Z ERROR svc{rule:05d} request failed: "
+                            f"{ERROR_CODES[rule % len(ERROR_CODES)]} after 3 retries")
+    miss_messages = [f"ERROR unknown-service request failed: E_UNKNOWN id={n}" for n in range(200)]
+
+    print(f"{args.rules} rules, index built in {build_ms:.1f} ms (regexes compile on first use)")
+    print(f"{'lookup':>8} {'alerts':>7} {'us/lookup':>10} {'hit rate':>9}")
+    for name, lookup in (('linear', lambda m: linear_match(index, m)), ('indexed', index.match)):
+        for kind, messages in (('hit', hit_messages), ('miss', miss_messages)):
+            repeat = 1 if name == 'linear' else args.repeat
+            micros = time_lookups(lookup, messages, repeat)
+            rate = sum(1 for m in messages if lookup(m)) / len(messages)
+            print(f"{name:>8} {kind:>7} {micros:>10.1f} {rate:>9.0%}")
+
+
+if __name__ == '__main__':
+    main()
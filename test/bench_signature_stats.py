@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Benchmark the historical-pattern context source.
+
+Builds a synthetic alerts table (default 1M alerts over 30 days, 2,000
+error signatures with a long-tailed distribution) on the in-memory
+DynamoDB stand-in and answers "how often has this signature occurred in
+the past week" for the hottest signature three ways:
+
+  scan (1 page) - the archived get_historical_pattern: a filtered Scan
+                  without pagination, which only sees the first 1 MB page
+  scan (full)   - the same Scan followed through LastEvaluatedKey
+  counters      - SignatureStats.pattern(): one GetItem on the
+                  pre-aggregated item that SignatureStats.record() built
+                  as the alerts were stored
+
+Reports requests, read capacity, items read, modelled latency (request
+round trips; the stand-in's own CPU time is shown separately) and whether the count is exact, plus
+the write capacity the counters cost at store time. The counters' window
+is whole UTC days, so the lookup time is pinned to the end of a day to
+make both windows cover the same alerts.
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from array import array
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+from boto3.dynamodb.conditions import Attr
+
+from dynamodb_local import LocalTable
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'lambdas', 'analyzer'))
+
+from signatures import DAY_SECONDS, SignatureStats, calculate_frequency
+
+MESSAGE = 'Database connection timeout after 30s: pool exhausted on orders-db (signature {n})'
+
+
+class SyntheticAlertsTable(LocalTable):
+    """Alerts table whose items are generated on the fly from compact arrays"""
+
+    def __init__(self, signatures, timestamps, seed):
+        super().__init__('alert_id', 'timestamp')
+        self.signatures = signatures
+        self.timestamps = timestamps
+        # Scan order follows the partition key hash, not arrival order
+        self.order = array('I', range(len(signatures)))
+        random.Random(seed).shuffle(self.order)
+
+    def iter_items(self):
+        for n in self.order:
+            signature, timestamp = self.signatures[n], self.timestamps[n]
+            yield {
+                'alert_id': f"alert-{n:08d}",
+                'timestamp': timestamp,
+                'severity': 'HIGH',
+                'source': 'cloudwatch_logs',
+                'error_signature': f"sig-{signature:04d}",
+                'message': MESSAGE.format(n=signature),
+            }
+
+
+def corpus(alerts, signatures, days, now, seed):
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(signatures)]
+    picked = array('H', rng.choices(range(signatures), weights=weights, k=alerts))
+    timestamps = array('q', sorted(now - rng.randrange(days * DAY_SECONDS) for _ in range(alerts)))
+    return picked, timestamps
+
+
+def scan(table, signature, cutoff, paginate):
+    """The archived Scan-based pattern lookup"""
+    kwargs = {'FilterExpression': Attr('error_signature').eq(signature) & Attr('timestamp').gt(cutoff)}
+    items = []
+    while True:
+        response = table.scan(**kwargs)
+        items += response.get('Items', [])
+        if not paginate or 'LastEvaluatedKey' not in response:
+            return len(items)
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def measure(table, run):
+    table.reset_stats()
+    start = time.perf_counter()
+    result = run()
+    return result, time.perf_counter() - start, dict(table.stats)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--alerts', type=int, default=1_000_000)
+    parser.add_argument('--signatures', type=int, default=2000)
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--page-ms', type=float, default=60.0, help='modelled round trip per 1 MB Scan page')
+    parser.add_argument('--get-ms', type=float, default=4.0, help='modelled round trip per GetItem/UpdateItem')
+    parser.add_argument('--seed', type=int, default=11)
+    args = parser.parse_args()
+
+    # End the window at a UTC day boundary so the 7 daily counters and the
+    # Scan's rolling 7 x 24h cutoff cover the same alerts
+    now = int(time.time()) // DAY_SECONDS * DAY_SECONDS - 1
+    cutoff = now - 7 * DAY_SECONDS
+    signatures, timestamps = corpus(args.alerts, args.signatures, args.days, now, args.seed)
+    target = 'sig-0000'
+    expected = sum(1 for s, t in zip(signatures, timestamps) if s == 0 and t > cutoff)
+
+    alerts = SyntheticAlertsTable(signatures, timestamps, args.seed)
+    counters_table = LocalTable('error_signature')
+    stats = SignatureStats(counters_table)
+
+    # Store time: one counter update per alert (in arrival order)
+    counters_table.reset_stats()
+    start = time.perf_counter()
+    for signature, timestamp in zip(signatures, timestamps):
+        stats.record(f"sig-{signature:04d}", timestamp)
+    record_seconds = time.perf_counter() - start
+    write_stats = dict(counters_table.stats)
+
+    runs = [
+        ('scan (1 page)', alerts, lambda: scan(alerts, target, cutoff, paginate=False), args.page_ms),
+        ('scan (full)', alerts, lambda: scan(alerts, target, cutoff, paginate=True), args.page_ms),
+        ('counters', counters_table, lambda: stats.pattern(target, now)['occurrence_count'], args.get_ms),
+    ]
+
+    print(f"{args.alerts:,} alerts over {args.days} days, {args.signatures:,} signatures; "
+          f"{target} has {expected:,} occurrences in the past 7 days\n")
+    print(f"{'lookup':>14} {'requests':>9} {'RCU':>9} {'items read':>11} {'local ms':>9} {'model ms':>9} "
+          f"{'count':>8} {'frequency':>15} {'exact':>6}")
+    for name, table, run, rtt_ms in runs:
+        count, seconds, table_stats = measure(table, run)
+        modelled = table_stats['requests'] * rtt_ms
+        print(f"{name:>14} {table_stats['requests']:>9,} {table_stats['rcu']:>9,.1f} {table_stats['items_read']:>11,} "
+              f"{seconds * 1000:>9.1f} {modelled:>9.0f} {count:>8,} {calculate_frequency(count):>15} "
+              f"{'yes' if count == expected else 'no':>6}")
+
+    print(f"\ncounter upkeep: {write_stats['requests']:,} UpdateItem calls for {args.alerts:,} alerts "
+          f"({write_stats['conditional_failures']:,} out-of-order retries), {write_stats['wcu']:,.0f} WCU, "
+          f"{len(counters_table.items):,} items, {record_seconds * 1e6 / args.alerts:.1f} us local CPU per alert")
+
+
+if __name__ == '__main__':
+    main()
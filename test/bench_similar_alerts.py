@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Benchmark the similar-alerts context source.
+
+Fills the in-memory DynamoDB stand-in with a day of stored alerts (full
+items: message, raw data and analysis) and looks up similar alerts for a
+stream of new ones:
+
+  archived  - the old get_recent_similar_alerts: Query on
+              severity-timestamp-index (projection ALL), Limit=10, with
+              len(items) as the count
+  paginated - the same Query followed to the end to get a true count,
+              still reading whole items
+  projected - SimilarAlerts on the INCLUDE-projected indexes, matched on
+              error signature: top-k by recency plus a COUNT of the rest
+  cached    - the same through ContextGatherer, whose short per-key cache
+              serves repeats of a signature
+
+Reports requests, read capacity, the size of the result handed to the
+prompt builder and whether the count matches the number of alerts that
+really share the signature.
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+from boto3.dynamodb.conditions import Key
+
+from dynamodb_local import LocalTable
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'lambdas', 'analyzer'))
+
+import context
+import metrics
+from context import ContextGatherer, ContextSource
+from similar import FIELDS, SimilarAlerts, excluding
+
+SEVERITIES = ['CRITICAL', 'HIGH', 'MEDIUM', 'LOW']
+
+
+def stored_alerts(count, signatures, now, rng):
+    weights = [1 / (rank + 1) for rank in range(signatures)]
+    for n in range(count):
+        signature = rng.choices(range(signatures), weights=weights)[0]
+        yield {
+            'alert_id': f"alert-{n:06d}",
+            'timestamp': now - rng.randrange(86400),
+            'severity': SEVERITIES[signature % 4],
+            'error_signature': f"sig-{signature:04d}",
+            'title': f"Error {signature} in service-{signature % 17}",
+            'message': f"[ERROR] service-{signature % 17} failed: " + 'x' * rng.randrange(200, 800),
+            'raw_data': {'logGroup': '/aws/bench', 'events': ['y' * 300]},
+            'analysis': json.dumps({'summary': 'z' * 400, 'remediation': ['w' * 200] * 4}),
+        }
+
+
+def archived(table, alert, now):
+    response = table.query(
+        IndexName='severity-timestamp-index',
+        KeyConditionExpression=Key('severity').eq(alert['severity']) & Key('timestamp').gt(now - 86400),
+        ScanIndexForward=False,
+        Limit=10
+    )
+    return [item for item in response.get('Items', []) if item.get('alert_id') != alert.get('alert_id')]
+
+
+def paginated(table, alert, now):
+    """Every same-signature alert of the day, read whole through the severity index"""
+    kwargs = {
+        'IndexName': 'severity-timestamp-index',
+        'KeyConditionExpression': Key('severity').eq(alert['severity']) & Key('timestamp').gt(now - 86400),
+        'ScanIndexForward': False,
+    }
+    items = []
+    while True:
+        response = table.query(**kwargs)
+        items += [item for item in response.get('Items', []) if item['error_signature'] == alert['error_signature']]
+        if 'LastEvaluatedKey' not in response:
+            return items
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--stored', type=int, default=20000)
+    parser.add_argument('--lookups', type=int, default=200)
+    parser.add_argument('--signatures', type=int, default=300)
+    parser.add_argument('--seed', type=int, default=5)
+    args = parser.parse_args()
+
+    context.print = metrics.print = lambda *a, **k: None
+    rng = random.Random(args.seed)
+    now = int(time.time())
+
+    full = LocalTable('alert_id', indexes={'severity-timestamp-index': ('severity', 'timestamp', None)})
+    projected = LocalTable('alert_id', indexes={
+        'severity-timestamp-index': ('severity', 'timestamp', FIELDS),
+        'signature-timestamp-index': ('error_signature', 'timestamp', FIELDS),
+    })
+    for item in stored_alerts(args.stored, args.signatures, now, rng):
+        full.items[item['alert_id']] = projected.items[item['alert_id']] = item
+
+    truth = {}
+    for item in full.items.values():
+        truth[item['error_signature']] = truth.get(item['error_signature'], 0) + 1
+    # New alerts (not yet stored) whose signatures follow the stored mix
+    lookups = []
+    for n in range(args.lookups):
+        template = full.items[f"alert-{rng.randrange(args.stored):06d}"]
+        lookups.append({**template, 'alert_id': f"new-{n}", 'timestamp': now})
+
+    service = SimilarAlerts(projected)
+    source = ContextSource('recent_similar_alerts', lambda a: service.recent('error_signature', a['error_signature'], now),
+                           lambda a: a['error_signature'], 60, lambda a, s: excluding(a, s, service.top_k))
+    gatherer = ContextGatherer([source])
+
+    runs = [
+        ('archived', full, lambda a: archived(full, a, now), lambda r: len(r)),
+        ('paginated', full, lambda a: paginated(full, a, now), lambda r: len(r)),
+        ('projected', projected, lambda a: excluding(a, service.recent('error_signature', a['error_signature'], now),
+                                                    service.top_k), lambda r: r['count']),
+        ('cached', projected, lambda a: gatherer.gather(a)['recent_similar_alerts'], lambda r: r['count']),
+    ]
+
+    print(f"{args.stored:,} stored alerts, {args.signatures} signatures, {args.lookups} lookups\n")
+    print(f"{'mode':>10} {'requests':>9} {'RCU':>8} {'result KB':>12} {'exact counts':>13}")
+    for name, table, run, count_of in runs:
+        table.reset_stats()
+        returned = exact = 0
+        for alert in lookups:
+            result = run(alert)
+            returned += len(json.dumps(result, default=str))
+            exact += count_of(result) == truth[alert['error_signature']]
+        print(f"{name:>10} {table.stats['requests']:>9,} {table.stats['rcu']:>8,.1f} {returned / 1024:>12,.0f} "
+              f"{exact * 100 / len(lookups):>12.0f}%")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Benchmark streaming analysis with early summary dispatch.
+
+Runs single-alert analyses against the local mock LLM server's chunked
+streaming endpoints (Gemini and Anthropic style) and reports how long
+on-call waits for the first distribution message with and without
+streaming.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+from mock_llm import MockLLMServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'lambdas', 'analyzer'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'lambdas', 'shared', 'python'))
+
+ALERT = {'alert_id': 'bench', 'severity': 'CRITICAL',
+         'message': 'Redis cache cluster unavailable\nredis.exceptions.ConnectionError: Error connecting to Redis on localhost:6379'}
+
+RUNBOOK = [
+    'Check the cluster status in the ElastiCache console',
+    'Confirm the primary node is reachable from the application subnets',
+    'Review security group changes from the last deploy',
+    'Fail over to the replica if the primary is unhealthy',
+    'Watch CurrConnections and EngineCPUUtilization until they recover'
+] * 4
+
+
+class VerboseMockLLMServer(MockLLMServer):
+    """Mock whose reports carry long remediation steps, like real analyses"""
+
+    def report(self, message):
+        report = super().report(message)
+        report['remediation_steps'] = report['remediation_steps'] + RUNBOOK
+        return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    server = VerboseMockLLMServer(base_latency=0.2, per_token_latency=0.01).start()
+
+    import handler
+    import metrics
+    from routing import RoutingPolicy
+    from runbooks import RunbookIndex
+    from llm import AnthropicProvider, GeminiProvider
+
+    handler.print = metrics.print = lambda *a, **k: None
+    # No runbooks and one tier for every alert, so every alert reaches the LLM
+    handler.runbooks = RunbookIndex([])
+    handler.routing_policy = RoutingPolicy({})
+    providers = [
+        ('google', GeminiProvider('test-key', base_url=server.url)),
+        ('anthropic', AnthropicProvider('test-key', base_url=server.url)),
+    ]
+
+    print(f"{'provider':>10} {'mode':>10} {'first msg ms':>13} {'full ms':>9}")
+    for name, provider in providers:
+        for streaming in (False, True):
+            handler.STREAMING = streaming
+            first = full = 0.0
+            for _ in range(args.runs):
+                start = time.perf_counter()
+                first_at = []
+                handler.analyze_alerts(
+                    provider, [ALERT], pack_size=1,
+                    on_preliminary=lambda body, report, model: first_at.append(time.perf_counter())
+                )
+                done = time.perf_counter()
+                first += (first_at[0] if first_at else done) - start
+                full += done - start
+
+            mode = 'streaming' if streaming else 'blocking'
+            print(f"{name:>10} {mode:>10} {first * 1000 / args.runs:>13.0f} {full * 1000 / args.runs:>9.0f}")
+
+    server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Benchmark the analyzer's long-running SQS worker against the Lambda
+event source model, on the local SQS stand-in and the mock LLM server.
+
+Sends --alerts alerts from --log-groups log groups to a FIFO processing
+queue and drains it:
+
+  lambda  - the event source mapping with batch_size 1 (the default):
+            one invocation per message, --invoke-ms of invocation
+            overhead each, one message group so one invocation at a time
+  worker  - worker.py with long polls of 10 and --in-flight batches
+            analyzed at once, with one message group (as today) and with
+            a group per log group (ALERT_MESSAGE_GROUPS=log_group)
+
+Reports throughput, time from send to the distribution message (p50/p95),
+and SQS requests. Then checks graceful shutdown: a worker is stopped
+halfway through and a second one drains the queue; every alert must be
+distributed exactly once.
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+from mock_llm import MockLLMServer
+from sqs_local import LocalSQS
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'lambdas', 'analyzer'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'lambdas', 'shared', 'python'))
+
+
+class TimedSQS(LocalSQS):
+    """Records when each alert's distribution message is sent"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.distribution_url = self.create_queue(QueueName='distribution.fifo')['QueueUrl']
+        self.distributed = {}
+        self.done = threading.Condition()
+
+    def send_message(self, QueueUrl, MessageBody, **kwargs):
+        response = super().send_message(QueueUrl, MessageBody, **kwargs)
+        if QueueUrl == self.distribution_url:
+            with self.done:
+                alert_id = json.loads(MessageBody)['alert_id']
+                self.distributed.setdefault(alert_id, []).append(time.monotonic())
+                self.done.notify_all()
+        return response
+
+    def wait_distributed(self, count, timeout=300):
+        with self.done:
+            self.done.wait_for(lambda: len(self.distributed) >= count, timeout)
+
+
+def send_alerts(sqs, queue_url, args, mode):
+    from queues import message_group
+
+    sent = {}
+    for n in range(args.alerts):
+        body = {'alert_id': f"alert-{n}", 'severity': 'HIGH', 'log_group': f"/ecs/service-{n % args.log_groups}",
+                'message': f"[ERROR] request {n} failed: upstream service-{n % args.log_groups} unavailable"}
+        sqs.send_message(QueueUrl=queue_url, MessageBody=json.dumps(body), MessageGroupId=message_group(body, mode))
+        sent[body['alert_id']] = time.monotonic()
+    return sent
+
+
+class Context:
+    def get_remaining_time_in_millis(self):
+        return 60000
+
+
+def run_lambda(handler, sqs, queue_url, args):
+    """The event source mapping: poll, invoke with the batch, delete it"""
+    os.environ['DISTRIBUTION_QUEUE_URL'] = sqs.distribution_url
+    while len(sqs.distributed) < args.alerts:
+        messages = sqs.receive_message(QueueUrl=queue_url, MaxNumberOfMessages=1, WaitTimeSeconds=1).get('Messages')
+        if not messages:
+            continue
+        time.sleep(args.invoke_ms / 1000)
+        handler.lambda_handler({'Records': [{'messageId': m['MessageId'], 'body': m['Body']} for m in messages]}, Context())
+        sqs.delete_message_batch(QueueUrl=queue_url, Entries=[
+            {'Id': str(n), 'ReceiptHandle': m['ReceiptHandle']} for n, m in enumerate(messages)])
+
+
+def start_worker(worker_module, sqs, queue_url, providers, in_flight):
+    worker = worker_module.Worker(sqs, queue_url, providers, sqs.distribution_url, max_in_flight=in_flight,
+                                  wait_seconds=1, shutdown_seconds=5)
+    thread = threading.Thread(target=worker.run)
+    thread.start()
+    return worker, thread
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))] if ordered else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--alerts', type=int, default=200)
+    parser.add_argument('--log-groups', type=int, default=20)
+    parser.add_argument('--in-flight', type=int, default=4)
+    parser.add_argument('--invoke-ms', type=float, default=30.0, help='Lambda invocation overhead')
+    parser.add_argument('--llm-ms', type=float, default=150.0, help='mock LLM base latency')
+    parser.add_argument('--sqs-ms', type=float, default=5.0, help='SQS request latency')
+    args = parser.parse_args()
+
+    server = MockLLMServer(base_latency=args.llm_ms / 1000, per_token_latency=0.0001).start()
+
+    import handler
+    import http_client
+    import metrics
+    import worker as worker_module
+    from llm import GeminiProvider
+    from routing import RoutingPolicy
+    from runbooks import RunbookIndex
+
+    handler.print = metrics.print = worker_module.print = http_client.print = lambda *a, **k: None
+    handler.runbooks = RunbookIndex([])
+    handler.routing_policy = RoutingPolicy({})
+    handler.correlator = None
+    provider = GeminiProvider('test-key', model='gemini-2.5-flash', base_url=server.url)
+    providers = {'fast': provider, 'deep': provider}
+    handler.get_provider = lambda tier: providers[tier]
+
+    print(f"{args.alerts} alerts from {args.log_groups} log groups; mock LLM ~{args.llm_ms:.0f} ms per call, "
+          f"SQS {args.sqs_ms:.0f} ms per request\n")
+    print(f"{'mode':>8} {'groups':>10} {'in flight':>10} {'alerts/s':>9} {'latency p50 s':>14} "
+          f"{'latency p95 s':>14} {'receives':>9} {'deletes':>8}")
+
+    runs = [('lambda', 'single', 1), ('worker', 'single', args.in_flight), ('worker', 'log_group', args.in_flight),
+            ('worker', 'log_group', args.in_flight * 2)]
+    for mode, groups, in_flight in runs:
+        sqs = TimedSQS(latency=args.sqs_ms / 1000)
+        queue_url = sqs.create_queue(QueueName='processing.fifo')['QueueUrl']
+        handler.sqs = sqs
+        sent = send_alerts(sqs, queue_url, args, groups)
+        sqs.stats.clear()
+        start = time.monotonic()
+        if mode == 'lambda':
+            run_lambda(handler, sqs, queue_url, args)
+        else:
+            worker, thread = start_worker(worker_module, sqs, queue_url, providers, in_flight)
+            sqs.wait_distributed(args.alerts)
+            worker.stop()
+            thread.join()
+        elapsed = time.monotonic() - start
+        latencies = [sqs.distributed[alert_id][0] - sent_at for alert_id, sent_at in sent.items()]
+        deletes = sqs.stats['DeleteMessageBatch'] + sqs.stats['DeleteMessage']
+        print(f"{mode:>8} {groups:>10} {in_flight:>10} {args.alerts / elapsed:>9.1f} "
+              f"{percentile(latencies, 50):>14.1f} {percentile(latencies, 95):>14.1f} "
+              f"{sqs.stats['ReceiveMessage']:>9,} {deletes:>8,}")
+
+    # Graceful shutdown: stop one worker halfway, drain with another
+    sqs = TimedSQS(latency=args.sqs_ms / 1000)
+    queue_url = sqs.create_queue(QueueName='processing.fifo')['QueueUrl']
+    handler.sqs = sqs
+    send_alerts(sqs, queue_url, args, 'log_group')
+    first, thread = start_worker(worker_module, sqs, queue_url, providers, args.in_flight)
+    sqs.wait_distributed(args.alerts // 2)
+    first.stop()
+    thread.join()
+    stopped_with = len(sqs.distributed)
+    second, thread = start_worker(worker_module, sqs, queue_url, providers, args.in_flight)
+    sqs.wait_distributed(args.alerts, timeout=60)
+    second.stop()
+    thread.join()
+    twice = sum(len(times) > 1 for times in sqs.distributed.values())
+    left = int(sqs.get_queue_attributes(QueueUrl=queue_url)['Attributes']['ApproximateNumberOfMessages'])
+    print(f"\nshutdown: first worker stopped after {stopped_with} alerts, second drained the rest; "
+          f"{len(sqs.distributed)}/{args.alerts} distributed, {twice} twice, {left} left in the queue")
+
+    server.stop()
+
+
+if __name__ == '__main__':
+    main()
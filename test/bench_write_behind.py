@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Benchmark batched alert storage and distribution status writes.
+
+For batches of alerts, stores each alert record and then updates its
+distribution status (conditional on the record existing), against the
+client-level DynamoDB stand-in with a per-request latency:
+
+  per-item    - the archived pattern: one PutItem per alert from the
+                analyzer and one UpdateItem per alert from the notifier
+  batched     - WriteBehind: records flushed with BatchWriteItem (25 per
+                call), status updates as one UpdateItem each
+  transaction - batched, with status updates queued atomic=True and sent
+                as TransactWriteItems (100 per call, twice the WCU)
+  throttled   - batched, with a share of BatchWriteItem writes returned as
+                UnprocessedItems and retried with backoff
+
+A few status updates target alerts that were never stored, so their
+condition fails. Reports requests, write capacity, wall time and whether
+every record and status landed.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+from dynamodb_local import LocalDynamoDB, LocalTable
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'lambdas', 'shared', 'python'))
+
+from storage import WriteBehind
+
+TABLE = 'alerts'
+STATUS_UPDATE = 'SET distribution_status = :status, distributed_at = :time'
+
+
+def records(count):
+    now = int(time.time())
+    return [{
+        'alert_id': f"alert-{n:04d}",
+        'timestamp': now - n,
+        'severity': 'HIGH',
+        'source': 'cloudwatch_logs',
+        'title': f"Payment API timeouts on shard {n % 7}",
+        'message': f"[ERROR] upstream timeout calling payments shard {n % 7}: " + 'x' * 400,
+        'error_signature': f"{n % 13:016x}",
+        'analysis': json.dumps({'summary': 's' * 200, 'root_cause_hypothesis': 'r' * 300,
+                                'remediation_steps': ['step ' + 'y' * 120] * 4}),
+        'model': 'gemini-2.5-flash',
+        'created_at': now,
+    } for n in range(count)]
+
+
+def status_values():
+    return {':status': {'slack': True, 'stage': 'final'}, ':time': int(time.time())}
+
+
+def per_item(client, items, missing):
+    for item in items:
+        client.put_item(TableName=TABLE, Item=item)
+    for alert_id in [item['alert_id'] for item in items] + missing:
+        try:
+            client.update_item(TableName=TABLE, Key={'alert_id': alert_id}, UpdateExpression=STATUS_UPDATE,
+                               ExpressionAttributeValues=status_values(),
+                               ConditionExpression='attribute_exists(alert_id)')
+        except Exception:
+            pass
+
+
+def batched(client, items, missing, atomic=False):
+    writes = WriteBehind(client, key_schema={TABLE: ['alert_id']}, base_delay=0.01)
+    for item in items:
+        writes.put(TABLE, item)
+    writes.flush()
+    for alert_id in [item['alert_id'] for item in items] + missing:
+        writes.update(TABLE, {'alert_id': alert_id}, STATUS_UPDATE, values=status_values(),
+                      condition='attribute_exists(alert_id)', atomic=atomic)
+    return writes.flush()
+
+
+def transaction(client, items, missing):
+    return batched(client, items, missing, atomic=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', default='10,100')
+    parser.add_argument('--latency', type=float, default=0.008, help='seconds per DynamoDB request')
+    parser.add_argument('--unprocessed', type=float, default=0.2, help='share of batch writes throttled')
+    args = parser.parse_args()
+
+    print(f"{'alerts':>7} {'mode':>11} {'requests':>9} {'WCU':>7} {'wall ms':>8} {'retries':>8} {'complete':>9}")
+    for size in [int(s) for s in args.sizes.split(',')]:
+        items = records(size)
+        missing = [f"never-stored-{n}" for n in range(max(1, size // 10))]
+
+        for name, run, throttle in (('per-item', per_item, 0.0), ('batched', batched, 0.0),
+                                    ('transaction', transaction, 0.0), ('throttled', batched, args.unprocessed)):
+            table = LocalTable('alert_id')
+            client = LocalDynamoDB({TABLE: table}, latency=args.latency, unprocessed_rate=throttle, seed=size)
+            start = time.perf_counter()
+            stats = run(client, items, missing)
+            elapsed = time.perf_counter() - start
+
+            complete = len(table.items) == size and all('distribution_status' in i for i in table.items.values())
+            retries = stats['retries'] if stats else 0
+            print(f"{size:>7} {name:>11} {client.stats['requests']:>9} {client.stats['wcu']:>7.0f} "
+                  f"{elapsed * 1000:>8.0f} {retries:>8} {'yes' if complete else 'no':>9}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,590 @@
+#!/usr/bin/env python3
+"""
+In-memory stand-in for a boto3 DynamoDB Table, for local benchmarks.
+
+Implements the subset of the Table API the analyzer uses (get_item,
+put_item, update_item, query, scan) including update/condition/filter
+expressions with attribute name and value placeholders and nested
+document paths, 1 MB result
+pages, and ConditionalCheckFailedException as a botocore ClientError.
+Every call is counted with the read/write capacity DynamoDB would bill:
+reads in 4 KB units (halved for eventually consistent reads), writes in
+1 KB units of the larger of the old and new item.
+"""
+
+import functools
+import json
+import math
+import random
+import re
+import threading
+import time
+from decimal import Decimal
+
+from boto3.dynamodb.conditions import ConditionBase, ConditionExpressionBuilder
+from botocore.exceptions import ClientError
+
+PAGE_BYTES = 1024 * 1024
+
+TOKEN = re.compile(r'\s*(<=|>=|<>|[=<>(),+-]|[#:]?[A-Za-z_]\w*(?:\.#?[A-Za-z_]\w*)*|\S)')
+
+
+def item_size(item):
+    """Approximate DynamoDB item size in bytes"""
+    size = 0
+    for name, value in item.items():
+        size += len(name)
+        if isinstance(value, (int, float, Decimal)) and not isinstance(value, bool):
+            size += len(str(value)) // 2 + 1
+        elif isinstance(value, str):
+            size += len(value.encode('utf-8'))
+        elif isinstance(value, (bytes, bytearray)):
+            size += len(value)
+        else:
+            size += len(json.dumps(value, default=str))
+    return size
+
+
+def tokenize(expression):
+    return TOKEN.findall(expression)
+
+
+class Parser:
+    """Recursive-descent parser for condition and update expressions"""
+
+    def __init__(self, expression):
+        self.tokens = tokenize(expression)
+        self.pos = 0
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def take(self, expected=None):
+        token = self.peek()
+        if expected is not None and (token or '').upper() != expected:
+            raise ValueError(f"Expected {expected}, got {token}")
+        self.pos += 1
+        return token
+
+    # Conditions: or_expr := and_expr (OR and_expr)*
+
+    def condition(self):
+        node = self.and_expr()
+        while (self.peek() or '').upper() == 'OR':
+            self.take()
+            node = ('or', node, self.and_expr())
+        return node
+
+    def and_expr(self):
+        node = self.not_expr()
+        while (self.peek() or '').upper() == 'AND':
+            self.take()
+            node = ('and', node, self.not_expr())
+        return node
+
+    def not_expr(self):
+        if (self.peek() or '').upper() == 'NOT':
+            self.take()
+            return ('not', self.not_expr())
+        return self.comparison()
+
+    def comparison(self):
+        if self.peek() == '(':
+            self.take('(')
+            node = self.condition()
+            self.take(')')
+            return node
+
+        token = self.peek()
+        if token in ('attribute_exists', 'attribute_not_exists', 'begins_with', 'contains'):
+            self.take()
+            self.take('(')
+            args = [self.operand()]
+            while self.peek() == ',':
+                self.take()
+                args.append(self.operand())
+            self.take(')')
+            return (token, *args)
+
+        left = self.operand()
+        op = self.take()
+        if op.upper() == 'BETWEEN':
+            low = self.operand()
+            self.take('AND')
+            return ('between', left, low, self.operand())
+        if op.upper() == 'IN':
+            self.take('(')
+            values = [self.operand()]
+            while self.peek() == ',':
+                self.take()
+                values.append(self.operand())
+            self.take(')')
+            return ('in', left, values)
+        return ('cmp', op, left, self.operand())
+
+    def operand(self):
+        token = self.take()
+        if token in ('if_not_exists', 'list_append', 'size'):
+            self.take('(')
+            args = [self.value()]
+            while self.peek() == ',':
+                self.take()
+                args.append(self.value())
+            self.take(')')
+            return (token, *args)
+        return ('value', token) if token.startswith(':') else ('path', token)
+
+    def value(self):
+        node = self.operand()
+        while self.peek() in ('+', '-'):
+            op = self.take()
+            node = (op, node, self.operand())
+        return node
+
+    # Updates: SET a = v, ... ADD a :v, ... REMOVE a, ... DELETE a :v
+
+    def update(self):
+        actions = []
+        while self.peek() is not None:
+            clause = self.take().upper()
+            while True:
+                path = self.take()
+                if clause == 'SET':
+                    self.take('=')
+                    actions.append(('SET', path, self.value()))
+                elif clause in ('ADD', 'DELETE'):
+                    actions.append((clause, path, self.operand()))
+                elif clause == 'REMOVE':
+                    actions.append(('REMOVE', path, None))
+                else:
+                    raise ValueError(f"Unknown update clause {clause}")
+                if self.peek() != ',':
+                    break
+                self.take()
+        return actions
+
+
+@functools.lru_cache(maxsize=1024)
+def parse_condition(expression):
+    return Parser(expression).condition()
+
+
+@functools.lru_cache(maxsize=1024)
+def parse_update(expression):
+    return Parser(expression).update()
+
+
+class LocalTable:
+    """Dict-backed table keyed on hash (and optional range) key.
+
+    indexes maps a GSI name to (hash key, range key, projected attributes);
+    projected attributes of None means projection_type ALL.
+    """
+
+    def __init__(self, hash_key, range_key=None, indexes=None):
+        self.hash_key = hash_key
+        self.range_key = range_key
+        self.indexes = indexes or {}
+        self.items = {}
+        self.cursors = {}
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.stats = {'requests': 0, 'rcu': 0.0, 'wcu': 0.0, 'items_read': 0, 'conditional_failures': 0}
+
+    # Expression evaluation
+
+    def _resolve(self, node, item, names, values):
+        kind = node[0]
+        if kind == 'value':
+            return values[node[1]]
+        if kind == 'path':
+            return self._get_path(item, node[1], names)
+        if kind == 'if_not_exists':
+            current = self._resolve(node[1], item, names, values)
+            return current if current is not None else self._resolve(node[2], item, names, values)
+        if kind == 'list_append':
+            return list(self._resolve(node[1], item, names, values) or []) + \
+                list(self._resolve(node[2], item, names, values) or [])
+        if kind == 'size':
+            return len(self._resolve(node[1], item, names, values) or '')
+        if kind in ('+', '-'):
+            left = self._resolve(node[1], item, names, values)
+            right = self._resolve(node[2], item, names, values)
+            return left + right if kind == '+' else left - right
+        raise ValueError(f"Cannot resolve {node}")
+
+    def _check(self, node, item, names, values):
+        kind = node[0]
+        if kind == 'or':
+            return self._check(node[1], item, names, values) or self._check(node[2], item, names, values)
+        if kind == 'and':
+            return self._check(node[1], item, names, values) and self._check(node[2], item, names, values)
+        if kind == 'not':
+            return not self._check(node[1], item, names, values)
+        if kind in ('attribute_exists', 'attribute_not_exists'):
+            exists = self._get_path(item, node[1][1], names, missing=self) is not self
+            return exists if kind == 'attribute_exists' else not exists
+        if kind == 'begins_with':
+            value = self._resolve(node[1], item, names, values)
+            return isinstance(value, str) and value.startswith(self._resolve(node[2], item, names, values))
+        if kind == 'contains':
+            value = self._resolve(node[1], item, names, values)
+            return value is not None and self._resolve(node[2], item, names, values) in value
+        if kind == 'between':
+            value = self._resolve(node[1], item, names, values)
+            return value is not None and \
+                self._resolve(node[2], item, names, values) <= value <= self._resolve(node[3], item, names, values)
+        if kind == 'in':
+            return self._resolve(node[1], item, names, values) in [self._resolve(v, item, names, values) for v in node[2]]
+
+        op, left, right = node[1], self._resolve(node[2], item, names, values), self._resolve(node[3], item, names, values)
+        if op == '=':
+            return left == right
+        if op == '<>':
+            return left != right
+        if left is None or right is None:
+            return False
+        return {'<': left < right, '<=': left <= right, '>': left > right, '>=': left >= right}[op]
+
+    def _expression(self, expression, names, values, is_key=False):
+        """Accept a boto3 Condition object or an expression string"""
+        if isinstance(expression, ConditionBase):
+            built = ConditionExpressionBuilder().build_expression(expression, is_key_condition=is_key)
+            return (built.condition_expression, {**(names or {}), **built.attribute_name_placeholders},
+                    {**(values or {}), **built.attribute_value_placeholders})
+        return expression, names or {}, values or {}
+
+    # Document paths: a.#b.c walks nested maps
+
+    @staticmethod
+    def _get_path(item, path, names, missing=None):
+        value = item
+        for segment in path.split('.'):
+            if not isinstance(value, dict) or names.get(segment, segment) not in value:
+                return missing
+            value = value[names.get(segment, segment)]
+        return value
+
+    @staticmethod
+    def _parent(item, path, names):
+        """(map holding the path's last segment, its name); nested maps are copied on write"""
+        segments = [names.get(segment, segment) for segment in path.split('.')]
+        parent = item
+        for segment in segments[:-1]:
+            if not isinstance(parent.get(segment), dict):
+                raise ClientError(
+                    {'Error': {'Code': 'ValidationException',
+                               'Message': 'The document path provided in the update expression is invalid for update'}},
+                    'UpdateItem'
+                )
+            parent[segment] = dict(parent[segment])
+            parent = parent[segment]
+        return parent, segments[-1]
+
+    def _conditional_failure(self, operation):
+        self.stats['conditional_failures'] += 1
+        raise ClientError(
+            {'Error': {'Code': 'ConditionalCheckFailedException', 'Message': 'The conditional request failed'}},
+            operation
+        )
+
+    def _key(self, key):
+        return (key[self.hash_key], key.get(self.range_key)) if self.range_key else key[self.hash_key]
+
+    def _project(self, item, projection, names):
+        if not projection:
+            return dict(item)
+        wanted = [names.get(p.strip(), p.strip()) for p in projection.split(',')]
+        return {name: item[name] for name in wanted if name in item}
+
+    # Table API
+
+    def get_item(self, Key, ProjectionExpression=None, ExpressionAttributeNames=None, ConsistentRead=False):
+        item = self.items.get(self._key(Key))
+        self.stats['requests'] += 1
+        units = math.ceil(item_size(item) / 4096) if item else 1
+        self.stats['rcu'] += max(units, 1) * (1 if ConsistentRead else 0.5)
+        if item is None:
+            return {}
+        self.stats['items_read'] += 1
+        return {'Item': self._project(item, ProjectionExpression, ExpressionAttributeNames or {})}
+
+    def put_item(self, Item, ConditionExpression=None, ExpressionAttributeNames=None,
+                 ExpressionAttributeValues=None):
+        key = self._key(Item)
+        current = self.items.get(key, {})
+        self.stats['requests'] += 1
+        self.stats['wcu'] += max(1, math.ceil(max(item_size(current), item_size(Item)) / 1024))
+        if ConditionExpression:
+            expression, names, values = self._expression(ConditionExpression, ExpressionAttributeNames,
+                                                         ExpressionAttributeValues)
+            if not self._check(parse_condition(expression), current, names, values):
+                self._conditional_failure('PutItem')
+        self.items[key] = dict(Item)
+        return {}
+
+    def delete_item(self, Key, ConditionExpression=None, ExpressionAttributeNames=None,
+                    ExpressionAttributeValues=None):
+        key = self._key(Key)
+        current = self.items.get(key)
+        self.stats['requests'] += 1
+        self.stats['wcu'] += max(1, math.ceil(item_size(current) / 1024)) if current else 1
+        if ConditionExpression:
+            expression, names, values = self._expression(ConditionExpression, ExpressionAttributeNames,
+                                                         ExpressionAttributeValues)
+            if not self._check(parse_condition(expression), current or {}, names, values):
+                self._conditional_failure('DeleteItem')
+        self.items.pop(key, None)
+        return {}
+
+    def update_item(self, Key, UpdateExpression, ConditionExpression=None, ExpressionAttributeNames=None,
+                    ExpressionAttributeValues=None, ReturnValues='NONE'):
+        key = self._key(Key)
+        current = self.items.get(key, {})
+        names = ExpressionAttributeNames or {}
+        values = ExpressionAttributeValues or {}
+        self.stats['requests'] += 1
+
+        if ConditionExpression:
+            expression, names, values = self._expression(ConditionExpression, names, values)
+            if not self._check(parse_condition(expression), current, names, values):
+                self.stats['wcu'] += max(1, math.ceil(item_size(current) / 1024))
+                self._conditional_failure('UpdateItem')
+
+        updated = dict(current) if current else dict(Key)
+        for action, path, operand in parse_update(UpdateExpression):
+            parent, name = self._parent(updated, path, names)
+            if action == 'SET':
+                parent[name] = self._resolve(operand, current, names, values)
+            elif action == 'ADD':
+                value = self._resolve(operand, current, names, values)
+                parent[name] = (parent[name] | value) if isinstance(value, set) else parent.get(name, 0) + value
+            elif action == 'DELETE':
+                parent[name] = parent.get(name, set()) - self._resolve(operand, current, names, values)
+            else:
+                parent.pop(name, None)
+
+        self.stats['wcu'] += max(1, math.ceil(max(item_size(current), item_size(updated)) / 1024))
+        self.items[key] = updated
+        return {'Attributes': dict(updated)} if ReturnValues != 'NONE' else {}
+
+    def iter_items(self):
+        """Items in storage order (overridable for synthetic tables)"""
+        return iter(self.items.values())
+
+    def _page(self, candidates, filter_node, names, values, limit, projection, select=None):
+        """One result page: stops at 1 MB read or `limit` evaluated items"""
+        read_bytes = 0
+        evaluated = 0
+        matched = []
+        last_key = None
+
+        for item in candidates:
+            size = item_size(item)
+            read_bytes += size
+            evaluated += 1
+            last_key = {k: item[k] for k in (self.hash_key, self.range_key) if k}
+            if filter_node is None or self._check(filter_node, item, names, values):
+                matched.append(item if select == 'COUNT' else self._project(item, projection, names))
+            if read_bytes >= PAGE_BYTES or (limit and evaluated >= limit):
+                break
+        else:
+            last_key = None
+
+        self.stats['requests'] += 1
+        self.stats['items_read'] += evaluated
+        self.stats['rcu'] += max(1, math.ceil(read_bytes / 4096)) * 0.5
+        response = {'Count': len(matched), 'ScannedCount': evaluated}
+        if select != 'COUNT':
+            response['Items'] = matched
+        if last_key:
+            response['LastEvaluatedKey'] = last_key
+        return response
+
+    def _after(self, items, start_key):
+        """Skip items up to and including start_key"""
+        items = iter(items)
+        if not start_key:
+            return items
+        target = self._key(start_key)
+        for item in items:
+            if self._key(item) == target:
+                break
+        return items
+
+    def scan(self, FilterExpression=None, ExpressionAttributeNames=None, ExpressionAttributeValues=None,
+             ExclusiveStartKey=None, Limit=None, ProjectionExpression=None):
+        names, values, node = ExpressionAttributeNames or {}, ExpressionAttributeValues or {}, None
+        if FilterExpression is not None:
+            expression, names, values = self._expression(FilterExpression, names, values)
+            node = parse_condition(expression)
+        # Resume an open scan where its last page stopped rather than
+        # skipping from the start (which makes a paginated scan quadratic)
+        items = self.cursors.pop(self._key(ExclusiveStartKey), None) if ExclusiveStartKey else None
+        if items is None:
+            items = self._after(self.iter_items(), ExclusiveStartKey)
+        response = self._page(items, node, names, values, Limit, ProjectionExpression)
+        if 'LastEvaluatedKey' in response:
+            self.cursors[self._key(response['LastEvaluatedKey'])] = items
+        return response
+
+    def query(self, KeyConditionExpression, IndexName=None, FilterExpression=None, ExpressionAttributeNames=None,
+              ExpressionAttributeValues=None, ExclusiveStartKey=None, Limit=None, ScanIndexForward=True,
+              ProjectionExpression=None, Select=None):
+        """Query the table or a GSI; index items carry only the projected attributes"""
+        hash_key, range_key, projected = self.indexes.get(IndexName, (self.hash_key, self.range_key, None))
+        names, values = ExpressionAttributeNames or {}, ExpressionAttributeValues or {}
+        expression, names, values = self._expression(KeyConditionExpression, names, values, is_key=True)
+        key_node = parse_condition(expression)
+
+        matches = [item for item in self.iter_items() if self._check(key_node, item, names, values)]
+        matches.sort(key=lambda item: item.get(range_key) if range_key else 0, reverse=not ScanIndexForward)
+        if projected is not None:
+            keep = {self.hash_key, self.range_key, hash_key, range_key, *projected}
+            matches = [{k: v for k, v in item.items() if k in keep} for item in matches]
+
+        filter_node = None
+        if FilterExpression is not None:
+            expression, names, values = self._expression(FilterExpression, names, values)
+            filter_node = parse_condition(expression)
+        return self._page(self._after(matches, ExclusiveStartKey), filter_node, names, values, Limit,
+                          ProjectionExpression, Select)
+
+
+class LocalDynamoDB:
+    """Client-level stand-in over LocalTables: single-item calls plus
+    BatchGetItem, BatchWriteItem and TransactWriteItems, with a fixed
+    per-request latency and a share of batch writes returned as
+    UnprocessedItems (throttling).
+    """
+
+    def __init__(self, tables, latency=0.005, unprocessed_rate=0.0, seed=0):
+        self.tables = tables
+        self.latency = latency
+        self.unprocessed_rate = unprocessed_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.RLock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.stats = {'requests': 0, 'wcu': 0.0, 'unprocessed': 0, 'cancelled': 0}
+
+    def _request(self):
+        self.stats['requests'] += 1
+        time.sleep(self.latency)
+
+    def _wcu(self, table, write, factor=1):
+        """Run a table write and bill its capacity to this client; single-item writes are atomic"""
+        with self.lock:
+            before = table.stats['wcu']
+            try:
+                return write()
+            finally:
+                self.stats['wcu'] += (table.stats['wcu'] - before) * factor
+
+    def put_item(self, TableName, Item, **kwargs):
+        self._request()
+        table = self.tables[TableName]
+        return self._wcu(table, lambda: table.put_item(Item=Item, **kwargs))
+
+    def update_item(self, TableName, Key, **kwargs):
+        self._request()
+        table = self.tables[TableName]
+        return self._wcu(table, lambda: table.update_item(Key=Key, **kwargs))
+
+    def delete_item(self, TableName, Key, **kwargs):
+        self._request()
+        table = self.tables[TableName]
+        return self._wcu(table, lambda: table.delete_item(Key=Key, **kwargs))
+
+    def batch_get_item(self, RequestItems):
+        """Up to 100 keys across tables; every key is found or reported missing"""
+        self._request()
+        keys = [(name, key) for name, request in RequestItems.items() for key in request['Keys']]
+        if len(keys) > 100:
+            raise ClientError({'Error': {'Code': 'ValidationException', 'Message': 'Too many items'}}, 'BatchGetItem')
+        if len({(name, self.tables[name]._key(key)) for name, key in keys}) < len(keys):
+            raise ClientError({'Error': {'Code': 'ValidationException',
+                                         'Message': 'Provided list of item keys contains duplicates'}},
+                              'BatchGetItem')
+
+        responses = {}
+        for name, request in RequestItems.items():
+            table = self.tables[name]
+            found = responses.setdefault(name, [])
+            for key in request['Keys']:
+                item = table.get_item(Key=key, ProjectionExpression=request.get('ProjectionExpression'),
+                                      ExpressionAttributeNames=request.get('ExpressionAttributeNames'),
+                                      ConsistentRead=request.get('ConsistentRead', False)).get('Item')
+                if item is not None:
+                    found.append(item)
+        return {'Responses': responses, 'UnprocessedKeys': {}}
+
+    def batch_write_item(self, RequestItems):
+        self._request()
+        requests = [(name, request) for name, table_requests in RequestItems.items() for request in table_requests]
+        if len(requests) > 25:
+            raise ClientError({'Error': {'Code': 'ValidationException', 'Message': 'Too many items'}}, 'BatchWriteItem')
+
+        seen = set()
+        for name, request in requests:
+            table = self.tables[name]
+            item = request['PutRequest']['Item'] if 'PutRequest' in request else request['DeleteRequest']['Key']
+            key = (name, table._key(item))
+            if key in seen:
+                raise ClientError({'Error': {'Code': 'ValidationException',
+                                             'Message': 'Provided list of item keys contains duplicates'}},
+                                  'BatchWriteItem')
+            seen.add(key)
+
+        unprocessed = {}
+        for name, request in requests:
+            table = self.tables[name]
+            if self.rng.random() < self.unprocessed_rate:
+                unprocessed.setdefault(name, []).append(request)
+                self.stats['unprocessed'] += 1
+            elif 'PutRequest' in request:
+                self._wcu(table, lambda: table.put_item(Item=request['PutRequest']['Item']))
+            else:
+                table.items.pop(table._key(request['DeleteRequest']['Key']), None)
+                self.stats['wcu'] += 1
+        return {'UnprocessedItems': unprocessed}
+
+    def transact_write_items(self, TransactItems):
+        """All or nothing: conditions are checked first; each write bills 2x"""
+        self._request()
+        if len(TransactItems) > 100:
+            raise ClientError({'Error': {'Code': 'ValidationException', 'Message': 'Too many items'}},
+                              'TransactWriteItems')
+
+        reasons = []
+        for entry in TransactItems:
+            (action, params), = entry.items()
+            table = self.tables[params['TableName']]
+            key = params['Item'] if action == 'Put' else params['Key']
+            current = table.items.get(table._key(key), {})
+            condition = params.get('ConditionExpression')
+            ok = not condition or table._check(parse_condition(condition), current,
+                                               params.get('ExpressionAttributeNames', {}),
+                                               params.get('ExpressionAttributeValues', {}))
+            reasons.append({'Code': 'None' if ok else 'ConditionalCheckFailed'})
+
+        if any(reason['Code'] != 'None' for reason in reasons):
+            self.stats['cancelled'] += 1
+            self.stats['wcu'] += len(TransactItems) * 2
+            raise ClientError({'Error': {'Code': 'TransactionCanceledException', 'Message': 'Transaction cancelled'},
+                               'CancellationReasons': reasons}, 'TransactWriteItems')
+
+        for entry in TransactItems:
+            (action, params), = entry.items()
+            table = self.tables[params['TableName']]
+            kwargs = {k: v for k, v in params.items() if k not in ('TableName', 'ConditionExpression')}
+            if action == 'Put':
+                self._wcu(table, lambda: table.put_item(**kwargs), factor=2)
+            elif action == 'Update':
+                self._wcu(table, lambda: table.update_item(**kwargs), factor=2)
+            elif action == 'Delete':
+                table.items.pop(table._key(params['Key']), None)
+                self.stats['wcu'] += 2
+        return {}
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+Local mock LLM server for benchmarking the analyzer without calling Gemini.
+
+Speaks enough of the Gemini generateContent/streamGenerateContent and
+Anthropic Messages APIs for the analyzer's providers, counts tokens
+(roughly 4 characters per token) and simulates generation latency as a
+fixed overhead plus a per-token cost. Streaming requests are answered with
+a chunked server-sent-events response, one chunk every few tokens.
+Requests carrying a response schema (Gemini responseSchema, Anthropic
+forced tool use) are answered with JSON incident reports. Output is cut
+at the request's max output tokens, and per-model latency profiles let
+benchmarks compare cheap and expensive models.
+"""
+
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def estimate_tokens(text):
+    """Rough token count (~4 characters per token)"""
+    return max(1, len(text) // 4)
+
+
+def fake_diagnosis(message):
+    """Canned diagnosis fields for an alert message"""
+    upper = message.upper()
+    severity = 'CRITICAL' if 'CRITICAL' in upper or 'MEMORY' in upper else 'HIGH'
+    return {
+        'severity': severity,
+        'cause': f"Upstream dependency failure reported by: {message[:60]}",
+        'action': 'Check the dependency health dashboard and recent deploys'
+    }
+
+
+def fake_report(message):
+    """Canned incident report (the analyzer's REPORT_SCHEMA) for an alert message"""
+    diagnosis = fake_diagnosis(message)
+    return {
+        'summary': f"Dependency failure: {message.splitlines()[0][:80]}",
+        'severity': diagnosis['severity'],
+        'severity_assessment': 'User-facing requests are failing',
+        'root_cause_hypothesis': diagnosis['cause'],
+        'affected_components': ['api'],
+        'impact_assessment': 'Elevated error rate for dependent requests',
+        'remediation_steps': [diagnosis['action']],
+        'monitoring_recommendations': ['Alert on dependency error rate'],
+        'related_documentation': [],
+        'confidence_level': 'MEDIUM',
+        'requires_immediate_attention': diagnosis['severity'] == 'CRITICAL'
+    }
+
+
+class MockLLMServer:
+    """Threaded mock LLM HTTP server with request/token counters"""
+
+    def __init__(self, base_latency=0.05, per_token_latency=0.0005, per_input_token_latency=0.0, port=0,
+                 models=None):
+        self.base_latency = base_latency
+        self.per_token_latency = per_token_latency
+        self.per_input_token_latency = per_input_token_latency
+        # model name -> (base_latency, per_token_latency) overriding the defaults
+        self.models = models or {}
+        self.lock = threading.Lock()
+        self.reset_stats()
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                payload = json.loads(self.rfile.read(length) or b'{}')
+
+                if 'streamGenerateContent' in self.path or payload.get('stream'):
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'text/event-stream')
+                    self.send_header('Transfer-Encoding', 'chunked')
+                    self.end_headers()
+                    for event in server.handle_stream(self.path, payload):
+                        data = f"data: {json.dumps(event)}\n\n".encode('utf-8')
+                        self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b'\r\n')
+                        self.wfile.flush()
+                    self.wfile.write(b'0\r\n\r\n')
+                    return
+
+                status, body = server.handle(self.path, payload)
+                data = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address
+        return f"http://{host}:{port}"
+
+    def reset_stats(self):
+        with self.lock:
+            self.stats = {'requests': 0, 'input_tokens': 0, 'output_tokens': 0, 'by_model': {}}
+
+    def record(self, model, input_tokens, output_tokens):
+        with self.lock:
+            per_model = self.stats['by_model'].setdefault(
+                model, {'requests': 0, 'input_tokens': 0, 'output_tokens': 0}
+            )
+            for counters in (self.stats, per_model):
+                counters['requests'] += 1
+                counters['input_tokens'] += input_tokens
+                counters['output_tokens'] += output_tokens
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def report(self, message):
+        """Incident report for one alert; override to shape structured answers"""
+        return fake_report(message)
+
+    def generate(self, prompt, structured=False):
+        """Produce a response text for a prompt"""
+        packed = re.findall(r'^\[([^\]]+)\] (.*)$', prompt, re.MULTILINE)
+        if packed and 'JSON array' in prompt:
+            if structured:
+                return json.dumps([dict(id=alert_id, **self.report(message)) for alert_id, message in packed])
+            return json.dumps([dict(id=alert_id, **fake_diagnosis(message)) for alert_id, message in packed])
+
+        match = re.search(r'^Alert: (.*)$', prompt, re.MULTILINE)
+        if structured:
+            return json.dumps(self.report(match.group(1) if match else prompt))
+
+        diagnosis = fake_diagnosis(match.group(1) if match else prompt)
+        return (
+            f"1. Severity: {diagnosis['severity']}\n"
+            f"2. Likely cause: {diagnosis['cause']}\n"
+            f"3. Recommended action: {diagnosis['action']}"
+        )
+
+    def is_structured(self, payload):
+        return bool(payload.get('tools') or payload.get('generationConfig', {}).get('responseSchema'))
+
+    def model_of(self, path, payload):
+        if path.startswith('/v1/messages'):
+            return payload.get('model', 'unknown')
+        match = re.search(r'/models/([^:]+):', path)
+        return match.group(1) if match else 'unknown'
+
+    def latency_of(self, model):
+        """(base, per output token) latency for a model"""
+        return self.models.get(model, (self.base_latency, self.per_token_latency))
+
+    def truncate(self, payload, text):
+        """Cut text at the request's max output tokens"""
+        max_tokens = payload.get('max_tokens') or payload.get('generationConfig', {}).get('maxOutputTokens')
+        return text[:max_tokens * 4] if max_tokens else text
+
+    def prompt_of(self, path, payload):
+        if path.startswith('/v1/messages'):
+            return ''.join(m.get('content', '') for m in payload.get('messages', []))
+        return ''.join(
+            part.get('text', '')
+            for content in payload.get('contents', [])
+            for part in content.get('parts', [])
+        )
+
+    def handle_stream(self, path, payload, tokens_per_chunk=4):
+        """Yield server-sent event payloads, sleeping per generated token"""
+        prompt = self.prompt_of(path, payload)
+        model = self.model_of(path, payload)
+        base_latency, per_token_latency = self.latency_of(model)
+        tool_use = path.startswith('/v1/messages') and payload.get('tools')
+        text = self.truncate(payload, self.generate(prompt, self.is_structured(payload)))
+
+        self.record(model, estimate_tokens(prompt), estimate_tokens(text))
+
+        time.sleep(base_latency + self.per_input_token_latency * estimate_tokens(prompt))
+        step = tokens_per_chunk * 4
+        for start in range(0, len(text), step):
+            piece = text[start:start + step]
+            time.sleep(per_token_latency * estimate_tokens(piece))
+            if tool_use:
+                yield {'type': 'content_block_delta', 'index': 0,
+                       'delta': {'type': 'input_json_delta', 'partial_json': piece}}
+            elif path.startswith('/v1/messages'):
+                yield {'type': 'content_block_delta', 'index': 0, 'delta': {'type': 'text_delta', 'text': piece}}
+            else:
+                yield {'candidates': [{'content': {'parts': [{'text': piece}]}}]}
+
+    def handle(self, path, payload):
+        """Route a request and return (status, body)"""
+        anthropic = path.startswith('/v1/messages')
+        prompt = self.prompt_of(path, payload)
+        model = self.model_of(path, payload)
+        base_latency, per_token_latency = self.latency_of(model)
+        text = self.generate(prompt, self.is_structured(payload))
+        if not (anthropic and payload.get('tools')):
+            # A truncated tool call can't be returned as a tool_use input
+            text = self.truncate(payload, text)
+
+        input_tokens = estimate_tokens(prompt)
+        output_tokens = estimate_tokens(text)
+        time.sleep(
+            base_latency
+            + self.per_input_token_latency * input_tokens
+            + per_token_latency * output_tokens
+        )
+
+        self.record(model, input_tokens, output_tokens)
+
+        if anthropic:
+            if payload.get('tools'):
+                tool_input = json.loads(text)
+                if isinstance(tool_input, list):
+                    tool_input = {'items': tool_input}
+                content = [{'type': 'tool_use', 'name': payload['tools'][0]['name'], 'input': tool_input}]
+            else:
+                content = [{'type': 'text', 'text': text}]
+            return 200, {
+                'type': 'message',
+                'content': content,
+                'usage': {'input_tokens': input_tokens, 'output_tokens': output_tokens}
+            }
+
+        return 200, {
+            'candidates': [{'content': {'parts': [{'text': text}]}}],
+            'usageMetadata': {
+                'promptTokenCount': input_tokens,
+                'candidatesTokenCount': output_tokens
+            }
+        }
+
+
+if __name__ == '__main__':
+    server = MockLLMServer(port=8089).start()
+    print(f"Mock LLM server listening on {server.url}")
+    print("Press Ctrl+C to stop")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+In-memory stand-in for a boto3 SQS client, for local benchmarks.
+
+Implements the subset of the client API the analyzer, its worker and the
+operational tools use (send_message(_batch), receive_message with long
+polling, delete_message(_batch), change_message_visibility(_batch),
+get_queue_attributes) on any number of queues, with FIFO semantics for
+queues whose name ends in .fifo: messages are handed out in order within
+a message group, and a group with a message in flight hands out nothing
+else until it is deleted or becomes visible again; a receive fills its
+batch from one group before the next. Receipt handles change on every
+receive; a stale one is rejected with ReceiptHandleIsInvalid. A queue
+created with a RedrivePolicy moves a message to its dead-letter queue
+instead of handing it out more than maxReceiveCount times, keeping its
+SentTimestamp. Message attributes are returned on every receive (no
+MessageAttributeNames filtering). Every request is counted, and can be
+given a fixed latency.
+"""
+
+import itertools
+import json
+import threading
+import time
+from collections import Counter
+
+from botocore.exceptions import ClientError
+
+
+class Message:
+    def __init__(self, message_id, body, group, attributes=None):
+        self.id = message_id
+        self.body = body
+        self.group = group
+        self.attributes = attributes or {}
+        self.sent_at = int(time.time() * 1000)
+        self.receive_count = 0
+        self.receipt = None
+        self.visible_at = 0.0
+
+
+ARN_PREFIX = 'arn:aws:sqs:local:000000000000:'
+
+
+class LocalSQS:
+    """Thread-safe in-memory SQS; queue URLs are local://<name>"""
+
+    def __init__(self, visibility_timeout=30.0, latency=0.0):
+        self.visibility_timeout = visibility_timeout
+        self.latency = latency
+        self.queues = {}
+        self.attributes = {}
+        self.cond = threading.Condition()
+        self.ids = itertools.count(1)
+        self.stats = Counter()
+
+    def create_queue(self, QueueName, Attributes=None):
+        url = f"local://{QueueName}"
+        with self.cond:
+            self.queues.setdefault(url, [])
+            self.attributes[url] = dict(Attributes or {})
+        return {'QueueUrl': url}
+
+    def _redrive(self, url, queue):
+        """Move messages received maxReceiveCount times to the dead-letter queue"""
+        policy = self.attributes[url].get('RedrivePolicy')
+        if not policy:
+            return
+        policy = json.loads(policy)
+        target = self.queues[f"local://{policy['deadLetterTargetArn'][len(ARN_PREFIX):]}"]
+        now = time.monotonic()
+        for message in [m for m in queue if m.visible_at <= now and m.receive_count >= int(policy['maxReceiveCount'])]:
+            queue.remove(message)
+            message.receive_count = 0
+            message.receipt = None
+            target.append(message)
+
+    def _request(self, operation):
+        self.stats[operation] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _queue(self, url, operation):
+        if url not in self.queues:
+            raise ClientError({'Error': {'Code': 'AWS.SimpleQueueService.NonExistentQueue',
+                                         'Message': f"No queue {url}"}}, operation)
+        return self.queues[url]
+
+    def _send(self, queue_url, body, group, attributes, operation):
+        queue = self._queue(queue_url, operation)
+        if queue_url.endswith('.fifo') and not group:
+            raise ClientError({'Error': {'Code': 'MissingParameter',
+                                         'Message': 'MessageGroupId is required for FIFO queues'}}, operation)
+        message = Message(f"m-{next(self.ids)}", body, group, attributes)
+        queue.append(message)
+        self.cond.notify_all()
+        return message
+
+    def send_message(self, QueueUrl, MessageBody, MessageGroupId=None, MessageDeduplicationId=None,
+                     MessageAttributes=None, **kwargs):
+        self._request('SendMessage')
+        with self.cond:
+            message = self._send(QueueUrl, MessageBody, MessageGroupId, MessageAttributes, 'SendMessage')
+        return {'MessageId': message.id}
+
+    def send_message_batch(self, QueueUrl, Entries):
+        self._request('SendMessageBatch')
+        successful, failed = [], []
+        with self.cond:
+            for entry in Entries:
+                try:
+                    message = self._send(QueueUrl, entry['MessageBody'], entry.get('MessageGroupId'),
+                                         entry.get('MessageAttributes'), 'SendMessageBatch')
+                except ClientError as e:
+                    if e.response['Error']['Code'] != 'MissingParameter':
+                        raise
+                    failed.append({'Id': entry['Id'], 'Code': 'MissingParameter', 'SenderFault': True})
+                    continue
+                successful.append({'Id': entry['Id'], 'MessageId': message.id})
+        return {'Successful': successful, 'Failed': failed}
+
+    def _visible(self, queue, now, limit, fifo):
+        """Up to limit receivable messages, oldest first; in-flight FIFO groups are skipped.
+
+        Like SQS, a FIFO receive fills the batch from the oldest group's
+        messages before moving on to the next group.
+        """
+        busy = {m.group for m in queue if fifo and m.visible_at > now}
+        # Queue order is send order, so a group's messages come out in order
+        ready = [m for m in queue if m.visible_at <= now and m.group not in busy]
+        if fifo:
+            first = {}
+            for n, message in enumerate(ready):
+                first.setdefault(message.group, n)
+            ready.sort(key=lambda m: first[m.group])
+        return ready[:limit]
+
+    def receive_message(self, QueueUrl, MaxNumberOfMessages=1, WaitTimeSeconds=0, VisibilityTimeout=None, **kwargs):
+        self._request('ReceiveMessage')
+        deadline = time.monotonic() + WaitTimeSeconds
+        with self.cond:
+            queue = self._queue(QueueUrl, 'ReceiveMessage')
+            while True:
+                self._redrive(QueueUrl, queue)
+                now = time.monotonic()
+                found = self._visible(queue, now, MaxNumberOfMessages, QueueUrl.endswith('.fifo'))
+                if found or now >= deadline:
+                    break
+                # Woken by sends, deletes and visibility changes; in-flight messages time out on their own
+                waits = [m.visible_at - now for m in queue if m.visible_at > now]
+                self.cond.wait(min([deadline - now] + waits))
+
+            timeout = float(self.attributes[QueueUrl].get('VisibilityTimeout', self.visibility_timeout)
+                            if VisibilityTimeout is None else VisibilityTimeout)
+            messages = []
+            for message in found:
+                message.receive_count += 1
+                message.receipt = f"{message.id}/{message.receive_count}"
+                message.visible_at = now + timeout
+                messages.append({
+                    'MessageId': message.id,
+                    'ReceiptHandle': message.receipt,
+                    'Body': message.body,
+                    'Attributes': {'ApproximateReceiveCount': str(message.receive_count),
+                                   'SentTimestamp': str(message.sent_at),
+                                   **({'MessageGroupId': message.group} if message.group else {})},
+                    **({'MessageAttributes': dict(message.attributes)} if message.attributes else {})
+                })
+        return {'Messages': messages} if messages else {}
+
+    def _find(self, queue, receipt):
+        for message in queue:
+            if message.receipt == receipt:
+                return message
+        return None
+
+    def _invalid(self, receipt, operation):
+        return ClientError({'Error': {'Code': 'ReceiptHandleIsInvalid',
+                                      'Message': f"Receipt handle {receipt} is invalid"}}, operation)
+
+    def delete_message(self, QueueUrl, ReceiptHandle):
+        self._request('DeleteMessage')
+        with self.cond:
+            queue = self._queue(QueueUrl, 'DeleteMessage')
+            message = self._find(queue, ReceiptHandle)
+            if message is None:
+                raise self._invalid(ReceiptHandle, 'DeleteMessage')
+            queue.remove(message)
+            self.cond.notify_all()
+        return {}
+
+    def delete_message_batch(self, QueueUrl, Entries):
+        self._request('DeleteMessageBatch')
+        successful, failed = [], []
+        with self.cond:
+            queue = self._queue(QueueUrl, 'DeleteMessageBatch')
+            for entry in Entries:
+                message = self._find(queue, entry['ReceiptHandle'])
+                if message is None:
+                    failed.append({'Id': entry['Id'], 'Code': 'ReceiptHandleIsInvalid', 'SenderFault': True})
+                    continue
+                queue.remove(message)
+                successful.append({'Id': entry['Id']})
+            self.cond.notify_all()
+        return {'Successful': successful, 'Failed': failed}
+
+    def change_message_visibility(self, QueueUrl, ReceiptHandle, VisibilityTimeout):
+        self._request('ChangeMessageVisibility')
+        with self.cond:
+            message = self._find(self._queue(QueueUrl, 'ChangeMessageVisibility'), ReceiptHandle)
+            if message is None:
+                raise self._invalid(ReceiptHandle, 'ChangeMessageVisibility')
+            message.visible_at = time.monotonic() + VisibilityTimeout
+            self.cond.notify_all()
+        return {}
+
+    def change_message_visibility_batch(self, QueueUrl, Entries):
+        self._request('ChangeMessageVisibilityBatch')
+        successful, failed = [], []
+        with self.cond:
+            queue = self._queue(QueueUrl, 'ChangeMessageVisibilityBatch')
+            for entry in Entries:
+                message = self._find(queue, entry['ReceiptHandle'])
+                if message is None:
+                    failed.append({'Id': entry['Id'], 'Code': 'ReceiptHandleIsInvalid', 'SenderFault': True})
+                    continue
+                message.visible_at = time.monotonic() + entry['VisibilityTimeout']
+                successful.append({'Id': entry['Id']})
+            self.cond.notify_all()
+        return {'Successful': successful, 'Failed': failed}
+
+    def get_queue_attributes(self, QueueUrl, AttributeNames=None):
+        self._request('GetQueueAttributes')
+        with self.cond:
+            queue = self._queue(QueueUrl, 'GetQueueAttributes')
+            now = time.monotonic()
+            in_flight = sum(m.visible_at > now for m in queue)
+        return {'Attributes': {'QueueArn': ARN_PREFIX + QueueUrl[len('local://'):],
+                               'ApproximateNumberOfMessages': str(len(queue) - in_flight),
+                               'ApproximateNumberOfMessagesNotVisible': str(in_flight)}}
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Invalidate cached analyses after a deploy or rollback.
+
+Bumps the deploy generation of each given log group (--scope) or of a
+deployed service's log groups (--service, mapped through DEPLOY_SCOPES as
+the ingestor does for CodeDeploy/ECS events). Every analysis cached under
+an older generation stops being served at once; nothing is deleted.
+
+    ANALYSIS_CACHE_TABLE=... python tools/invalidate_cache.py --service orders-api
+    ANALYSIS_CACHE_TABLE=... python tools/invalidate_cache.py --scope /ecs/orders-api --show
+
+`task invalidate-cache -- --service orders-api` fills in the table name
+from Terraform outputs.
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambdas', 'shared', 'python'))
+
+from generations import Generations, deploy_scopes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scope', action='append', default=[], help='log group (or alert source) to invalidate')
+    parser.add_argument('--service', action='append', default=[], help='deployed service to invalidate')
+    parser.add_argument('--reason', default='manual', help='recorded with the bump')
+    parser.add_argument('--show', action='store_true', help='print the generations without bumping them')
+    args = parser.parse_args()
+
+    table_name = os.environ.get('ANALYSIS_CACHE_TABLE')
+    if not table_name:
+        parser.error('ANALYSIS_CACHE_TABLE must be set')
+    scopes = list(args.scope)
+    for service in args.service:
+        scopes += deploy_scopes(service, os.environ.get('DEPLOY_SCOPES', '{}'))
+    if not scopes:
+        parser.error('give at least one --scope or --service')
+
+    import boto3
+
+    generations = Generations(boto3.resource('dynamodb').Table(table_name), memo_seconds=0)
+    for scope in dict.fromkeys(scopes):
+        if args.show:
+            print(f"{scope}: generation {generations.current(scope)}")
+        else:
+            print(f"{scope}: generation {generations.bump(scope, args.reason)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+List, inspect and replay messages the analyzer quarantined.
+
+A message is quarantined when it can never be processed - its payload
+isn't a well-formed alert (the analyzer raised MalformedAlert for it) -
+and is acknowledged, so its message group isn't held up. Once the cause
+is fixed (a deploy, or a corrected payload), replay sends it back to the
+processing queue, in its alert's message group.
+
+    QUARANTINE_TABLE=... python tools/manage_quarantine.py list
+    QUARANTINE_TABLE=... python tools/manage_quarantine.py inspect <message id>
+    QUARANTINE_TABLE=... PROCESSING_QUEUE_URL=... python tools/manage_quarantine.py replay <message id> ...
+    QUARANTINE_TABLE=... PROCESSING_QUEUE_URL=... python tools/manage_quarantine.py replay --all --dry-run
+
+replay --payload FILE sends a corrected payload in place of a message's
+own. `task quarantine -- list` fills in the table, queue and message
+group mode from Terraform outputs.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambdas', 'shared', 'python'))
+
+from quarantine import QUARANTINED, REPLAYED, Quarantine
+from queues import message_group
+
+
+def alert_body(payload):
+    """The payload's alert, or None if it isn't a JSON object"""
+    try:
+        body = json.loads(payload)
+    except ValueError:
+        return None
+    return body if isinstance(body, dict) else None
+
+
+def replay(store, sqs, queue_url, item, payload=None):
+    """Send a quarantined message (or a corrected payload) back to the processing queue"""
+    payload = payload or item['payload']
+    body = alert_body(payload)
+    if body is None:
+        raise ValueError('payload is not a JSON object; pass a corrected one with --payload')
+    sqs.send_message(
+        QueueUrl=queue_url,
+        MessageBody=payload,
+        MessageGroupId=message_group(body),
+        # A replay is a new message even when the payload is unchanged
+        MessageDeduplicationId=f"replay-{item['message_id']}-{int(item.get('replays', 0)) + 1}"
+    )
+    store.mark_replayed(item['message_id'])
+
+
+def show_list(items):
+    print(f"{'message id':<38} {'quarantined (UTC)':<20} {'status':<12} {'severity':<9} {'alert id':<24} error")
+    for item in items:
+        quarantined_at = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(int(item['quarantined_at'])))
+        error = f"{item['error_type']}: {item['error']}".replace('\n', ' ')
+        print(f"{item['message_id']:<38} {quarantined_at:<20} {item['status']:<12} "
+              f"{item.get('severity', '-'):<9} {item.get('alert_id', '-'):<24} {error[:80]}")
+
+
+def show_item(item):
+    body = alert_body(item['payload'])
+    details = {name: value for name, value in item.items() if name != 'payload'}
+    print(json.dumps(details, indent=2, sort_keys=True, default=str))
+    print('payload:')
+    print(json.dumps(body, indent=2) if body is not None else item['payload'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+    listing = commands.add_parser('list', help='quarantined messages, newest first')
+    listing.add_argument('--status', choices=[QUARANTINED, REPLAYED, 'all'], default=QUARANTINED)
+    listing.add_argument('--limit', type=int, default=50)
+    inspect = commands.add_parser('inspect', help="a message's error and payload")
+    inspect.add_argument('message_id')
+    replaying = commands.add_parser('replay', help='send messages back to the processing queue')
+    replaying.add_argument('message_id', nargs='*')
+    replaying.add_argument('--all', action='store_true', help='every message still quarantined')
+    replaying.add_argument('--payload', help='file with a corrected payload (one message only)')
+    replaying.add_argument('--dry-run', action='store_true', help='show what would be replayed')
+    args = parser.parse_args()
+
+    table_name = os.environ.get('QUARANTINE_TABLE')
+    if not table_name:
+        parser.error('QUARANTINE_TABLE must be set')
+
+    import boto3
+
+    store = Quarantine(boto3.resource('dynamodb').Table(table_name))
+
+    if args.command == 'list':
+        items = store.list(None if args.status == 'all' else args.status)
+        show_list(items[:args.limit])
+        if len(items) > args.limit:
+            print(f"... {len(items) - args.limit} more (--limit)")
+        return
+
+    if args.command == 'inspect':
+        item = store.get(args.message_id)
+        if item is None:
+            sys.exit(f"{args.message_id}: not in quarantine")
+        show_item(item)
+        return
+
+    queue_url = os.environ.get('PROCESSING_QUEUE_URL')
+    if not queue_url and not args.dry_run:
+        parser.error('PROCESSING_QUEUE_URL must be set')
+    if bool(args.all) == bool(args.message_id):
+        parser.error('give message IDs or --all')
+    if args.payload and (args.all or len(args.message_id) != 1):
+        parser.error('--payload replays a single message')
+    payload = None
+    if args.payload:
+        with open(args.payload) as f:
+            payload = f.read()
+
+    if args.all:
+        items = store.list(QUARANTINED)
+    else:
+        items = []
+        for message_id in args.message_id:
+            item = store.get(message_id)
+            if item is None:
+                sys.exit(f"{message_id}: not in quarantine")
+            items.append(item)
+
+    sqs = None if args.dry_run else boto3.client('sqs')
+    replayed = 0
+    for item in items:
+        if args.dry_run:
+            ready = alert_body(payload or item['payload']) is not None
+            print(f"{item['message_id']}: {'would replay' if ready else 'payload is not a JSON object, skipped'}")
+            continue
+        try:
+            replay(store, sqs, queue_url, item, payload)
+        except ValueError as e:
+            print(f"{item['message_id']}: {str(e)}")
+            continue
+        replayed += 1
+        print(f"{item['message_id']}: replayed")
+    if not args.dry_run:
+        print(f"Replayed {replayed}/{len(items)} message(s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Pre-warm the analysis cache from historical alerts.
+
+Scans the alerts table for the past --days, ranks error signatures by
+how many alerts they produced, and runs the analyzer's own pipeline
+(runbooks, routing, prompt building, the configured providers) on the
+newest alert of each of the --top signatures at no more than --rate LLM
+calls per second. Results land in the analysis cache exactly as a live
+refresh would. Signatures that already have a fresh entry, or that a
+runbook answers without the LLM, are skipped.
+
+Prints the share of the period's alerts the cache (plus runbooks) covers
+before and after warming.
+
+Against a deployment (table names and provider settings as the analyzer
+sees them; `task prewarm-cache` fills them in from Terraform outputs):
+
+    ALERTS_TABLE=... ANALYSIS_CACHE_TABLE=... AI_PROVIDER=google \\
+    GOOGLE_API_KEY_PARAM=... python tools/prewarm_cache.py --days 7 --top 200
+
+Locally, against the in-memory table stand-in filled with synthetic
+history and the mock LLM server:
+
+    python tools/prewarm_cache.py --local
+"""
+
+import argparse
+import os
+import sys
+import time
+from collections import Counter
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'lambdas', 'analyzer'))
+sys.path.insert(0, os.path.join(ROOT, 'lambdas', 'shared', 'python'))
+
+DAY_SECONDS = 86400
+
+
+def signature_counts(table, days, now):
+    """Alerts per signature over the period, and the newest alert_id of each"""
+    from boto3.dynamodb.conditions import Attr
+
+    counts = Counter()
+    newest = {}
+    kwargs = {
+        'FilterExpression': Attr('timestamp').gt(int(now - days * DAY_SECONDS)),
+        'ProjectionExpression': 'alert_id, error_signature, #ts',
+        'ExpressionAttributeNames': {'#ts': 'timestamp'},
+    }
+    while True:
+        response = table.scan(**kwargs)
+        for item in response.get('Items', []):
+            signature = item.get('error_signature')
+            if not signature:
+                continue
+            counts[signature] += 1
+            if signature not in newest or item['timestamp'] > newest[signature][0]:
+                newest[signature] = (item['timestamp'], item['alert_id'])
+        if 'LastEvaluatedKey' not in response:
+            return counts, {signature: alert_id for signature, (_, alert_id) in newest.items()}
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def representative(table, alert_id):
+    """The alert body for a stored alert (either storage layout)"""
+    import blobs
+
+    item = blobs.decode(table.get_item(Key={'alert_id': alert_id}).get('Item') or {})
+    if 'message' not in item:
+        return None
+    return {name: item[name] for name in ('alert_id', 'message', 'severity', 'source', 'log_group', 'log_stream',
+                                          'timestamp') if name in item}
+
+
+def covered(handler, counts, bodies, now):
+    """Signatures answered without an LLM call: a fresh cache entry or a runbook"""
+    result = set()
+    for signature in counts:
+        body = bodies.get(signature, {})
+        if body and handler.runbooks.match(body['message']):
+            result.add(signature)
+            continue
+        entry = handler.analysis_cache.lookup(signature, now)
+        if entry and entry.state == 'fresh':
+            result.add(signature)
+    return result
+
+
+def share(counts, signatures):
+    total = sum(counts.values())
+    return sum(counts[s] for s in signatures) * 100 / total if total else 0.0
+
+
+def representatives(alerts_table, counts, newest, top):
+    """The representative alert of each of the top signatures that has one stored"""
+    bodies = {}
+    for signature, _ in counts.most_common(top):
+        body = representative(alerts_table, newest[signature])
+        if body is not None:
+            bodies[signature] = body
+    return bodies
+
+
+def warm(handler, providers, counts, bodies, top, rate, force, dry_run, now):
+    """Analyze and cache the top signatures from their representative alerts.
+
+    Returns the signatures analyzed (or, on a dry run, that would be) and
+    the failure and skip counts.
+    """
+    interval = 1 / rate if rate > 0 else 0
+    analyzed = set()
+    failed = skipped = 0
+    next_call = time.monotonic()
+
+    for signature, _ in counts.most_common(top):
+        body = bodies.get(signature)
+        if body is None:
+            skipped += 1
+            continue
+
+        entry = handler.analysis_cache.lookup(signature, now)
+        if (entry and entry.state == 'fresh' and not force) or handler.runbooks.match(body['message']):
+            skipped += 1
+            continue
+        if dry_run:
+            analyzed.add(signature)
+            continue
+
+        time.sleep(max(0.0, next_call - time.monotonic()))
+        next_call = time.monotonic() + interval
+
+        # A 'refresh' body bypasses the cache lookup and is cached when done
+        [(_, model)] = handler.analyze_alerts(providers, [{**body, 'refresh': True}], pack_size=1)
+        if model == 'fallback':
+            failed += 1
+        else:
+            analyzed.add(signature)
+        print(f"  {signature} ({counts[signature]} alerts) -> {model}")
+
+    return analyzed, failed, skipped
+
+
+def local_setup(args):
+    """Synthetic alert history on the table stand-in, and the mock LLM"""
+    import random
+
+    sys.path.insert(0, os.path.join(ROOT, 'test'))
+    from dynamodb_local import LocalTable
+    from mock_llm import MockLLMServer
+
+    import blobs
+    from llm import GeminiProvider
+    from runbooks import fingerprint
+
+    rng = random.Random(args.seed)
+    alerts_table = LocalTable('alert_id')
+    now = time.time()
+    weights = [1 / (rank + 1) for rank in range(args.local_signatures)]
+    services = ['orders', 'payments', 'search', 'auth', 'inventory']
+    # Letters, not digits: fingerprints mask numbers
+    dependencies = [''.join(chr(97 + (s // 26 ** i) % 26) for i in range(3)) for s in range(args.local_signatures)]
+    for n in range(args.local_alerts):
+        s = rng.choices(range(args.local_signatures), weights=weights)[0]
+        message = (f"[ERROR] {services[s % 5]}-api: {['timeout', 'refused', 'reset', 'throttled'][s % 4]} "
+                   f"calling {dependencies[s]}-svc (request {rng.getrandbits(32):08x})")
+        alerts_table.items[f"alert-{n}"] = blobs.encode({
+            'alert_id': f"alert-{n}", 'timestamp': int(now - rng.uniform(0, args.days * DAY_SECONDS)),
+            'severity': ['HIGH', 'MEDIUM', 'LOW'][s % 3], 'source': 'cloudwatch_logs',
+            'error_signature': fingerprint(message), 'message': message, 'analysis': '{}'
+        }, 'zlib')
+
+    server = MockLLMServer().start()
+    provider = GeminiProvider('test-key', model='gemini-2.5-flash', base_url=server.url)
+    return alerts_table, LocalTable('error_signature'), {'fast': provider, 'deep': provider}, server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--days', type=int, default=7, help='history to rank signatures by')
+    parser.add_argument('--top', type=int, default=200, help='signatures to warm')
+    parser.add_argument('--rate', type=float, default=2.0, help='max LLM calls per second')
+    parser.add_argument('--force', action='store_true', help='re-analyze signatures that are already fresh')
+    parser.add_argument('--dry-run', action='store_true', help='rank and report without calling the LLM')
+    parser.add_argument('--local', action='store_true', help='use the table stand-in and mock LLM')
+    parser.add_argument('--local-alerts', type=int, default=20000)
+    parser.add_argument('--local-signatures', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    if args.local:
+        os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+    import handler
+    import metrics
+    from analysis_cache import AnalysisCache
+
+    metrics.set_enabled(False)
+    server = None
+    if args.local:
+        alerts_table, cache_table, providers, server = local_setup(args)
+        handler.analysis_cache = AnalysisCache(cache_table)
+    else:
+        if handler.analysis_cache is None or not handler.ALERTS_TABLE:
+            parser.error('ALERTS_TABLE and ANALYSIS_CACHE_TABLE must be set (or use --local)')
+        alerts_table = handler.dynamodb.Table(handler.ALERTS_TABLE)
+        providers = {tier: handler.get_provider(tier) for tier in ('fast', 'deep')}
+
+    now = time.time()
+    counts, newest = signature_counts(alerts_table, args.days, now)
+    total = sum(counts.values())
+    print(f"{total:,} alerts, {len(counts):,} signatures in the past {args.days} days; "
+          f"top {args.top} produced {share(counts, [s for s, _ in counts.most_common(args.top)]):.1f}% of them")
+
+    bodies = representatives(alerts_table, counts, newest, args.top)
+    before = covered(handler, counts, bodies, now)
+    analyzed, failed, skipped = warm(handler, providers, counts, bodies, args.top, args.rate, args.force,
+                                     args.dry_run, now)
+    after = covered(handler, counts, bodies, time.time()) | (analyzed if args.dry_run else set())
+
+    print(f"\n{'would analyze' if args.dry_run else 'analyzed'} {len(analyzed)}, failed {failed}, "
+          f"skipped {skipped} (fresh or runbook)")
+    print(f"coverage of the past {args.days} days' alerts: {share(counts, before):.1f}% before, "
+          f"{'projected ' if args.dry_run else ''}"
+          f"{share(counts, after):.1f}% after ({len(after):,} of {len(counts):,} signatures)")
+
+    if server:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
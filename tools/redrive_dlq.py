@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+"""
+Redrive dead-lettered messages to their source queue once the cause is fixed.
+
+Drains the processing or distribution dead-letter queue (--queue) in
+receives of up to 10 and sends the messages that pass the filters back to
+the queue they came from, in their original message group, at no more
+than --rate messages per second so the analyzer (or Slack) isn't
+stampeded. Filters: --severity (repeatable), --min-age/--max-age since the
+message was first sent (e.g. 30m, 6h, 2d) and --fingerprint of the alert's
+message (repeatable; the analyzer's error signature). Only the oldest
+message per alert is redriven - per alert and kind (preliminary, final,
+update) for distribution messages - and later copies are deleted as
+duplicates. Progress is printed every --progress seconds.
+
+Messages that don't pass the filters stay in the dead-letter queue: they
+are moved to its back (a FIFO queue hands out nothing more of a group
+while one of its messages is held). Messages moved or redriven carry
+their original sent time, so a later run filters them the same way.
+--dry-run only receives: it reports what would be redriven, sends and
+deletes nothing, and makes the messages visible again at the end. A FIFO
+queue hands out nothing more of a group until those are released, so on
+a FIFO dead-letter queue a dry run sees the first receive (up to 10
+messages) of each message group.
+
+    task redrive-dlq -- --queue processing --severity CRITICAL --severity HIGH --max-age 24h
+    task redrive-dlq -- --queue distribution --rate 2 --dry-run
+
+Locally, against the in-memory SQS stand-in with a synthetic backlog of
+dead-lettered alerts (ages, severities, duplicates, unparseable ones):
+
+    python tools/redrive_dlq.py --local --rate 100 --severity HIGH --max-age 1d
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from collections import Counter
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'lambdas', 'analyzer'))
+sys.path.insert(0, os.path.join(ROOT, 'lambdas', 'shared', 'python'))
+
+MAX_BATCH = 10
+
+# First sent time of a message this tool moved or redrove (epoch ms)
+ORIGINAL_SENT = 'RedriveSentTimestamp'
+
+DURATION_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+QUEUES = {
+    # --queue: (dead-letter queue URL variable, source queue URL variable)
+    'processing': ('PROCESSING_DLQ_URL', 'PROCESSING_QUEUE_URL'),
+    'distribution': ('DISTRIBUTION_DLQ_URL', 'DISTRIBUTION_QUEUE_URL'),
+}
+
+
+def duration(text):
+    """Seconds in '90', '30m', '6h' or '2d'"""
+    unit = DURATION_UNITS.get(text[-1:].lower())
+    try:
+        return float(text[:-1]) * unit if unit else float(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"not a duration: {text}")
+
+
+def parse_body(text):
+    try:
+        body = json.loads(text)
+    except ValueError:
+        return None
+    return body if isinstance(body, dict) else None
+
+
+class Redrive:
+    """One drain of a dead-letter queue into its source queue.
+
+    sqs is a boto3 SQS client (or the local stand-in). fingerprint maps an
+    alert's message to its error signature; only needed with fingerprints.
+    """
+
+    def __init__(self, sqs, dlq_url, queue_url, kind, severities=(), min_age=None, max_age=None,
+                 fingerprints=(), fingerprint=None, rate=5.0, limit=None, dry_run=False, visibility=900,
+                 progress=5.0):
+        self.sqs = sqs
+        self.dlq_url = dlq_url
+        self.queue_url = queue_url
+        self.kind = kind
+        self.severities = {severity.upper() for severity in severities}
+        self.min_age = min_age
+        self.max_age = max_age
+        self.fingerprints = set(fingerprints)
+        self.fingerprint = fingerprint
+        self.rate = rate
+        self.limit = limit
+        self.dry_run = dry_run
+        self.visibility = visibility
+        self.progress = progress
+        self.stats = Counter()
+        # Dedupe keys redriven so far, IDs of the messages moved to the
+        # back and the kept messages received again, held until the end
+        self.seen = set()
+        self.moved = set()
+        self.held = []
+        self.started = None
+
+    @property
+    def filtered(self):
+        return bool(self.severities or self.min_age is not None or self.max_age is not None or self.fingerprints)
+
+    def sent_at(self, message):
+        """When the message was first sent, in epoch seconds"""
+        original = message.get('MessageAttributes', {}).get(ORIGINAL_SENT)
+        if original:
+            return int(original['StringValue']) / 1000
+        return int(message['Attributes']['SentTimestamp']) / 1000
+
+    def selected(self, body, message, now):
+        """Whether a message passes the filters; unparseable ones only pass without filters"""
+        if not self.filtered:
+            return True
+        if body is None:
+            return False
+        if self.severities and str(body.get('severity', '')).upper() not in self.severities:
+            return False
+        age = now - self.sent_at(message)
+        if (self.min_age is not None and age < self.min_age) or (self.max_age is not None and age > self.max_age):
+            return False
+        if self.fingerprints:
+            text = body.get('message' if self.kind == 'processing' else 'alert')
+            if not isinstance(text, str) or self.fingerprint(text) not in self.fingerprints:
+                return False
+        return True
+
+    def dedupe_key(self, body):
+        if body is None or not body.get('alert_id'):
+            return None
+        if self.kind == 'distribution':
+            return body['alert_id'], 'update' if body.get('update') else \
+                'preliminary' if body.get('preliminary') else 'final'
+        return body['alert_id']
+
+    def run(self):
+        self.started = reported = time.monotonic()
+        while self.limit is None or self.stats['redriven'] < self.limit:
+            messages = self.sqs.receive_message(
+                QueueUrl=self.dlq_url,
+                MaxNumberOfMessages=MAX_BATCH,
+                WaitTimeSeconds=1,
+                VisibilityTimeout=self.visibility,
+                AttributeNames=['SentTimestamp', 'MessageGroupId'],
+                MessageAttributeNames=[ORIGINAL_SENT]
+            ).get('Messages', [])
+            if not messages:
+                break
+            self._handle(messages)
+            if time.monotonic() - reported >= self.progress:
+                self.report()
+                reported = time.monotonic()
+        self._release()
+        self.report()
+        return self.stats
+
+    def _handle(self, messages):
+        """Redrive, keep or drop one receive's messages"""
+        redrive, keep, drop = [], [], []
+        now = time.time()
+        for message in messages:
+            if message['MessageId'] in self.moved:
+                self.held.append(message)
+                continue
+            self.stats['received'] += 1
+            body = parse_body(message['Body'])
+            key = self.dedupe_key(body)
+            if not self.selected(body, message, now):
+                self.stats['kept'] += 1
+                keep.append(message)
+            elif key is not None and key in self.seen:
+                self.stats['duplicates'] += 1
+                drop.append(message)
+            elif self.limit is not None and self.stats['redriven'] + len(redrive) >= self.limit:
+                keep.append(message)
+            else:
+                if key is not None:
+                    self.seen.add(key)
+                redrive.append((message, key))
+
+        if self.dry_run:
+            # Nothing sent or deleted: all of it is made visible again at the end
+            self.stats['redriven'] += len(redrive)
+            self.held += drop + keep + [message for message, _ in redrive]
+            return
+
+        done = list(drop)
+        if redrive:
+            self._pace(len(redrive))
+            sent = self._send(self.queue_url, [message for message, _ in redrive])
+            for message, key in redrive:
+                if message['MessageId'] in sent:
+                    done.append(message)
+                else:
+                    # Left where it is; another copy of the alert may go instead
+                    self.seen.discard(key)
+                    self.held.append(message)
+            self.stats['redriven'] += len(sent)
+            self.stats['failed'] += len(redrive) - len(sent)
+
+        if keep:
+            moved = self._send(self.dlq_url, keep, keep=True)
+            self.moved.update(moved.values())
+            done += [message for message in keep if message['MessageId'] in moved]
+            self.held += [message for message in keep if message['MessageId'] not in moved]
+        if done:
+            self._delete(done)
+
+    def _pace(self, count):
+        """Sleep until sending count more messages stays within the rate"""
+        if self.rate > 0:
+            time.sleep(max(0.0, (self.stats['redriven'] + count) / self.rate - (time.monotonic() - self.started)))
+
+    def _send(self, queue_url, messages, keep=False):
+        """Send copies of messages to a queue; returns {original MessageId: new MessageId} of those sent"""
+        entries = []
+        for n, message in enumerate(messages):
+            entry = {'Id': str(n), 'MessageBody': message['Body']}
+            if queue_url.endswith('.fifo'):
+                entry['MessageGroupId'] = message['Attributes'].get('MessageGroupId') or 'alerts'
+                # A rerun within SQS's 5 minute deduplication window doesn't send it twice
+                entry['MessageDeduplicationId'] = f"{'keep' if keep else 'redrive'}-{message['MessageId']}"
+            # Ages stay those of the first send, should it be dead-lettered again
+            entry['MessageAttributes'] = {ORIGINAL_SENT: {
+                'DataType': 'Number', 'StringValue': str(int(self.sent_at(message) * 1000))}}
+            entries.append(entry)
+        response = self.sqs.send_message_batch(QueueUrl=queue_url, Entries=entries)
+        for failure in response.get('Failed', []):
+            print(f"Could not send message {messages[int(failure['Id'])]['MessageId']}: {failure.get('Code')}")
+        return {messages[int(success['Id'])]['MessageId']: success['MessageId']
+                for success in response.get('Successful', [])}
+
+    def _delete(self, messages):
+        response = self.sqs.delete_message_batch(
+            QueueUrl=self.dlq_url,
+            Entries=[{'Id': str(n), 'ReceiptHandle': m['ReceiptHandle']} for n, m in enumerate(messages)]
+        )
+        for failure in response.get('Failed', []):
+            print(f"Could not delete message {messages[int(failure['Id'])]['MessageId']}: {failure.get('Code')}")
+
+    def _release(self):
+        """Make the held messages visible again"""
+        for start in range(0, len(self.held), MAX_BATCH):
+            chunk = self.held[start:start + MAX_BATCH]
+            self.sqs.change_message_visibility_batch(
+                QueueUrl=self.dlq_url,
+                Entries=[{'Id': str(n), 'ReceiptHandle': m['ReceiptHandle'], 'VisibilityTimeout': 0}
+                         for n, m in enumerate(chunk)]
+            )
+        self.held = []
+
+    def report(self):
+        elapsed = time.monotonic() - self.started
+        stats = self.stats
+        print(f"{stats['received']} received: {stats['redriven']} {'would be ' if self.dry_run else ''}redriven, "
+              f"{stats['kept']} kept, {stats['duplicates']} duplicates, {stats['failed']} failed "
+              f"({stats['redriven'] / elapsed if elapsed else 0:.1f}/s over {elapsed:.0f} s)")
+
+
+def local_setup(args):
+    """A local SQS stand-in with a synthetic dead-letter backlog in both queues.
+
+    Returns the client and {kind: (dead-letter queue URL, source queue URL)}.
+    """
+    import random
+
+    sys.path.insert(0, os.path.join(ROOT, 'test'))
+    from sqs_local import LocalSQS
+
+    rng = random.Random(args.seed)
+    sqs = LocalSQS()
+    urls = {kind: (sqs.create_queue(QueueName=f"{kind}-dlq.fifo")['QueueUrl'],
+                   sqs.create_queue(QueueName=f"{kind}.fifo")['QueueUrl']) for kind in QUEUES}
+    now = time.time()
+    services = ['orders', 'payments', 'search', 'auth']
+    alerts = []
+    for n in range(args.local_messages):
+        if alerts and rng.random() < 0.15:
+            # Dead-lettered twice (ingested twice, or a redelivered copy)
+            alert = rng.choice(alerts)
+        else:
+            service = services[n % 4]
+            alert = {'alert_id': f"alert-{n}", 'severity': rng.choice(['CRITICAL', 'HIGH', 'MEDIUM', 'LOW']),
+                     'log_group': f"/ecs/{service}",
+                     'message': f"[ERROR] {service}-api: upstream {['timeout', 'refused'][n % 2]} (request {n})"}
+            alerts.append(alert)
+        sent_at = int((now - rng.uniform(0, 3 * 86400)) * 1000)
+        processing = json.dumps(alert) if rng.random() > 0.02 else '{"alert_id": "truncated'
+        distribution = json.dumps({'alert_id': alert['alert_id'], 'alert': alert['message'],
+                                   'severity': alert['severity'], 'preliminary': False, 'update': False})
+        for kind, body in (('processing', processing), ('distribution', distribution)):
+            group = 'alerts' if kind == 'processing' else 'analysis'
+            sqs.send_message(QueueUrl=urls[kind][0], MessageBody=body, MessageGroupId=group)
+            sqs.queues[urls[kind][0]][-1].sent_at = sent_at
+    return sqs, urls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--queue', choices=sorted(QUEUES), default='processing')
+    parser.add_argument('--severity', action='append', default=[], help='redrive only this severity')
+    parser.add_argument('--min-age', type=duration, help='redrive only messages at least this old (e.g. 1h)')
+    parser.add_argument('--max-age', type=duration, help='redrive only messages at most this old (e.g. 2d)')
+    parser.add_argument('--fingerprint', action='append', default=[], help="redrive only this error signature")
+    parser.add_argument('--rate', type=float, default=5.0, help='max messages redriven per second')
+    parser.add_argument('--limit', type=int, help='stop after redriving this many messages')
+    parser.add_argument('--dry-run', action='store_true', help='report what would be redriven; send and delete nothing')
+    parser.add_argument('--visibility', type=int, default=900,
+                        help='seconds received messages stay hidden; longer than the whole drain')
+    parser.add_argument('--progress', type=float, default=5.0, help='seconds between progress lines')
+    parser.add_argument('--local', action='store_true', help='use the SQS stand-in with a synthetic backlog')
+    parser.add_argument('--local-messages', type=int, default=300)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    if args.local:
+        sqs, urls = local_setup(args)
+        dlq_url, queue_url = urls[args.queue]
+    else:
+        dlq_var, queue_var = QUEUES[args.queue]
+        dlq_url, queue_url = os.environ.get(dlq_var), os.environ.get(queue_var)
+        if not dlq_url or not queue_url:
+            parser.error(f"{dlq_var} and {queue_var} must be set (or use --local)")
+        import boto3
+        sqs = boto3.client('sqs')
+
+    fingerprint = None
+    if args.fingerprint:
+        from runbooks import fingerprint
+
+    redrive = Redrive(sqs, dlq_url, queue_url, args.queue, severities=args.severity, min_age=args.min_age,
+                      max_age=args.max_age, fingerprints=args.fingerprint, fingerprint=fingerprint,
+                      rate=args.rate, limit=args.limit, dry_run=args.dry_run, visibility=args.visibility,
+                      progress=args.progress)
+    print(f"Redriving {dlq_url} -> {queue_url}{' (dry run)' if args.dry_run else ''}")
+    if args.dry_run and dlq_url.endswith('.fifo'):
+        print('FIFO queue: the dry run sees up to 10 messages per message group')
+    redrive.run()
+
+    if args.local:
+        # What reached the source queue, checked against the filters
+        now = time.time()
+        received = sqs.receive_message(QueueUrl=queue_url, MaxNumberOfMessages=len(sqs.queues[queue_url]))
+        bodies = [(parse_body(m['Body']), m) for m in received.get('Messages', [])]
+        keys = [key for key in (redrive.dedupe_key(body) for body, _ in bodies) if key is not None]
+        duplicates = len(keys) - len(set(keys))
+        outside = sum(not redrive.selected(body, message, now) for body, message in bodies)
+        left = sqs.get_queue_attributes(QueueUrl=dlq_url)['Attributes']['ApproximateNumberOfMessages']
+        print(f"source queue: {len(bodies)} messages, {duplicates} duplicate alerts, {outside} outside the filters; "
+              f"{left} left in the dead-letter queue")
+        sys.exit(1 if duplicates or outside else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Train the analyzer's local alert classifier from stored alerts.
+
+Scans the alerts table for the past --days and labels each alert the LLM
+analyzed (directly or through the analysis cache) with the severity the
+LLM assigned and whether it needed the LLM: it did unless the analysis
+came back at one of the --benign severities without asking for immediate
+attention. Alerts answered by runbooks, rules, the fallback or the
+classifier itself are left out. Fits the hashed n-gram model on all but
+a --holdout share, reports how the model would have done on the rest at
+--threshold, and writes the model file the analyzer loads
+(lambdas/analyzer/classifier.npz, packaged with the function).
+
+Needs numpy. Against a deployment:
+
+    ALERTS_TABLE=... python tools/train_classifier.py --days 30
+
+`task train-classifier` fills in the table name from Terraform outputs.
+Locally, on synthetic history:
+
+    python tools/train_classifier.py --local
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'lambdas', 'analyzer'))
+sys.path.insert(0, os.path.join(ROOT, 'lambdas', 'shared', 'python'))
+
+import classifier
+
+DAY_SECONDS = 86400
+SEVERITIES = ['CRITICAL', 'HIGH', 'MEDIUM', 'LOW']
+
+# Analyses that aren't an LLM's judgment of the alert
+NOT_JUDGED = ('classifier', 'runbook', 'none', 'fallback')
+
+
+def labelled(item, benign):
+    """(body, category, needs_llm) for a stored alert, or None if it can't teach anything"""
+    import blobs
+
+    item = blobs.decode(item)
+    if 'message' not in item or item.get('model') in NOT_JUDGED:
+        return None
+    try:
+        report = json.loads(item.get('analysis') or '{}')
+    except ValueError:
+        return None
+    severity = report.get('severity')
+    if severity not in SEVERITIES:
+        return None
+    needs_llm = bool(report.get('requires_immediate_attention')) or severity not in benign
+    return {'message': item['message'], 'severity': item.get('severity', 'MEDIUM')}, severity, needs_llm
+
+
+def examples(table, days, now, benign):
+    """Labelled examples from the alerts stored over the period"""
+    from boto3.dynamodb.conditions import Attr
+
+    result = []
+    kwargs = {'FilterExpression': Attr('timestamp').gt(int(now - days * DAY_SECONDS))}
+    while True:
+        response = table.scan(**kwargs)
+        for item in response.get('Items', []):
+            example = labelled(item, benign)
+            if example:
+                result.append(example)
+        if 'LastEvaluatedKey' not in response:
+            return result
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def evaluate(model, held_out):
+    """Share of alerts skipped, needs-LLM alerts skipped, category accuracy, mean inference microseconds"""
+    skipped = false_skips = correct = 0
+    start = time.perf_counter()
+    for body, category, needs_llm in held_out:
+        prediction = model.predict(body)
+        correct += prediction.category == category
+        if not prediction.needs_llm and prediction.confidence >= model.threshold:
+            skipped += 1
+            false_skips += needs_llm
+    elapsed = time.perf_counter() - start
+    total = max(1, len(held_out))
+    return {'skipped': skipped / total, 'false_skips': false_skips, 'accuracy': correct / total,
+            'micros': elapsed * 1e6 / total}
+
+
+def fit(train_examples, path, dims, epochs, threshold):
+    """Train, write the model file and load it back as the analyzer would"""
+    categories = [s for s in SEVERITIES if any(category == s for _, category, _ in train_examples)]
+    weights, bias = classifier.train(train_examples, categories, dims=dims, epochs=epochs)
+    classifier.save(path, weights, bias, categories)
+    return classifier.AlertClassifier(path, threshold)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--days', type=int, default=30, help='history to train on')
+    parser.add_argument('--output', default=classifier.DEFAULT_MODEL_PATH)
+    parser.add_argument('--benign', default='LOW,MEDIUM', help='analyzed severities that did not need the LLM')
+    parser.add_argument('--dims', type=int, default=classifier.DEFAULT_DIMS)
+    parser.add_argument('--epochs', type=int, default=60)
+    parser.add_argument('--holdout', type=float, default=0.2, help='share of examples kept for evaluation')
+    parser.add_argument('--threshold', type=float, default=0.9, help='confidence the analyzer skips the LLM at')
+    parser.add_argument('--local', action='store_true', help='train on synthetic history')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    benign = set(args.benign.split(','))
+    now = time.time()
+    if args.local:
+        os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+        sys.path.insert(0, os.path.join(ROOT, 'test'))
+        from bench_classifier import history
+
+        table = history(random.Random(args.seed), 20000, now)
+    else:
+        table_name = os.environ.get('ALERTS_TABLE')
+        if not table_name:
+            parser.error('ALERTS_TABLE must be set (or use --local)')
+        import boto3
+
+        table = boto3.resource('dynamodb').Table(table_name)
+
+    data = examples(table, args.days, now, benign)
+    if not data:
+        parser.error(f"no LLM-analyzed alerts in the past {args.days} days")
+    random.Random(args.seed).shuffle(data)
+    cut = int(len(data) * (1 - args.holdout))
+    print(f"{len(data):,} labelled alerts, {sum(not needs for *_, needs in data) / len(data):.0%} routine; "
+          f"training on {cut:,}")
+
+    # Evaluate a model trained without the held-out alerts, then ship one trained on everything
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory() as scratch:
+        result = evaluate(fit(data[:cut], os.path.join(scratch, 'model.npz'), args.dims, args.epochs,
+                              args.threshold), data[cut:])
+    print(f"trained in {time.perf_counter() - start:.1f} s; held out at threshold {args.threshold}: "
+          f"{result['skipped']:.1%} of alerts skip the LLM, {result['false_skips']} of them needed it; "
+          f"category accuracy {result['accuracy']:.1%}; {result['micros']:.0f} us per alert")
+
+    fit(data, args.output, args.dims, args.epochs, args.threshold)
+    print(f"wrote {args.output} ({os.path.getsize(args.output) / 1024:.0f} KB)")
+
+
+if __name__ == '__main__':
+    main()